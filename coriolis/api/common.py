@@ -1,12 +1,88 @@
 # Copyright 2016 Cloudbase Solutions Srl
 # All Rights Reserved.
 
+from urllib import parse
+
+from oslo_utils import timeutils
+
+from coriolis import exception
 from coriolis import utils
 
 
+TIME_FILTER_PARAMS = ["created_since", "created_before", "updated_since"]
+
+
 def get_paging_params(req):
     marker = req.GET.get("marker")
     limit = req.GET.get("limit")
     if limit is not None:
         limit = utils.parse_int_value(limit)
     return marker, limit
+
+
+def _get_list_param(req, name):
+    """ Returns the list of values of the given query parameter, which may
+    be passed multiple times and/or as comma-separated values.
+    """
+    return [
+        item.strip() for value in req.GET.getall(name)
+        for item in value.split(",") if item.strip()]
+
+
+def get_sort_params(req):
+    sort_keys = _get_list_param(req, "sort_key")
+    sort_dirs = _get_list_param(req, "sort_dir")
+    for sort_dir in sort_dirs:
+        if sort_dir not in ("asc", "desc"):
+            raise exception.InvalidInput(
+                "Invalid sort direction '%s'. Must be one of 'asc' or "
+                "'desc'." % sort_dir)
+    if len(sort_dirs) > len(sort_keys):
+        raise exception.InvalidInput(
+            "More sort directions than sort keys were provided.")
+    return sort_keys or None, sort_dirs or None
+
+
+def get_fields_param(req, required_fields=None):
+    """ Returns the list of fields requested to be included in the results,
+    along with the given required ones, or None if all fields should be.
+    """
+    fields = _get_list_param(req, "fields")
+    if not fields:
+        return None
+    for field in (required_fields or []):
+        if field not in fields:
+            fields.append(field)
+    return fields
+
+
+def get_transfer_action_filters(req):
+    filters = {}
+    statuses = _get_list_param(req, "status")
+    if statuses:
+        filters["status"] = statuses
+    for param in TIME_FILTER_PARAMS:
+        value = req.GET.get(param)
+        if not value:
+            continue
+        try:
+            timeutils.parse_isotime(value)
+        except ValueError:
+            raise exception.InvalidInput(
+                "Invalid ISO 8601 timestamp for '%s': %s" % (param, value))
+        filters[param] = value
+    return filters
+
+
+def get_collection_links(req, items, limit, id_key="id"):
+    """ Returns the link to the next page of a paginated collection, if the
+    current page is full.
+    """
+    if not limit or len(items) < limit:
+        return []
+    params = [
+        (key, value) for key, value in req.GET.items() if key != "marker"]
+    params.append(("marker", items[-1][id_key]))
+    return [{
+        "rel": "next",
+        "href": "%s?%s" % (req.path_url, parse.urlencode(params))}]
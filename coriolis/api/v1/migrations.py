@@ -1,6 +1,7 @@
 # Copyright 2016 Cloudbase Solutions Srl
 # All Rights Reserved.
 
+from coriolis.api import common
 from coriolis.api.v1 import utils as api_utils
 from coriolis.api.v1.views import migration_view
 from coriolis.api import wsgi as api_wsgi
@@ -49,12 +50,22 @@ class MigrationController(api_wsgi.Controller):
         context = req.environ["coriolis.context"]
         context.show_deleted = show_deleted
         context.can(migration_policies.get_migrations_policy_label("list"))
+        marker, limit = common.get_paging_params(req)
+        sort_keys, sort_dirs = common.get_sort_params(req)
+        fields = common.get_fields_param(req, required_fields=["id"])
+        if fields and "tasks" in fields and "executions" not in fields:
+            # NOTE: the tasks of a Migration are those of its execution:
+            fields.append("executions")
+        migrations = self._migration_api.get_migrations(
+            context,
+            include_tasks=CONF.api.include_task_info_in_migrations_api,
+            include_task_info=CONF.api.include_task_info_in_migrations_api,
+            marker=marker, limit=limit, sort_keys=sort_keys,
+            sort_dirs=sort_dirs,
+            filters=common.get_transfer_action_filters(req), fields=fields)
         return migration_view.collection(
-            req, self._migration_api.get_migrations(
-                context,
-                include_tasks=CONF.api.include_task_info_in_migrations_api,
-                include_task_info=CONF.api.include_task_info_in_migrations_api
-            ))
+            req, migrations,
+            links=common.get_collection_links(req, migrations, limit))
 
     def index(self, req):
         return self._list(req)
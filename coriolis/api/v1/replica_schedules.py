@@ -3,6 +3,7 @@
 
 from coriolis.api.v1.views import replica_schedule_view
 from coriolis.api import wsgi as api_wsgi
+from coriolis.cron import cron
 from coriolis import exception
 from coriolis.policies import replica_schedules as schedules_policies
 from coriolis.replica_cron import api
@@ -47,6 +48,7 @@ class ReplicaScheduleController(api_wsgi.Controller):
     def _validate_schedule(self, schedule):
         schema = schemas.SCHEDULE_API_BODY_SCHEMA["properties"]["schedule"]
         schemas.validate_value(schedule, schema)
+        cron.parse_schedule(schedule)
         return schedule
 
     def _validate_expiration_date(self, expiration_date):
@@ -1,6 +1,7 @@
 # Copyright 2016 Cloudbase Solutions Srl
 # All Rights Reserved.
 
+from coriolis.api import common
 from coriolis.api.v1 import utils as api_utils
 from coriolis.api.v1.views import replica_tasks_execution_view
 from coriolis.api.v1.views import replica_view
@@ -50,11 +51,19 @@ class ReplicaController(api_wsgi.Controller):
         context.show_deleted = show_deleted
         context.can(replica_policies.get_replicas_policy_label("list"))
         include_task_info = CONF.api.include_task_info_in_replicas_api
+        marker, limit = common.get_paging_params(req)
+        sort_keys, sort_dirs = common.get_sort_params(req)
+        replicas = self._replica_api.get_replicas(
+            context,
+            include_tasks_executions=include_task_info,
+            include_task_info=include_task_info,
+            marker=marker, limit=limit, sort_keys=sort_keys,
+            sort_dirs=sort_dirs,
+            filters=common.get_transfer_action_filters(req),
+            fields=common.get_fields_param(req, required_fields=["id"]))
         return replica_view.collection(
-            req, self._replica_api.get_replicas(
-                context,
-                include_tasks_executions=include_task_info,
-                include_task_info=include_task_info))
+            req, replicas,
+            links=common.get_collection_links(req, replicas, limit))
 
     def index(self, req):
         return self._list(req)
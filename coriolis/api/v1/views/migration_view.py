@@ -33,7 +33,10 @@ def single(req, migration):
     return {"migration": _format_migration(req, migration)}
 
 
-def collection(req, migrations):
+def collection(req, migrations, links=None):
     formatted_migrations = [_format_migration(req, m)
                             for m in migrations]
-    return {'migrations': formatted_migrations}
+    result = {'migrations': formatted_migrations}
+    if links:
+        result['migrations_links'] = links
+    return result
@@ -15,10 +15,11 @@ def _format_replica(req, replica, keys=None):
     replica_dict = dict(itertools.chain.from_iterable(
         transform(k, v) for k, v in replica.items()))
 
-    executions = replica_dict.get('executions', [])
-    replica_dict['executions'] = [
-        view.format_replica_tasks_execution(req, ex)
-        for ex in executions]
+    if 'executions' in replica_dict:
+        executions = replica_dict.get('executions', [])
+        replica_dict['executions'] = [
+            view.format_replica_tasks_execution(req, ex)
+            for ex in executions]
 
     return replica_dict
 
@@ -27,7 +28,10 @@ def single(req, replica):
     return {"replica": _format_replica(req, replica)}
 
 
-def collection(req, replicas):
+def collection(req, replicas, links=None):
     formatted_replicas = [_format_replica(req, m)
                           for m in replicas]
-    return {'replicas': formatted_replicas}
+    result = {'replicas': formatted_replicas}
+    if links:
+        result['replicas_links'] = links
+    return result
@@ -0,0 +1,143 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+""" Dependency index of the tasks of executions, which the Conductor
+advances the state of the executions with.
+
+The index of an execution holds the children of each task and the number
+of parents of each task which have yet to reach a terminal state, so that
+the state changes of some tasks only lead to the re-evaluation of their
+direct children instead of all the tasks of the execution.
+
+The indexes are cached, but the statuses of the tasks are always refreshed
+from the ones passed in on each state advancement, so a cached index whose
+execution was advanced by another Conductor process in the meantime simply
+gets updated with all the task status changes which happened since.
+"""
+
+import collections
+import heapq
+import threading
+
+from oslo_log import log as logging
+
+from coriolis import constants
+
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 100
+
+
+class ExecutionGraph(object):
+    """ Dependency index of the tasks of a single execution. """
+
+    def __init__(self, tasks):
+        self.tasks = {}
+        self.statuses = {}
+        self.parents = {}
+        self.children = collections.defaultdict(list)
+        self.on_error_tasks = set()
+        self._remaining_parents = {}
+        self._ready = set()
+        # NOTE: heap of (index, task_id) of the ready tasks, whose entries
+        # are only discarded when popped if no longer in '_ready':
+        self._ready_heap = []
+
+        for task in tasks:
+            self.tasks[task.id] = task
+            self.statuses[task.id] = task.status
+            self.parents[task.id] = list(task.depends_on or [])
+            if task.on_error:
+                self.on_error_tasks.add(task.id)
+        for task_id, parent_ids in self.parents.items():
+            for parent_id in parent_ids:
+                self.children[parent_id].append(task_id)
+            self._remaining_parents[task_id] = len([
+                parent_id for parent_id in parent_ids
+                if not self._is_finalized(parent_id)])
+            self._refresh_ready(task_id)
+
+    def _is_finalized(self, task_id):
+        return self.statuses.get(task_id) in (
+            constants.FINALIZED_TASK_STATUSES)
+
+    def _refresh_ready(self, task_id):
+        is_ready = (
+            self.statuses[task_id] == constants.TASK_STATUS_SCHEDULED and
+            not self._remaining_parents[task_id])
+        if is_ready and task_id not in self._ready:
+            self._ready.add(task_id)
+            heapq.heappush(
+                self._ready_heap, (self.tasks[task_id].index, task_id))
+        elif not is_ready:
+            self._ready.discard(task_id)
+
+    def has_tasks(self, tasks):
+        return self.tasks.keys() == {task.id for task in tasks}
+
+    def refresh(self, tasks):
+        """ Updates the index with the current tasks of the execution. """
+        for task in tasks:
+            self.tasks[task.id] = task
+            if self.statuses[task.id] != task.status:
+                self.set_task_status(task.id, task.status)
+
+    def set_task_status(self, task_id, status):
+        was_finalized = self._is_finalized(task_id)
+        self.statuses[task_id] = status
+        is_finalized = self._is_finalized(task_id)
+        if was_finalized != is_finalized:
+            for child_id in self.children[task_id]:
+                self._remaining_parents[child_id] += (
+                    -1 if is_finalized else 1)
+                self._refresh_ready(child_id)
+        self._refresh_ready(task_id)
+
+    def get_parent_statuses(self, task_id):
+        return {
+            parent_id: self.statuses[parent_id]
+            for parent_id in self.parents[task_id]}
+
+    def pop_ready_task(self):
+        """ Returns the SCHEDULED task with the lowest index whose parents
+        have all reached a terminal state, or None if there are none.
+        """
+        while self._ready_heap:
+            _, task_id = heapq.heappop(self._ready_heap)
+            if task_id in self._ready:
+                self._ready.discard(task_id)
+                return self.tasks[task_id]
+        return None
+
+
+class ExecutionGraphCache(object):
+    """ LRU cache of the dependency indexes of executions. """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self._max_size = max_size
+        self._graphs = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, execution_id, tasks):
+        """ Returns the dependency index of the given execution, refreshed
+        with the given current tasks of the execution.
+        """
+        with self._lock:
+            graph = self._graphs.pop(execution_id, None)
+        if graph is not None and graph.has_tasks(tasks):
+            graph.refresh(tasks)
+        else:
+            LOG.debug(
+                "Building dependency index for the %d tasks of execution "
+                "'%s'", len(tasks), execution_id)
+            graph = ExecutionGraph(tasks)
+        with self._lock:
+            self._graphs[execution_id] = graph
+            while len(self._graphs) > self._max_size:
+                self._graphs.popitem(last=False)
+        return graph
+
+    def invalidate(self, execution_id):
+        with self._lock:
+            self._graphs.pop(execution_id, None)
@@ -1,6 +1,11 @@
 # Copyright 2016 Cloudbase Solutions Srl
 # All Rights Reserved.
 
+import collections
+import threading
+import time
+
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
@@ -16,7 +21,21 @@ LOG = logging.getLogger(__name__)
 conductor_opts = [
     cfg.IntOpt("conductor_rpc_timeout",
                help="Number of seconds until RPC calls to the "
-                    "conductor timeout.")
+                    "conductor timeout."),
+    cfg.FloatOpt("task_events_flush_interval",
+                 default=2,
+                 min=0,
+                 help="Number of seconds for which the events and progress "
+                      "updates of a task are buffered before being sent to "
+                      "the conductor in a single batch, with consecutive "
+                      "updates of the same progress update being coalesced. "
+                      "A value of 0 sends each of them as it occurs."),
+    cfg.IntOpt("task_events_max_batch_size",
+               default=100,
+               min=1,
+               help="Maximum number of buffered events and progress updates "
+                    "of a task after which they are sent to the conductor "
+                    "without waiting for the flush interval."),
 ]
 
 CONF = cfg.CONF
@@ -184,11 +203,15 @@ class ConductorClient(rpc.BaseRPCClient):
             user_scripts=user_scripts)
 
     def get_replicas(self, ctxt, include_tasks_executions=False,
-                     include_task_info=False):
+                     include_task_info=False, marker=None, limit=None,
+                     sort_keys=None, sort_dirs=None, filters=None,
+                     fields=None):
         return self._call(
             ctxt, 'get_replicas',
             include_tasks_executions=include_tasks_executions,
-            include_task_info=include_task_info)
+            include_task_info=include_task_info, marker=marker, limit=limit,
+            sort_keys=sort_keys, sort_dirs=sort_dirs, filters=filters,
+            fields=fields)
 
     def get_replica(self, ctxt, replica_id, include_task_info=False):
         return self._call(
@@ -204,10 +227,14 @@ class ConductorClient(rpc.BaseRPCClient):
             ctxt, 'delete_replica_disks', replica_id=replica_id)
 
     def get_migrations(self, ctxt, include_tasks=False,
-                       include_task_info=False):
+                       include_task_info=False, marker=None, limit=None,
+                       sort_keys=None, sort_dirs=None, filters=None,
+                       fields=None):
         return self._call(
             ctxt, 'get_migrations', include_tasks=include_tasks,
-            include_task_info=include_task_info)
+            include_task_info=include_task_info, marker=marker, limit=limit,
+            sort_keys=sort_keys, sort_dirs=sort_dirs, filters=filters,
+            fields=fields)
 
     def get_migration(self, ctxt, migration_id, include_task_info=False):
         return self._call(
@@ -308,6 +335,36 @@ class ConductorClient(rpc.BaseRPCClient):
             new_current_step=new_current_step,
             new_total_steps=new_total_steps, new_message=new_message)
 
+    def add_task_events(self, ctxt, task_id, events, wait=False):
+        operation = self._cast
+        if wait:
+            operation = self._call
+        operation(ctxt, 'add_task_events', task_id=task_id, events=events)
+
+    def add_task_progress_updates(
+            self, ctxt, task_id, progress_updates, wait=False):
+        operation = self._cast
+        if wait:
+            operation = self._call
+        operation(
+            ctxt, 'add_task_progress_updates', task_id=task_id,
+            progress_updates=progress_updates)
+
+    def update_task_progress_updates(
+            self, ctxt, task_id, progress_updates, wait=False):
+        operation = self._cast
+        if wait:
+            operation = self._call
+        operation(
+            ctxt, 'update_task_progress_updates', task_id=task_id,
+            progress_updates=progress_updates)
+
+    def update_task_volume_checkpoint(
+            self, ctxt, task_id, disk_id, checkpoint):
+        self._cast(
+            ctxt, 'update_task_volume_checkpoint', task_id=task_id,
+            disk_id=disk_id, checkpoint=checkpoint)
+
     def create_replica_schedule(self, ctxt, replica_id,
                                 schedule, enabled, exp_date,
                                 shutdown_instance):
@@ -412,6 +469,10 @@ class ConductorClient(rpc.BaseRPCClient):
             ctxt, 'update_service', service_id=service_id,
             updated_values=updated_values)
 
+    def update_service_load(self, ctxt, service_id, load):
+        self._cast(
+            ctxt, 'update_service_load', service_id=service_id, load=load)
+
     def delete_service(self, ctxt, service_id):
         return self._call(
             ctxt, 'delete_service', service_id=service_id)
@@ -445,10 +506,27 @@ class ConductorClient(rpc.BaseRPCClient):
 
 
 class ConductorTaskRpcEventHandler(events.BaseEventHandler):
+    """ Reports the events and progress updates of a task to the conductor.
+
+    Unless the flush interval is set to 0, new events and progress updates
+    are buffered and periodically sent in batches, while successive updates
+    of the same progress update only send the latest one. Progress updates
+    whose index is needed by the caller are always created synchronously,
+    after flushing everything buffered before them.
+    """
+
     def __init__(self, ctxt, task_id):
         self._ctxt = ctxt
         self._task_id = task_id
         self._rpc_conductor_client_instance = None
+        self._flush_interval = CONF.conductor.task_events_flush_interval
+        self._max_batch_size = CONF.conductor.task_events_max_batch_size
+        self._send_lock = threading.Lock()
+        self._flusher = None
+        self._last_flush = time.time()
+        self._pending_events = []
+        self._pending_progress_updates = []
+        self._pending_progress_update_steps = collections.OrderedDict()
 
     @property
     def _rpc_conductor_client(self):
@@ -459,6 +537,67 @@ class ConductorTaskRpcEventHandler(events.BaseEventHandler):
             self._rpc_conductor_client_instance = ConductorClient()
         return self._rpc_conductor_client_instance
 
+    @property
+    def _batching_enabled(self):
+        return self._flush_interval > 0
+
+    def _get_pending_count(self):
+        return (
+            len(self._pending_events) + len(self._pending_progress_updates) +
+            len(self._pending_progress_update_steps))
+
+    def _flush_periodically(self):
+        while self._get_pending_count():
+            eventlet.sleep(max(
+                0, self._last_flush + self._flush_interval - time.time()))
+            try:
+                self.flush()
+            except Exception:
+                LOG.warn(
+                    "Failed to send the buffered events of task '%s' to the "
+                    "conductor", self._task_id, exc_info=True)
+        self._flusher = None
+
+    def _buffered(self):
+        """ Sends out the buffered events if there are too many of them, or
+        makes sure they will be sent after the flush interval otherwise.
+        """
+        if self._get_pending_count() >= self._max_batch_size:
+            self.flush()
+        elif self._flusher is None:
+            self._flusher = eventlet.spawn(self._flush_periodically)
+
+    def flush(self, wait=False):
+        with self._send_lock:
+            events = self._pending_events
+            progress_updates = self._pending_progress_updates
+            progress_update_steps = self._pending_progress_update_steps
+            self._pending_events = []
+            self._pending_progress_updates = []
+            self._pending_progress_update_steps = collections.OrderedDict()
+            self._last_flush = time.time()
+
+            if events:
+                LOG.debug(
+                    "Sending %d events for task '%s' to conductor",
+                    len(events), self._task_id)
+                self._rpc_conductor_client.add_task_events(
+                    self._ctxt, self._task_id, events, wait=wait)
+            if progress_updates:
+                LOG.debug(
+                    "Sending %d progress updates for task '%s' to conductor",
+                    len(progress_updates), self._task_id)
+                self._rpc_conductor_client.add_task_progress_updates(
+                    self._ctxt, self._task_id, progress_updates, wait=wait)
+            if progress_update_steps:
+                LOG.debug(
+                    "Sending new steps of %d progress updates for task '%s' "
+                    "to conductor", len(progress_update_steps),
+                    self._task_id)
+                self._rpc_conductor_client.update_task_progress_updates(
+                    self._ctxt, self._task_id,
+                    list(progress_update_steps.values()), wait=wait)
+
     @classmethod
     def get_progress_update_identifier(self, progress_update):
         return progress_update['index']
@@ -468,9 +607,17 @@ class ConductorTaskRpcEventHandler(events.BaseEventHandler):
         LOG.info(
             "Sending progress update for task '%s' to conductor: %s",
             self._task_id, message)
-        return self._rpc_conductor_client.add_task_progress_update(
-            self._ctxt, self._task_id, message, initial_step=initial_step,
-            total_steps=total_steps, return_event=return_event)
+        if not self._batching_enabled or return_event:
+            # NOTE: the progress updates are indexed by the conductor in the
+            # order in which they are received:
+            self.flush()
+            return self._rpc_conductor_client.add_task_progress_update(
+                self._ctxt, self._task_id, message, initial_step=initial_step,
+                total_steps=total_steps, return_event=return_event)
+        self._pending_progress_updates.append({
+            "message": message, "initial_step": initial_step,
+            "total_steps": total_steps})
+        self._buffered()
 
     def update_progress_update(
             self, update_identifier, new_current_step,
@@ -478,10 +625,33 @@ class ConductorTaskRpcEventHandler(events.BaseEventHandler):
         LOG.info(
             "Updating progress update '%s' for task '%s' with new step %s",
             update_identifier, self._task_id, new_current_step)
-        self._rpc_conductor_client.update_task_progress_update(
-            self._ctxt, self._task_id, update_identifier, new_current_step,
-            new_total_steps=new_total_steps, new_message=new_message)
+        if not self._batching_enabled:
+            self._rpc_conductor_client.update_task_progress_update(
+                self._ctxt, self._task_id, update_identifier,
+                new_current_step, new_total_steps=new_total_steps,
+                new_message=new_message)
+            return
+        update = self._pending_progress_update_steps.get(
+            update_identifier, {"index": update_identifier})
+        update["current_step"] = new_current_step
+        if new_total_steps is not None:
+            update["total_steps"] = new_total_steps
+        if new_message is not None:
+            update["message"] = new_message
+        self._pending_progress_update_steps[update_identifier] = update
+        self._buffered()
 
     def add_event(self, message, level=constants.TASK_EVENT_INFO):
-        self._rpc_conductor_client.add_task_event(
-            self._ctxt, self._task_id, level, message)
+        if not self._batching_enabled:
+            self._rpc_conductor_client.add_task_event(
+                self._ctxt, self._task_id, level, message)
+            return
+        self._pending_events.append({"level": level, "message": message})
+        self._buffered()
+
+    def update_volume_checkpoint(self, disk_id, checkpoint):
+        LOG.debug(
+            "Sending checkpoint for disk '%s' of task '%s' to conductor",
+            disk_id, self._task_id)
+        self._rpc_conductor_client.update_task_volume_checkpoint(
+            self._ctxt, self._task_id, disk_id, checkpoint)
@@ -1,15 +1,19 @@
 # Copyright 2016 Cloudbase Solutions Srl
 # All Rights Reserved.
 
+import collections
 import copy
 import functools
+import inspect
 import itertools
 import uuid
 
-from oslo_concurrency import lockutils
+import eventlet
+from eventlet import queue as eventlet_queue
 from oslo_config import cfg
 from oslo_log import log as logging
 
+from coriolis.conductor import execution_graph
 from coriolis import constants
 from coriolis import context
 from coriolis.db import api as db_api
@@ -17,6 +21,7 @@ from coriolis.db.sqlalchemy import models
 from coriolis import exception
 from coriolis import keystone
 from coriolis.licensing import client as licensing_client
+from coriolis import locks
 from coriolis.minion_manager.rpc import client as rpc_minion_manager_client
 from coriolis.replica_cron.rpc import client as rpc_cron_client
 from coriolis.scheduler.rpc import client as rpc_scheduler_client
@@ -35,7 +40,21 @@ CONDUCTOR_OPTS = [
                 default=False,
                 help="If set, any OSMorphing task which errors out will have "
                      "all of its following tasks unscheduled so as to allow "
-                     "for live debugging of the OSMorphing setup.")
+                     "for live debugging of the OSMorphing setup."),
+    cfg.IntOpt("task_dispatch_concurrency",
+               default=20,
+               min=1,
+               help="Maximum number of Worker services which are told to "
+                    "begin tasks in parallel when multiple tasks of an "
+                    "execution are started at once."),
+    cfg.IntOpt("worker_capacity_retry_interval",
+               default=10,
+               min=1,
+               help="Number of seconds between attempts to start the tasks "
+                    "which could not be started because all of the Worker "
+                    "services able to run them were at capacity. Such "
+                    "tasks are also retried whenever a Worker service "
+                    "reports its load.")
 ]
 
 CONF = cfg.CONF
@@ -46,116 +65,70 @@ TASK_DEADLOCK_ERROR_MESSAGE = (
     "Please review the Conductor logs and contact support for assistance.")
 
 
-def endpoint_synchronized(func):
-    @functools.wraps(func)
-    def wrapper(self, ctxt, endpoint_id, *args, **kwargs):
-        @lockutils.synchronized(
-            constants.ENDPOINT_LOCK_NAME_FORMAT % endpoint_id,
-            external=True)
-        def inner():
-            return func(self, ctxt, endpoint_id, *args, **kwargs)
-        return inner()
-    return wrapper
-
-
-def replica_synchronized(func):
-    @functools.wraps(func)
-    def wrapper(self, ctxt, replica_id, *args, **kwargs):
-        @lockutils.synchronized(
-            constants.REPLICA_LOCK_NAME_FORMAT % replica_id,
-            external=True)
-        def inner():
-            return func(self, ctxt, replica_id, *args, **kwargs)
-        return inner()
-    return wrapper
-
-
-def schedule_synchronized(func):
-    @functools.wraps(func)
-    def wrapper(self, ctxt, replica_id, schedule_id, *args, **kwargs):
-        @lockutils.synchronized(
-            constants.SCHEDULE_LOCK_NAME_FORMAT % schedule_id,
-            external=True)
-        def inner():
-            return func(self, ctxt, replica_id, schedule_id, *args, **kwargs)
-        return inner()
-    return wrapper
-
-
-def task_synchronized(func):
-    @functools.wraps(func)
-    def wrapper(self, ctxt, task_id, *args, **kwargs):
-        @lockutils.synchronized(
-            constants.TASK_LOCK_NAME_FORMAT % task_id,
-            external=True)
-        def inner():
-            return func(self, ctxt, task_id, *args, **kwargs)
-        return inner()
-    return wrapper
+def _synchronized_on_arg(
+        lock_name_format, arg_name, mode=locks.LOCK_MODE_WRITE):
+    """ Returns a decorator which holds the lock of the object whose ID is
+    passed to the decorated method as the given argument.
+    """
+    def _decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            object_id = signature.bind(*args, **kwargs).arguments[arg_name]
+            with locks.lock(lock_name_format % object_id, mode=mode):
+                return func(*args, **kwargs)
+        return wrapper
+    return _decorator
+
+
+endpoint_synchronized = _synchronized_on_arg(
+    constants.ENDPOINT_LOCK_NAME_FORMAT, "endpoint_id")
+endpoint_read_synchronized = _synchronized_on_arg(
+    constants.ENDPOINT_LOCK_NAME_FORMAT, "endpoint_id",
+    mode=locks.LOCK_MODE_READ)
+replica_synchronized = _synchronized_on_arg(
+    constants.REPLICA_LOCK_NAME_FORMAT, "replica_id")
+replica_read_synchronized = _synchronized_on_arg(
+    constants.REPLICA_LOCK_NAME_FORMAT, "replica_id",
+    mode=locks.LOCK_MODE_READ)
+schedule_synchronized = _synchronized_on_arg(
+    constants.SCHEDULE_LOCK_NAME_FORMAT, "schedule_id")
+schedule_read_synchronized = _synchronized_on_arg(
+    constants.SCHEDULE_LOCK_NAME_FORMAT, "schedule_id",
+    mode=locks.LOCK_MODE_READ)
+task_synchronized = _synchronized_on_arg(
+    constants.TASK_LOCK_NAME_FORMAT, "task_id")
+migration_synchronized = _synchronized_on_arg(
+    constants.MIGRATION_LOCK_NAME_FORMAT, "migration_id")
+migration_read_synchronized = _synchronized_on_arg(
+    constants.MIGRATION_LOCK_NAME_FORMAT, "migration_id",
+    mode=locks.LOCK_MODE_READ)
+tasks_execution_synchronized = _synchronized_on_arg(
+    constants.EXECUTION_LOCK_NAME_FORMAT, "execution_id")
+tasks_execution_read_synchronized = _synchronized_on_arg(
+    constants.EXECUTION_LOCK_NAME_FORMAT, "execution_id",
+    mode=locks.LOCK_MODE_READ)
+region_synchronized = _synchronized_on_arg(
+    constants.REGION_LOCK_NAME_FORMAT, "region_id")
+region_read_synchronized = _synchronized_on_arg(
+    constants.REGION_LOCK_NAME_FORMAT, "region_id",
+    mode=locks.LOCK_MODE_READ)
+service_synchronized = _synchronized_on_arg(
+    constants.SERVICE_LOCK_NAME_FORMAT, "service_id")
+service_read_synchronized = _synchronized_on_arg(
+    constants.SERVICE_LOCK_NAME_FORMAT, "service_id",
+    mode=locks.LOCK_MODE_READ)
 
 
 def parent_tasks_execution_synchronized(func):
     @functools.wraps(func)
     def wrapper(self, ctxt, task_id, *args, **kwargs):
-        task = db_api.get_task(ctxt, task_id)
-
-        @lockutils.synchronized(
-            constants.EXECUTION_LOCK_NAME_FORMAT % task.execution_id,
-            external=True)
-        @lockutils.synchronized(
-            constants.TASK_LOCK_NAME_FORMAT % task_id,
-            external=True)
-        def inner():
-            return func(self, ctxt, task_id, *args, **kwargs)
-        return inner()
-    return wrapper
-
-
-def migration_synchronized(func):
-    @functools.wraps(func)
-    def wrapper(self, ctxt, migration_id, *args, **kwargs):
-        @lockutils.synchronized(
-            constants.MIGRATION_LOCK_NAME_FORMAT % migration_id,
-            external=True)
-        def inner():
-            return func(self, ctxt, migration_id, *args, **kwargs)
-        return inner()
-    return wrapper
-
-
-def tasks_execution_synchronized(func):
-    @functools.wraps(func)
-    def wrapper(self, ctxt, replica_id, execution_id, *args, **kwargs):
-        @lockutils.synchronized(
-            constants.EXECUTION_LOCK_NAME_FORMAT % execution_id,
-            external=True)
-        def inner():
-            return func(self, ctxt, replica_id, execution_id, *args, **kwargs)
-        return inner()
-    return wrapper
-
+        execution_id = db_api.get_task_execution_id(ctxt, task_id)
 
-def region_synchronized(func):
-    @functools.wraps(func)
-    def wrapper(self, ctxt, region_id, *args, **kwargs):
-        @lockutils.synchronized(
-            constants.REGION_LOCK_NAME_FORMAT % region_id,
-            external=True)
-        def inner():
-            return func(self, ctxt, region_id, *args, **kwargs)
-        return inner()
-    return wrapper
-
-
-def service_synchronized(func):
-    @functools.wraps(func)
-    def wrapper(self, ctxt, service_id, *args, **kwargs):
-        @lockutils.synchronized(
-            constants.SERVICE_LOCK_NAME_FORMAT % service_id,
-            external=True)
-        def inner():
-            return func(self, ctxt, service_id, *args, **kwargs)
-        return inner()
+        with locks.lock(constants.EXECUTION_LOCK_NAME_FORMAT % execution_id):
+            with locks.lock(constants.TASK_LOCK_NAME_FORMAT % task_id):
+                return func(self, ctxt, task_id, *args, **kwargs)
     return wrapper
 
 
@@ -166,6 +139,13 @@ class ConductorServerEndpoint(object):
         self._scheduler_client_instance = None
         self._replica_cron_client_instance = None
         self._minion_manager_client_instance = None
+        self._execution_graphs = execution_graph.ExecutionGraphCache()
+        # NOTE: the tasks waiting for Worker services to have capacity for
+        # them are left PENDING without a host in the DB, and every conductor
+        # process periodically retries starting them:
+        self._capacity_retry_thread = None
+        self._capacity_retry_queue = eventlet_queue.LightQueue()
+        self._capacity_deferred_tasks_found = False
 
     # NOTE(aznashwan): it is unsafe to fork processes with pre-instantiated
     # oslo_messaging clients as the underlying eventlet thread queues will
@@ -256,9 +236,16 @@ class ConductorServerEndpoint(object):
             region_sets=region_sets, enabled=enabled,
             random_choice=random_choice,
             raise_on_no_matches=raise_on_no_matches)
-        service = db_api.get_service(ctxt, selected_service["id"])
         return rpc_worker_client.WorkerClient.from_service_definition(
-            service)
+            selected_service)
+
+    def _invalidate_scheduler_service_registry(self, ctxt):
+        try:
+            self._scheduler_client.invalidate_service_registry(ctxt)
+        except Exception:
+            LOG.warn(
+                "Failed to invalidate the service registry cache of the "
+                "Scheduler. Error was: %s", utils.get_exception_details())
 
     def _check_delete_reservation_for_transfer(self, transfer_action):
         action_id = transfer_action.base_id
@@ -383,7 +370,7 @@ class ConductorServerEndpoint(object):
     def get_endpoints(self, ctxt):
         return db_api.get_endpoints(ctxt)
 
-    @endpoint_synchronized
+    @endpoint_read_synchronized
     def get_endpoint(self, ctxt, endpoint_id):
         endpoint = db_api.get_endpoint(ctxt, endpoint_id)
         if not endpoint:
@@ -588,29 +575,222 @@ class ConductorServerEndpoint(object):
             "target_environment": action.destination_environment
         }
 
-    def _get_worker_service_rpc_for_task(
-            self, ctxt, task, origin_endpoint, destination_endpoint,
-            retry_count=5, retry_period=2, random_choice=True):
-        worker_service = None
-        try:
-            worker_service = (
-                self._scheduler_client.get_worker_service_for_task(
-                    ctxt, {"id": task.id, "task_type": task.task_type},
-                    origin_endpoint, destination_endpoint,
-                    retry_count=retry_count, retry_period=retry_period,
-                    random_choice=random_choice))
-        except Exception as ex:
+    def _get_worker_service_rpcs_for_tasks(
+            self, ctxt, tasks, origin_endpoint, destination_endpoint,
+            retry_count=5, retry_period=2):
+        """ Schedules all the given tasks with a single request to the
+        Scheduler, returning a dict mapping task IDs to Worker clients.
+        The host of the Worker service each task was scheduled on is
+        recorded on the task, so that the tasks without one are known to
+        still be waiting to be started.
+        The tasks for which all suitable Worker services are at capacity
+        are left out of the returned dict without waiting for them.
+        The tasks which could not be scheduled are marked as such and the
+        error of the first one is raised.
+        """
+        worker_services, errors = (
+            self._scheduler_client.get_worker_services_for_tasks(
+                ctxt, [{"id": task.id, "task_type": task.task_type}
+                       for task in tasks],
+                origin_endpoint, destination_endpoint,
+                retry_count=retry_count, retry_period=retry_period))
+
+        first_error = None
+        for task in tasks:
+            if task.id not in errors:
+                continue
+            if isinstance(
+                    errors[task.id], exception.WorkerServicesAtCapacityError):
+                LOG.debug(
+                    "All Worker services able to run task '%s' are at "
+                    "capacity.", task.id)
+                continue
             LOG.debug(
                 "Failed to get worker service for task '%s'. Updating status "
-                "to unscheduleable. Error trace was: %s",
-                task.id, utils.get_exception_details())
+                "to unscheduleable. Error was: %s", task.id, errors[task.id])
             db_api.set_task_status(
                 ctxt, task.id, constants.TASK_STATUS_FAILED_TO_SCHEDULE,
-                exception_details=str(ex))
+                exception_details=str(errors[task.id]))
+            if first_error is None:
+                first_error = errors[task.id]
+        if first_error is not None:
+            raise first_error
+
+        db_api.set_tasks_hosts(
+            ctxt, {task_id: service.get("host")
+                   for task_id, service in worker_services.items()})
+        return {
+            task_id: rpc_worker_client.WorkerClient.from_service_definition(
+                service)
+            for task_id, service in worker_services.items()}
+
+    def _start_tasks(
+            self, ctxt, execution, tasks, origin, destination,
+            origin_endpoint, destination_endpoint, tasks_info,
+            scheduling_retry_count=5, scheduling_retry_period=2):
+        """ Starts all the given tasks of the execution at once, setting
+        their statuses in bulk, scheduling them with a single request and
+        having the Worker services begin them in parallel.
+        Should any task fail to be started, the execution is cancelled and
+        the error is raised.
+        The tasks for which all suitable Worker services are at capacity are
+        left PENDING without a host and get started later by
+        `_retry_capacity_deferred_tasks`.
+        Must be called with the lock of the execution held.
+
+        :param tasks_info: dict mapping the IDs of the tasks to their info.
+        :return: list of the IDs of the started tasks.
+        """
+        if not tasks:
+            return []
+        task_ids = [task.id for task in tasks]
+        db_api.set_tasks_statuses(
+            ctxt, task_ids, constants.TASK_STATUS_PENDING)
+
+        try:
+            worker_rpcs = self._get_worker_service_rpcs_for_tasks(
+                ctxt, tasks, origin_endpoint, destination_endpoint,
+                retry_count=scheduling_retry_count,
+                retry_period=scheduling_retry_period)
+        except Exception:
+            LOG.warn(
+                "Error occured while scheduling new tasks %s. Cancelling "
+                "execution '%s'. Error was: %s", task_ids, execution.id,
+                utils.get_exception_details())
+            self._cancel_tasks_execution(ctxt, execution, requery=True)
             raise
 
-        return rpc_worker_client.WorkerClient.from_service_definition(
-            worker_service)
+        deferred_tasks = [task for task in tasks if task.id not in worker_rpcs]
+        if deferred_tasks:
+            self._defer_tasks_for_capacity(ctxt, execution, deferred_tasks)
+            tasks = [task for task in tasks if task.id in worker_rpcs]
+
+        def _begin_task(task):
+            try:
+                worker_rpcs[task.id].begin_task(
+                    ctxt,
+                    task_id=task.id,
+                    task_type=task.task_type,
+                    origin=origin,
+                    destination=destination,
+                    instance=task.instance,
+                    task_info=tasks_info[task.id])
+            except Exception as ex:
+                LOG.warn(
+                    "Error occured while starting new task '%s'. Error "
+                    "was: %s", task.id, utils.get_exception_details())
+                return ex
+            LOG.debug(
+                "Successfully started task with ID '%s' (type '%s') for "
+                "execution '%s'", task.id, task.task_type, execution.id)
+            return None
+
+        pool = eventlet.GreenPool(CONF.conductor.task_dispatch_concurrency)
+        errors = [
+            ex for ex in pool.imap(_begin_task, tasks) if ex is not None]
+        if errors:
+            LOG.warn(
+                "Failed to start %d of the new tasks of execution '%s'. "
+                "Cancelling it.", len(errors), execution.id)
+            self._cancel_tasks_execution(ctxt, execution, requery=True)
+            raise errors[0]
+
+        return [task.id for task in tasks]
+
+    def _defer_tasks_for_capacity(self, ctxt, execution, tasks):
+        """ Notes that the given tasks of the execution, which were left
+        PENDING without a host, are waiting for Worker services to have
+        capacity for them, and makes sure they get retried periodically.
+        """
+        LOG.info(
+            "All Worker services able to run tasks %s of execution '%s' are "
+            "at capacity. Retrying to start them later.",
+            [task.id for task in tasks], execution.id)
+        for task in tasks:
+            db_api.add_task_event(
+                ctxt, task.id, constants.TASK_EVENT_INFO,
+                "Waiting for a Worker service to be able to run the task.")
+        self._capacity_deferred_tasks_found = True
+        self._ensure_capacity_retry_thread()
+
+    def _ensure_capacity_retry_thread(self):
+        # NOTE: the greenthread is only spawned when needed so as to not
+        # have it running before the service forks its worker processes:
+        if self._capacity_retry_thread is None:
+            self._capacity_retry_thread = eventlet.spawn(
+                self._capacity_retry_loop)
+
+    def _capacity_retry_loop(self):
+        while True:
+            try:
+                self._capacity_retry_queue.get(
+                    timeout=CONF.conductor.worker_capacity_retry_interval)
+            except eventlet_queue.Empty:
+                pass
+            # NOTE: multiple load reports may have queued up meanwhile:
+            while not self._capacity_retry_queue.empty():
+                self._capacity_retry_queue.get_nowait()
+            try:
+                self._retry_capacity_deferred_tasks()
+            except Exception:
+                LOG.warn(
+                    "Failed to retry the tasks waiting for Worker capacity. "
+                    "Error was: %s", utils.get_exception_details())
+
+    def _retry_capacity_deferred_tasks(self):
+        """ Attempts to start all the tasks of any execution which were left
+        PENDING without a host for the lack of Worker capacity. The ones
+        which still cannot be started are left as they are by `_start_tasks`.
+        """
+        ctxt = context.get_admin_context()
+        deferred_tasks = db_api.get_capacity_deferred_tasks(ctxt)
+        self._capacity_deferred_tasks_found = bool(deferred_tasks)
+        execution_ids = {task.execution_id for task in deferred_tasks}
+        for execution_id in execution_ids:
+            try:
+                self._start_capacity_deferred_tasks(execution_id)
+            except Exception:
+                LOG.warn(
+                    "Failed to start the tasks of execution '%s' which were "
+                    "waiting for Worker capacity. Error was: %s",
+                    execution_id, utils.get_exception_details())
+
+    def _start_capacity_deferred_tasks(self, execution_id):
+        with locks.lock(constants.EXECUTION_LOCK_NAME_FORMAT % execution_id):
+            # NOTE: the tasks are looked up again under the lock as they may
+            # have been meanwhile started or unscheduled by another process:
+            execution = db_api.get_tasks_execution(
+                context.get_admin_context(), execution_id,
+                include_tasks=False)
+            ctxt = context.get_admin_context(trust_id=execution.trust_id)
+            ctxt.delete_trust_id = execution.delete_trust_id
+            tasks = db_api.get_capacity_deferred_tasks(
+                ctxt, execution_id=execution_id)
+            if not tasks:
+                return
+
+            action = execution.action
+            instance_infos = {}
+            tasks_info = {}
+            for task in tasks:
+                if task.instance not in instance_infos:
+                    instance_infos[task.instance] = (
+                        db_api.get_action_instance_info(
+                            ctxt, execution.action_id, task.instance) or {})
+                tasks_info[task.id] = instance_infos[task.instance]
+
+            started_tasks = self._start_tasks(
+                ctxt, execution, tasks,
+                self._get_task_origin(ctxt, action),
+                self._get_task_destination(ctxt, action),
+                db_api.get_endpoint(ctxt, action.origin_endpoint_id),
+                db_api.get_endpoint(ctxt, action.destination_endpoint_id),
+                tasks_info)
+            if started_tasks:
+                LOG.info(
+                    "Started the following tasks for execution '%s' after "
+                    "Worker capacity freed up: %s",
+                    execution_id, started_tasks)
 
     def _begin_tasks(
             self, ctxt, action, execution, task_info_override=None,
@@ -619,6 +799,10 @@ class ConductorServerEndpoint(object):
         if not ctxt.trust_id:
             keystone.create_trust(ctxt)
             ctxt.delete_trust_id = True
+        # NOTE: the trust is recorded so that any tasks which have to wait
+        # for Worker capacity can be started later by any conductor:
+        db_api.set_execution_trust(
+            ctxt, execution.id, ctxt.trust_id, ctxt.delete_trust_id)
 
         task_info = action.info
         if task_info_override is not None:
@@ -631,39 +815,27 @@ class ConductorServerEndpoint(object):
         destination_endpoint = db_api.get_endpoint(
             ctxt, action.destination_endpoint_id)
 
-        newly_started_tasks = []
+        tasks_to_start = []
         for task in execution.tasks:
             if (not task.depends_on and (
                     task.status == constants.TASK_STATUS_SCHEDULED)):
                 LOG.info(
                     "Starting dependency-less task '%s' for execution '%s'",
                     task.id, execution.id)
-                db_api.set_task_status(
-                    ctxt, task.id, constants.TASK_STATUS_PENDING)
-                try:
-                    worker_rpc = self._get_worker_service_rpc_for_task(
-                        ctxt, task, origin_endpoint, destination_endpoint,
-                        retry_count=scheduling_retry_count,
-                        retry_period=scheduling_retry_period)
-                    worker_rpc.begin_task(
-                        ctxt,
-                        task_id=task.id,
-                        task_type=task.task_type,
-                        origin=origin,
-                        destination=destination,
-                        instance=task.instance,
-                        task_info=task_info.get(task.instance, {}))
-                except Exception:
-                    LOG.warn(
-                        "Error occured while starting new task '%s'. "
-                        "Cancelling execution '%s'. Error was: %s",
-                        task.id, execution.id, utils.get_exception_details())
-                    self._cancel_tasks_execution(
-                        ctxt, execution, requery=True)
-                    raise
-                newly_started_tasks.append(task.id)
-
-        if newly_started_tasks:
+                tasks_to_start.append(task)
+
+        with locks.lock(constants.EXECUTION_LOCK_NAME_FORMAT % execution.id):
+            newly_started_tasks = self._start_tasks(
+                ctxt, execution, tasks_to_start, origin, destination,
+                origin_endpoint, destination_endpoint,
+                {task.id: task_info.get(task.instance, {})
+                 for task in tasks_to_start},
+                scheduling_retry_count=scheduling_retry_count,
+                scheduling_retry_period=scheduling_retry_period)
+
+        # NOTE: tasks which are waiting for Worker capacity are PENDING and
+        # will be started later, so the execution is running regardless:
+        if tasks_to_start:
             LOG.info(
                 "Started the following tasks for Execution '%s': %s",
                 execution.id, newly_started_tasks)
@@ -1027,7 +1199,7 @@ class ConductorServerEndpoint(object):
         return self.get_replica_tasks_execution(
             ctxt, replica_id, execution.id)
 
-    @replica_synchronized
+    @replica_read_synchronized
     def get_replica_tasks_executions(self, ctxt, replica_id,
                                      include_tasks=False,
                                      include_task_info=False):
@@ -1035,7 +1207,7 @@ class ConductorServerEndpoint(object):
             ctxt, replica_id, include_tasks,
             include_task_info=include_task_info, to_dict=True)
 
-    @tasks_execution_synchronized
+    @tasks_execution_read_synchronized
     def get_replica_tasks_execution(self, ctxt, replica_id, execution_id,
                                     include_task_info=False):
         return self._get_replica_tasks_execution(
@@ -1082,12 +1254,16 @@ class ConductorServerEndpoint(object):
         return execution
 
     def get_replicas(self, ctxt, include_tasks_executions=False,
-                     include_task_info=False):
+                     include_task_info=False, marker=None, limit=None,
+                     sort_keys=None, sort_dirs=None, filters=None,
+                     fields=None):
         return db_api.get_replicas(
             ctxt, include_tasks_executions,
-            include_task_info=include_task_info, to_dict=True)
+            include_task_info=include_task_info, to_dict=True,
+            marker=marker, limit=limit, sort_keys=sort_keys,
+            sort_dirs=sort_dirs, filters=filters, fields=fields)
 
-    @replica_synchronized
+    @replica_read_synchronized
     def get_replica(self, ctxt, replica_id, include_task_info=False):
         return self._get_replica(
             ctxt, replica_id,
@@ -1220,13 +1396,16 @@ class ConductorServerEndpoint(object):
         return replica
 
     def get_migrations(self, ctxt, include_tasks,
-                       include_task_info=False):
+                       include_task_info=False, marker=None, limit=None,
+                       sort_keys=None, sort_dirs=None, filters=None,
+                       fields=None):
         return db_api.get_migrations(
             ctxt, include_tasks,
             include_task_info=include_task_info,
-            to_dict=True)
+            to_dict=True, marker=marker, limit=limit, sort_keys=sort_keys,
+            sort_dirs=sort_dirs, filters=filters, fields=fields)
 
-    @migration_synchronized
+    @migration_read_synchronized
     def get_migration(self, ctxt, migration_id, include_task_info=False):
         return self._get_migration(
             ctxt, migration_id, include_task_info=include_task_info,
@@ -1511,9 +1690,8 @@ class ConductorServerEndpoint(object):
                 migration.instance_osmorphing_minion_pool_mappings):
             # NOTE: we lock on the migration ID to ensure the minion
             # allocation confirmations don't come in too early:
-            with lockutils.lock(
-                    constants.MIGRATION_LOCK_NAME_FORMAT % migration.id,
-                    external=True):
+            with locks.lock(
+                    constants.MIGRATION_LOCK_NAME_FORMAT % migration.id):
                 (self._minion_manager_client
                      .allocate_minion_machines_for_migration(
                          ctxt, migration, include_transfer_minions=False,
@@ -2099,9 +2277,8 @@ class ConductorServerEndpoint(object):
         if uses_minion_pools:
             # NOTE: we lock on the migration ID to ensure the minion
             # allocation confirmations don't come in too early:
-            with lockutils.lock(
-                    constants.MIGRATION_LOCK_NAME_FORMAT % migration.id,
-                    external=True):
+            with locks.lock(
+                    constants.MIGRATION_LOCK_NAME_FORMAT % migration.id):
                 (self._minion_manager_client
                     .allocate_minion_machines_for_migration(
                         ctxt, migration, include_transfer_minions=True,
@@ -2152,9 +2329,8 @@ class ConductorServerEndpoint(object):
                 "Migration '%s' is already being cancelled. Please use the "
                 "force option if you'd like to force-cancel it.")
 
-        with lockutils.lock(
-                constants.EXECUTION_LOCK_NAME_FORMAT % execution.id,
-                external=True):
+        with locks.lock(
+                constants.EXECUTION_LOCK_NAME_FORMAT % execution.id):
             self._cancel_tasks_execution(ctxt, execution, force=force)
         self._check_delete_reservation_for_transfer(migration)
 
@@ -2459,11 +2635,16 @@ class ConductorServerEndpoint(object):
         Returns the state of the execution when the check occured
         (either RUNNING or DEADLOCKED)
         """
+        tasks = None
         if requery:
-            execution = db_api.get_tasks_execution(ctxt, execution.id)
+            execution = db_api.get_tasks_execution(
+                ctxt, execution.id, include_tasks=False)
+            if not task_statuses:
+                tasks = db_api.get_tasks_execution_task_summaries(
+                    ctxt, execution.id)
         if not task_statuses:
             task_statuses = {}
-            for task in execution.tasks:
+            for task in (tasks if tasks is not None else execution.tasks):
                 task_statuses[task.id] = task.status
 
         determined_state = constants.EXECUTION_STATUS_RUNNING
@@ -2507,30 +2688,26 @@ class ConductorServerEndpoint(object):
         ERROR - not RUNNING and at least one is ERROR'd
         DEADLOCKED - has SCHEDULED tasks but none RUNNING/PENDING/CANCELLING
         """
-        is_running = False
-        is_canceled = False
-        is_cancelling = False
-        is_errord = False
-        has_scheduled_tasks = False
-        task_stat_map = {}
         if requery:
-            execution = db_api.get_tasks_execution(ctxt, execution.id)
-        for task in execution.tasks:
-            task_stat_map[task.id] = task.status
-            if task.status in constants.ACTIVE_TASK_STATUSES:
-                is_running = True
-            if task.status in constants.CANCELED_TASK_STATUSES:
-                is_canceled = True
-            if task.status in (
-                    constants.TASK_STATUS_ERROR,
-                    constants.TASK_STATUS_FAILED_TO_SCHEDULE):
-                is_errord = True
-            if task.status in (
-                    constants.TASK_STATUS_CANCELLING,
-                    constants.TASK_STATUS_CANCELLING_AFTER_COMPLETION):
-                is_cancelling = True
-            if task.status == constants.TASK_STATUS_SCHEDULED:
-                has_scheduled_tasks = True
+            # NOTE: only the number of tasks in each status is needed:
+            task_status_counts = db_api.get_tasks_execution_status_counts(
+                ctxt, execution.id)
+        else:
+            task_status_counts = collections.Counter(
+                task.status for task in execution.tasks)
+
+        task_statuses = set(task_status_counts.keys())
+        is_running = bool(task_statuses.intersection(
+            constants.ACTIVE_TASK_STATUSES))
+        is_canceled = bool(task_statuses.intersection(
+            constants.CANCELED_TASK_STATUSES))
+        is_errord = bool(task_statuses.intersection([
+            constants.TASK_STATUS_ERROR,
+            constants.TASK_STATUS_FAILED_TO_SCHEDULE]))
+        is_cancelling = bool(task_statuses.intersection([
+            constants.TASK_STATUS_CANCELLING,
+            constants.TASK_STATUS_CANCELLING_AFTER_COMPLETION]))
+        has_scheduled_tasks = constants.TASK_STATUS_SCHEDULED in task_statuses
 
         status = constants.EXECUTION_STATUS_COMPLETED
         if has_scheduled_tasks and not is_running:
@@ -2553,8 +2730,8 @@ class ConductorServerEndpoint(object):
 
         LOG.debug(
             "Overall status for Execution '%s' determined to be '%s'."
-            "Task statuses at time of decision: %s",
-            execution.id, status, task_stat_map)
+            "Task status counts at time of decision: %s",
+            execution.id, status, dict(task_status_counts))
         return status
 
     def _advance_execution_state(
@@ -2565,6 +2742,8 @@ class ConductorServerEndpoint(object):
         updates its state to the finalized one.
         Returns a list of all the tasks which were started.
         NOTE: should only be called with a lock on the Execution!
+        NOTE: the tasks of all instances are considered, the 'instance' only
+        being used for validation and logging.
 
         Requirements for a task to be started:
         - any SCHEDULED task with no deps will be instantly started
@@ -2580,7 +2759,10 @@ class ConductorServerEndpoint(object):
             * at least one non-error parent task must have been COMPLETED
         """
         if requery:
-            execution = db_api.get_tasks_execution(ctxt, execution.id)
+            # NOTE: only the properties of the tasks needed for deciding which
+            # of them to start are loaded:
+            execution = db_api.get_tasks_execution(
+                ctxt, execution.id, include_tasks=False)
         if execution.status not in constants.ACTIVE_EXECUTION_STATUSES:
             LOG.warn(
                 "Execution state advancement called on Execution '%s' which "
@@ -2588,21 +2770,22 @@ class ConductorServerEndpoint(object):
                 "Double-checking for deadlock and returning early.",
                 execution.id, execution.status)
             if self._check_clean_execution_deadlock(
-                    ctxt, execution, task_statuses=None,
-                    requery=not requery) == (
+                    ctxt, execution, task_statuses=None) == (
                         constants.EXECUTION_STATUS_DEADLOCKED):
                 LOG.error(
                     "Execution '%s' deadlocked even before Replica state "
                     "advancement . Cleanup has been perfomed. Returning.",
                     execution.id)
+            self._execution_graphs.invalidate(execution.id)
             return []
 
-        tasks_to_process = execution.tasks
-        if instance:
-            tasks_to_process = [
-                task for task in execution.tasks
-                if task.instance == instance]
-        if not tasks_to_process:
+        if requery:
+            execution_tasks = db_api.get_tasks_execution_task_summaries(
+                ctxt, execution.id)
+        else:
+            execution_tasks = execution.tasks
+        if not execution_tasks or instance and not any(
+                task.instance == instance for task in execution_tasks):
             raise exception.InvalidActionTasksExecutionState(
                 "State advancement requested for execution '%s' for "
                 "instance '%s', which has no tasks defined for it." % (
@@ -2614,95 +2797,56 @@ class ConductorServerEndpoint(object):
 
         origin = self._get_task_origin(ctxt, execution.action)
         destination = self._get_task_destination(ctxt, execution.action)
-        action = db_api.get_action(
-            ctxt, execution.action_id, include_task_info=True)
         origin_endpoint = db_api.get_endpoint(
             ctxt, execution.action.origin_endpoint_id)
         destination_endpoint = db_api.get_endpoint(
             ctxt, execution.action.destination_endpoint_id)
 
-        started_tasks = []
+        # NOTE: only the info of the instances whose tasks get started is
+        # loaded, as the info of every instance of the action can be large:
+        instance_infos = {}
 
-        def _start_task(task):
-            task_info = None
-            if task.instance not in action.info:
-                LOG.error(
-                    "No info present for instance '%s' in action '%s' for task"
-                    " '%s' (type '%s') of execution '%s' (type '%s'). "
-                    "Defaulting to empty dict." %
-                    (task.instance, action.id, task.id, task.task_type,
-                     execution.id, execution.type))
-                task_info = {}
-            else:
-                task_info = action.info[task.instance]
-            db_api.set_task_status(
-                ctxt, task.id, constants.TASK_STATUS_PENDING)
-            try:
-                worker_rpc = self._get_worker_service_rpc_for_task(
-                    ctxt, task, origin_endpoint, destination_endpoint)
-                worker_rpc.begin_task(
-                    ctxt,
-                    task_id=task.id,
-                    task_type=task.task_type,
-                    origin=origin,
-                    destination=destination,
-                    instance=task.instance,
-                    task_info=task_info)
-                LOG.debug(
-                    "Successfully started task with ID '%s' (type '%s') "
-                    "for execution '%s'", task.id, task.task_type,
-                    execution.id)
-                started_tasks.append(task.id)
-                return constants.TASK_STATUS_PENDING
-            except Exception:
-                LOG.warn(
-                    "Error occured while starting new task '%s'. "
-                    "Cancelling execution '%s'. Error was: %s",
-                    task.id, execution.id, utils.get_exception_details())
-                self._cancel_tasks_execution(
-                    ctxt, execution, requery=True)
-                raise
+        def _get_instance_info(task_instance):
+            if task_instance not in instance_infos:
+                instance_infos[task_instance] = (
+                    db_api.get_action_instance_info(
+                        ctxt, execution.action_id, task_instance))
+            return instance_infos[task_instance]
 
-        # aggregate all tasks and statuses:
-        task_statuses = {}
-        task_deps = {}
-        on_error_tasks = []
-        for task in execution.tasks:
-            task_statuses[task.id] = task.status
+        # NOTE: the tasks ready to be started are only gathered while going
+        # through the tasks, and are then all started at once:
+        tasks_to_start = []
 
-            if task.depends_on:
-                task_deps[task.id] = task.depends_on
-            else:
-                task_deps[task.id] = []
+        def _start_task(task):
+            tasks_to_start.append(task)
+            return constants.TASK_STATUS_PENDING
 
-            if task.on_error:
-                on_error_tasks.append(task.id)
+        # NOTE: the dependency index of the execution is refreshed with the
+        # current task statuses, and only the SCHEDULED tasks whose parents
+        # have all reached a terminal state get evaluated. Finalizing a task
+        # then makes its children be evaluated in the same iteration:
+        graph = self._execution_graphs.get(execution.id, execution_tasks)
+        task_statuses = graph.statuses
 
         LOG.debug(
             "All task statuses before execution '%s' lifecycle iteration "
             "(for tasks of instance '%s'): %s",
             execution.id, instance, task_statuses)
 
-        # NOTE: the tasks are saved in a random order in the DB, which
-        # complicates the processing logic so we just pre-sort:
-        for task in sorted(tasks_to_process, key=lambda t: t.index):
-
-            if task_statuses[task.id] == constants.TASK_STATUS_SCHEDULED:
+        try:
+            task = graph.pop_ready_task()
+            while task is not None:
+                parent_task_statuses = graph.get_parent_statuses(task.id)
 
                 # immediately start depency-less tasks (on-error or otherwise)
-                if not task_deps[task.id]:
+                if not parent_task_statuses:
                     LOG.info(
                         "Starting depency-less task '%s'", task.id)
-                    task_statuses[task.id] = _start_task(task)
-                    continue
-
-                parent_task_statuses = {
-                    dep_id: task_statuses[dep_id]
-                    for dep_id in task_deps[task.id]}
+                    graph.set_task_status(task.id, _start_task(task))
 
                 # immediately unschedule tasks (on-error or otherwise)
                 # if all of their parent tasks got un-scheduled:
-                if task_deps[task.id] and all([
+                elif all([
                         dep_stat == constants.TASK_STATUS_UNSCHEDULED
                         for dep_stat in parent_task_statuses.values()]):
                     LOG.info(
@@ -2714,102 +2858,106 @@ class ConductorServerEndpoint(object):
                         exception_details=(
                             "Unscheduled due to the unscheduling of all "
                             "parent tasks."))
-                    task_statuses[task.id] = constants.TASK_STATUS_UNSCHEDULED
-                    continue
-
-                # check all parents have finalized:
-                if all([
-                        dep_stat in constants.FINALIZED_TASK_STATUSES
-                        for dep_stat in parent_task_statuses.values()]):
-
-                    # handle non-error tasks:
-                    if task.id not in on_error_tasks:
-                        # start non-error tasks whose parents have
-                        # all completed successfully:
-                        if all([
-                                dep_stat == constants.TASK_STATUS_COMPLETED
-                                for dep_stat in (
-                                    parent_task_statuses.values())]):
-                            LOG.info(
-                                "Starting task '%s' as all dependencies have "
-                                "completed successfully: %s",
-                                task.id, parent_task_statuses)
-                            task_statuses[task.id] = _start_task(task)
-                        else:
-                            # it means one/more parents error'd/unscheduled
-                            # so we mark this task as unscheduled:
-                            LOG.info(
-                                "Unscheduling plain task '%s' as not all "
-                                "parent tasks completed successfully: %s",
-                                task.id, parent_task_statuses)
-                            db_api.set_task_status(
-                                ctxt, task.id,
-                                constants.TASK_STATUS_UNSCHEDULED,
-                                exception_details=(
-                                    "Unscheduled due to some parent tasks not "
-                                    "having completed successfully."))
-                            task_statuses[task.id] = (
-                                constants.TASK_STATUS_UNSCHEDULED)
-
-                    # handle on-error tasks:
+                    graph.set_task_status(
+                        task.id, constants.TASK_STATUS_UNSCHEDULED)
+
+                # handle non-error tasks:
+                elif task.id not in graph.on_error_tasks:
+                    # start non-error tasks whose parents have
+                    # all completed successfully:
+                    if all([
+                            dep_stat == constants.TASK_STATUS_COMPLETED
+                            for dep_stat in parent_task_statuses.values()]):
+                        LOG.info(
+                            "Starting task '%s' as all dependencies have "
+                            "completed successfully: %s",
+                            task.id, parent_task_statuses)
+                        graph.set_task_status(task.id, _start_task(task))
                     else:
-                        non_error_parents = {
-                            dep_id: task_statuses[dep_id]
-                            for dep_id in parent_task_statuses.keys()
-                            if dep_id not in on_error_tasks}
-
-                        # if there are no non-error parents whatsoever, it
-                        # means that one or more of the parent on-error tasks
-                        # [should] have a parent non-error task which failed:
-                        if not non_error_parents and (
-                                constants.TASK_STATUS_COMPLETED in (
-                                    parent_task_statuses.values())):
-                            LOG.info(
-                                "Starting on-error task '%s' as all parent "
-                                "tasks have been finalized and there are "
-                                "no non-error parents to directly depend on, "
-                                "but one or more on-error tasks have completed"
-                                " successfully: %s", task.id,
-                                parent_task_statuses)
-                            task_statuses[task.id] = _start_task(task)
-                        # start on-error tasks only if at least one non-error
-                        # parent task has completed successfully:
-                        elif constants.TASK_STATUS_COMPLETED in (
-                                non_error_parents.values()):
-                            LOG.info(
-                                "Starting on-error task '%s' as all parent "
-                                "tasks have been finalized and at least one "
-                                "non-error parent (%s) was completed: %s",
-                                task.id, list(non_error_parents.keys()),
-                                parent_task_statuses)
-                            task_statuses[task.id] = _start_task(task)
-                        else:
-                            LOG.info(
-                                "Unscheduling on-error task '%s' as none of "
-                                "its parent non-error tasks (%s) have "
-                                "completed successfully: %s",
-                                task.id, list(non_error_parents.keys()),
-                                parent_task_statuses)
-                            db_api.set_task_status(
-                                ctxt, task.id,
-                                constants.TASK_STATUS_UNSCHEDULED,
-                                exception_details=(
-                                    "Unscheduled due to no non-error parent "
-                                    "tasks having completed successfully."))
-                            task_statuses[task.id] = (
-                                constants.TASK_STATUS_UNSCHEDULED)
-
+                        # it means one/more parents error'd/unscheduled
+                        # so we mark this task as unscheduled:
+                        LOG.info(
+                            "Unscheduling plain task '%s' as not all "
+                            "parent tasks completed successfully: %s",
+                            task.id, parent_task_statuses)
+                        db_api.set_task_status(
+                            ctxt, task.id,
+                            constants.TASK_STATUS_UNSCHEDULED,
+                            exception_details=(
+                                "Unscheduled due to some parent tasks not "
+                                "having completed successfully."))
+                        graph.set_task_status(
+                            task.id, constants.TASK_STATUS_UNSCHEDULED)
+
+                # handle on-error tasks:
                 else:
-                    LOG.debug(
-                        "No lifecycle decision was taken with respect to task "
-                        "%s of execution %s as not all parent tasks have "
-                        "reached a terminal state: %s",
-                        task.id, execution.id, parent_task_statuses)
-            else:
-                LOG.debug(
-                    "No lifecycle decision to make for task '%s' of execution "
-                    "'%s' as it is not in a position to be scheduled: %s",
-                    task.id, execution.id, task_statuses[task.id])
+                    non_error_parents = {
+                        dep_id: dep_stat
+                        for dep_id, dep_stat in parent_task_statuses.items()
+                        if dep_id not in graph.on_error_tasks}
+
+                    # if there are no non-error parents whatsoever, it
+                    # means that one or more of the parent on-error tasks
+                    # [should] have a parent non-error task which failed:
+                    if not non_error_parents and (
+                            constants.TASK_STATUS_COMPLETED in (
+                                parent_task_statuses.values())):
+                        LOG.info(
+                            "Starting on-error task '%s' as all parent "
+                            "tasks have been finalized and there are "
+                            "no non-error parents to directly depend on, "
+                            "but one or more on-error tasks have completed"
+                            " successfully: %s", task.id,
+                            parent_task_statuses)
+                        graph.set_task_status(task.id, _start_task(task))
+                    # start on-error tasks only if at least one non-error
+                    # parent task has completed successfully:
+                    elif constants.TASK_STATUS_COMPLETED in (
+                            non_error_parents.values()):
+                        LOG.info(
+                            "Starting on-error task '%s' as all parent "
+                            "tasks have been finalized and at least one "
+                            "non-error parent (%s) was completed: %s",
+                            task.id, list(non_error_parents.keys()),
+                            parent_task_statuses)
+                        graph.set_task_status(task.id, _start_task(task))
+                    else:
+                        LOG.info(
+                            "Unscheduling on-error task '%s' as none of "
+                            "its parent non-error tasks (%s) have "
+                            "completed successfully: %s",
+                            task.id, list(non_error_parents.keys()),
+                            parent_task_statuses)
+                        db_api.set_task_status(
+                            ctxt, task.id,
+                            constants.TASK_STATUS_UNSCHEDULED,
+                            exception_details=(
+                                "Unscheduled due to no non-error parent "
+                                "tasks having completed successfully."))
+                        graph.set_task_status(
+                            task.id, constants.TASK_STATUS_UNSCHEDULED)
+
+                task = graph.pop_ready_task()
+
+            tasks_info = {}
+            for task in tasks_to_start:
+                task_info = _get_instance_info(task.instance)
+                if task_info is None:
+                    LOG.error(
+                        "No info present for instance '%s' in action '%s' for "
+                        "task '%s' (type '%s') of execution '%s' (type '%s'). "
+                        "Defaulting to empty dict." %
+                        (task.instance, execution.action_id, task.id,
+                         task.task_type, execution.id, execution.type))
+                    task_info = {}
+                tasks_info[task.id] = task_info
+            started_tasks = self._start_tasks(
+                ctxt, execution, tasks_to_start, origin, destination,
+                origin_endpoint, destination_endpoint, tasks_info)
+        except Exception:
+            # NOTE: the statuses in the index can no longer be trusted:
+            self._execution_graphs.invalidate(execution.id)
+            raise
 
         if started_tasks:
             LOG.debug(
@@ -2839,6 +2987,9 @@ class ConductorServerEndpoint(object):
                 latest_execution_status, task_statuses)
             self._set_tasks_execution_status(
                 ctxt, execution, latest_execution_status)
+            if latest_execution_status not in (
+                    constants.ACTIVE_EXECUTION_STATUSES):
+                self._execution_graphs.invalidate(execution.id)
         else:
             LOG.debug(
                 "Execution '%s' has remained in status '%s' following "
@@ -2859,9 +3010,7 @@ class ConductorServerEndpoint(object):
         migration = db_api.get_migration(ctxt, migration_id)
         replica_id = migration.replica_id
 
-        with lockutils.lock(
-                constants.REPLICA_LOCK_NAME_FORMAT % replica_id,
-                external=True):
+        with locks.lock(constants.REPLICA_LOCK_NAME_FORMAT % replica_id):
             LOG.debug(
                 "Updating volume_info in replica due to snapshot "
                 "restore during migration. replica id: %s", replica_id)
@@ -3151,14 +3300,12 @@ class ConductorServerEndpoint(object):
             db_api.set_task_status(
                 ctxt, task_id, constants.TASK_STATUS_COMPLETED)
 
-        execution = db_api.get_tasks_execution(ctxt, task.execution_id)
-        with lockutils.lock(
+        execution = db_api.get_tasks_execution(
+            ctxt, task.execution_id, include_tasks=False)
+        with locks.lock(
                 constants.EXECUTION_TYPE_TO_ACTION_LOCK_NAME_FORMAT_MAP[
-                    execution.type] % execution.action_id,
-                external=True):
+                    execution.type] % execution.action_id):
             action_id = execution.action_id
-            action = db_api.get_action(
-                ctxt, action_id, include_task_info=True)
 
             updated_task_info = None
             if task_result:
@@ -3176,9 +3323,8 @@ class ConductorServerEndpoint(object):
                     db_api.update_transfer_action_info_for_instance(
                         ctxt, action_id, task.instance, task_result))
             else:
-                action = db_api.get_action(
-                    ctxt, action_id, include_task_info=True)
-                updated_task_info = action.info[task.instance]
+                updated_task_info = db_api.get_action_instance_info(
+                    ctxt, action_id, task.instance)
                 LOG.info(
                     "Task '%s' for instance '%s' of transfer action '%s' "
                     "has completed successfuly but has not returned "
@@ -3302,8 +3448,9 @@ class ConductorServerEndpoint(object):
             db_api.set_task_status(
                 ctxt, task.id, final_status,
                 exception_details=exception_details)
-            execution = db_api.get_tasks_execution(ctxt, task.execution_id)
-            self._advance_execution_state(ctxt, execution, requery=False)
+            execution = db_api.get_tasks_execution(
+                ctxt, task.execution_id, include_tasks=False)
+            self._advance_execution_state(ctxt, execution)
 
     @parent_tasks_execution_synchronized
     def set_task_error(self, ctxt, task_id, exception_details):
@@ -3377,11 +3524,9 @@ class ConductorServerEndpoint(object):
         execution = db_api.get_tasks_execution(ctxt, task.execution_id)
 
         action_id = execution.action_id
-        action = db_api.get_action(ctxt, action_id, include_task_info=True)
-        with lockutils.lock(
+        with locks.lock(
                 constants.EXECUTION_TYPE_TO_ACTION_LOCK_NAME_FORMAT_MAP[
-                    execution.type] % action_id,
-                external=True):
+                    execution.type] % action_id):
             if task.task_type == constants.TASK_TYPE_OS_MORPHING and (
                     CONF.conductor.debug_os_morphing_errors):
                 LOG.debug(
@@ -3408,8 +3553,9 @@ class ConductorServerEndpoint(object):
                         "All subtasks for Migration '%s' have been cancelled "
                         "to allow for OSMorphing debugging. The connection "
                         "info for the worker VM is: %s",
-                        action_id, action.info.get(task.instance, {}).get(
-                            'osmorphing_connection_info', {}))
+                        action_id, (db_api.get_action_instance_info(
+                            ctxt, action_id, task.instance) or {}).get(
+                                'osmorphing_connection_info', {}))
                     self._set_tasks_execution_status(
                         ctxt, execution,
                         constants.EXECUTION_STATUS_CANCELED_FOR_DEBUGGING)
@@ -3425,7 +3571,8 @@ class ConductorServerEndpoint(object):
             # NOTE: if this was a migration, make sure to delete
             # its associated reservation.
             if execution.type == constants.EXECUTION_TYPE_MIGRATION:
-                self._check_delete_reservation_for_transfer(action)
+                self._check_delete_reservation_for_transfer(
+                    db_api.get_action(ctxt, action_id))
 
     @task_synchronized
     def add_task_event(self, ctxt, task_id, level, message):
@@ -3466,6 +3613,72 @@ class ConductorServerEndpoint(object):
             ctxt, task_id, progress_update_index, new_current_step,
             new_total_steps=new_total_steps, new_message=new_message)
 
+    def _check_task_accepts_events(self, ctxt, task_id, events_type):
+        task = db_api.get_task(ctxt, task_id)
+        if task.status not in constants.ACTIVE_TASK_STATUSES:
+            raise exception.InvalidTaskState(
+                "Task with ID '%s' is in a non-running state ('%s') but it "
+                "has received %s from its task host ('%s'). Refusing "
+                "them." % (task.id, task.status, events_type, task.host))
+
+    @task_synchronized
+    def add_task_events(self, ctxt, task_id, events):
+        LOG.info("Adding %d events for task '%s'", len(events), task_id)
+        self._check_task_accepts_events(ctxt, task_id, "task events")
+        db_api.add_task_events(ctxt, task_id, events)
+
+    @task_synchronized
+    def add_task_progress_updates(self, ctxt, task_id, progress_updates):
+        LOG.info(
+            "Adding %d progress updates for task '%s'",
+            len(progress_updates), task_id)
+        self._check_task_accepts_events(ctxt, task_id, "progress updates")
+        db_api.add_task_progress_updates(ctxt, task_id, progress_updates)
+
+    @task_synchronized
+    def update_task_progress_updates(self, ctxt, task_id, progress_updates):
+        LOG.info(
+            "Updating %d progress updates for task '%s'",
+            len(progress_updates), task_id)
+        db_api.update_task_progress_updates(ctxt, task_id, progress_updates)
+
+    @task_synchronized
+    def update_task_volume_checkpoint(
+            self, ctxt, task_id, disk_id, checkpoint):
+        task = db_api.get_task(ctxt, task_id)
+        if task.status not in constants.ACTIVE_TASK_STATUSES:
+            LOG.warn(
+                "Task with ID '%s' is in a non-running state ('%s') but it "
+                "has sent a checkpoint for disk '%s'. Ignoring it.",
+                task.id, task.status, disk_id)
+            return
+
+        execution = db_api.get_tasks_execution(
+            ctxt, task.execution_id, include_tasks=False)
+        with locks.lock(
+                constants.EXECUTION_TYPE_TO_ACTION_LOCK_NAME_FORMAT_MAP[
+                    execution.type] % execution.action_id):
+            instance_info = db_api.get_action_instance_info(
+                ctxt, execution.action_id, task.instance) or {}
+            volumes_info = copy.deepcopy(
+                instance_info.get("volumes_info", []))
+            matching_vols = [
+                vol for vol in volumes_info if vol.get("disk_id") == disk_id]
+            if not matching_vols:
+                LOG.warn(
+                    "Could not find disk '%s' in the volumes info of "
+                    "instance '%s' of action '%s'. Ignoring checkpoint.",
+                    disk_id, task.instance, execution.action_id)
+                return
+            for vol in matching_vols:
+                vol["replica_checkpoint"] = checkpoint
+            LOG.debug(
+                "Saving checkpoint for disk '%s' of instance '%s' of action "
+                "'%s'", disk_id, task.instance, execution.action_id)
+            db_api.update_transfer_action_info_for_instance(
+                ctxt, execution.action_id, task.instance,
+                {"volumes_info": volumes_info})
+
     def _get_replica_schedule(self, ctxt, replica_id,
                               schedule_id, expired=True):
         schedule = db_api.get_replica_schedule(
@@ -3531,12 +3744,12 @@ class ConductorServerEndpoint(object):
             lambda ctxt, sched: self._cleanup_schedule_resources(
                 ctxt, sched))
 
-    @replica_synchronized
+    @replica_read_synchronized
     def get_replica_schedules(self, ctxt, replica_id=None, expired=True):
         return db_api.get_replica_schedules(
             ctxt, replica_id=replica_id, expired=expired)
 
-    @schedule_synchronized
+    @schedule_read_synchronized
     def get_replica_schedule(self, ctxt, replica_id,
                              schedule_id, expired=True):
         return self._get_replica_schedule(
@@ -3646,6 +3859,8 @@ class ConductorServerEndpoint(object):
 
     def get_diagnostics(self, ctxt):
         diagnostics = utils.get_diagnostics_info()
+        diagnostics['lock_wait_stats'] = (
+            locks.get_lock_manager().get_wait_stats())
         if self._licensing_client:
             diagnostics['licensing_status'] = (
                 self._licensing_client.get_licence_status())
@@ -3665,12 +3880,13 @@ class ConductorServerEndpoint(object):
         region.description = description
         region.enabled = enabled
         db_api.add_region(ctxt, region)
+        self._invalidate_scheduler_service_registry(ctxt)
         return self.get_region(ctxt, region.id)
 
     def get_regions(self, ctxt):
         return db_api.get_regions(ctxt)
 
-    @region_synchronized
+    @region_read_synchronized
     def get_region(self, ctxt, region_id):
         region = db_api.get_region(ctxt, region_id)
         if not region:
@@ -3684,6 +3900,7 @@ class ConductorServerEndpoint(object):
             "Attempting to update region '%s' with payload: %s",
             region_id, updated_values)
         db_api.update_region(ctxt, region_id, updated_values)
+        self._invalidate_scheduler_service_registry(ctxt)
         LOG.info("Region '%s' successfully updated", region_id)
         return db_api.get_region(ctxt, region_id)
 
@@ -3692,6 +3909,7 @@ class ConductorServerEndpoint(object):
         # TODO(aznashwan): add checks for endpoints/services
         # associated to the region before deletion:
         db_api.delete_region(ctxt, region_id)
+        self._invalidate_scheduler_service_registry(ctxt)
 
     def register_service(
             self, ctxt, host, binary, topic, enabled, mapped_regions=None,
@@ -3742,6 +3960,7 @@ class ConductorServerEndpoint(object):
                 db_api.delete_service(ctxt, service.id)
                 raise
 
+        self._invalidate_scheduler_service_registry(ctxt)
         return self.get_service(ctxt, service.id)
 
     def check_service_registered(self, ctxt, host, binary, topic):
@@ -3769,13 +3988,14 @@ class ConductorServerEndpoint(object):
             "specs": status["specs"],
             "status": constants.SERVICE_STATUS_UP}
         db_api.update_service(ctxt, service_id, updated_values)
+        self._invalidate_scheduler_service_registry(ctxt)
         LOG.debug("Successfully refreshed status of service '%s'", service_id)
         return db_api.get_service(ctxt, service_id)
 
     def get_services(self, ctxt):
         return db_api.get_services(ctxt)
 
-    @service_synchronized
+    @service_read_synchronized
     def get_service(self, ctxt, service_id):
         service = db_api.get_service(ctxt, service_id)
         if not service:
@@ -3789,9 +4009,22 @@ class ConductorServerEndpoint(object):
             "Attempting to update service '%s' with payload: %s",
             service_id, updated_values)
         db_api.update_service(ctxt, service_id, updated_values)
+        self._invalidate_scheduler_service_registry(ctxt)
         LOG.info("Successfully updated service '%s'", service_id)
         return db_api.get_service(ctxt, service_id)
 
+    def update_service_load(self, ctxt, service_id, load):
+        # NOTE: load reports only ever touch the load columns of the service
+        # and are frequent, so they do not contend for the service lock:
+        LOG.debug("Updating load of service '%s': %s", service_id, load)
+        db_api.update_service_load(ctxt, service_id, load)
+        # NOTE: load reports reach every conductor process sooner or later,
+        # so they also make sure each of them is retrying deferred tasks:
+        self._ensure_capacity_retry_thread()
+        if self._capacity_deferred_tasks_found:
+            self._capacity_retry_queue.put(None)
+
     @service_synchronized
     def delete_service(self, ctxt, service_id):
         db_api.delete_service(ctxt, service_id)
+        self._invalidate_scheduler_service_registry(ctxt)
@@ -202,6 +202,10 @@ MINION_POOL_OPERATIONS_TASKS = [
     TASK_TYPE_POWER_OFF_DESTINATION_MINION
 ]
 
+DISK_TRANSFER_TASKS = [
+    TASK_TYPE_REPLICATE_DISKS
+]
+
 TASK_PLATFORM_SOURCE = "source"
 TASK_PLATFORM_DESTINATION = "destination"
 TASK_PLATFORM_BILATERAL = "bilateral"
@@ -275,10 +279,14 @@ TMP_DIRS_KEY = "__tmp_dirs"
 
 COMPRESSION_FORMAT_GZIP = "gzip"
 COMPRESSION_FORMAT_ZLIB = "zlib"
+COMPRESSION_FORMAT_ZSTD = "zstd"
+COMPRESSION_FORMAT_LZ4 = "lz4"
 
 VALID_COMPRESSION_FORMATS = [
     COMPRESSION_FORMAT_GZIP,
-    COMPRESSION_FORMAT_ZLIB
+    COMPRESSION_FORMAT_ZLIB,
+    COMPRESSION_FORMAT_ZSTD,
+    COMPRESSION_FORMAT_LZ4
 ]
 
 TRANSFER_ACTION_TYPE_MIGRATION = "migration"
@@ -368,6 +376,7 @@ MINION_MACHINE_STATUS_ALLOCATING = "ALLOCATING"
 MINION_MACHINE_STATUS_DEALLOCATING = "DEALLOCATING"
 MINION_MACHINE_STATUS_ERROR = "ERROR"
 MINION_MACHINE_STATUS_POWERING_OFF = "POWERING_OFF"
+MINION_MACHINE_STATUS_POWERING_ON = "POWERING_ON"
 MINION_MACHINE_STATUS_POWER_ERROR = "POWER_ERROR"
 MINION_MACHINE_STATUS_ERROR_DEPLOYING = "ERROR_DEPLOYING"
 MINION_MACHINE_STATUS_AVAILABLE = "AVAILABLE"
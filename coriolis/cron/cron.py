@@ -1,12 +1,14 @@
 import datetime
+import heapq
+import itertools
 import sys
 import time
 
 import eventlet
+from eventlet import queue as eventlet_queue
 from eventlet import semaphore
 from oslo_log import log
 from oslo_utils import timeutils
-import schedule
 
 from coriolis import exception
 from coriolis import schemas
@@ -15,6 +17,121 @@ from coriolis import schemas
 LOG = log.getLogger(__name__)
 
 SCHEDULE_FIELDS = ("minute", "hour", "dom", "month", "dow")
+SCHEDULE_FIELD_RANGES = {
+    "minute": (0, 59),
+    "hour": (0, 23),
+    "dom": (1, 31),
+    "month": (1, 12),
+    "dow": (0, 6)}
+
+# NOTE: as all the fields of a schedule must match, some schedules (such as
+# February 29th on a Monday) only run once every few decades, and some
+# (such as February 30th) never do:
+MAX_NEXT_RUN_TIME_LOOKAHEAD = datetime.timedelta(days=366 * 30)
+# NOTE: the cron loop re-evaluates its jobs at least this often, so as to
+# account for any changes of the system clock:
+MAX_CRON_SLEEP_SECONDS = 60
+
+
+def _get_datetime_fields(dt):
+    fields = ('year', 'month', 'dom', 'hour',
+              'minute', 'second', 'dow')
+    return dict(zip(fields, dt.timetuple()))
+
+
+def _parse_schedule_field(field, value):
+    """ Returns the set of values matched by the given schedule field, or
+    None if it matches any value. The field can either be a single value or
+    a cron expression of comma-separated values, ranges and/or wildcards,
+    each optionally with a step (ex: "*/10", "1-5,30-40/2").
+    """
+    if value is None:
+        return None
+    low, high = SCHEDULE_FIELD_RANGES[field]
+    if isinstance(value, int):
+        value = str(value)
+    if not isinstance(value, str):
+        raise exception.InvalidInput(
+            "Invalid value for schedule field '%s': %s" % (field, value))
+
+    values = set()
+    for item in value.split(","):
+        expr, has_step, step = item.strip().partition("/")
+        try:
+            step = int(step) if has_step else 1
+            if expr == "*":
+                start, end = low, high
+            else:
+                start, has_end, end = expr.partition("-")
+                start = int(start)
+                if has_end:
+                    end = int(end)
+                elif has_step:
+                    end = high
+                else:
+                    end = start
+        except ValueError:
+            raise exception.InvalidInput(
+                "Invalid expression for schedule field '%s': %s" % (
+                    field, value))
+        if step < 1 or not low <= start <= end <= high:
+            raise exception.InvalidInput(
+                "Expression '%s' for schedule field '%s' is outside of the "
+                "allowed range of %d-%d." % (item, field, low, high))
+        values.update(range(start, end + 1, step))
+
+    if len(values) == high - low + 1:
+        return None
+    return frozenset(values)
+
+
+def parse_schedule(schedule):
+    """ Returns a dict with the set of values matched by each field of the
+    given schedule, or None for the fields which match any value.
+    Raises InvalidInput if any of the fields is invalid.
+    """
+    return {
+        field: _parse_schedule_field(field, schedule.get(field))
+        for field in SCHEDULE_FIELDS}
+
+
+def _field_matches(parsed_schedule, dt_fields, field):
+    values = parsed_schedule[field]
+    return values is None or dt_fields[field] in values
+
+
+def _get_next_run_time(parsed_schedule, start, end):
+    run_time = start.replace(second=0, microsecond=0)
+    if run_time < start:
+        run_time += datetime.timedelta(minutes=1)
+    while run_time <= end:
+        dt_fields = _get_datetime_fields(run_time)
+        if not _field_matches(parsed_schedule, dt_fields, "month"):
+            run_time = (
+                run_time.replace(day=1, hour=0, minute=0) +
+                datetime.timedelta(days=32)).replace(day=1)
+        elif not (_field_matches(parsed_schedule, dt_fields, "dom") and
+                  _field_matches(parsed_schedule, dt_fields, "dow")):
+            run_time = run_time.replace(
+                hour=0, minute=0) + datetime.timedelta(days=1)
+        elif not _field_matches(parsed_schedule, dt_fields, "hour"):
+            run_time = run_time.replace(
+                minute=0) + datetime.timedelta(hours=1)
+        elif not _field_matches(parsed_schedule, dt_fields, "minute"):
+            run_time += datetime.timedelta(minutes=1)
+        else:
+            return run_time
+    return None
+
+
+def get_next_run_time(schedule, start, end=None):
+    """ Returns the first minute between the given start and end datetimes
+    on which a job with the given schedule would run, or None if there is
+    none.
+    """
+    if end is None:
+        end = start + MAX_NEXT_RUN_TIME_LOOKAHEAD
+    return _get_next_run_time(parse_schedule(schedule), start, end)
 
 
 class CronJob(object):
@@ -32,6 +149,8 @@ class CronJob(object):
         #         "month": 11,
         #         "dow": 1
         #     }
+        # where each field may also be a cron expression such as "*/10",
+        # "1-5" or "0,30".
         # param: enabled: bool: Whether or not this cron job is enabled
         # param: expires: datetime: expiration date for this cronjob
         # param: on_success: callable: a function that gets called if the
@@ -54,6 +173,7 @@ class CronJob(object):
 
         schema = schemas.SCHEDULE_API_BODY_SCHEMA["properties"]["schedule"]
         schemas.validate_value(schedule, schema)
+        self._parsed_schedule = parse_schedule(schedule)
 
         if on_success and not callable(on_success):
             raise ValueError("on_success must be callable")
@@ -74,19 +194,6 @@ class CronJob(object):
                     "Invalid expires")
         self._expires = expires
 
-    def _compare(self, pairs):
-        # we don't support the full cron syntax. Either exact matches
-        # or wildcard matches are allowed. Expressions such as:
-        # */10 (every 10 units)
-        # are not supported
-        ret = []
-        for item in pairs:
-            if item[1] is None or item[0] == item[1]:
-                ret.append(True)
-            else:
-                ret.append(False)
-        return ret
-
     def is_expired(self):
         now = timeutils.utcnow()
         if self._expires and self._expires < now:
@@ -104,14 +211,21 @@ class CronJob(object):
             LOG.debug('Job %s is not enabled', self.name)
             return False
 
-        fields = ('year', 'month', 'dom', 'hour',
-                  'minute', 'second', 'dow')
-        dt_fields = dict(zip(fields, dt.timetuple()))
+        dt_fields = _get_datetime_fields(dt)
+        return all(
+            _field_matches(self._parsed_schedule, dt_fields, field)
+            for field in SCHEDULE_FIELDS)
 
-        pairs = [(dt_fields[i], self.schedule.get(i))
-                 for i in SCHEDULE_FIELDS]
-        compared = self._compare(pairs)
-        return False not in compared
+    def get_next_run_time(self, start):
+        """ Returns the time of the next run of the job from the given
+        datetime onwards, or None if it will not run anymore.
+        """
+        if self._enabled is False:
+            return None
+        end = start + MAX_NEXT_RUN_TIME_LOOKAHEAD
+        if self._expires:
+            end = min(end, self._expires)
+        return _get_next_run_time(self._parsed_schedule, start, end)
 
     def _send_status(self, queue, status):
         if not queue:
@@ -147,9 +261,24 @@ class Cron(object):
         self._queue = eventlet.Queue(maxsize=1000)
         self._should_stop = False
         self._jobs = {}
+        # NOTE: heap of the (next_run_time, sequence_number, job) of the
+        # registered jobs, whose entries are only discarded when popped
+        # if the job was unregistered or replaced in the meantime:
+        self._jobs_heap = []
+        self._sequence = itertools.count()
+        self._wakeup_queue = eventlet_queue.LightQueue()
         self._eventlets = []
         self._semaphore = semaphore.Semaphore(value=1)
 
+    def _schedule_job(self, job, start):
+        next_run_time = job.get_next_run_time(start)
+        if next_run_time is None:
+            LOG.debug("Job %s has no further runs scheduled", job.name)
+            return None
+        heapq.heappush(
+            self._jobs_heap, (next_run_time, next(self._sequence), job))
+        return next_run_time
+
     def register(self, job):
         if not isinstance(job, CronJob):
             raise ValueError("Invalid job class")
@@ -157,6 +286,11 @@ class Cron(object):
         LOG.debug("Registering cron job with name '%s'", name)
         with self._semaphore:
             self._jobs[name] = job
+            next_run_time = self._schedule_job(job, timeutils.utcnow())
+            if next_run_time is not None and (
+                    self._jobs_heap[0][2] is job):
+                # wake up the loop so it sleeps until this job's run instead:
+                self._wakeup_queue.put(None)
 
     def unregister(self, name):
         job = self._jobs.get(name)
@@ -177,31 +311,41 @@ class Cron(object):
                 for job in jobs:
                     del self._jobs[job]
 
+    def _get_due_jobs(self, now):
+        due_jobs = []
+        with self._semaphore:
+            while self._jobs_heap and self._jobs_heap[0][0] <= now:
+                run_time, _, job = heapq.heappop(self._jobs_heap)
+                if self._jobs.get(job.name) is not job:
+                    continue
+                due_jobs.append(job)
+                # NOTE: runs missed while the loop was late are skipped:
+                self._schedule_job(
+                    job, max(run_time + datetime.timedelta(minutes=1), now))
+        return due_jobs
+
+    def _get_sleep_time(self, now):
+        with self._semaphore:
+            if not self._jobs_heap:
+                return MAX_CRON_SLEEP_SECONDS
+            next_run_time = self._jobs_heap[0][0]
+        return max(0, min(
+            (next_run_time - now).total_seconds(), MAX_CRON_SLEEP_SECONDS))
+
     def _check_jobs(self):
-        LOG.debug("Checking cron jobs")
-        jobs = self._jobs.copy()
-        job_nr = len(jobs)
-        spawned = 0
         now = timeutils.utcnow()
-        if job_nr:
-            for job in jobs:
-                LOG.debug('Checking job %s with schedule: %s', jobs[job].name,
-                          jobs[job].schedule)
-                if jobs[job].should_run(now):
-                    LOG.debug("Spawning job %s" % job)
-                    eventlet.spawn(jobs[job].start, self._queue)
-                    spawned += 1
-
-        done = timeutils.utcnow()
-        delta = done - now
-        LOG.debug("Spawned %(jobs)d jobs in %(seconds)d seconds" % {
-            "seconds": delta.seconds,
-            "jobs": spawned})
+        for job in self._get_due_jobs(now):
+            LOG.debug("Spawning job %s" % job.name)
+            eventlet.spawn(job.start, self._queue)
+        return self._get_sleep_time(timeutils.utcnow())
 
     def _loop(self):
         while True:
-            schedule.run_pending()
-            time.sleep(.2)
+            sleep_time = self._check_jobs()
+            try:
+                self._wakeup_queue.get(timeout=sleep_time)
+            except eventlet_queue.Empty:
+                pass
 
     def _result_loop(self):
         while True:
@@ -249,7 +393,6 @@ class Cron(object):
             time.sleep(.5)
 
     def start(self):
-        schedule.every().minute.do(self._check_jobs)
         self._eventlets.append(eventlet.spawn(self._loop))
         self._eventlets.append(eventlet.spawn(self._janitor))
         self._eventlets.append(eventlet.spawn(self._result_loop))
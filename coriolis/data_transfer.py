@@ -1,17 +1,22 @@
 # Copyright 2016 Cloudbase Solutions Srl
 # All Rights Reserved.
 
-import gzip
+import functools
 import os
 import stat
 import struct
+import time
 import zlib
 
+from eventlet import tpool
+import lz4.frame
 import requests
 import requests_unixsocket
+import zstandard
 
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import units
 from urllib import parse
 
 from coriolis import constants
@@ -24,6 +29,47 @@ compressor_opts = [
                     'will be done through this service. This value can be '
                     'either a unix socket path (/var/run/compressor.sock '
                     'or an IP:PORT.'),
+    cfg.IntOpt('gzip_compression_level',
+               default=9, min=0, max=9,
+               help='Compression level used for gzip transfer compression.'),
+    cfg.IntOpt('zlib_compression_level',
+               default=-1, min=-1, max=9,
+               help='Compression level used for zlib transfer compression. '
+                    '-1 selects the zlib default.'),
+    cfg.IntOpt('zstd_compression_level',
+               default=3, min=-5, max=22,
+               help='Compression level used for zstd transfer compression.'),
+    cfg.IntOpt('lz4_compression_level',
+               default=0, min=0, max=16,
+               help='Compression level used for lz4 transfer compression.'),
+    cfg.BoolOpt('offload_compression',
+                default=True,
+                help='Run transfer compression on eventlet\'s pool of native '
+                     'threads (sized through EVENTLET_THREADPOOL_SIZE). As '
+                     'the compression libraries release the GIL, this allows '
+                     'compressing several chunks in parallel without '
+                     'stalling network I/O.'),
+    cfg.IntOpt('compression_workers',
+               default=0, min=0,
+               help='Maximum number of chunks of a disk being compressed at '
+                    'the same time by a backup writer. 0 means the number of '
+                    'CPU cores.'),
+    cfg.BoolOpt('adaptive_compression',
+                default=False,
+                help='Periodically sample the compression ratio and time of '
+                     'each of the compression formats supported by the '
+                     'backup writer on the chunks of a disk, and switch to '
+                     'the one with the lowest estimated transfer time, '
+                     'including sending the data uncompressed.'),
+    cfg.IntOpt('adaptive_compression_sample_interval',
+               default=32, min=1,
+               help='Number of chunks of a disk after which the compression '
+                    'formats are sampled again in adaptive mode.'),
+    cfg.IntOpt('adaptive_compression_link_mbps',
+               default=100, min=1,
+               help='Estimated throughput in MB/s of the link towards the '
+                    'backup writer, used by adaptive compression to weigh '
+                    'compression time against the size of the data sent.'),
 ]
 
 CONF = cfg.CONF
@@ -31,10 +77,192 @@ CONF.register_opts(compressor_opts)
 
 LOG = logging.getLogger(__name__)
 
-_COMPRESS_FUNC = {
-    constants.COMPRESSION_FORMAT_GZIP: gzip.compress,
-    constants.COMPRESSION_FORMAT_ZLIB: zlib.compress,
-}
+# NOTE: the coriolis-compressor service only implements these formats:
+_PROXIED_COMPRESSION_FORMATS = [
+    constants.COMPRESSION_FORMAT_GZIP,
+    constants.COMPRESSION_FORMAT_ZLIB,
+]
+
+# NOTE: the inflated size set on the messages asking write_data to zero out
+# a range of the disk instead of writing their payload:
+ZERO_MSG_SIZE_INFLATED = 0xFFFFFFFF
+# NOTE: the inflated size set on the messages asking write_data to copy a
+# range of the disk which is already on the target:
+COPY_MSG_SIZE_INFLATED = 0xFFFFFFFE
+
+# NOTE: the number of (length, format, compression level) combinations of
+# compressed zero chunks which are cached:
+COMPRESSED_ZEROS_CACHE_SIZE = 16
+
+_zeros = b""
+
+
+def _get_compression_level(fmt):
+    if fmt == constants.COMPRESSION_FORMAT_GZIP:
+        return CONF.gzip_compression_level
+    if fmt == constants.COMPRESSION_FORMAT_ZLIB:
+        return CONF.zlib_compression_level
+    if fmt == constants.COMPRESSION_FORMAT_ZSTD:
+        return CONF.zstd_compression_level
+    if fmt == constants.COMPRESSION_FORMAT_LZ4:
+        return CONF.lz4_compression_level
+    raise exception.CoriolisException(
+        "Invalid compression format requested: %s" % fmt)
+
+
+def _get_compressor(fmt):
+    level = _get_compression_level(fmt)
+    if fmt == constants.COMPRESSION_FORMAT_GZIP:
+        # NOTE: wbits=31 selects the gzip container format:
+        return zlib.compressobj(level, wbits=31)
+    if fmt == constants.COMPRESSION_FORMAT_ZLIB:
+        return zlib.compressobj(level)
+    if fmt == constants.COMPRESSION_FORMAT_ZSTD:
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    return lz4.frame.LZ4FrameCompressor(compression_level=level)
+
+
+def get_compression_workers():
+    return CONF.compression_workers or os.cpu_count() or 1
+
+
+def compress_buffers(buffers, fmt):
+    """ Compresses the given buffers as a single stream of the given format
+    without concatenating them first. Returns the list of compressed pieces.
+    """
+    # NOTE: the compressor must be set up outside of the native threads, as
+    # reading the config options may involve green locks:
+    compressor = _get_compressor(fmt)
+    if CONF.offload_compression:
+        # NOTE: only the calling greenthread waits on the result, the other
+        # ones (including the ones doing network I/O) keep running:
+        return tpool.execute(_run_compressor, compressor, buffers)
+    return _run_compressor(compressor, buffers)
+
+
+def _run_compressor(compressor, buffers):
+    pieces = []
+    if isinstance(compressor, lz4.frame.LZ4FrameCompressor):
+        pieces.append(compressor.begin())
+    pieces.extend(compressor.compress(buf) for buf in buffers)
+    pieces.append(compressor.flush())
+    return [piece for piece in pieces if piece]
+
+
+def _compress(content, fmt):
+    return b"".join(compress_buffers([content], fmt))
+
+
+class AdaptiveCompressor(object):
+    """ Chooses how to compress the chunks of a single disk.
+
+    Every 'adaptive_compression_sample_interval' chunks, the next chunk gets
+    compressed with each of the given formats, and the one yielding the
+    lowest estimated transfer time (compression time plus sending the result
+    over a link of 'adaptive_compression_link_mbps') gets used for the
+    following chunks. Compression gets turned off altogether if sending the
+    data as-is is estimated to be faster.
+    """
+
+    def __init__(self, formats):
+        for fmt in formats:
+            if fmt not in constants.VALID_COMPRESSION_FORMATS:
+                raise exception.CoriolisException(
+                    "Invalid compression format requested: %s" % fmt)
+        self._formats = list(formats)
+        self._current_format = None
+        self._chunks_until_sample = 0
+
+    @property
+    def current_format(self):
+        return self._current_format
+
+    def _sample(self, buffers):
+        link_rate = float(CONF.adaptive_compression_link_mbps * units.Mi)
+        data_len = sum(len(buf) for buf in buffers)
+
+        best_format = None
+        best_pieces = buffers
+        best_cost = data_len / link_rate
+        results = {}
+        for fmt in self._formats:
+            start = time.time()
+            pieces = compress_buffers(buffers, fmt)
+            elapsed = time.time() - start
+            pieces_len = sum(len(piece) for piece in pieces)
+            cost = elapsed + pieces_len / link_rate
+            results[fmt] = (pieces_len, elapsed)
+            if cost < best_cost:
+                best_format, best_pieces, best_cost = fmt, pieces, cost
+
+        if best_format != self._current_format:
+            LOG.debug(
+                "Switching transfer compression from '%s' to '%s'. Sampled "
+                "%d bytes (compressed size, seconds): %s",
+                self._current_format, best_format, data_len, results)
+        self._current_format = best_format
+        return best_pieces, best_format
+
+    def compress(self, buffers):
+        """ Returns the (possibly) compressed buffers and the compression
+        format used, or None if they were left uncompressed.
+        """
+        if self._chunks_until_sample <= 0:
+            self._chunks_until_sample = (
+                CONF.adaptive_compression_sample_interval)
+            return self._sample(buffers)
+
+        self._chunks_until_sample -= 1
+        if self._current_format is None:
+            return buffers, None
+        return compress_buffers(buffers, self._current_format), (
+            self._current_format)
+
+
+def _get_zeros(length):
+    global _zeros
+    if len(_zeros) < length:
+        _zeros = bytes(length)
+    return _zeros
+
+
+def is_zero_block(data):
+    """ Checks whether the given bytes-like object only holds zeros. """
+    view = memoryview(data).cast("B")
+    # NOTE: bytes.startswith() boils down to a memcmp() against the zeroed
+    # buffer, unlike comparing memoryviews, which goes element by element:
+    return _get_zeros(len(view)).startswith(view)
+
+
+def get_zero_runs(data, block_size):
+    """ Splits the given bytes-like object into runs of consecutive blocks of
+    'block_size' bytes which are either all zeros or not. Returns a list of
+    (start, length, is_zero) tuples covering the whole object.
+    """
+    view = memoryview(data).cast("B")
+    runs = []
+    for start in range(0, len(view), block_size):
+        length = min(block_size, len(view) - start)
+        is_zero = is_zero_block(view[start:start + length])
+        if runs and runs[-1][2] == is_zero:
+            runs[-1] = (runs[-1][0], runs[-1][1] + length, is_zero)
+        else:
+            runs.append((start, length, is_zero))
+    return runs
+
+
+def get_compressed_zeros(length, fmt):
+    """ Returns 'length' zeros compressed in the given format. The results
+    are cached, as zero chunks of a disk almost always have the same size.
+    """
+    return _get_compressed_zeros(length, fmt, _get_compression_level(fmt))
+
+
+@functools.lru_cache(maxsize=COMPRESSED_ZEROS_CACHE_SIZE)
+def _get_compressed_zeros(length, fmt, level):
+    # NOTE: the compression level is only part of the cache key, so that
+    # changes to the compression level options are taken into account:
+    return _compress(_get_zeros(length)[:length], fmt)
 
 
 def _get_session_and_address():
@@ -64,14 +292,18 @@ def compression_proxy(content, fmt):
             "Invalid compression format requested: %s" % fmt)
     data = content
     sess, url = _get_session_and_address()
-    if None in (sess, url):
-        compressed_data = _COMPRESS_FUNC[fmt](data)
+    if None in (sess, url) or fmt not in _PROXIED_COMPRESSION_FORMATS:
+        if sess:
+            sess.close()
+        compressed_data = _compress(data, fmt)
     else:
         try:
             headers = {
                 "X-Compression-Format": fmt,
             }
-            ret = sess.post(url, data=data, headers=headers,
+            # NOTE: requests would iterate over any other bytes-like object
+            # instead of sending it as-is:
+            ret = sess.post(url, data=bytes(data), headers=headers,
                             timeout=CONF.default_requests_timeout)
             ret.raise_for_status()
             compressed_data = ret.content
@@ -79,7 +311,7 @@ def compression_proxy(content, fmt):
             LOG.exception(
                 "failed to compress using coriolis-compressor: %s" % err)
             LOG.info("falling back to built-in compressor")
-            compressed_data = _COMPRESS_FUNC[fmt](content)
+            compressed_data = _compress(content, fmt)
         finally:
             sess.close()
 
@@ -98,28 +330,68 @@ def compression_proxy(content, fmt):
     return data, compress
 
 
-def encode_data(msg_id, path, offset, content, compress=True):
-    inflated_content = (path.encode() + b'\0' +
-                        struct.pack("<Q", offset) +
-                        content)
+def encode_data_buffers(msg_id, path, offset, content, compress=True,
+                        compressor=None):
+    """ Returns the message for writing 'content' at 'offset' in 'path' as a
+    list of buffers which can be sent as-is through a scatter-gather write
+    (e.g. `writelines()`), so that 'content' (which may be any bytes-like
+    object, such as a memoryview) never needs to be copied.
 
-    data_len_inflated = len(inflated_content)
+    If an AdaptiveCompressor is given, it decides whether the message gets
+    compressed, in which case it must only be set up with the zlib format.
+    """
+    inflated_prefix = path.encode() + b'\0' + struct.pack("<Q", offset)
+    data_len_inflated = len(inflated_prefix) + len(content)
 
     compressed = False
-    if compress:
-        data_content, compressed = compression_proxy(
-            inflated_content, constants.COMPRESSION_FORMAT_ZLIB)
-        data_len = len(data_content)
+    if compress and compressor:
+        data_buffers, fmt = compressor.compress([inflated_prefix, content])
+        compressed = fmt is not None
+        data_len = sum(len(buf) for buf in data_buffers)
+    elif compress:
+        if CONF.compressor_address:
+            data_content, compressed = compression_proxy(
+                inflated_prefix + content, constants.COMPRESSION_FORMAT_ZLIB)
+            data_buffers = [data_content]
+        else:
+            data_buffers = compress_buffers(
+                [inflated_prefix, content], constants.COMPRESSION_FORMAT_ZLIB)
+            # No advantage in sending the compressed data otherwise:
+            compressed = (
+                sum(len(buf) for buf in data_buffers) < data_len_inflated)
+        data_len = sum(len(buf) for buf in data_buffers)
 
     if not compressed:
         data_len = data_len_inflated
         data_len_inflated = 0
-        data_content = inflated_content
+        data_buffers = [inflated_prefix, content]
+
+    header = struct.pack("<III", msg_id, data_len, data_len_inflated)
+    return [header] + data_buffers
 
-    return (struct.pack("<I", msg_id) +
-            struct.pack("<I", data_len) +
-            struct.pack("<I", data_len_inflated) +
-            data_content)
+
+def encode_zeros(msg_id, path, offset, length):
+    """ Returns the message asking write_data to zero out 'length' bytes at
+    'offset' in 'path', by punching a hole if the target allows it.
+    """
+    data = path.encode() + b'\0' + struct.pack("<QQ", offset, length)
+    return struct.pack(
+        "<III", msg_id, len(data), ZERO_MSG_SIZE_INFLATED) + data
+
+
+def encode_copy(msg_id, path, offset, src_offset, length):
+    """ Returns the message asking write_data to copy 'length' bytes from
+    'src_offset' to 'offset' in 'path'.
+    """
+    data = path.encode() + b'\0' + struct.pack(
+        "<QQQ", offset, src_offset, length)
+    return struct.pack(
+        "<III", msg_id, len(data), COPY_MSG_SIZE_INFLATED) + data
+
+
+def encode_data(msg_id, path, offset, content, compress=True):
+    return b"".join(encode_data_buffers(
+        msg_id, path, offset, content, compress=compress))
 
 
 def encode_eod(msg_id):
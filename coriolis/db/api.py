@@ -1,12 +1,15 @@
 # Copyright 2016 Cloudbase Solutions Srl
 # All Rights Reserved.
 
+import datetime
 import uuid
 
 from oslo_config import cfg
 from oslo_db import api as db_api
+from oslo_db import exception as db_exception
 from oslo_db import options as db_options
 from oslo_db.sqlalchemy import enginefacade
+from oslo_db.sqlalchemy import utils as sqlalchemyutils
 from oslo_log import log as logging
 from oslo_utils import timeutils
 from sqlalchemy import func
@@ -14,6 +17,7 @@ from sqlalchemy import or_
 from sqlalchemy import orm
 from sqlalchemy.sql import null
 
+from coriolis import constants
 from coriolis.db.sqlalchemy import models
 from coriolis import exception
 from coriolis import utils
@@ -280,7 +284,7 @@ def get_replica_tasks_executions(context, replica_id, include_tasks=False,
     q = _soft_delete_aware_query(context, models.TasksExecution)
     q = q.join(models.Replica)
     if include_task_info:
-        q = q.options(orm.joinedload('action').undefer('info'))
+        q = q.options(orm.joinedload('action').selectinload('instance_infos'))
     if include_tasks:
         q = _get_tasks_with_details_options(q)
     if is_user_context(context):
@@ -299,7 +303,7 @@ def get_replica_tasks_execution(context, replica_id, execution_id,
     q = _soft_delete_aware_query(context, models.TasksExecution).join(
         models.Replica)
     if include_task_info:
-        q = q.options(orm.joinedload('action').undefer('info'))
+        q = q.options(orm.joinedload('action').selectinload('instance_infos'))
     q = _get_tasks_with_details_options(q)
     if is_user_context(context):
         q = q.filter(models.Replica.project_id == context.project_id)
@@ -350,6 +354,23 @@ def get_replica_schedules(context, replica_id=None, expired=True):
     return sched_filter.all()
 
 
+@enginefacade.reader
+def get_minion_pool_replica_schedules(context, minion_pool_id):
+    """ Returns the schedule and expiration date of the enabled and unexpired
+    schedules of the Replicas using the given minion pool, along with the
+    instances of their Replica.
+    """
+    q = _get_replica_schedules_filter(context, expired=False)
+    q = q.filter(
+        models.ReplicaSchedule.enabled.is_(True),
+        or_(models.Replica.origin_minion_pool_id == minion_pool_id,
+            models.Replica.destination_minion_pool_id == minion_pool_id))
+    return q.with_entities(
+        models.ReplicaSchedule.schedule,
+        models.ReplicaSchedule.expiration_date,
+        models.Replica.instances).all()
+
+
 @enginefacade.reader
 def get_replica_schedule(context, replica_id, schedule_id, expired=True):
     sched_filter = _get_replica_schedules_filter(
@@ -423,27 +444,141 @@ def _get_replica_with_tasks_executions_options(q):
     return q.options(orm.joinedload(models.Replica.executions))
 
 
+TRANSFER_ACTIONS_SORT_KEYS = [
+    "id", "created_at", "updated_at", "last_execution_status",
+    "origin_endpoint_id", "destination_endpoint_id"]
+DEFAULT_TRANSFER_ACTIONS_SORT_KEYS = ["created_at", "id"]
+
+
+def _parse_filter_time(value):
+    if isinstance(value, datetime.datetime):
+        return timeutils.normalize_time(value)
+    try:
+        return timeutils.normalize_time(timeutils.parse_isotime(value))
+    except ValueError:
+        raise exception.InvalidInput(
+            "Invalid ISO 8601 timestamp: %s" % value)
+
+
+def _filter_transfer_actions_query(q, model, filters):
+    """ Applies the given filters to a transfer action query.
+
+    :param filters: dict with any of the following keys: {
+        "status": ["List of last execution statuses"],
+        "created_since": "<ISO 8601 timestamp>",
+        "created_before": "<ISO 8601 timestamp>",
+        "updated_since": "<ISO 8601 timestamp>"}
+    """
+    filters = filters or {}
+    if filters.get("status"):
+        q = q.filter(model.last_execution_status.in_(filters["status"]))
+    if filters.get("created_since"):
+        q = q.filter(
+            model.created_at >= _parse_filter_time(filters["created_since"]))
+    if filters.get("created_before"):
+        q = q.filter(
+            model.created_at < _parse_filter_time(filters["created_before"]))
+    if filters.get("updated_since"):
+        updated_since = _parse_filter_time(filters["updated_since"])
+        q = q.filter(or_(
+            model.updated_at >= updated_since,
+            model.created_at >= updated_since))
+    return q
+
+
+def _paginate_transfer_actions_query(
+        context, q, model, marker=None, limit=None, sort_keys=None,
+        sort_dirs=None):
+    """ Sorts the given transfer action query and limits it to the page of
+    at most `limit` actions following the one with the ID `marker`.
+    """
+    sort_keys = list(sort_keys or DEFAULT_TRANSFER_ACTIONS_SORT_KEYS)
+    invalid_keys = set(sort_keys).difference(TRANSFER_ACTIONS_SORT_KEYS)
+    if invalid_keys:
+        raise exception.InvalidInput(
+            "Invalid sort keys: %s. Transfer actions can only be sorted "
+            "by: %s" % (sorted(invalid_keys), TRANSFER_ACTIONS_SORT_KEYS))
+    sort_dirs = list(sort_dirs or [])
+    for sort_dir in sort_dirs:
+        if sort_dir not in ("asc", "desc"):
+            raise exception.InvalidInput(
+                "Invalid sort direction '%s'. Must be one of 'asc' or "
+                "'desc'." % sort_dir)
+    sort_dirs = sort_dirs[:len(sort_keys)]
+    sort_dirs.extend(["desc"] * (len(sort_keys) - len(sort_dirs)))
+    # NOTE: the IDs of Replicas/Migrations are the same as those of their
+    # base transfer actions, whose primary key is also used as a tie-breaker
+    # so that pages never overlap:
+    sort_keys = ["base_id" if key == "id" else key for key in sort_keys]
+    if "base_id" not in sort_keys:
+        sort_keys.append("base_id")
+        sort_dirs.append(sort_dirs[-1])
+
+    marker_action = None
+    if marker is not None:
+        marker_q = _soft_delete_aware_query(context, model)
+        if is_user_context(context):
+            marker_q = marker_q.filter(
+                model.project_id == context.project_id)
+        marker_action = marker_q.filter(model.id == marker).first()
+        if not marker_action:
+            raise exception.InvalidInput(
+                "Marker '%s' could not be found." % marker)
+
+    return sqlalchemyutils.paginate_query(
+        q, model, limit, sort_keys, marker=marker_action,
+        sort_dirs=sort_dirs)
+
+
+def _get_projected_dicts(actions, fields, **to_dict_kwargs):
+    results = [action.to_dict(**to_dict_kwargs) for action in actions]
+    if not fields:
+        return results
+    return [
+        {key: value for key, value in result.items() if key in fields}
+        for result in results]
+
+
 @enginefacade.reader
 def get_replicas(context,
                  include_tasks_executions=False,
                  include_task_info=False,
-                 to_dict=False):
+                 to_dict=False,
+                 marker=None,
+                 limit=None,
+                 sort_keys=None,
+                 sort_dirs=None,
+                 filters=None,
+                 fields=None):
+    """ Returns the Replicas matching the given filters, sorted by the given
+    keys and directions and paginated after the given marker Replica ID.
+    If a list of fields is given, the resulting dicts only include those,
+    and the executions and info of the Replicas are only loaded if among
+    them.
+    """
+    if fields:
+        include_tasks_executions = (
+            include_tasks_executions and "executions" in fields)
+        include_task_info = include_task_info and "info" in fields
     q = _soft_delete_aware_query(context, models.Replica)
     if include_tasks_executions:
         q = _get_replica_with_tasks_executions_options(q)
     if include_task_info:
-        q = q.options(orm.undefer('info'))
+        q = q.options(orm.selectinload('instance_infos'))
     q = q.filter()
     if is_user_context(context):
         q = q.filter(
             models.Replica.project_id == context.project_id)
+    q = _filter_transfer_actions_query(q, models.Replica, filters)
+    q = _paginate_transfer_actions_query(
+        context, q, models.Replica, marker=marker, limit=limit,
+        sort_keys=sort_keys, sort_dirs=sort_dirs)
     db_result = q.all()
     if to_dict:
-        return [
-            i.to_dict(
-                include_task_info=include_task_info,
-                include_executions=include_tasks_executions)
-            for i in db_result]
+        return _get_projected_dicts(
+            db_result, fields,
+            include_task_info=include_task_info,
+            include_executions=include_tasks_executions)
     return db_result
 
 
@@ -452,7 +587,7 @@ def get_replica(context, replica_id, include_task_info=False, to_dict=False):
     q = _soft_delete_aware_query(context, models.Replica)
     q = _get_replica_with_tasks_executions_options(q)
     if include_task_info:
-        q = q.options(orm.undefer('info'))
+        q = q.options(orm.selectinload('instance_infos'))
     if is_user_context(context):
         q = q.filter(
             models.Replica.project_id == context.project_id)
@@ -483,6 +618,7 @@ def add_replica(context, replica):
     replica.user_id = context.user
     replica.project_id = context.project_id
     _session(context).add(replica)
+    _session(context).add_all(replica.instance_infos.values())
 
 
 @enginefacade.writer
@@ -518,23 +654,39 @@ def get_replica_migrations(context, replica_id):
 
 @enginefacade.reader
 def get_migrations(context, include_tasks=False,
-                   include_task_info=False, to_dict=False):
+                   include_task_info=False, to_dict=False, marker=None,
+                   limit=None, sort_keys=None, sort_dirs=None, filters=None,
+                   fields=None):
+    """ Returns the Migrations matching the given filters, sorted and
+    paginated the same way as `get_replicas`.
+    """
+    include_executions = True
+    if fields:
+        include_executions = "executions" in fields
+        include_tasks = include_tasks and include_executions
+        include_task_info = include_task_info and "info" in fields
     q = _soft_delete_aware_query(context, models.Migration)
     if include_tasks:
         q = _get_migration_task_query_options(q)
-    else:
+    elif include_executions:
         q = q.options(orm.joinedload("executions"))
     if include_task_info:
-        q = q.options(orm.undefer('info'))
+        q = q.options(orm.selectinload('instance_infos'))
 
     args = {}
     if is_user_context(context):
         args["project_id"] = context.project_id
-    result = q.filter_by(**args).all()
+    q = q.filter_by(**args)
+    q = _filter_transfer_actions_query(q, models.Migration, filters)
+    q = _paginate_transfer_actions_query(
+        context, q, models.Migration, marker=marker, limit=limit,
+        sort_keys=sort_keys, sort_dirs=sort_dirs)
+    result = q.all()
     if to_dict:
-        return [i.to_dict(
+        return _get_projected_dicts(
+            result, fields,
             include_task_info=include_task_info,
-            include_tasks=include_tasks) for i in result]
+            include_tasks=include_tasks)
     return result
 
 
@@ -565,7 +717,7 @@ def get_migration(context, migration_id, include_task_info=False,
     q = _soft_delete_aware_query(context, models.Migration)
     q = _get_migration_task_query_options(q)
     if include_task_info:
-        q = q.options(orm.undefer('info'))
+        q = q.options(orm.selectinload('instance_infos'))
     args = {"id": migration_id}
     if is_user_context(context):
         args["project_id"] = context.project_id
@@ -581,6 +733,7 @@ def add_migration(context, migration):
     migration.user_id = context.user
     migration.project_id = context.project_id
     _session(context).add(migration)
+    _session(context).add_all(migration.instance_infos.values())
 
 
 @enginefacade.writer
@@ -615,7 +768,7 @@ def get_action(context, action_id, include_task_info=False):
     action = _soft_delete_aware_query(
         context, models.BaseTransferAction)
     if include_task_info:
-        action = action.options(orm.undefer('info'))
+        action = action.options(orm.selectinload('instance_infos'))
     if is_user_context(context):
         action = action.filter(
             models.BaseTransferAction.project_id == context.project_id)
@@ -627,6 +780,19 @@ def get_action(context, action_id, include_task_info=False):
     return action
 
 
+@enginefacade.writer
+def set_execution_trust(context, execution_id, trust_id, delete_trust_id):
+    """ Records the trust the tasks of the given execution are run with. """
+    execution = _soft_delete_aware_query(
+        context, models.TasksExecution).filter(
+            models.TasksExecution.id == execution_id).first()
+    if not execution:
+        raise exception.NotFound(
+            "Tasks execution not found: %s" % execution_id)
+    execution.trust_id = trust_id
+    execution.delete_trust_id = delete_trust_id
+
+
 @enginefacade.writer
 def set_action_last_execution_status(
         context, action_id, last_execution_status):
@@ -634,6 +800,25 @@ def set_action_last_execution_status(
     action.last_execution_status = last_execution_status
 
 
+def _get_transfer_action_info(context, action_id, instance):
+    return _model_query(context, models.TransferActionInfo).filter(
+        models.TransferActionInfo.action_id == action_id,
+        models.TransferActionInfo.instance == instance).first()
+
+
+@enginefacade.reader
+def get_action_instance_info(context, action_id, instance):
+    """ Returns the info for the given instance of the action, or None if
+    there is none, without loading the info of any of its other instances.
+    """
+    # NOTE: checks the action exists and is accessible by the user:
+    get_action(context, action_id)
+    instance_info = _get_transfer_action_info(context, action_id, instance)
+    if instance_info is None:
+        return None
+    return instance_info.info
+
+
 @enginefacade.writer
 def update_transfer_action_info_for_instance(
         context, action_id, instance, new_instance_info):
@@ -641,19 +826,18 @@ def update_transfer_action_info_for_instance(
     Returns the updated value.
     Sub-fields of the dict already in the info will get overwritten entirely!
     """
-    action = get_action(context, action_id, include_task_info=True)
+    # NOTE: checks the action exists and is accessible by the user:
+    get_action(context, action_id)
+    instance_info = _get_transfer_action_info(context, action_id, instance)
+    instance_info_old = {}
+    if instance_info is not None:
+        instance_info_old = instance_info.info
     if not new_instance_info:
         LOG.debug(
             "No new info provided for action '%s' and instance '%s'. "
             "Nothing to update in the DB.",
             action_id, instance)
-        return action.info.get(instance, {})
-
-    # Copy is needed, otherwise sqlalchemy won't save the changes
-    action_info = action.info.copy()
-    instance_info_old = {}
-    if instance in action_info:
-        instance_info_old = action_info[instance]
+        return instance_info_old
 
     old_keys = set(instance_info_old.keys())
     new_keys = set(new_instance_info.keys())
@@ -670,12 +854,16 @@ def update_transfer_action_info_for_instance(
             "'%s' in action with ID '%s': %s",
             instance, action_id, newly_added_keys)
 
+    # Copy is needed, otherwise sqlalchemy won't save the changes
     instance_info_old_copy = instance_info_old.copy()
     instance_info_old_copy.update(new_instance_info)
-    action_info[instance] = instance_info_old_copy
-    action.info = action_info
+    if instance_info is None:
+        instance_info = models.TransferActionInfo(
+            action_id=action_id, instance=instance)
+        _session(context).add(instance_info)
+    instance_info.info = instance_info_old_copy
 
-    return action_info[instance]
+    return instance_info_old_copy
 
 
 @enginefacade.writer
@@ -695,11 +883,15 @@ def set_transfer_action_result(context, action_id, instance, result):
 
 
 @enginefacade.reader
-def get_tasks_execution(context, execution_id):
+def get_tasks_execution(context, execution_id, include_tasks=True):
+    """ Returns the execution with the given ID along with its action and,
+    unless otherwise specified, its tasks.
+    """
     q = _soft_delete_aware_query(context, models.TasksExecution)
     q = q.join(models.BaseTransferAction)
     q = q.options(orm.joinedload("action"))
-    q = q.options(orm.joinedload("tasks"))
+    if include_tasks:
+        q = q.options(orm.joinedload("tasks"))
     if is_user_context(context):
         q = q.filter(
             models.BaseTransferAction.project_id == context.project_id)
@@ -711,6 +903,30 @@ def get_tasks_execution(context, execution_id):
     return execution
 
 
+@enginefacade.reader
+def get_tasks_execution_status_counts(context, execution_id):
+    """ Returns a dict with the number of tasks of the given execution in
+    each status.
+    """
+    q = _soft_delete_aware_query(
+        context, models.Task.status, func.count(models.Task.id))
+    q = q.filter(models.Task.execution_id == execution_id)
+    return dict(q.group_by(models.Task.status).all())
+
+
+@enginefacade.reader
+def get_tasks_execution_task_summaries(context, execution_id):
+    """ Returns the tasks of the given execution with only the properties
+    needed for advancing its state: their ID, type, status, dependencies,
+    whether they are on-error tasks, index and instance.
+    """
+    q = _soft_delete_aware_query(
+        context, models.Task.id, models.Task.task_type, models.Task.status,
+        models.Task.depends_on, models.Task.on_error, models.Task.index,
+        models.Task.instance)
+    return q.filter(models.Task.execution_id == execution_id).all()
+
+
 def _get_task(context, task_id):
     task = _soft_delete_aware_query(context, models.Task).filter_by(
         id=task_id).first()
@@ -726,6 +942,59 @@ def set_task_status(context, task_id, status, exception_details=None):
     task.exception_details = exception_details
 
 
+@enginefacade.writer
+def set_tasks_statuses(context, task_ids, status, exception_details=None):
+    """ Sets the status of all the tasks with the given IDs at once. """
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+    q = _soft_delete_aware_query(context, models.Task).filter(
+        models.Task.id.in_(task_ids))
+    count = q.update({
+        "status": status, "exception_details": exception_details},
+        synchronize_session=False)
+    if count != len(set(task_ids)):
+        raise exception.NotFound(
+            "One or more of the tasks with IDs %s do not exist." % task_ids)
+
+
+@enginefacade.writer
+def set_tasks_hosts(context, task_hosts):
+    """ Sets the hosts of the tasks from the given dict mapping task IDs to
+    hosts, updating all the tasks with the same host at once.
+    """
+    tasks_by_host = {}
+    for task_id, host in task_hosts.items():
+        tasks_by_host.setdefault(host, []).append(task_id)
+    for host, task_ids in tasks_by_host.items():
+        q = _soft_delete_aware_query(context, models.Task).filter(
+            models.Task.id.in_(task_ids))
+        q.update({"host": host}, synchronize_session=False)
+
+
+@enginefacade.reader
+def get_capacity_deferred_tasks(context, execution_id=None):
+    """ Returns the tasks of active executions which are PENDING but were not
+    yet assigned to any Worker service host, meaning they are waiting for a
+    Worker service to have the capacity to run them.
+    Only the ID, execution ID, type and instance of the tasks are returned.
+    """
+    q = _soft_delete_aware_query(
+        context, models.Task.id, models.Task.execution_id,
+        models.Task.task_type, models.Task.instance)
+    q = q.join(
+        models.TasksExecution,
+        models.TasksExecution.id == models.Task.execution_id)
+    q = q.filter(
+        models.Task.status == constants.TASK_STATUS_PENDING,
+        models.Task.host.is_(None),
+        models.TasksExecution.status.in_(
+            constants.ACTIVE_EXECUTION_STATUSES))
+    if execution_id is not None:
+        q = q.filter(models.Task.execution_id == execution_id)
+    return q.all()
+
+
 @enginefacade.writer
 def set_task_host_properties(context, task_id, host=None, process_id=None):
     task = _get_task(context, task_id)
@@ -741,6 +1010,15 @@ def get_task(context, task_id):
     return q.filter_by(id=task_id).first()
 
 
+@enginefacade.reader
+def get_task_execution_id(context, task_id):
+    q = _soft_delete_aware_query(context, models.Task.execution_id)
+    result = q.filter(models.Task.id == task_id).first()
+    if not result:
+        raise exception.NotFound("Task with ID '%s' not found." % task_id)
+    return result[0]
+
+
 @enginefacade.writer
 def add_task_event(context, task_id, level, message):
     task_event = models.TaskEvent()
@@ -756,6 +1034,28 @@ def add_task_event(context, task_id, level, message):
     return task_event
 
 
+@enginefacade.writer
+def add_task_events(context, task_id, events):
+    """ Adds the given list of dicts with the 'level' and 'message' of each
+    event to the task, in order.
+    """
+    next_index = 0
+    last_event = _get_last_task_event(context, task_id)
+    if last_event:
+        next_index = last_event.index + 1
+    task_events = []
+    for i, event in enumerate(events):
+        task_event = models.TaskEvent()
+        task_event.id = str(uuid.uuid4())
+        task_event.index = next_index + i
+        task_event.task_id = task_id
+        task_event.level = event["level"]
+        task_event.message = event["message"]
+        task_events.append(task_event)
+    _session(context).add_all(task_events)
+    return task_events
+
+
 @enginefacade.reader
 def _get_last_task_event(context, task_id):
     q = _soft_delete_aware_query(
@@ -884,6 +1184,62 @@ def add_task_progress_update(
     return task_progress_update
 
 
+@enginefacade.writer
+def add_task_progress_updates(context, task_id, progress_updates):
+    """ Adds the given list of dicts with the 'message' and optional
+    'initial_step' and 'total_steps' of each progress update to the task,
+    in order.
+    """
+    next_index = 0
+    last_progress_update = _get_last_task_progress_update(context, task_id)
+    if last_progress_update:
+        next_index = last_progress_update.index + 1
+    task_progress_updates = []
+    for i, progress_update in enumerate(progress_updates):
+        task_progress_update = models.TaskProgressUpdate()
+        task_progress_update.id = str(uuid.uuid4())
+        task_progress_update.task_id = task_id
+        task_progress_update.current_step = progress_update.get(
+            "initial_step", 0)
+        task_progress_update.total_steps = progress_update.get(
+            "total_steps", 0)
+        task_progress_update.message = progress_update["message"]
+        task_progress_update.index = next_index + i
+        task_progress_updates.append(task_progress_update)
+    _session(context).add_all(task_progress_updates)
+    return task_progress_updates
+
+
+@enginefacade.writer
+def update_task_progress_updates(context, task_id, progress_updates):
+    """ Updates the progress updates of the task with the given list of
+    dicts with the 'index' and 'current_step' of each progress update, as
+    well as its optional new 'total_steps' and 'message'.
+    """
+    q = _soft_delete_aware_query(context, models.TaskProgressUpdate)
+    task_progress_updates = {
+        update.index: update for update in q.filter(
+            models.TaskProgressUpdate.task_id == task_id,
+            models.TaskProgressUpdate.index.in_(
+                [u["index"] for u in progress_updates]))}
+    missing = [
+        u["index"] for u in progress_updates
+        if u["index"] not in task_progress_updates]
+    if missing:
+        raise exception.NotFound(
+            "Could not find progress updates for task with ID '%s' and "
+            "indexes %s in the DB for updating." % (task_id, missing))
+
+    for progress_update in progress_updates:
+        task_progress_update = task_progress_updates[
+            progress_update["index"]]
+        task_progress_update.current_step = progress_update["current_step"]
+        if progress_update.get("total_steps") is not None:
+            task_progress_update.total_steps = progress_update["total_steps"]
+        if progress_update.get("message") is not None:
+            task_progress_update.message = progress_update["message"]
+
+
 @enginefacade.writer
 def update_task_progress_update(
         context, task_id, update_index, new_current_step,
@@ -1184,6 +1540,31 @@ def update_service(context, service_id, updated_values):
     _try_unmap_regions(regions_to_unmap)
 
 
+@enginefacade.reader
+def get_service_loads(context):
+    """ Returns a dict mapping the IDs of all services to their last
+    reported load and the time it was reported at.
+    """
+    q = _soft_delete_aware_query(context, models.Service).with_entities(
+        models.Service.id, models.Service.load,
+        models.Service.load_updated_at)
+    return {
+        service_id: (load, load_updated_at)
+        for (service_id, load, load_updated_at) in q.all()}
+
+
+@enginefacade.writer
+def update_service_load(context, service_id, load):
+    q = _soft_delete_aware_query(context, models.Service).filter(
+        models.Service.id == service_id)
+    count = q.update({
+        "load": load, "load_updated_at": timeutils.utcnow()},
+        synchronize_session=False)
+    if not count:
+        raise exception.NotFound(
+            "Service with ID '%s' does not exist." % service_id)
+
+
 @enginefacade.writer
 def delete_service(context, service_id):
     service = get_service(context, service_id)
@@ -1303,7 +1684,12 @@ def update_minion_machine(context, minion_machine_id, updated_values):
     updateable_fields = [
         "connection_info", "provider_properties", "allocation_status",
         "backup_writer_connection_info", "allocated_action",
-        "last_used_at", "power_status"]
+        "last_used_at", "power_status", "last_healthcheck_at"]
+    if "power_status" in updated_values and (
+            updated_values["power_status"] != minion_machine.power_status):
+        # NOTE: the result of any previous healthcheck no longer applies:
+        updated_values = dict(updated_values)
+        updated_values.setdefault("last_healthcheck_at", None)
     _update_sqlalchemy_object_fields(
         minion_machine, updateable_fields, updated_values)
 
@@ -1350,6 +1736,32 @@ def set_minion_machines_allocation_statuses(
         machine.allocation_status = allocation_status
 
 
+@enginefacade.writer
+def claim_available_minion_machines(
+        context, minion_pool_id, minion_machine_ids, action_id,
+        allocation_status):
+    """ Atomically allocates to the given action those of the given machines
+    of the pool which are still AVAILABLE, setting them in the given
+    allocation status. Returns the IDs of the claimed machines, in the
+    order they were given in.
+    """
+    if not minion_machine_ids:
+        return []
+    q = _soft_delete_aware_query(context, models.MinionMachine).filter(
+        models.MinionMachine.pool_id == minion_pool_id,
+        models.MinionMachine.id.in_(minion_machine_ids),
+        models.MinionMachine.allocation_status == (
+            constants.MINION_MACHINE_STATUS_AVAILABLE))
+    now = timeutils.utcnow()
+    claimed_ids = set()
+    for machine in q.with_for_update().all():
+        machine.allocated_action = action_id
+        machine.allocation_status = allocation_status
+        machine.last_used_at = now
+        claimed_ids.add(machine.id)
+    return [mid for mid in minion_machine_ids if mid in claimed_ids]
+
+
 @enginefacade.writer
 def delete_minion_machine(context, minion_machine_id):
     # TODO(aznashwan): update models to be soft-delete-aware to
@@ -1465,3 +1877,85 @@ def update_minion_pool(context, minion_pool_id, updated_values):
     # the oslo_db library uses this method for both the `created_at` and
     # `updated_at` fields
     setattr(lifecycle, 'updated_at', timeutils.utcnow())
+
+
+def _lock_holder_sort_key(holder):
+    return (holder.created_at, holder.id)
+
+
+@db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@enginefacade.writer
+def try_acquire_lock(context, name, holder_id, mode, owner, timeout):
+    """ Attempts to grant the given lock to the holder with the given ID in
+    the given mode ('read' or 'write'), returning whether it was granted.
+    Readers are refused while writers hold or wait for the lock, and waiting
+    writers are granted the lock in the order in which they first attempted
+    to acquire it. Holders which were not refreshed within the given timeout
+    in seconds are considered released.
+    """
+    named_lock = _model_query(context, models.NamedLock).filter(
+        models.NamedLock.name == name).with_for_update().first()
+    if not named_lock:
+        named_lock = models.NamedLock()
+        named_lock.name = name
+        try:
+            with _session(context).begin_nested():
+                _session(context).add(named_lock)
+        except db_exception.DBDuplicateEntry:
+            # NOTE: the lock was added in the meantime by another holder.
+            pass
+        named_lock = _model_query(context, models.NamedLock).filter(
+            models.NamedLock.name == name).with_for_update().first()
+
+    now = timeutils.utcnow()
+    holders_query = _model_query(context, models.NamedLockHolder).filter(
+        models.NamedLockHolder.name == name)
+    holders_query.filter(
+        models.NamedLockHolder.expires_at < now).delete(
+            synchronize_session=False)
+
+    holder = None
+    others = []
+    for lock_holder in holders_query.all():
+        if lock_holder.id == holder_id:
+            holder = lock_holder
+        else:
+            others.append(lock_holder)
+    if not holder:
+        holder = models.NamedLockHolder()
+        holder.id = holder_id
+        holder.name = name
+        holder.mode = mode
+        holder.owner = owner
+        holder.created_at = now
+
+    if mode == "read":
+        granted = not any(h.mode != "read" for h in others)
+    else:
+        granted = not any(h.granted for h in others) and not any(
+            _lock_holder_sort_key(h) < _lock_holder_sort_key(holder)
+            for h in others if h.mode != "read")
+
+    if granted or mode != "read":
+        # NOTE: waiting writers are recorded so that new readers wait for
+        # them instead of starving them:
+        holder.granted = granted
+        holder.expires_at = now + datetime.timedelta(seconds=timeout)
+        _session(context).add(holder)
+    return granted
+
+
+@enginefacade.writer
+def refresh_lock_holders(context, holder_ids, timeout):
+    _model_query(context, models.NamedLockHolder).filter(
+        models.NamedLockHolder.id.in_(holder_ids)).update(
+            {models.NamedLockHolder.expires_at: (
+                timeutils.utcnow() + datetime.timedelta(seconds=timeout))},
+            synchronize_session=False)
+
+
+@enginefacade.writer
+def release_lock_holder(context, holder_id):
+    _model_query(context, models.NamedLockHolder).filter(
+        models.NamedLockHolder.id == holder_id).delete(
+            synchronize_session=False)
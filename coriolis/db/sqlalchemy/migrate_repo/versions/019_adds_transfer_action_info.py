@@ -0,0 +1,65 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import uuid
+import zlib
+
+from oslo_serialization import jsonutils
+import sqlalchemy
+from sqlalchemy.dialects import mysql
+
+
+def _get_blob_type(migrate_engine):
+    if migrate_engine.name == 'mysql':
+        return mysql.BLOB(4294967295)
+    return sqlalchemy.LargeBinary
+
+
+def _load_info(value):
+    if value is None:
+        return {}
+    try:
+        value = zlib.decompress(value)
+    except Exception:
+        pass
+    return jsonutils.loads(value) or {}
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData()
+    meta.bind = migrate_engine
+
+    base_transfer_action = sqlalchemy.Table(
+        'base_transfer_action', meta, autoload=True)
+
+    # the info of each instance of a transfer action gets its own row:
+    transfer_action_info = sqlalchemy.Table(
+        'transfer_action_info', meta,
+        sqlalchemy.Column("id", sqlalchemy.String(36), primary_key=True,
+                          default=lambda: str(uuid.uuid4())),
+        sqlalchemy.Column('created_at', sqlalchemy.DateTime),
+        sqlalchemy.Column('updated_at', sqlalchemy.DateTime),
+        sqlalchemy.Column(
+            "action_id", sqlalchemy.String(36),
+            sqlalchemy.ForeignKey('base_transfer_action.base_id'),
+            nullable=False, index=True),
+        sqlalchemy.Column(
+            "instance", sqlalchemy.String(1024), nullable=False),
+        sqlalchemy.Column(
+            "info", _get_blob_type(migrate_engine), nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8')
+    transfer_action_info.create()
+
+    actions = migrate_engine.execute(sqlalchemy.select(
+        [base_transfer_action.c.base_id, base_transfer_action.c.info]))
+    for action_id, info in actions.fetchall():
+        for instance, instance_info in _load_info(info).items():
+            migrate_engine.execute(transfer_action_info.insert().values(
+                id=str(uuid.uuid4()),
+                action_id=action_id,
+                instance=instance,
+                info=zlib.compress(
+                    jsonutils.dumps(instance_info).encode('utf-8'))))
+
+    base_transfer_action.c.info.drop()
@@ -0,0 +1,47 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import sqlalchemy
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData()
+    meta.bind = migrate_engine
+
+    named_lock = sqlalchemy.Table(
+        'named_lock', meta,
+        sqlalchemy.Column(
+            "name", sqlalchemy.String(255), primary_key=True),
+        sqlalchemy.Column('created_at', sqlalchemy.DateTime),
+        sqlalchemy.Column('updated_at', sqlalchemy.DateTime),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8')
+
+    named_lock_holder = sqlalchemy.Table(
+        'named_lock_holder', meta,
+        sqlalchemy.Column(
+            "id", sqlalchemy.String(36), primary_key=True),
+        sqlalchemy.Column('created_at', sqlalchemy.DateTime),
+        sqlalchemy.Column('updated_at', sqlalchemy.DateTime),
+        sqlalchemy.Column(
+            "name", sqlalchemy.String(255),
+            sqlalchemy.ForeignKey('named_lock.name'),
+            nullable=False, index=True),
+        sqlalchemy.Column("mode", sqlalchemy.String(20), nullable=False),
+        sqlalchemy.Column("owner", sqlalchemy.String(255), nullable=False),
+        sqlalchemy.Column(
+            "granted", sqlalchemy.Boolean, nullable=False, default=False),
+        sqlalchemy.Column(
+            "expires_at", sqlalchemy.DateTime, nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8')
+
+    tables = [named_lock, named_lock_holder]
+    for index, table in enumerate(tables):
+        try:
+            table.create()
+        except Exception:
+            # If an error occurs, drop all tables created so far to return
+            # to the previously existing state.
+            meta.drop_all(tables=tables[:index])
+            raise
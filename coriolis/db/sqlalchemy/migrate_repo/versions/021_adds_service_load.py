@@ -0,0 +1,19 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import sqlalchemy
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData()
+    meta.bind = migrate_engine
+
+    # add the last reported load of each service:
+    service = sqlalchemy.Table('service', meta, autoload=True)
+
+    load = sqlalchemy.Column("load", sqlalchemy.Text, nullable=True)
+    service.create_column(load)
+
+    load_updated_at = sqlalchemy.Column(
+        "load_updated_at", sqlalchemy.DateTime, nullable=True)
+    service.create_column(load_updated_at)
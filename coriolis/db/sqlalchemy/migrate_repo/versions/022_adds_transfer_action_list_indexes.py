@@ -0,0 +1,32 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import sqlalchemy
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData()
+    meta.bind = migrate_engine
+
+    # index the columns which transfer action listings are filtered and
+    # sorted by:
+    base_transfer_action = sqlalchemy.Table(
+        'base_transfer_action', meta, autoload=True)
+    indexes = [
+        sqlalchemy.Index(
+            "ix_base_transfer_action_deleted_at_created_at",
+            base_transfer_action.c.deleted_at,
+            base_transfer_action.c.created_at),
+        sqlalchemy.Index(
+            "ix_base_transfer_action_project_id_created_at",
+            base_transfer_action.c.project_id,
+            base_transfer_action.c.created_at),
+        sqlalchemy.Index(
+            "ix_base_transfer_action_last_execution_status",
+            base_transfer_action.c.last_execution_status),
+        sqlalchemy.Index(
+            "ix_base_transfer_action_updated_at",
+            base_transfer_action.c.updated_at),
+    ]
+    for index in indexes:
+        index.create(migrate_engine)
@@ -0,0 +1,16 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import sqlalchemy
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData()
+    meta.bind = migrate_engine
+
+    # index the tasks by their execution and status, which the statuses of
+    # executions are aggregated by:
+    task = sqlalchemy.Table('task', meta, autoload=True)
+    index = sqlalchemy.Index(
+        "ix_task_execution_id_status", task.c.execution_id, task.c.status)
+    index.create(migrate_engine)
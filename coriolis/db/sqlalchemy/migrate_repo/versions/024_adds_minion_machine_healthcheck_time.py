@@ -0,0 +1,16 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import sqlalchemy
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData()
+    meta.bind = migrate_engine
+
+    minion_machine = sqlalchemy.Table(
+        'minion_machine', meta, autoload=True)
+
+    last_healthcheck_at = sqlalchemy.Column(
+        "last_healthcheck_at", sqlalchemy.DateTime, nullable=True)
+    minion_machine.create_column(last_healthcheck_at)
@@ -0,0 +1,21 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import sqlalchemy
+
+
+def upgrade(migrate_engine):
+    meta = sqlalchemy.MetaData()
+    meta.bind = migrate_engine
+
+    tasks_execution = sqlalchemy.Table(
+        'tasks_execution', meta, autoload=True)
+
+    trust_id = sqlalchemy.Column(
+        "trust_id", sqlalchemy.String(255), nullable=True)
+    tasks_execution.create_column(trust_id)
+
+    delete_trust_id = sqlalchemy.Column(
+        "delete_trust_id", sqlalchemy.Boolean, nullable=False,
+        default=False)
+    tasks_execution.create_column(delete_trust_id)
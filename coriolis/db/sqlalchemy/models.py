@@ -5,8 +5,10 @@ import uuid
 
 from oslo_db.sqlalchemy import models
 import sqlalchemy
+from sqlalchemy.ext import associationproxy
 from sqlalchemy.ext import declarative
 from sqlalchemy import orm
+from sqlalchemy.orm import collections
 from sqlalchemy import schema
 
 from coriolis import constants
@@ -143,6 +145,9 @@ class MinionPoolProgressUpdate(
 class Task(BASE, models.TimestampMixin, models.SoftDeleteMixin,
            models.ModelBase):
     __tablename__ = 'task'
+    __table_args__ = (
+        sqlalchemy.Index(
+            "ix_task_execution_id_status", "execution_id", "status"),)
 
     id = sqlalchemy.Column(sqlalchemy.String(36),
                            default=lambda: str(uuid.uuid4()),
@@ -216,6 +221,11 @@ class TasksExecution(BASE, models.TimestampMixin, models.ModelBase,
     status = sqlalchemy.Column(sqlalchemy.String(100), nullable=False)
     number = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
     type = sqlalchemy.Column(sqlalchemy.String(255))
+    # NOTE: the trust the tasks of the execution are run with, so that the
+    # ones which could not be started right away can be started later:
+    trust_id = sqlalchemy.Column(sqlalchemy.String(255), nullable=True)
+    delete_trust_id = sqlalchemy.Column(
+        sqlalchemy.Boolean, nullable=False, default=False)
 
     def to_dict(self):
         result = {
@@ -235,9 +245,35 @@ class TasksExecution(BASE, models.TimestampMixin, models.ModelBase,
         return result
 
 
+class TransferActionInfo(BASE, models.TimestampMixin, models.ModelBase):
+    __tablename__ = 'transfer_action_info'
+
+    id = sqlalchemy.Column(sqlalchemy.String(36),
+                           default=lambda: str(uuid.uuid4()),
+                           primary_key=True)
+    action_id = sqlalchemy.Column(
+        sqlalchemy.String(36),
+        sqlalchemy.ForeignKey('base_transfer_action.base_id'),
+        nullable=False, index=True)
+    instance = sqlalchemy.Column(sqlalchemy.String(1024), nullable=False)
+    info = sqlalchemy.Column(types.Bson, nullable=False)
+
+
 class BaseTransferAction(BASE, models.TimestampMixin, models.ModelBase,
                          models.SoftDeleteMixin):
     __tablename__ = 'base_transfer_action'
+    __table_args__ = (
+        sqlalchemy.Index(
+            "ix_base_transfer_action_deleted_at_created_at",
+            "deleted_at", "created_at"),
+        sqlalchemy.Index(
+            "ix_base_transfer_action_project_id_created_at",
+            "project_id", "created_at"),
+        sqlalchemy.Index(
+            "ix_base_transfer_action_last_execution_status",
+            "last_execution_status"),
+        sqlalchemy.Index(
+            "ix_base_transfer_action_updated_at", "updated_at"))
 
     base_id = sqlalchemy.Column(sqlalchemy.String(36),
                                 default=lambda: str(uuid.uuid4()),
@@ -256,7 +292,18 @@ class BaseTransferAction(BASE, models.TimestampMixin, models.ModelBase,
         sqlalchemy.String(255), nullable=False,
         default=lambda: constants.EXECUTION_STATUS_UNEXECUTED)
     reservation_id = sqlalchemy.Column(sqlalchemy.String(36), nullable=True)
-    info = orm.deferred(sqlalchemy.Column(types.Bson, nullable=False))
+    # NOTE: the info rows are only ever saved explicitly through the DB API,
+    # so that re-attaching an action (e.g. when adding an execution for it)
+    # does not persist changes made to its info in the meantime:
+    instance_infos = orm.relationship(
+        TransferActionInfo, cascade="delete",
+        collection_class=collections.attribute_mapped_collection("instance"))
+    # NOTE: dict-like view over the info of each instance, which is stored
+    # in its own row so that it may be read and updated on its own:
+    info = associationproxy.association_proxy(
+        "instance_infos", "info",
+        creator=lambda instance, info: TransferActionInfo(
+            instance=instance, info=info))
     notes = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
     origin_endpoint_id = sqlalchemy.Column(
         sqlalchemy.String(36),
@@ -315,7 +362,7 @@ class BaseTransferAction(BASE, models.TimestampMixin, models.ModelBase,
             for ex in self.executions:
                 result["executions"].append(ex.to_dict())
         if include_task_info:
-            result["info"] = self.info
+            result["info"] = dict(self.info)
         return result
 
 
@@ -420,6 +467,8 @@ class Service(BASE, models.TimestampMixin, models.ModelBase,
         default=lambda: constants.SERVICE_STATUS_UNKNOWN)
     providers = sqlalchemy.Column(types.Json(), nullable=True)
     specs = sqlalchemy.Column(types.Json(), nullable=True)
+    load = sqlalchemy.Column(types.Json(), nullable=True)
+    load_updated_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=True)
     mapped_regions = orm.relationship(
         'Region', back_populates='mapped_services',
         secondary="service_region_mapping")
@@ -506,6 +555,9 @@ class MinionMachine(BASE, models.TimestampMixin, models.ModelBase,
     last_used_at = sqlalchemy.Column(
         sqlalchemy.types.DateTime, nullable=True)
 
+    last_healthcheck_at = sqlalchemy.Column(
+        sqlalchemy.types.DateTime, nullable=True)
+
     connection_info = sqlalchemy.Column(
         types.Json, nullable=True)
 
@@ -530,6 +582,7 @@ class MinionMachine(BASE, models.TimestampMixin, models.ModelBase,
             "connection_info": self.connection_info,
             "allocated_action": self.allocated_action,
             "last_used_at": self.last_used_at,
+            "last_healthcheck_at": self.last_healthcheck_at,
             "backup_writer_connection_info": (
                 self.backup_writer_connection_info),
             "provider_properties": self.provider_properties
@@ -674,3 +727,25 @@ class ReplicaSchedule(BASE, models.TimestampMixin, models.ModelBase,
     shutdown_instance = sqlalchemy.Column(
         sqlalchemy.Boolean, nullable=False, default=False)
     trust_id = sqlalchemy.Column(sqlalchemy.String(255), nullable=False)
+
+
+class NamedLock(BASE, models.TimestampMixin, models.ModelBase):
+    __tablename__ = "named_lock"
+
+    name = sqlalchemy.Column(sqlalchemy.String(255), primary_key=True)
+
+
+class NamedLockHolder(BASE, models.TimestampMixin, models.ModelBase):
+    __tablename__ = "named_lock_holder"
+
+    id = sqlalchemy.Column(sqlalchemy.String(36),
+                           default=lambda: str(uuid.uuid4()),
+                           primary_key=True)
+    name = sqlalchemy.Column(
+        sqlalchemy.String(255),
+        sqlalchemy.ForeignKey('named_lock.name'), nullable=False, index=True)
+    mode = sqlalchemy.Column(sqlalchemy.String(20), nullable=False)
+    owner = sqlalchemy.Column(sqlalchemy.String(255), nullable=False)
+    granted = sqlalchemy.Column(
+        sqlalchemy.Boolean, nullable=False, default=False)
+    expires_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=False)
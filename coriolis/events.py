@@ -102,6 +102,10 @@ class EventManager(object, with_metaclass(abc.ABCMeta)):
         self._call_event_handler(
             'add_event', message, level=constants.TASK_EVENT_ERROR)
 
+    def update_volume_checkpoint(self, disk_id, checkpoint):
+        self._call_event_handler(
+            'update_volume_checkpoint', disk_id, checkpoint)
+
 
 class BaseEventHandler(object, with_metaclass(abc.ABCMeta)):
 
@@ -126,3 +130,18 @@ class BaseEventHandler(object, with_metaclass(abc.ABCMeta)):
     @abc.abstractmethod
     def add_event(self, message, level=constants.TASK_EVENT_INFO):
         pass
+
+    def update_volume_checkpoint(self, disk_id, checkpoint):
+        """ Persists the progress of the replication of the given disk, so
+        that a later replication may resume from it. Checkpoints are not
+        persisted by default.
+        """
+        pass
+
+    def flush(self, wait=False):
+        """ Sends out any events or progress updates which the handler may
+        have buffered. Must be called with 'wait' set before the task
+        reports its result, so that the last events are stored before the
+        task gets finalized.
+        """
+        pass
@@ -467,6 +467,13 @@ class NoSuitableWorkerServiceError(NoServiceError):
         "criteria for the required operation.")
 
 
+class WorkerServicesAtCapacityError(NoSuitableWorkerServiceError):
+    message = _(
+        "All of the Coriolis Worker services which fit the criteria for the "
+        "required operation are running as many tasks as they are "
+        "configured to.")
+
+
 class OSMorphingException(CoriolisException):
     pass
 
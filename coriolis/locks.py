@@ -0,0 +1,336 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+""" Named locks shared between the processes and hosts of Coriolis services.
+
+Locks may be taken in either read mode, which may be held by any number of
+holders at once, or write mode, which excludes all other holders. The
+following backends are available:
+
+- "file": locks files in the oslo_concurrency lock_path, which only
+  synchronizes the services running on the same host. The lock files are
+  the same ones used by oslo_concurrency's external locks.
+- "db": lock rows in the Coriolis database, which synchronizes the services
+  on all hosts using it. The locks held by each process are periodically
+  refreshed, and those which were not refreshed within the configured timeout
+  (e.g. after a crash) are considered released.
+
+The time spent waiting for each lock is tracked in order to help identify
+contended locks.
+"""
+
+import abc
+import collections
+import contextlib
+import functools
+import os
+import threading
+import time
+import uuid
+
+import eventlet
+import fasteners
+from oslo_concurrency import lockutils
+from oslo_config import cfg
+from oslo_log import log as logging
+from six import with_metaclass
+
+from coriolis import context
+from coriolis.db import api as db_api
+from coriolis import exception
+from coriolis import utils
+
+
+LOCK_MODE_READ = "read"
+LOCK_MODE_WRITE = "write"
+LOCK_MODES = [LOCK_MODE_READ, LOCK_MODE_WRITE]
+
+LOCK_BACKEND_FILE = "file"
+LOCK_BACKEND_DB = "db"
+
+locks_opts = [
+    cfg.StrOpt("backend",
+               default=LOCK_BACKEND_FILE,
+               choices=[LOCK_BACKEND_FILE, LOCK_BACKEND_DB],
+               help="Backend used for the locks of the Coriolis services. "
+                    "The 'file' backend can only be used when all services "
+                    "run on the same host, while the 'db' one uses the "
+                    "Coriolis database to synchronize services on any host. "
+                    "All services must use the same backend."),
+    cfg.FloatOpt("wait_warning_threshold",
+                 default=10,
+                 min=0,
+                 help="Number of seconds spent waiting for a lock after "
+                      "which a warning is logged. 0 disables the warning."),
+    cfg.IntOpt("max_tracked_locks",
+               default=1024,
+               min=1,
+               help="Maximum number of lock names for which the time spent "
+                    "waiting for them is tracked, with the least recently "
+                    "used ones being discarded first."),
+    cfg.FloatOpt("db_poll_interval",
+                 default=0.2,
+                 min=0.01,
+                 help="Number of seconds between attempts to acquire a lock "
+                      "held by another holder when using the 'db' backend."),
+    cfg.IntOpt("db_lock_timeout",
+               default=60,
+               min=3,
+               help="Number of seconds after which a lock held through the "
+                    "'db' backend is considered released if the process "
+                    "holding it did not refresh it, as it does every third "
+                    "of this interval."),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(locks_opts, 'locks')
+
+LOG = logging.getLogger(__name__)
+
+_LOCK_MANAGER = None
+
+
+class BaseLockManager(object, with_metaclass(abc.ABCMeta)):
+
+    def __init__(self):
+        self._wait_stats = collections.OrderedDict()
+        self._wait_warning_threshold = CONF.locks.wait_warning_threshold
+        self._max_tracked_locks = CONF.locks.max_tracked_locks
+
+    @abc.abstractmethod
+    def _acquire(self, name, mode):
+        """ Blocks until the lock is acquired in the given mode and returns
+        the handle which is to be passed to `_release`.
+        """
+        pass
+
+    @abc.abstractmethod
+    def _release(self, name, mode, handle):
+        pass
+
+    def _record_wait(self, name, mode, waited):
+        stats = self._wait_stats.pop(name, None)
+        if stats is None:
+            stats = {
+                "acquisitions": 0, "total_wait": 0, "max_wait": 0}
+        stats["acquisitions"] += 1
+        stats["total_wait"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+        self._wait_stats[name] = stats
+        while len(self._wait_stats) > self._max_tracked_locks:
+            self._wait_stats.popitem(last=False)
+
+        if self._wait_warning_threshold and (
+                waited >= self._wait_warning_threshold):
+            LOG.warn(
+                "Waited %.2f seconds for acquiring lock '%s' in %s mode",
+                waited, name, mode)
+
+    @contextlib.contextmanager
+    def lock(self, name, mode=LOCK_MODE_WRITE):
+        if mode not in LOCK_MODES:
+            raise exception.CoriolisException(
+                "Invalid lock mode '%s'. Must be one of: %s" % (
+                    mode, LOCK_MODES))
+        start = time.time()
+        handle = self._acquire(name, mode)
+        self._record_wait(name, mode, time.time() - start)
+        try:
+            yield
+        finally:
+            self._release(name, mode, handle)
+
+    def get_wait_stats(self):
+        """ Returns a dict with the number of acquisitions as well as the
+        total and maximum number of seconds spent waiting for each of the most
+        recently used locks.
+        """
+        return {
+            name: dict(stats) for name, stats in self._wait_stats.items()}
+
+
+class FileLockManager(BaseLockManager):
+
+    def __init__(self):
+        super(FileLockManager, self).__init__()
+        self._internal_locks = lockutils.FairLocks()
+        self._shared_guards = lockutils.Semaphores()
+        # NOTE: the file locks of a process are released when any of its file
+        # descriptors for the lock file gets closed, so the process' readers
+        # of a lock share a single read lock of the file:
+        self._shared_file_locks = {}
+
+    def _get_file_lock(self, name):
+        if CONF.oslo_concurrency.disable_process_locking:
+            return None
+        lock_path = lockutils.get_lock_path(CONF)
+        if not lock_path:
+            raise cfg.RequiredOptError(
+                'lock_path', cfg.OptGroup('oslo_concurrency'))
+        return fasteners.InterProcessReaderWriterLock(
+            os.path.join(lock_path, name.replace(os.sep, '_')),
+            sleep_func=lambda delay: time.sleep(delay))
+
+    def _acquire_shared_file_lock(self, name):
+        with self._shared_guards.get(name):
+            if name not in self._shared_file_locks:
+                file_lock = self._get_file_lock(name)
+                if file_lock:
+                    file_lock.acquire_read_lock()
+                self._shared_file_locks[name] = [file_lock, 0]
+            self._shared_file_locks[name][1] += 1
+
+    def _release_shared_file_lock(self, name):
+        with self._shared_guards.get(name):
+            shared = self._shared_file_locks[name]
+            shared[1] -= 1
+            if not shared[1]:
+                del self._shared_file_locks[name]
+                if shared[0]:
+                    shared[0].release_read_lock()
+
+    def _acquire(self, name, mode):
+        internal_lock = self._internal_locks.get(name)
+        file_lock = None
+        if mode == LOCK_MODE_READ:
+            internal_lock.acquire_read_lock()
+            try:
+                self._acquire_shared_file_lock(name)
+            except BaseException:
+                internal_lock.release_read_lock()
+                raise
+        else:
+            internal_lock.acquire_write_lock()
+            try:
+                file_lock = self._get_file_lock(name)
+                if file_lock:
+                    file_lock.acquire_write_lock()
+            except BaseException:
+                internal_lock.release_write_lock()
+                raise
+        return internal_lock, file_lock
+
+    def _release(self, name, mode, handle):
+        internal_lock, file_lock = handle
+        if mode == LOCK_MODE_READ:
+            try:
+                self._release_shared_file_lock(name)
+            finally:
+                internal_lock.release_read_lock()
+        else:
+            try:
+                if file_lock:
+                    file_lock.release_write_lock()
+            finally:
+                internal_lock.release_write_lock()
+
+
+class DBLockManager(BaseLockManager):
+
+    def __init__(self):
+        super(DBLockManager, self).__init__()
+        self._internal_locks = lockutils.FairLocks()
+        self._owner = "%s:%s" % (utils.get_hostname(), os.getpid())
+        self._poll_interval = CONF.locks.db_poll_interval
+        self._lock_timeout = CONF.locks.db_lock_timeout
+        self._held_locks = {}
+        self._held_locks_lock = threading.Lock()
+        self._refresher = None
+
+    def _refresh_held_locks(self):
+        ctxt = context.get_admin_context()
+        while True:
+            eventlet.sleep(self._lock_timeout / 3)
+            with self._held_locks_lock:
+                holder_ids = list(self._held_locks)
+                if not holder_ids:
+                    self._refresher = None
+                    return
+            try:
+                db_api.refresh_lock_holders(
+                    ctxt, holder_ids, self._lock_timeout)
+            except Exception:
+                LOG.warn(
+                    "Failed to refresh the locks held by '%s': %s",
+                    self._owner, utils.get_exception_details())
+
+    def _acquire_db_lock(self, name, mode):
+        ctxt = context.get_admin_context()
+        holder_id = str(uuid.uuid4())
+        with self._held_locks_lock:
+            # NOTE: waiting holders are also refreshed, so that the
+            # writers waiting for a lock keep new readers out:
+            self._held_locks[holder_id] = name
+            if self._refresher is None:
+                self._refresher = eventlet.spawn(self._refresh_held_locks)
+        try:
+            while not db_api.try_acquire_lock(
+                    ctxt, name, holder_id, mode, self._owner,
+                    self._lock_timeout):
+                time.sleep(self._poll_interval)
+        except BaseException:
+            self._release_db_lock(holder_id)
+            raise
+        return holder_id
+
+    def _release_db_lock(self, holder_id):
+        with self._held_locks_lock:
+            self._held_locks.pop(holder_id, None)
+        db_api.release_lock_holder(context.get_admin_context(), holder_id)
+
+    def _acquire(self, name, mode):
+        # NOTE: the holders within the same process are synchronized locally
+        # first, so that they do not all poll the DB:
+        internal_lock = self._internal_locks.get(name)
+        if mode == LOCK_MODE_READ:
+            internal_lock.acquire_read_lock()
+        else:
+            internal_lock.acquire_write_lock()
+        try:
+            return internal_lock, self._acquire_db_lock(name, mode)
+        except BaseException:
+            if mode == LOCK_MODE_READ:
+                internal_lock.release_read_lock()
+            else:
+                internal_lock.release_write_lock()
+            raise
+
+    def _release(self, name, mode, handle):
+        internal_lock, holder_id = handle
+        try:
+            self._release_db_lock(holder_id)
+        finally:
+            if mode == LOCK_MODE_READ:
+                internal_lock.release_read_lock()
+            else:
+                internal_lock.release_write_lock()
+
+
+LOCK_MANAGER_CLASSES = {
+    LOCK_BACKEND_FILE: FileLockManager,
+    LOCK_BACKEND_DB: DBLockManager,
+}
+
+
+def get_lock_manager():
+    global _LOCK_MANAGER
+    if _LOCK_MANAGER is None:
+        _LOCK_MANAGER = LOCK_MANAGER_CLASSES[CONF.locks.backend]()
+    return _LOCK_MANAGER
+
+
+def lock(name, mode=LOCK_MODE_WRITE):
+    """ Returns a context manager which holds the given lock in the given
+    mode for its duration.
+    """
+    return get_lock_manager().lock(name, mode=mode)
+
+
+def synchronized(name, mode=LOCK_MODE_WRITE):
+    def _decorator(func):
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            with lock(name, mode=mode):
+                return func(*args, **kwargs)
+        return _wrapper
+    return _decorator
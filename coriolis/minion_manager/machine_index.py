@@ -0,0 +1,85 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+""" Index of the minion machines of a minion pool by their allocation and
+power statuses, which the Minion Manager selects machines from.
+
+The index is built from the machines of the pool as loaded from the DB,
+and keeps their order so that the same machines are always preferred over
+others, facilitating the rest to be left unused and thus torn down during
+the periodic refreshes of the pool.
+"""
+
+import collections
+import heapq
+
+
+class MinionMachineIndex(object):
+
+    def __init__(self, minion_machines):
+        self._machines = {}
+        self._positions = {}
+        self._statuses = {}
+        # NOTE: heaps of the (position, machine_id) of the machines in each
+        # (allocation_status, power_status), whose entries are only
+        # discarded when popped if the machine is no longer in that status:
+        self._buckets = collections.defaultdict(list)
+        self._counts = collections.Counter()
+        for position, machine in enumerate(minion_machines):
+            self._machines[machine.id] = machine
+            self._positions[machine.id] = position
+            self.release(machine)
+
+    def _pop_stale_entries(self, key):
+        bucket = self._buckets[key]
+        while bucket and self._statuses.get(bucket[0][1]) != key:
+            heapq.heappop(bucket)
+        return bucket
+
+    def count(self, allocation_status, power_status=None):
+        if power_status is not None:
+            return self._counts[(allocation_status, power_status)]
+        return sum(
+            count for key, count in self._counts.items()
+            if key[0] == allocation_status)
+
+    def acquire(self, allocation_status, power_statuses=None):
+        """ Removes from the index and returns the first machine in the given
+        allocation status and any of the given power statuses, or None if
+        there are none.
+        """
+        best_key = None
+        best_entry = None
+        for key in list(self._buckets):
+            if key[0] != allocation_status or (
+                    power_statuses is not None and (
+                        key[1] not in power_statuses)):
+                continue
+            bucket = self._pop_stale_entries(key)
+            if bucket and (best_entry is None or bucket[0] < best_entry):
+                best_key = key
+                best_entry = bucket[0]
+        if best_key is None:
+            return None
+
+        machine_id = heapq.heappop(self._buckets[best_key])[1]
+        self._statuses.pop(machine_id)
+        self._counts[best_key] -= 1
+        return self._machines[machine_id]
+
+    def release(self, machine):
+        """ (Re-)adds the machine to the index in its current statuses. """
+        self.remove(machine.id)
+        if machine.id not in self._positions:
+            self._positions[machine.id] = len(self._positions)
+        self._machines[machine.id] = machine
+        key = (machine.allocation_status, machine.power_status)
+        self._statuses[machine.id] = key
+        self._counts[key] += 1
+        heapq.heappush(
+            self._buckets[key], (self._positions[machine.id], machine.id))
+
+    def remove(self, machine_id):
+        key = self._statuses.pop(machine_id, None)
+        if key is not None:
+            self._counts[key] -= 1
@@ -134,6 +134,13 @@ class MinionManagerClient(rpc.BaseRPCClient):
             minion_pool_id=minion_pool_id,
             force=force)
 
+    def cancel_minion_pool_background_flows(
+            self, ctxt, minion_pool_id, exclude_flow_ids=None):
+        self._fanout_cast(
+            ctxt, "cancel_minion_pool_background_flows",
+            minion_pool_id=minion_pool_id,
+            exclude_flow_ids=exclude_flow_ids)
+
     def get_minion_pools(self, ctxt):
         return self._call(ctxt, 'get_minion_pools')
 
@@ -2,7 +2,6 @@
 # All Rights Reserved.
 
 import datetime
-import math
 import uuid
 
 from oslo_config import cfg
@@ -21,6 +20,7 @@ from coriolis.db import api as db_api
 from coriolis.db.sqlalchemy import models
 from coriolis import exception
 from coriolis import keystone
+from coriolis.minion_manager import machine_index
 from coriolis.minion_manager.rpc import client as rpc_minion_manager_client
 from coriolis.minion_manager.rpc import tasks as minion_mgr_tasks
 from coriolis.minion_manager.rpc import utils as minion_manager_utils
@@ -40,15 +40,56 @@ MINION_MANAGER_OPTS = [
         "minion_pool_default_refresh_period_minutes",
         default=10,
         help="Number of minutes in which to refresh minion pools."
-             "Set to 0 to completely disable automatic refreshing.")]
+             "Set to 0 to completely disable automatic refreshing."),
+    cfg.IntOpt(
+        "minion_pool_prewarm_window_minutes",
+        default=0,
+        min=0,
+        help="Number of minutes ahead of the scheduled executions of the "
+             "Replicas using a minion pool within which the pool refreshes "
+             "power on or create enough minion machines for all of their "
+             "instances, so that they are available by the time the "
+             "executions start. Should exceed the pool refresh period plus "
+             "the time it takes to deploy a minion machine. Set to 0 to "
+             "disable pre-warming based on Replica schedules."),
+    cfg.IntOpt(
+        "minion_pool_prewarm_history_minutes",
+        default=0,
+        min=0,
+        help="Number of minutes of minion machine allocation history which "
+             "pool refreshes take into account, keeping as many minion "
+             "machines available as were allocated within that period, "
+             "minus the ones still in use. Set to 0 to disable pre-warming "
+             "based on the allocation history."),
+    cfg.IntOpt(
+        "minion_healthcheck_cache_ttl",
+        default=300,
+        min=0,
+        help="Number of seconds for which the result of a successful "
+             "healthcheck of a powered on minion machine is reused instead "
+             "of healthchecking the machine again, be it during pool "
+             "refreshes or when allocating it. The minion machines which do "
+             "need healthchecking are then first healthchecked together "
+             "through a single request to a Worker service. Set to 0 to "
+             "always healthcheck each minion machine separately."),
+    cfg.IntOpt(
+        "minion_healthcheck_batch_size",
+        default=10,
+        min=1,
+        help="Maximum number of minion machines healthchecked together "
+             "through a single request to a Worker service. Larger numbers "
+             "of machines are split across multiple requests so that each "
+             "of them completes within the Worker RPC timeout. Should not "
+             "exceed the 'minion_healthcheck_concurrency' of the Worker "
+             "services.")]
 
 CONF = cfg.CONF
 CONF.register_opts(MINION_MANAGER_OPTS, 'minion_manager')
 
 MINION_POOL_REFRESH_JOB_PREFIX_FORMAT = "pool-%s-refresh"
-MINION_POOL_REFRESH_CRON_JOB_NAME_FORMAT = "pool-%s-refresh-minute-%d"
+MINION_POOL_REFRESH_CRON_JOB_NAME_FORMAT = "pool-%s-refresh-every-%d-minutes"
 MINION_POOL_REFRESH_CRON_JOB_DESCRIPTION_FORMAT = (
-    "Regularly scheduled refresh job for minion pool '%s' on minute %d.")
+    "Regularly scheduled refresh job for minion pool '%s' every %d minutes.")
 
 
 def _trigger_pool_refresh(ctxt, minion_manager_client, minion_pool_id):
@@ -142,23 +183,15 @@ class MinionManagerServerEndpoint(object):
             period_minutes = 10
         admin_ctxt = context.get_admin_context(
             minion_pool.maintenance_trust_id)
-        description = (
-            "Scheduled refresh job for minion pool '%s'" % minion_pool.id)
-
-        # NOTE: we need to generate hourly schedules for each minute in
-        # the hour we would like the refresh to be triggered:
-        for minute in [
-                period_minutes * i for i in range(
-                    math.ceil(60 / period_minutes))]:
-            name = MINION_POOL_REFRESH_CRON_JOB_NAME_FORMAT % (
-                minion_pool.id, minute)
-            description = MINION_POOL_REFRESH_CRON_JOB_DESCRIPTION_FORMAT % (
-                minion_pool.id, minute)
-            self._cron.register(
-                cron.CronJob(
-                    name, description, {"minute": minute}, True, None, None,
-                    None, _trigger_pool_refresh, admin_ctxt,
-                    self._rpc_minion_manager_client, minion_pool.id))
+        name = MINION_POOL_REFRESH_CRON_JOB_NAME_FORMAT % (
+            minion_pool.id, period_minutes)
+        description = MINION_POOL_REFRESH_CRON_JOB_DESCRIPTION_FORMAT % (
+            minion_pool.id, period_minutes)
+        self._cron.register(
+            cron.CronJob(
+                name, description, {"minute": "*/%d" % period_minutes}, True,
+                None, None, None, _trigger_pool_refresh, admin_ctxt,
+                self._rpc_minion_manager_client, minion_pool.id))
 
     def _unregister_refresh_jobs_for_minion_pool(
             self, minion_pool, raise_on_error=True):
@@ -216,7 +249,10 @@ class MinionManagerServerEndpoint(object):
         return self._minion_manager_client_instance
 
     def get_diagnostics(self, ctxt):
-        return utils.get_diagnostics_info()
+        diagnostics = utils.get_diagnostics_info()
+        diagnostics["background_flows"] = (
+            self._taskflow_runner.get_background_flow_stats())
+        return diagnostics
 
     def get_endpoint_source_minion_pool_options(
             self, ctxt, endpoint_id, env, option_names):
@@ -559,6 +595,51 @@ class MinionManagerServerEndpoint(object):
                     ctxt, migration['id'], str(ex)))
             raise
 
+    def _claim_available_minion_machines(
+            self, ctxt, minion_pool_id, pool_machine_index, action_id, count):
+        """ Reserves up to the given number of AVAILABLE machines of the pool
+        for the given action within the DB, in the order they are selected
+        from the given machine index, and returns them.
+        """
+        claimed_machines = []
+        try:
+            while len(claimed_machines) < count:
+                candidates = []
+                while len(claimed_machines) + len(candidates) < count:
+                    machine = pool_machine_index.acquire(
+                        constants.MINION_MACHINE_STATUS_AVAILABLE)
+                    if not machine:
+                        break
+                    candidates.append(machine)
+                if not candidates:
+                    break
+
+                claimed_ids = db_api.claim_available_minion_machines(
+                    ctxt, minion_pool_id, [m.id for m in candidates],
+                    action_id, constants.MINION_MACHINE_STATUS_RESERVED)
+                claimed_machines.extend([
+                    m for m in candidates if m.id in claimed_ids])
+                if len(claimed_ids) < len(candidates):
+                    LOG.debug(
+                        "The following minion machines of pool '%s' were "
+                        "allocated elsewhere before they could be reserved "
+                        "for action '%s': %s", minion_pool_id, action_id,
+                        [m.id for m in candidates if m.id not in claimed_ids])
+        except Exception:
+            if claimed_machines:
+                db_api.set_minion_machines_allocation_statuses(
+                    ctxt, [m.id for m in claimed_machines], None,
+                    constants.MINION_MACHINE_STATUS_AVAILABLE,
+                    refresh_allocation_time=False)
+            raise
+
+        if claimed_machines:
+            LOG.debug(
+                "Reserved the following pre-existing minion machines from "
+                "pool '%s' for action '%s': %s", minion_pool_id, action_id,
+                [m.id for m in claimed_machines])
+        return claimed_machines
+
     def _make_minion_machine_allocation_subflow_for_action(
             self, ctxt, minion_pool, action_id, action_instances,
             subflow_name, inject_for_tasks=None):
@@ -573,15 +654,14 @@ class MinionManagerServerEndpoint(object):
             "action_instance_minion_allocation_mappings": {
                 "<action_instance_id>": "<allocated_minion_id>"}}
         """
-        currently_available_machines = [
-            machine for machine in minion_pool.minion_machines
-            if machine.allocation_status
-            == constants.MINION_MACHINE_STATUS_AVAILABLE]
+        pool_machine_index = machine_index.MinionMachineIndex(
+            minion_pool.minion_machines)
         extra_available_machine_slots = (
             minion_pool.maximum_minions - len(minion_pool.minion_machines))
         num_instances = len(action_instances)
-        num_currently_available_machines = len(currently_available_machines)
-        if (num_instances > (len(currently_available_machines) + (
+        num_currently_available_machines = pool_machine_index.count(
+            constants.MINION_MACHINE_STATUS_AVAILABLE)
+        if (num_instances > (num_currently_available_machines + (
                 extra_available_machine_slots))):
             raise exception.InvalidMinionPoolState(
                 "Minion pool '%s' is unable to accommodate the requested "
@@ -595,30 +675,40 @@ class MinionManagerServerEndpoint(object):
                     num_currently_available_machines,
                     extra_available_machine_slots))
 
-        def _select_machine(minion_pool, exclude=None):
-            selected_machine = None
-            # NOTE(aznashwan): this will iterate through machines in a set
-            # order every time, thus ensuring that some are preferred over
-            # others and facilitating some to be left unused and thus torn
-            # down during the periodic refreshes:
-            for machine in minion_pool.minion_machines:
-                if exclude and machine.id in exclude:
-                    LOG.debug(
-                        "Excluding minion machine '%s' from search for use "
-                        "action '%s'", machine.id, action_id)
-                    continue
-                if (machine.allocation_status !=
-                        constants.MINION_MACHINE_STATUS_AVAILABLE):
-                    LOG.debug(
-                        "Minion machine with ID '%s' is in status '%s' "
-                        "instead of the expected '%s'. Skipping for use "
-                        "with action '%s'.",
-                        machine.id, machine.allocation_status,
-                        constants.MINION_MACHINE_STATUS_AVAILABLE, action_id)
-                    continue
-                selected_machine = machine
-                break
-            return selected_machine
+        seen_instances = set()
+        for instance in action_instances:
+            if instance in seen_instances:
+                raise exception.InvalidInput(
+                    "Instance with identifier '%s' passed twice for "
+                    "minion machine allocation from pool '%s' for action "
+                    "'%s'. Full instances list was: %s" %
+                    (instance, minion_pool.id, action_id, action_instances))
+            seen_instances.add(instance)
+
+        # NOTE(aznashwan): this will select the machines in a set order
+        # every time, thus ensuring that some are preferred over others and
+        # facilitating some to be left unused and thus torn down during the
+        # periodic refreshes:
+        claimed_machines = self._claim_available_minion_machines(
+            ctxt, minion_pool.id, pool_machine_index, action_id,
+            num_instances)
+        if num_instances - len(claimed_machines) > (
+                extra_available_machine_slots):
+            if claimed_machines:
+                db_api.set_minion_machines_allocation_statuses(
+                    ctxt, [m.id for m in claimed_machines], None,
+                    constants.MINION_MACHINE_STATUS_AVAILABLE,
+                    refresh_allocation_time=False)
+            raise exception.InvalidMinionPoolState(
+                "Minion pool '%s' is unable to accommodate the requested "
+                "number of machines (%s) for transfer action '%s', as only "
+                "%d of its available machines could be reserved, with room "
+                "to upscale a further %d until the maximum is reached. Some "
+                "machines were allocated to other actions in the meantime, "
+                "please retry once they become available again." % (
+                    minion_pool.id, num_instances, action_id,
+                    len(claimed_machines), extra_available_machine_slots))
+        claimed_machines = iter(claimed_machines)
 
         allocation_subflow = unordered_flow.Flow(subflow_name)
         instance_minion_allocations = {}
@@ -626,14 +716,7 @@ class MinionManagerServerEndpoint(object):
         existing_machines_to_allocate = {}
         for instance in action_instances:
 
-            if instance in instance_minion_allocations:
-                raise exception.InvalidInput(
-                    "Instance with identifier '%s' passed twice for "
-                    "minion machine allocation from pool '%s' for action "
-                    "'%s'. Full instances list was: %s" %
-                    (instance, minion_pool.id, action_id, action_instances))
-            minion_machine = _select_machine(
-                minion_pool, exclude=instance_minion_allocations.values())
+            minion_machine = next(claimed_machines, None)
             if minion_machine:
                 # take note of the machine and setup a healthcheck:
                 instance_minion_allocations[instance] = minion_machine.id
@@ -649,7 +732,9 @@ class MinionManagerServerEndpoint(object):
                         power_on_machine=True,
                         inject_for_tasks=inject_for_tasks,
                         machine_status_on_success=(
-                            constants.MINION_MACHINE_STATUS_IN_USE)))
+                            constants.MINION_MACHINE_STATUS_IN_USE),
+                        healthcheck_cache_ttl=(
+                            CONF.minion_manager.minion_healthcheck_cache_ttl)))
             else:
                 # add task which creates the new machine:
                 new_machine_id = str(uuid.uuid4())
@@ -679,16 +764,6 @@ class MinionManagerServerEndpoint(object):
         new_machine_db_entries_added = []
         try:
             if existing_machines_to_allocate:
-                # mark any existing machines as allocated:
-                LOG.debug(
-                    "Marking the following pre-existing minion machines "
-                    "from pool '%s' of action '%s' for each instance as "
-                    "allocated with the DB: %s",
-                    minion_pool.id, action_id, existing_machines_to_allocate)
-                db_api.set_minion_machines_allocation_statuses(
-                    ctxt, list(existing_machines_to_allocate.keys()),
-                    action_id, constants.MINION_MACHINE_STATUS_RESERVED,
-                    refresh_allocation_time=True)
                 self._add_minion_pool_event(
                     ctxt, minion_pool.id, constants.TASK_EVENT_INFO,
                     "The following pre-existing minion machines will be "
@@ -753,6 +828,11 @@ class MinionManagerServerEndpoint(object):
             "The following minion machine allocation from pool '%s' were or "
             "will be made for action '%s': %s",
             minion_pool.id, action_id, instance_minion_allocations)
+        allocation_subflow = self._add_batch_healthcheck_to_flow(
+            minion_pool, allocation_subflow, [
+                machine for machine in minion_pool.minion_machines
+                if machine.id in existing_machines_to_allocate],
+            action_id, inject_for_tasks=inject_for_tasks)
         return {
             "flow": allocation_subflow,
             "action_instance_minion_allocation_mappings": (
@@ -844,7 +924,7 @@ class MinionManagerServerEndpoint(object):
         if include_transfer_minions and action['origin_minion_pool_id']:
             pools_used.append(action['origin_minion_pool_id'])
             with minion_manager_utils.get_minion_pool_lock(
-                    action['origin_minion_pool_id'], external=True):
+                    action['origin_minion_pool_id']):
                 # fetch pool, origin endpoint, and initial store:
                 minion_pool = self._get_minion_pool(
                     ctxt, action['origin_minion_pool_id'],
@@ -881,7 +961,7 @@ class MinionManagerServerEndpoint(object):
         if include_transfer_minions and action['destination_minion_pool_id']:
             pools_used.append(action['destination_minion_pool_id'])
             with minion_manager_utils.get_minion_pool_lock(
-                    action['destination_minion_pool_id'], external=True):
+                    action['destination_minion_pool_id']):
                 # fetch pool, destination endpoint, and initial store:
                 minion_pool = self._get_minion_pool(
                     ctxt, action['destination_minion_pool_id'],
@@ -951,7 +1031,7 @@ class MinionManagerServerEndpoint(object):
                     continue
 
                 with minion_manager_utils.get_minion_pool_lock(
-                        osmorphing_pool_id, external=True):
+                        osmorphing_pool_id):
                     pools_used.append(osmorphing_pool_id)
                     # fetch pool, destination endpoint, and initial store:
                     minion_pool = self._get_minion_pool(
@@ -1069,7 +1149,7 @@ class MinionManagerServerEndpoint(object):
 
         for (pool_id, machines) in pool_machine_mappings.items():
             with (minion_manager_utils.
-                  get_minion_pool_lock(pool_id, external=True)):
+                  get_minion_pool_lock(pool_id)):
                 for machine in machines:
                     LOG.debug(
                         "Deleting machine with ID '%s' "
@@ -1091,7 +1171,7 @@ class MinionManagerServerEndpoint(object):
 
         machine_allocated_status = constants.MINION_MACHINE_STATUS_IN_USE
         with minion_manager_utils.get_minion_pool_lock(
-                minion_machine.pool_id, external=True):
+                minion_machine.pool_id):
             if (minion_machine.allocation_status != machine_allocated_status
                     or not minion_machine.allocated_action):
                 LOG.warn(
@@ -1135,7 +1215,7 @@ class MinionManagerServerEndpoint(object):
         # iterate over each pool and its machines allocated to this action:
         for (pool_id, pool_machines) in pool_machine_mappings.items():
             with minion_manager_utils.get_minion_pool_lock(
-                    pool_id, external=True):
+                    pool_id):
                 machine_ids_to_deallocate = []
                 # NOTE: this is a workaround in case some crash/restart happens
                 # in the minion-manager service while new machine DB entries
@@ -1179,7 +1259,8 @@ class MinionManagerServerEndpoint(object):
     def _get_healtchcheck_flow_for_minion_machine(
             self, minion_pool, minion_machine, allocate_to_action=None,
             machine_status_on_success=constants.MINION_MACHINE_STATUS_AVAILABLE,  # noqa: E501
-            power_on_machine=True, inject_for_tasks=None):
+            power_on_machine=True, inject_for_tasks=None,
+            healthcheck_cache_ttl=0):
         """ Returns a taskflow graph flow with a healtcheck task
         and redeployment subflow on error. """
         # define healthcheck subflow for each machine:
@@ -1193,6 +1274,7 @@ class MinionManagerServerEndpoint(object):
             minion_mgr_tasks.HealthcheckMinionMachineTask(
                 minion_pool.id, minion_machine.id, minion_pool.platform,
                 machine_status_on_success=machine_status_on_success,
+                healthcheck_cache_ttl=healthcheck_cache_ttl,
                 inject=inject_for_tasks,
                 # we prevent a raise here as the healthcheck subflow
                 # will take care of redeploying the instance later:
@@ -1263,6 +1345,85 @@ class MinionManagerServerEndpoint(object):
 
         return machine_healthcheck_subflow
 
+    def _add_batch_healthcheck_to_flow(
+            self, minion_pool, flow, minion_machines, healthcheck_label,
+            inject_for_tasks=None):
+        """ Returns a linear flow which first healthchecks all the given
+        powered on minion machines whose last healthcheck is not cached
+        anymore through a single request to a Worker service before running
+        the given flow, or the given flow itself if there are none.
+        """
+        cache_ttl = CONF.minion_manager.minion_healthcheck_cache_ttl
+        if not cache_ttl:
+            return flow
+        machine_ids = [
+            machine.id for machine in minion_machines
+            if machine.power_status == (
+                constants.MINION_MACHINE_POWER_STATUS_POWERED_ON) and not (
+                    minion_mgr_tasks.is_minion_machine_healthcheck_cached(
+                        machine, cache_ttl))]
+        if not machine_ids:
+            return flow
+
+        LOG.debug(
+            "Minion machines %s of pool '%s' will be healthchecked together "
+            "ahead of flow '%s'.", machine_ids, minion_pool.id, flow.name)
+        batch_healthcheck_flow = linear_flow.Flow(
+            "%s-batch-healthcheck" % flow.name)
+        batch_healthcheck_flow.add(
+            minion_mgr_tasks.HealthcheckMinionMachinesTask(
+                minion_pool.id, machine_ids, minion_pool.platform,
+                healthcheck_label,
+                CONF.minion_manager.minion_healthcheck_batch_size,
+                inject=inject_for_tasks))
+        batch_healthcheck_flow.add(flow)
+        return batch_healthcheck_flow
+
+    def _get_minion_pool_prewarm_count(self, ctxt, minion_pool):
+        """ Returns the number of minion machines of the pool which should
+        be available ahead of the expected demand for them, being the
+        instances of the Replicas using the pool which are scheduled to be
+        executed soon or the number of machines recently allocated from the
+        pool which are no longer in use, whichever is greater.
+        """
+        now = timeutils.utcnow()
+        scheduled_demand = 0
+        window = CONF.minion_manager.minion_pool_prewarm_window_minutes
+        if window:
+            window_end = now + datetime.timedelta(minutes=window)
+            for schedule, expiration_date, instances in (
+                    db_api.get_minion_pool_replica_schedules(
+                        ctxt, minion_pool.id)):
+                next_run = cron.get_next_run_time(schedule, now, window_end)
+                if next_run and (
+                        not expiration_date or next_run < expiration_date):
+                    scheduled_demand += len(instances)
+
+        recent_demand = 0
+        history = CONF.minion_manager.minion_pool_prewarm_history_minutes
+        if history:
+            history_start = now - datetime.timedelta(minutes=history)
+            in_use_statuses = [
+                constants.MINION_MACHINE_STATUS_RESERVED,
+                constants.MINION_MACHINE_STATUS_IN_USE]
+            recently_allocated = [
+                machine for machine in minion_pool.minion_machines
+                if machine.last_used_at and (
+                    machine.last_used_at >= history_start)]
+            recent_demand = len([
+                machine for machine in recently_allocated
+                if machine.allocation_status not in in_use_statuses])
+
+        prewarm_count = min(
+            max(scheduled_demand, recent_demand), minion_pool.maximum_minions)
+        if prewarm_count:
+            LOG.debug(
+                "Determined minion pool '%s' pre-warm count to be %d based "
+                "on %d scheduled and %d recently allocated machines.",
+                minion_pool.id, prewarm_count, scheduled_demand,
+                recent_demand)
+        return prewarm_count
+
     def _get_minion_pool_refresh_flow(
             self, ctxt, minion_pool, requery=True):
 
@@ -1271,6 +1432,15 @@ class MinionManagerServerEndpoint(object):
                 ctxt, minion_pool.id, include_machines=True,
                 include_progress_updates=False, include_events=False)
 
+        # determine how many machines should be kept available ahead
+        # of the expected demand for them:
+        prewarm_count = self._get_minion_pool_prewarm_count(
+            ctxt, minion_pool)
+        available_machine_ids = [
+            machine.id for machine in minion_pool.minion_machines
+            if machine.allocation_status == (
+                constants.MINION_MACHINE_STATUS_AVAILABLE)]
+
         # determine how many machines could be feasibily downscaled:
         machine_statuses = {
             machine.id: machine.allocation_status
@@ -1286,11 +1456,17 @@ class MinionManagerServerEndpoint(object):
                 mid for mid in machine_statuses
                 if machine_statuses[mid] not in ignorable_machine_statuses]) - (  # noqa: E501
                     minion_pool.minimum_minions))
+        # NOTE: no machines are deallocated when fewer than the pre-warm
+        # count are available:
+        max_minions_to_deallocate = max(0, min(
+            max_minions_to_deallocate,
+            len(available_machine_ids) - prewarm_count))
         LOG.debug(
             "Determined minion pool '%s' machine deallocation number to be %d "
-            "(pool minimum is '%d') based on current machines stauses: %s",
+            "(pool minimum is '%d', pre-warm count is '%d') based on current "
+            "machines stauses: %s",
             minion_pool.id, max_minions_to_deallocate,
-            minion_pool.minimum_minions, machine_statuses)
+            minion_pool.minimum_minions, prewarm_count, machine_statuses)
 
         # define refresh flow and process all relevant machines:
         pool_refresh_flow = unordered_flow.Flow(
@@ -1299,6 +1475,8 @@ class MinionManagerServerEndpoint(object):
         now = timeutils.utcnow()
         machines_to_deallocate = []
         machines_to_healthcheck = []
+        cacheable_healthcheck_machines = []
+        powered_off_machines = []
         skipped_machines = {}
         healthcheckable_machine_statuses = [
             constants.MINION_MACHINE_STATUS_AVAILABLE,
@@ -1367,15 +1545,64 @@ class MinionManagerServerEndpoint(object):
             # else, perform a healthcheck on the machine if it is powered on:
             elif machine.power_status == (
                     constants.MINION_MACHINE_POWER_STATUS_POWERED_ON):
+                # NOTE: only machines which are not marked as error'd
+                # may reuse the results of their previous healthchecks:
+                healthcheck_cache_ttl = 0
+                if machine.id in available_machine_ids:
+                    healthcheck_cache_ttl = (
+                        CONF.minion_manager.minion_healthcheck_cache_ttl)
+                    cacheable_healthcheck_machines.append(machine)
                 pool_refresh_flow.add(
                     self._get_healtchcheck_flow_for_minion_machine(
                         minion_pool, machine, allocate_to_action=None,
                         machine_status_on_success=(
-                            constants.MINION_MACHINE_STATUS_AVAILABLE)))
+                            constants.MINION_MACHINE_STATUS_AVAILABLE),
+                        healthcheck_cache_ttl=healthcheck_cache_ttl))
                 machines_to_healthcheck.append(machine.id)
+            elif machine.power_status == (
+                    constants.MINION_MACHINE_POWER_STATUS_POWERED_OFF) and (
+                        machine.id in available_machine_ids):
+                powered_off_machines.append(machine)
+            else:
+                skipped_machines[machine.id] = (
+                    machine.allocation_status, machine.power_status)
+
+        # power on or create machines so the pre-warm count is reached:
+        prewarm_shortfall = prewarm_count - len([
+            mid for mid in machines_to_healthcheck
+            if mid in available_machine_ids])
+        machines_to_power_on = []
+        for machine in powered_off_machines:
+            if len(machines_to_power_on) < prewarm_shortfall:
+                pool_refresh_flow.add(
+                    minion_mgr_tasks.PowerOnMinionMachineTask(
+                        minion_pool.id, machine.id, minion_pool.platform,
+                        fail_on_error=False,
+                        status_once_powered_on=(
+                            constants.MINION_MACHINE_STATUS_AVAILABLE)))
+                machines_to_power_on.append(machine.id)
             else:
                 skipped_machines[machine.id] = (
                     machine.allocation_status, machine.power_status)
+        prewarm_shortfall = prewarm_shortfall - len(machines_to_power_on)
+
+        machine_db_entries_to_add = []
+        extra_available_machine_slots = (
+            minion_pool.maximum_minions - len(minion_pool.minion_machines))
+        for _ in range(
+                min(prewarm_shortfall, extra_available_machine_slots)):
+            new_minion_machine = models.MinionMachine()
+            new_minion_machine.id = str(uuid.uuid4())
+            new_minion_machine.pool_id = minion_pool.id
+            new_minion_machine.allocation_status = (
+                constants.MINION_MACHINE_STATUS_UNINITIALIZED)
+            new_minion_machine.power_status = (
+                constants.MINION_MACHINE_POWER_STATUS_UNINITIALIZED)
+            machine_db_entries_to_add.append(new_minion_machine)
+            pool_refresh_flow.add(
+                minion_mgr_tasks.AllocateMinionMachineTask(
+                    minion_pool.id, new_minion_machine.id,
+                    minion_pool.platform, raise_on_cleanup_failure=False))
 
         # update DB entried for all machines and emit relevant events:
         if skipped_machines:
@@ -1428,7 +1655,29 @@ class MinionManagerServerEndpoint(object):
                 "No minion machines require healthchecking during "
                 "pool refresh")
 
-        return pool_refresh_flow
+        if machines_to_power_on:
+            self._add_minion_pool_event(
+                ctxt, minion_pool.id, constants.TASK_EVENT_INFO,
+                "The following minion machines will be powered on ahead of "
+                "the expected demand for them as part of the refreshing of "
+                "the minion pool: %s" % machines_to_power_on)
+            for machine in machines_to_power_on:
+                db_api.set_minion_machine_allocation_status(
+                    ctxt, machine, constants.MINION_MACHINE_STATUS_POWERING_ON)
+
+        if machine_db_entries_to_add:
+            self._add_minion_pool_event(
+                ctxt, minion_pool.id, constants.TASK_EVENT_INFO,
+                "The following new minion machines will be created ahead of "
+                "the expected demand for them as part of the refreshing of "
+                "the minion pool: %s" % [
+                    m.id for m in machine_db_entries_to_add])
+            for new_machine in machine_db_entries_to_add:
+                db_api.add_minion_machine(ctxt, new_machine)
+
+        return self._add_batch_healthcheck_to_flow(
+            minion_pool, pool_refresh_flow, cacheable_healthcheck_machines,
+            "refresh")
 
     @minion_manager_utils.minion_pool_synchronized_op
     def refresh_minion_pool(self, ctxt, minion_pool_id):
@@ -1745,6 +1994,24 @@ class MinionManagerServerEndpoint(object):
 
         return deallocation_flow
 
+    def cancel_minion_pool_background_flows(
+            self, ctxt, minion_pool_id, exclude_flow_ids=None):
+        """ Cancels the background flows of the minion pool which were
+        started from this process of the minion manager, except for the
+        ones with the given IDs. Requested from all the processes at once
+        through a fanout cast, as each has background flows of its own.
+        """
+        exclude_flow_ids = exclude_flow_ids or []
+        runner = self._taskflow_runner
+        for flow in runner.get_background_flows(
+                name_prefix="pool-%s-" % minion_pool_id):
+            if flow["id"] in exclude_flow_ids:
+                continue
+            LOG.info(
+                "Cancelling background flow '%s' (status '%s') of minion "
+                "pool '%s'.", flow["name"], flow["status"], minion_pool_id)
+            runner.cancel_background_flow(flow["id"])
+
     def _get_pool_deallocation_initial_store(
             self, ctxt, minion_pool, endpoint_dict):
         base = self._get_pool_initial_taskflow_store_base(
@@ -1795,8 +2062,16 @@ class MinionManagerServerEndpoint(object):
             db_api.set_minion_pool_status(
                 ctxt, minion_pool_id,
                 constants.MINION_POOL_STATUS_POOL_MAINTENANCE)
-            self._taskflow_runner.run_flow_in_background(
-                deallocation_flow, store=initial_store)
+            deallocation_flow_id = (
+                self._taskflow_runner.run_flow_in_background(
+                    deallocation_flow, store=initial_store))
+            if force:
+                # NOTE: the flows of the pool may have been started from any
+                # of the processes of the minion manager:
+                (self._rpc_minion_manager_client
+                    .cancel_minion_pool_background_flows(
+                        ctxt, minion_pool.id,
+                        exclude_flow_ids=[deallocation_flow_id]))
             self._unregister_refresh_jobs_for_minion_pool(
                 minion_pool, raise_on_error=False)
             self._add_minion_pool_event(
@@ -4,6 +4,7 @@
 
 import abc
 import copy
+import datetime
 
 from oslo_log import log as logging
 from oslo_utils import timeutils
@@ -38,6 +39,8 @@ MINION_POOL_VALIDATION_TASK_NAME_FORMAT = "pool-%s-validation"
 MINION_POOL_UPDATE_STATUS_TASK_NAME_FORMAT = "pool-%s-update-status-%s"
 MINION_POOL_HEALTHCHECK_MACHINE_TASK_NAME_FORMAT = (
     "pool-%s-machine-%s-healthcheck")
+MINION_POOL_HEALTHCHECK_MACHINES_TASK_NAME_FORMAT = (
+    "pool-%s-machines-healthcheck-%s")
 MINION_POOL_ALLOCATE_SHARED_RESOURCES_TASK_NAME_FORMAT = (
     "pool-%s-allocate-shared-resources")
 MINION_POOL_DEALLOCATE_SHARED_RESOURCES_TASK_NAME_FORMAT = (
@@ -72,6 +75,19 @@ MINION_POOL_POWER_OFF_MACHINE_TASK_NAME_FORMAT = (
     "pool-%s-machine-%s-power-off")
 
 
+def is_minion_machine_healthcheck_cached(minion_machine, cache_ttl):
+    """ Returns whether the minion machine was successfully healthchecked
+    while powered on within the last 'cache_ttl' seconds.
+    """
+    if not cache_ttl or not minion_machine.last_healthcheck_at:
+        return False
+    if minion_machine.power_status != (
+            constants.MINION_MACHINE_POWER_STATUS_POWERED_ON):
+        return False
+    return timeutils.utcnow() < minion_machine.last_healthcheck_at + (
+        datetime.timedelta(seconds=cache_ttl))
+
+
 class MinionManagerTaskEventMixin(object):
 
     # NOTE(aznashwan): it is unsafe to fork processes with pre-instantiated
@@ -111,20 +127,20 @@ class MinionManagerTaskEventMixin(object):
 
     def _set_minion_pool_status(self, ctxt, minion_pool_id, new_status):
         with minion_manager_utils.get_minion_pool_lock(
-                minion_pool_id, external=True):
+                minion_pool_id):
             db_api.set_minion_pool_status(ctxt, minion_pool_id, new_status)
 
     def _update_minion_machine(
             self, ctxt, minion_pool_id, minion_machine_id, updated_values):
         with minion_manager_utils.get_minion_pool_lock(
-                minion_pool_id, external=True):
+                minion_pool_id):
             db_api.update_minion_machine(
                 ctxt, minion_machine_id, updated_values)
 
     def _set_minion_machine_allocation_status(
             self, ctxt, minion_pool_id, minion_machine_id, new_status):
         with minion_manager_utils.get_minion_pool_lock(
-                minion_pool_id, external=True):
+                minion_pool_id):
             db_api.set_minion_machine_allocation_status(
                 ctxt, minion_machine_id, new_status)
 
@@ -639,7 +655,7 @@ class AllocateSharedPoolResourcesTask(BaseMinionManangerTask):
 
     def execute(self, context, origin, destination, task_info):
         with minion_manager_utils.get_minion_pool_lock(
-                self._minion_pool_id, external=True):
+                self._minion_pool_id):
             minion_pool = db_api.get_minion_pool(
                 context, self._minion_pool_id)
             if not minion_pool:
@@ -666,7 +682,7 @@ class AllocateSharedPoolResourcesTask(BaseMinionManangerTask):
         self._add_minion_pool_event(
             context, "Successfully deployed shared pool resources")
         with minion_manager_utils.get_minion_pool_lock(
-                self._minion_pool_id, external=True):
+                self._minion_pool_id):
             db_api.update_minion_pool(
                 context, self._minion_pool_id, updated_values)
 
@@ -686,7 +702,7 @@ class AllocateSharedPoolResourcesTask(BaseMinionManangerTask):
             context, origin, destination, task_info, **kwargs)
 
         with minion_manager_utils.get_minion_pool_lock(
-                self._minion_pool_id, external=True):
+                self._minion_pool_id):
             updated_values = {
                 "pool_shared_resources": None}
             db_api.update_minion_pool(
@@ -917,7 +933,7 @@ class AllocateMinionMachineTask(BaseMinionManangerTask):
 
         # lastly, if the machine entry exists in the DB:
         with minion_manager_utils.get_minion_pool_lock(
-            self._minion_pool_id, external=True):
+            self._minion_pool_id):
             machine_db_entry = (
                 db_api.get_minion_machine(context, self._minion_machine_id))
             if machine_db_entry:
@@ -1052,7 +1068,7 @@ class DeallocateMinionMachineTask(BaseMinionManangerTask):
             "[Task '%s'] Deleting minion machine with ID '%s' from the DB",
             self._task_name, self._minion_machine_id)
         with minion_manager_utils.get_minion_pool_lock(
-                self._minion_pool_id, external=True):
+                self._minion_pool_id):
             db_api.delete_minion_machine(context, self._minion_machine_id)
 
         self._add_minion_pool_event(
@@ -1070,9 +1086,10 @@ class HealthcheckMinionMachineTask(BaseMinionManangerTask):
             self, minion_pool_id, minion_machine_id, minion_pool_type,
             fail_on_error=False,
             machine_status_on_success=constants.MINION_MACHINE_STATUS_AVAILABLE,  # noqa: E501
-            **kwargs):
+            healthcheck_cache_ttl=0, **kwargs):
         self._fail_on_error = fail_on_error
         self._machine_status_on_success = machine_status_on_success
+        self._healthcheck_cache_ttl = healthcheck_cache_ttl
         resource_healthcheck_task = (
             constants.TASK_TYPE_HEALTHCHECK_SOURCE_MINION)
         if minion_pool_type != constants.PROVIDER_PLATFORM_SOURCE:
@@ -1125,6 +1142,18 @@ class HealthcheckMinionMachineTask(BaseMinionManangerTask):
                 raise exception.InvalidMinionMachineState(base_msg)
             return {"healthy": False, "error": base_msg}
 
+        if is_minion_machine_healthcheck_cached(
+                machine, self._healthcheck_cache_ttl):
+            self._add_minion_pool_event(
+                context,
+                "Reusing the result of the healthcheck of minion machine with "
+                "internal pool ID '%s' performed at %s" % (
+                    self._minion_machine_id, machine.last_healthcheck_at))
+            self._set_minion_machine_allocation_status(
+                context, self._minion_pool_id, self._minion_machine_id,
+                self._machine_status_on_success)
+            return res
+
         self._add_minion_pool_event(
             context,
             "Healthchecking  minion machine with internal pool ID '%s'" % (
@@ -1140,9 +1169,10 @@ class HealthcheckMinionMachineTask(BaseMinionManangerTask):
                 context,
                 "Successfully healtchecked minion machine with internal "
                 "pool ID '%s'" % self._minion_machine_id)
-            self._set_minion_machine_allocation_status(
-                context, self._minion_pool_id, self._minion_machine_id,
-                self._machine_status_on_success)
+            self._update_minion_machine(
+                context, self._minion_pool_id, self._minion_machine_id, {
+                    "allocation_status": self._machine_status_on_success,
+                    "last_healthcheck_at": timeutils.utcnow()})
         except Exception as ex:
             self._add_minion_pool_event(
                 context,
@@ -1154,9 +1184,10 @@ class HealthcheckMinionMachineTask(BaseMinionManangerTask):
                 "Full trace was:\n%s", self._task_name,
                 self._minion_machine_id, self._minion_pool_id,
                 utils.get_exception_details())
-            self._set_minion_machine_allocation_status(
-                context, self._minion_pool_id, self._minion_machine_id,
-                constants.MINION_MACHINE_STATUS_ERROR)
+            self._update_minion_machine(
+                context, self._minion_pool_id, self._minion_machine_id, {
+                    "allocation_status": constants.MINION_MACHINE_STATUS_ERROR,
+                    "last_healthcheck_at": None})
             if not self._fail_on_error:
                 res = {
                     "healthy": False,
@@ -1176,6 +1207,110 @@ class HealthcheckMinionMachineTask(BaseMinionManangerTask):
             minion_pool_id, minion_machine_id)
 
 
+class HealthcheckMinionMachinesTask(BaseMinionManangerTask):
+    """ Task which healthchecks the given minion machines of a pool together
+    through requests to a Worker service for at most 'batch_size' machines
+    each, recording the time of the healthcheck of the healthy ones.
+
+    The healthchecks of the individual machines which follow it can then
+    reuse the results for the healthy machines. It never fails, leaving the
+    unhealthy machines to the healthchecks of the individual machines.
+    """
+
+    def __init__(
+            self, minion_pool_id, minion_machine_ids, minion_pool_type,
+            healthcheck_label, batch_size, **kwargs):
+        self._minion_machine_ids = minion_machine_ids
+        self._minion_pool_type = minion_pool_type
+        self._healthcheck_label = healthcheck_label
+        self._batch_size = batch_size
+        resource_healthcheck_task = (
+            constants.TASK_TYPE_HEALTHCHECK_SOURCE_MINION)
+        if minion_pool_type != constants.PROVIDER_PLATFORM_SOURCE:
+            resource_healthcheck_task = (
+                constants.TASK_TYPE_HEALTHCHECK_DESTINATION_MINION)
+        super(HealthcheckMinionMachinesTask, self).__init__(
+            minion_pool_id, None, resource_healthcheck_task, **kwargs)
+
+    def _get_task_name(self, minion_pool_id, minion_machine_id):
+        return MINION_POOL_HEALTHCHECK_MACHINES_TASK_NAME_FORMAT % (
+            minion_pool_id, self._healthcheck_label)
+
+    def execute(self, context, origin, destination, task_info):
+        minion_machines = {}
+        for machine_id in self._minion_machine_ids:
+            machine = self._get_minion_machine(
+                context, machine_id, raise_if_not_found=False)
+            if not machine or machine.power_status != (
+                    constants.MINION_MACHINE_POWER_STATUS_POWERED_ON):
+                continue
+            minion_machines[machine_id] = {
+                "minion_provider_properties": machine.provider_properties,
+                "minion_connection_info": machine.connection_info}
+        if not minion_machines:
+            LOG.debug(
+                "[Task '%s'] No powered on minion machines to healthcheck.",
+                self._task_name)
+            return task_info
+
+        platform_to_target = destination
+        if self._minion_pool_type == constants.PROVIDER_PLATFORM_SOURCE:
+            platform_to_target = origin
+        try:
+            worker_rpc = self._get_worker_service_rpc_for_task(
+                context, self._task_id, self._main_task_runner_type,
+                origin, destination)
+        except Exception:
+            LOG.warn(
+                "[Task '%s'] Failed to get a Worker service to healthcheck "
+                "minion machines %s together. They will be healthchecked "
+                "separately. Error was: %s", self._task_name,
+                list(minion_machines), utils.get_exception_details())
+            return task_info
+
+        # NOTE: the machines are healthchecked in batches so that each
+        # request completes within the RPC timeout of the Worker service:
+        results = {}
+        machine_ids = list(minion_machines)
+        for i in range(0, len(machine_ids), self._batch_size):
+            batch = {
+                machine_id: minion_machines[machine_id]
+                for machine_id in machine_ids[i:i + self._batch_size]}
+            try:
+                results.update(worker_rpc.healthcheck_minion_machines(
+                    context, platform_to_target["type"],
+                    self._minion_pool_type,
+                    platform_to_target.get("connection_info") or {}, batch))
+            except Exception:
+                LOG.warn(
+                    "[Task '%s'] Failed to healthcheck minion machines %s "
+                    "together. They will be healthchecked separately. Error "
+                    "was: %s", self._task_name, list(batch),
+                    utils.get_exception_details())
+        if not results:
+            return task_info
+
+        now = timeutils.utcnow()
+        healthy_machine_ids = []
+        for machine_id, error in results.items():
+            if error:
+                LOG.debug(
+                    "[Task '%s'] Healthcheck of minion machine '%s' failed: "
+                    "%s", self._task_name, machine_id, error)
+                continue
+            self._update_minion_machine(
+                context, self._minion_pool_id, machine_id,
+                {"last_healthcheck_at": now})
+            healthy_machine_ids.append(machine_id)
+        self._add_minion_pool_event(
+            context,
+            "Healthchecked minion machines %s together, of which the "
+            "following were healthy: %s" % (
+                list(results), healthy_machine_ids))
+
+        return task_info
+
+
 class MinionMachineHealtchcheckDecider(object):
     """ A callable to green/redlight further execution based on the result. """
 
@@ -1219,8 +1354,9 @@ class PowerOnMinionMachineTask(BaseMinionManangerTask):
 
     def __init__(
             self, minion_pool_id, minion_machine_id, minion_pool_type,
-            fail_on_error=True, **kwargs):
+            fail_on_error=True, status_once_powered_on=None, **kwargs):
         self._fail_on_error = fail_on_error
+        self._status_once_powered_on = status_once_powered_on
         power_on_task_type = (
             constants.TASK_TYPE_POWER_ON_SOURCE_MINION)
         if minion_pool_type != constants.PROVIDER_PLATFORM_SOURCE:
@@ -1245,21 +1381,30 @@ class PowerOnMinionMachineTask(BaseMinionManangerTask):
                 "already marked as powered on. Returning early." % (
                     self._task_name, self._minion_machine_id,
                     self._minion_pool_id))
+            # NOTE: the machine would otherwise be left in the status it was
+            # given while waiting to be powered on:
+            if self._status_once_powered_on:
+                self._set_minion_machine_allocation_status(
+                    context, self._minion_pool_id, self._minion_machine_id,
+                    self._status_once_powered_on)
             return task_info
 
-        if (machine.power_status !=
-                constants.MINION_MACHINE_POWER_STATUS_POWERED_OFF):
-            raise exception.InvalidMinionMachineState(
-                "Minion machine with ID '%s' from pool '%s' is in '%s' state "
-                "instead of the expected '%s' required for it to be powered "
-                "on." % (
-                    self._minion_machine_id, self._minion_pool_id,
-                    machine.power_status,
-                    constants.MINION_MACHINE_POWER_STATUS_POWERED_OFF))
-
         execution_info = {
             "minion_provider_properties": machine.provider_properties}
         try:
+            # NOTE: the check is within the error handling so that the
+            # machine is not left in the status it was given while waiting
+            # to be powered on when not failing on errors:
+            if (machine.power_status !=
+                    constants.MINION_MACHINE_POWER_STATUS_POWERED_OFF):
+                raise exception.InvalidMinionMachineState(
+                    "Minion machine with ID '%s' from pool '%s' is in '%s' "
+                    "state instead of the expected '%s' required for it to "
+                    "be powered on." % (
+                        self._minion_machine_id, self._minion_pool_id,
+                        machine.power_status,
+                        constants.MINION_MACHINE_POWER_STATUS_POWERED_OFF))
+
             self._set_minion_machine_power_status(
                 context, self._minion_pool_id,
                 self._minion_machine_id,
@@ -1270,6 +1415,10 @@ class PowerOnMinionMachineTask(BaseMinionManangerTask):
                 context, self._minion_pool_id,
                 self._minion_machine_id,
                 constants.MINION_MACHINE_POWER_STATUS_POWERED_ON)
+            if self._status_once_powered_on:
+                self._set_minion_machine_allocation_status(
+                    context, self._minion_pool_id, self._minion_machine_id,
+                    self._status_once_powered_on)
             self._add_minion_pool_event(
                 context,
                 "Successfully powered on minion machine with internal pool "
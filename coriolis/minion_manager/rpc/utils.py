@@ -3,26 +3,22 @@
 
 import functools
 
-from oslo_concurrency import lockutils
-
 from coriolis import constants
+from coriolis import locks
 
 
-def get_minion_pool_lock(minion_pool_id, external=True):
-    return lockutils.lock(
-        constants.MINION_POOL_LOCK_NAME_FORMAT % minion_pool_id,
-        external=external)
+def get_minion_pool_lock(minion_pool_id):
+    # NOTE: all locks are shared between processes by the lock manager:
+    return locks.lock(
+        constants.MINION_POOL_LOCK_NAME_FORMAT % minion_pool_id)
 
 
 def minion_pool_synchronized(minion_pool_id, func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        @lockutils.synchronized(
-            constants.MINION_POOL_LOCK_NAME_FORMAT % minion_pool_id,
-            external=True)
-        def inner():
+        with locks.lock(
+                constants.MINION_POOL_LOCK_NAME_FORMAT % minion_pool_id):
             return func(*args, **kwargs)
-        return inner()
     return wrapper
 
 
@@ -37,11 +33,8 @@ def minion_pool_synchronized_op(func):
 def minion_machine_synchronized(minion_pool_id, minion_machine_id, func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        @lockutils.synchronized(
-            constants.MINION_MACHINE_LOCK_NAME_FORMAT % (
-                minion_pool_id, minion_machine_id),
-            external=True)
-        def inner():
+        with locks.lock(
+                constants.MINION_MACHINE_LOCK_NAME_FORMAT % (
+                    minion_pool_id, minion_machine_id)):
             return func(*args, **kwargs)
-        return inner()
     return wrapper
@@ -4,8 +4,11 @@
 import abc
 import contextlib
 import copy
+import ctypes
+import ctypes.util
 import datetime
 import errno
+import hashlib
 import os
 import shutil
 import tempfile
@@ -16,6 +19,7 @@ import uuid
 import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import units
 import paramiko
 import requests
 from six import with_metaclass
@@ -31,6 +35,22 @@ opts = [
     cfg.BoolOpt('compress_transfers',
                 default=True,
                 help='Use compression if possible during disk transfers'),
+    cfg.ListOpt('http_writer_compression_formats',
+                default=[constants.COMPRESSION_FORMAT_GZIP],
+                help='Compression formats accepted as content encodings by '
+                     'the coriolis-writer service. The first one is used '
+                     'unless adaptive compression is enabled, in which case '
+                     'all of them are considered. The SSH backup writer '
+                     'only supports zlib.'),
+    cfg.BoolOpt('detect_zero_blocks',
+                default=True,
+                help='Detect blocks only holding zeros in the data written '
+                     'by the backup writers, and have them zeroed out on the '
+                     'target (by punching holes where supported) instead of '
+                     'sending them.'),
+    cfg.IntOpt('zero_block_size_kb',
+               default=1024, min=4,
+               help='Size in KB of the blocks checked for zeros.'),
 ]
 CONF.register_opts(opts)
 _CORIOLIS_HTTP_WRITER_CMD = "coriolis-writer"
@@ -66,6 +86,62 @@ _WRITER_ERR_MAP = {
     15: "ERR_OUT_OF_BOUDS",
 }
 
+_FALLOC_FL_KEEP_SIZE = 0x01
+_FALLOC_FL_PUNCH_HOLE = 0x02
+_libc = None
+
+
+def _punch_hole(fd, offset, length):
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        _libc.fallocate.argtypes = [
+            ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+    if _libc.fallocate(
+            fd, _FALLOC_FL_PUNCH_HOLE | _FALLOC_FL_KEEP_SIZE, offset, length):
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def _copy_range(fd, offset, src_offset, length):
+    copied = 0
+    use_copy_file_range = hasattr(os, "copy_file_range")
+    while copied < length:
+        count = 0
+        if use_copy_file_range:
+            try:
+                # NOTE: this avoids copying through userspace, and may even
+                # share the blocks if the file system supports reflinks:
+                count = os.copy_file_range(
+                    fd, fd, length - copied, src_offset + copied,
+                    offset + copied)
+            except OSError as ex:
+                # NOTE: block devices do not support it:
+                if ex.errno not in (
+                        errno.EINVAL, errno.EXDEV, errno.ENOSYS,
+                        errno.EOPNOTSUPP):
+                    raise
+                use_copy_file_range = False
+        if not use_copy_file_range:
+            buf = os.pread(
+                fd, min(length - copied, units.Mi), src_offset + copied)
+            count = os.pwrite(fd, buf, offset + copied)
+        if not count:
+            raise exception.CoriolisException(
+                "Failed to copy %d bytes from offset %d to %d" % (
+                    length, src_offset, offset))
+        copied += count
+
+
+def _get_zero_runs(data):
+    """ Returns the (start, length, is_zero) runs of the given data, which is
+    considered a single non-zero run if zero block detection is disabled.
+    """
+    if not CONF.detect_zero_blocks:
+        return [(0, len(data), False)]
+    return data_transfer.get_zero_runs(
+        data, CONF.zero_block_size_kb * units.Ki)
+
 
 def _disable_lvm2_lvmetad(ssh):
     """Disables lvm2-lvmetad service. This service is responsible
@@ -189,6 +265,24 @@ class BaseBackupWriterImpl(with_metaclass(abc.ABCMeta)):
     def write(self, data):
         pass
 
+    @abc.abstractmethod
+    def flush(self):
+        """ Waits for all the data written so far to reach the target. """
+        pass
+
+    @property
+    def supports_copy(self):
+        """ Whether the writer is able to 'copy' data on the target. """
+        return False
+
+    @abc.abstractmethod
+    def copy(self, src_offset, length):
+        """ Copies 'length' bytes already written at 'src_offset' to the
+        current position, without sending them again. Only to be called
+        if 'supports_copy' is set.
+        """
+        pass
+
     @abc.abstractmethod
     def close(self):
         pass
@@ -223,6 +317,7 @@ class BaseBackupWriter(with_metaclass(abc.ABCMeta)):
 class FileBackupWriterImpl(BaseBackupWriterImpl):
     def __init__(self, path, disk_id):
         self._file = None
+        self._punch_holes = True
         super(FileBackupWriterImpl, self).__init__(path, disk_id)
 
     def _open(self):
@@ -236,8 +331,51 @@ class FileBackupWriterImpl(BaseBackupWriterImpl):
     def truncate(self, size):
         self._file.truncate(size)
 
+    def _write_zeros(self, length):
+        """ Zeroes out the next 'length' bytes of the file by punching a hole,
+        returning False if the underlying file system or device does not
+        support it.
+        """
+        if not self._punch_holes:
+            return False
+        offset = self._file.tell()
+        self._file.flush()
+        fd = self._file.fileno()
+        try:
+            _punch_hole(fd, offset, length)
+        except OSError as ex:
+            if ex.errno not in (errno.EOPNOTSUPP, errno.ENOSYS):
+                raise
+            LOG.debug(
+                "Punching holes is not supported on %s, writing zeros "
+                "instead: %s", self._path, ex)
+            self._punch_holes = False
+            return False
+        # NOTE: holes punched past the end of the file do not extend it:
+        if os.lseek(fd, 0, os.SEEK_END) < offset + length:
+            os.ftruncate(fd, offset + length)
+        self._file.seek(offset + length)
+        return True
+
     def write(self, data):
-        self._file.write(data)
+        view = memoryview(data)
+        for start, length, is_zero in _get_zero_runs(view):
+            if is_zero and self._write_zeros(length):
+                continue
+            self._file.write(view[start:start + length])
+
+    def flush(self):
+        self._file.flush()
+
+    @property
+    def supports_copy(self):
+        return True
+
+    def copy(self, src_offset, length):
+        offset = self._file.tell()
+        self._file.flush()
+        _copy_range(self._file.fileno(), offset, src_offset, length)
+        self._file.seek(offset + length)
 
     def close(self):
         self._file.close()
@@ -256,24 +394,31 @@ class FileBackupWriter(BaseBackupWriter):
 
 class SSHBackupWriterImpl(BaseBackupWriterImpl):
     def __init__(self, path, disk_id, compress_transfer=None,
-                 encoder_count=3):
+                 encoder_count=None):
         self._msg_id = None
         self._stdin = None
         self._stdout = None
         self._stderr = None
         self._offset = None
         self._ssh = None
-        self._sender_q = eventlet.Queue(maxsize=5)
-        self._enc_q = eventlet.Queue(maxsize=5)
+        if not encoder_count:
+            encoder_count = data_transfer.get_compression_workers()
+        # NOTE: the queue holds the greenthreads encoding each message in
+        # the order they were written, so its size bounds both the number
+        # of messages being encoded in parallel and the memory they use:
+        self._sender_q = eventlet.Queue(maxsize=encoder_count)
         self._sender_evt = None
-        self._encoder_evt = []
-        self._encoder_cnt = encoder_count
         self._exception = None
         self._closing = False
 
         self._compress_transfer = compress_transfer
         if self._compress_transfer is None:
             self._compress_transfer = CONF.compress_transfers
+        self._adaptive_compressor = None
+        if self._compress_transfer and CONF.adaptive_compression:
+            # NOTE: write_data only knows how to inflate zlib streams:
+            self._adaptive_compressor = data_transfer.AdaptiveCompressor(
+                [constants.COMPRESSION_FORMAT_ZLIB])
         super(SSHBackupWriterImpl, self).__init__(path, disk_id)
 
     def _set_ssh_client(self, ssh):
@@ -287,10 +432,11 @@ class SSHBackupWriterImpl(BaseBackupWriterImpl):
             "chmod +x write_data && sudo ./write_data")
 
     def _encode_data(self, content, offset, msg_id):
-        msg = data_transfer.encode_data(
+        msg = data_transfer.encode_data_buffers(
             msg_id, self._path,
             offset, content,
-            compress=self._compress_transfer)
+            compress=self._compress_transfer,
+            compressor=self._adaptive_compressor)
 
         LOG.debug(
             "Guest path: %(path)s, offset: %(offset)d, content len: "
@@ -298,9 +444,26 @@ class SSHBackupWriterImpl(BaseBackupWriterImpl):
             {"path": self._path,
              "offset": offset,
              "content_len": len(content),
-             "msg_len": len(msg)})
+             "msg_len": sum(len(buf) for buf in msg)})
         return msg
 
+    def _encode_zeros(self, offset, length, msg_id):
+        LOG.debug(
+            "Guest path: %(path)s, offset: %(offset)d, zeros len: "
+            "%(length)d", {"path": self._path, "offset": offset,
+                           "length": length})
+        return data_transfer.encode_zeros(
+            msg_id, self._path, offset, length)
+
+    def _encode_copy(self, offset, src_offset, length, msg_id):
+        LOG.debug(
+            "Guest path: %(path)s, offset: %(offset)d, copied from offset: "
+            "%(src_offset)d, len: %(length)d",
+            {"path": self._path, "offset": offset,
+             "src_offset": src_offset, "length": length})
+        return data_transfer.encode_copy(
+            msg_id, self._path, offset, src_offset, length)
+
     def _encode_eod(self):
         msg = data_transfer.encode_eod(self._msg_id)
         LOG.debug("EOD message len: %d", len(msg))
@@ -316,17 +479,18 @@ class SSHBackupWriterImpl(BaseBackupWriterImpl):
                     "write_data exited with error code %r (%s)" % (
                         ret_val, _WRITER_ERR_MAP.get(int(ret_val))))
 
-        self._stdin.write(data)
-        self._stdin.flush()
+        if isinstance(data, bytes):
+            data = [data]
+        # NOTE: the buffers are sent straight through the channel, as the
+        # buffered stdin file would copy them into its own buffer first:
+        for buf in data:
+            self._stdin.channel.sendall(buf)
         self._stdout.read(4)
 
     def _open(self):
         self._exec_helper_cmd()
         self._sender_evt = eventlet.spawn(
             self._sender)
-        for _ in range(self._encoder_cnt):
-            self._encoder_evt.append(
-                eventlet.spawn(self._encoder))
 
     def seek(self, pos):
         self._offset = pos
@@ -336,30 +500,15 @@ class SSHBackupWriterImpl(BaseBackupWriterImpl):
 
     def _sender(self):
         while True:
-            data = self._sender_q.get()
+            encoder = self._sender_q.get()
             try:
-                self._send_msg(data)
+                self._send_msg(encoder.wait())
             except BaseException as err:
                 self._exception = err
                 raise
             finally:
                 self._sender_q.task_done()
-                del data
-
-    def _encoder(self):
-        while True:
-            payload = self._enc_q.get()
-            try:
-                data = self._encode_data(
-                    payload["data"],
-                    payload["offset"],
-                    payload["msg_id"])
-                self._sender_q.put(data)
-            except BaseException as err:
-                self._exception = err
-                raise
-            finally:
-                self._enc_q.task_done()
+                del encoder
 
     def write(self, data):
         if self._closing:
@@ -371,26 +520,56 @@ class SSHBackupWriterImpl(BaseBackupWriterImpl):
                 "Failed to write data. See log "
                 "for details.") from self._exception
 
-        payload = {
-            "offset": self._offset,
-            "data": data,
-            "msg_id": self._msg_id,
-        }
-        self._enc_q.put(payload)
-        self._offset += len(data)
+        view = memoryview(data)
+        for start, length, is_zero in _get_zero_runs(view):
+            if is_zero:
+                encoder = eventlet.spawn(
+                    self._encode_zeros, self._offset, length, self._msg_id)
+            else:
+                encoder = eventlet.spawn(
+                    self._encode_data, view[start:start + length],
+                    self._offset, self._msg_id)
+            self._sender_q.put(encoder)
+            self._offset += length
+            self._msg_id += 1
+
+    @property
+    def supports_copy(self):
+        return True
+
+    def copy(self, src_offset, length):
+        if self._closing:
+            raise exception.CoriolisException(
+                "Attempted to write to a closed writer.")
+
+        if self._exception:
+            raise exception.CoriolisException(
+                "Failed to write data. See log "
+                "for details.") from self._exception
+
+        self._sender_q.put(eventlet.spawn(
+            self._encode_copy, self._offset, src_offset, length,
+            self._msg_id))
+        self._offset += length
         self._msg_id += 1
 
     def _wait_for_queues(self):
         LOG.info("Waiting for unfinished transfers to complete")
         timeout = datetime.datetime.now() + datetime.timedelta(seconds=600)
-        while (self._enc_q.unfinished_tasks or
-               self._sender_q.unfinished_tasks) and not self._exception:
+        while self._sender_q.unfinished_tasks and not self._exception:
             time.sleep(0.5)
             now = datetime.datetime.now()
             if now >= timeout:
                 raise exception.CoriolisException(
                     "Timed out waiting for data transfer to finish")
 
+    def flush(self):
+        self._wait_for_queues()
+        if self._exception:
+            raise exception.CoriolisException(
+                "Failed to write data. See log "
+                "for details.") from self._exception
+
     def close(self):
         self._closing = True
         self._wait_for_queues()
@@ -410,10 +589,6 @@ class SSHBackupWriterImpl(BaseBackupWriterImpl):
             eventlet.kill(self._sender_evt)
             self._sender_evt = None
 
-        for i in self._encoder_evt:
-            eventlet.kill(i)
-        self._encoder_evt = []
-
     def _handle_exception(self, ex):
         super(SSHBackupWriterImpl, self)._handle_exception(ex)
 
@@ -508,13 +683,31 @@ class SSHBackupWriter(BaseBackupWriter):
             try:
                 # Check if the remote file already exists
                 sftp.stat('write_data')
+                # NOTE: a helper left behind by an older version may not
+                # support all the messages sent by this one:
+                if self._get_remote_helper_checksum(ssh) == (
+                        self._get_local_helper_checksum(local_path)):
+                    return
+                LOG.info("Replacing outdated write_data helper")
             except IOError as ex:
                 if ex.errno != errno.ENOENT:
                     raise
-                sftp.put(local_path, 'write_data')
+            try:
+                # NOTE: the helper may still be running for other disks, so
+                # it gets replaced atomically instead of being overwritten:
+                sftp.put(local_path, 'write_data.tmp')
+                sftp.posix_rename('write_data.tmp', 'write_data')
             finally:
                 sftp.close()
 
+    def _get_local_helper_checksum(self, local_path):
+        with open(local_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def _get_remote_helper_checksum(self, ssh):
+        out = utils.exec_ssh_cmd(ssh, "sha256sum write_data")
+        return out.decode().split()[0]
+
     @utils.retry_on_error(sleep_seconds=30)
     def _connect_ssh(self):
         LOG.info("Connecting to SSH host: %(ip)s:%(port)s" %
@@ -537,7 +730,7 @@ class SSHBackupWriter(BaseBackupWriter):
 
 class HTTPBackupWriterImpl(BaseBackupWriterImpl):
     def __init__(self, path, disk_id,
-                 compress_transfer=None, compressor_count=3):
+                 compress_transfer=None, compressor_count=None):
         self._offset = None
         self._session = None
         self._ip = None
@@ -549,16 +742,23 @@ class HTTPBackupWriterImpl(BaseBackupWriterImpl):
         self._write_error = False
         self._id = None
         self._exception = None
-        self._compressor_count = compressor_count
-        self._comp_q = eventlet.Queue(maxsize=5)
-        self._sender_q = eventlet.Queue(maxsize=5)
+        if not compressor_count:
+            compressor_count = data_transfer.get_compression_workers()
+        # NOTE: the queue holds the greenthreads compressing each chunk in
+        # the order they were written, so its size bounds both the number of
+        # chunks being compressed in parallel and the memory they use:
+        self._sender_q = eventlet.Queue(maxsize=compressor_count)
 
         self._sender_evt = None
-        self._compressor_evt = None
 
         self._compress_transfer = compress_transfer
         if self._compress_transfer is None:
             self._compress_transfer = CONF.compress_transfers
+        self._compression_formats = CONF.http_writer_compression_formats
+        self._adaptive_compressor = None
+        if self._compress_transfer and CONF.adaptive_compression:
+            self._adaptive_compressor = data_transfer.AdaptiveCompressor(
+                self._compression_formats)
         super(HTTPBackupWriterImpl, self).__init__(path, disk_id)
 
     def _set_info(self, info):
@@ -616,12 +816,6 @@ class HTTPBackupWriterImpl(BaseBackupWriterImpl):
         self._init_session()
         self._acquire()
         self._sender_evt = eventlet.spawn(self._sender)
-        if self._compressor_count is None or self._compressor_count == 0:
-            self._compressor_count = 1
-        self._compressor_evt = []
-        for _ in range(self._compressor_count):
-            self._compressor_evt.append(
-                eventlet.spawn(self._compressor))
 
     def seek(self, pos):
         self._offset = pos
@@ -637,32 +831,53 @@ class HTTPBackupWriterImpl(BaseBackupWriterImpl):
             self._init_session()
             return
 
-    def _compressor(self):
-        while True:
-            payload = self._comp_q.get()
-            send_payload = {
-                "encoding": None,
-                "offset": payload["offset"],
-            }
-            chunk = payload["data"]
-            if self._compress_transfer:
-                try:
-                    chunk, compressed = data_transfer.compression_proxy(
-                        chunk, constants.COMPRESSION_FORMAT_GZIP)
-                    if compressed:
-                        send_payload["encoding"] = 'gzip'
-                except BaseException as err:
-                    LOG.exception(err)
-                    self._exception = err
-                    self._comp_q.task_done()
-                    raise
-            send_payload["chunk"] = chunk
-            self._sender_q.put(send_payload)
-            self._comp_q.task_done()
+    def _compress_chunk(self, chunk):
+        """ Returns the chunk to send and its content encoding, if any. """
+        if CONF.detect_zero_blocks and data_transfer.is_zero_block(chunk):
+            # NOTE: coriolis-writer has no way of zeroing out a range other
+            # than writing it, but the compressed zeros can be reused:
+            fmt = self._compression_formats[0]
+            return data_transfer.get_compressed_zeros(len(chunk), fmt), fmt
+
+        if self._adaptive_compressor:
+            pieces, fmt = self._adaptive_compressor.compress([chunk])
+            if fmt is None:
+                return chunk, None
+            return b"".join(pieces), fmt
+
+        fmt = self._compression_formats[0]
+        chunk, compressed = data_transfer.compression_proxy(chunk, fmt)
+        if compressed:
+            return chunk, fmt
+        return chunk, None
+
+    def _compressor(self, offset, chunk):
+        send_payload = {
+            "encoding": None,
+            "offset": offset,
+        }
+        if self._compress_transfer and self._compression_formats:
+            try:
+                chunk, encoding = self._compress_chunk(chunk)
+                send_payload["encoding"] = encoding
+            except BaseException as err:
+                LOG.exception(err)
+                self._exception = err
+                raise
+        send_payload["chunk"] = chunk
+        return send_payload
 
     def _sender(self):
         while True:
-            payload = self._sender_q.get()
+            compressor = self._sender_q.get()
+            try:
+                payload = compressor.wait()
+            except BaseException:
+                # NOTE: the error was recorded by the compressor:
+                self._sender_q.task_done()
+                raise
+            finally:
+                del compressor
             offset = copy.copy(payload["offset"])
             headers = {
                 "X-Write-Offset": str(offset),
@@ -675,7 +890,11 @@ class HTTPBackupWriterImpl(BaseBackupWriterImpl):
             @utils.retry_on_error()
             def send():
                 self._ensure_session()
-                chunk = copy.copy(payload["chunk"])
+                chunk = payload["chunk"]
+                if not isinstance(chunk, bytes):
+                    # NOTE: requests would iterate over any other bytes-like
+                    # object instead of sending it as-is:
+                    chunk = bytes(chunk)
                 LOG.debug(
                     "Guest path: %(path)s, offset: %(offset)d, content len: "
                     "%(content_len)d",
@@ -720,20 +939,25 @@ class HTTPBackupWriterImpl(BaseBackupWriterImpl):
         if self._exception:
             raise exception.CoriolisException(self._exception)
 
-        payload = {
-            "offset": self._offset,
-            "data": data,
-        }
-        self._comp_q.put(payload)
+        self._sender_q.put(eventlet.spawn(
+            self._compressor, self._offset, data))
         self._offset += len(data)
 
+    def copy(self, src_offset, length):
+        raise exception.CoriolisException(
+            "The HTTP backup writer cannot copy data on the target.")
+
     def _wait_for_queues(self):
-        while (self._comp_q.unfinished_tasks or
-               self._sender_q.unfinished_tasks) and not self._exception:
+        while self._sender_q.unfinished_tasks and not self._exception:
             # No error recorded, and we have tasks in the queue
             LOG.info("Waiting for unfinished transfers to complete")
             time.sleep(0.5)
 
+    def flush(self):
+        self._wait_for_queues()
+        if self._exception:
+            raise exception.CoriolisException(self._exception)
+
     def close(self):
         self._closing = True
         self._wait_for_queues()
@@ -754,10 +978,6 @@ class HTTPBackupWriterImpl(BaseBackupWriterImpl):
         if self._sender_evt:
             eventlet.kill(self._sender_evt)
             self._sender_evt = None
-        if self._compressor_evt:
-            for i in self._compressor_evt:
-                eventlet.kill(i)
-            self._compressor_evt = None
 
 
 class HTTPBackupWriterBootstrapper(object):
@@ -953,7 +1173,7 @@ class HTTPBackupWriterBootstrapper(object):
 class HTTPBackupWriter(BaseBackupWriter):
 
     def __init__(self, ip, port, volumes_info, certificates,
-                 compressor_count=3):
+                 compressor_count=None):
         self._ip = ip
         self._port = port
         self._volumes_info = volumes_info
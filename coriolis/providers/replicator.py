@@ -1,21 +1,33 @@
 # Copyright 2019 Cloudbase Solutions Srl
 # All Rights Reserved.
 
+import base64
+import collections
+import hashlib
 import json
 import os
 import shutil
+import struct
 import tempfile
 import time
+import zlib
 
+import eventlet
+from eventlet.green import threading as green_threading
+from eventlet import semaphore
+from eventlet import tpool
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import units
+from requests import adapters
 from sshtunnel import SSHTunnelForwarder
 
 import paramiko
 import requests
 
+from coriolis import data_transfer
 from coriolis import exception
+from coriolis import replica_state
 from coriolis import utils
 
 LOG = logging.getLogger(__name__)
@@ -39,12 +51,187 @@ replicator_opts = [
     cfg.IntOpt('default_requests_timeout',
                default=60,
                help='Number of seconds for HTTP request timeouts.'),
+    cfg.IntOpt('chunk_download_workers',
+               default=4, min=1,
+               help='Number of chunks of a disk which are concurrently '
+                    'downloaded from the replicator.'),
+    cfg.IntOpt('max_inflight_chunks',
+               default=8, min=1,
+               help='Maximum amount of downloaded data of a disk, expressed '
+                    'in replicator chunks, which may be held in memory while '
+                    'waiting to be passed on to the backup writer.'),
+    cfg.IntOpt('max_coalesced_read_mb',
+               default=64, min=0,
+               help='Maximum size in MB of a single ranged read from the '
+                    'replicator when merging adjacent changed chunks. Values '
+                    'no larger than the replicator chunk size disable '
+                    'chunk coalescing.'),
+    cfg.IntOpt('coalesce_gap_tolerance_kb',
+               default=0, min=0,
+               help='Changed chunks separated by at most this many KB of '
+                    'unchanged data are merged into the same ranged read, '
+                    'with the unchanged data in between being re-sent.'),
+    cfg.IntOpt('concurrent_disk_syncs',
+               default=1, min=1,
+               help='Number of disks of an instance which are replicated '
+                    'at the same time.'),
+    cfg.IntOpt('memory_budget_mb',
+               default=0, min=0,
+               help='Maximum amount of downloaded chunk data in MB held in '
+                    'memory across all the disks being replicated at once. '
+                    'A value of 0 means no global limit, in which case only '
+                    'max_inflight_chunks applies per disk.'),
+    cfg.IntOpt('bandwidth_limit_mbps',
+               default=0, min=0,
+               help='Maximum download bandwidth in MB/s from the replicator '
+                    'shared by all the disks being replicated at once. '
+                    'A value of 0 means no limit.'),
+    cfg.BoolOpt('dedup_chunks',
+                default=False,
+                help='Keep an index of the hashes of the chunks written to '
+                     'each destination volume, and have the backup writer '
+                     'copy chunks already present on the volume instead of '
+                     'sending them again. Only supported by the SSH and file '
+                     'backup writers.'),
+    cfg.IntOpt('dedup_index_max_entries',
+               default=16384, min=1,
+               help='Maximum number of chunk hashes kept in the index of '
+                    'each destination volume while syncing it. The least '
+                    'recently used hashes are evicted first.'),
+    cfg.IntOpt('dedup_index_stored_entries',
+               default=512, min=0, max=4096,
+               help='Number of the most recently used chunk hashes of each '
+                    'destination volume which are stored along with the '
+                    'volume\'s info for use by the following syncs. Each '
+                    'takes up about 54 bytes.'),
+    cfg.IntOpt('checkpoint_interval_chunks',
+               default=64, min=0,
+               help='Number of replicated chunks of a disk after which a '
+                    'checkpoint of the chunks written so far is saved in '
+                    'the volume\'s info, so that a later sync may resume '
+                    'from it if this one fails. A value of 0 disables '
+                    'checkpoints.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(replicator_opts, 'replicator')
 
 
+class _BandwidthLimiter(object):
+    """ Paces the downloads of all disks so that their combined rate does
+    not exceed the given number of bytes per second.
+    """
+
+    def __init__(self, bytes_per_second):
+        self._rate = float(bytes_per_second)
+        self._lock = semaphore.Semaphore()
+        self._next_slot = time.time()
+
+    def consume(self, amount):
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next_slot)
+            self._next_slot = start + amount / self._rate
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _MemoryBudget(object):
+    """ Tracks the amount of downloaded data held in memory by all the disks
+    being replicated at once.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._available = size
+        self._cond = green_threading.Condition()
+
+    def reserve(self, amount, blocking=True):
+        # NOTE: a download larger than the whole budget may still proceed
+        # once nothing else is being held:
+        amount = min(amount, self._size)
+        with self._cond:
+            while self._available < amount:
+                if not blocking:
+                    return False
+                self._cond.wait()
+            self._available -= amount
+            return True
+
+    def release(self, amount):
+        amount = min(amount, self._size)
+        with self._cond:
+            self._available += amount
+            self._cond.notify_all()
+
+
+_CHUNK_INDEX_ENTRY = struct.Struct("<32sQ")
+
+
+class _ChunkIndex(object):
+    """ Index of the hashes of the chunks written to a destination volume,
+    holding the offset of a single chunk for each hash.
+    """
+
+    def __init__(self, encoded, max_entries):
+        # NOTE: ordered from the least to the most recently used hash:
+        self._offsets = collections.OrderedDict()
+        if encoded:
+            self._offsets.update(
+                _CHUNK_INDEX_ENTRY.iter_unpack(base64.b64decode(encoded)))
+        self._hashes = {
+            offset: digest for digest, offset in self._offsets.items()}
+        self._max_entries = max_entries
+
+    def find(self, digest):
+        offset = self._offsets.get(digest)
+        if offset is not None:
+            self._offsets.move_to_end(digest)
+        return offset
+
+    def discard(self, offset):
+        digest = self._hashes.pop(offset, None)
+        if digest is not None:
+            del self._offsets[digest]
+
+    def add(self, digest, offset):
+        self.discard(offset)
+        if digest in self._offsets:
+            self._offsets.move_to_end(digest)
+            return
+        self._offsets[digest] = offset
+        self._hashes[offset] = digest
+        while len(self._offsets) > self._max_entries:
+            _, evicted_offset = self._offsets.popitem(last=False)
+            del self._hashes[evicted_offset]
+
+    def encode(self, max_entries):
+        """ Packs the 'max_entries' most recently used hashes into a string
+        to be stored along with the info of the volume.
+        """
+        entries = list(self._offsets.items())
+        if max_entries < len(entries):
+            entries = entries[len(entries) - max_entries:]
+        return base64.b64encode(b"".join(
+            _CHUNK_INDEX_ENTRY.pack(digest, offset)
+            for digest, offset in entries)).decode()
+
+
+def _encode_chunk_bitmap(chunk_indexes):
+    bitmap = bytearray((max(chunk_indexes, default=-1) + 8) // 8)
+    for idx in chunk_indexes:
+        bitmap[idx // 8] |= 1 << (idx % 8)
+    return base64.b64encode(zlib.compress(bytes(bitmap))).decode()
+
+
+def _decode_chunk_bitmap(encoded):
+    bitmap = zlib.decompress(base64.b64decode(encoded))
+    return set(
+        i * 8 + bit for i, byte in enumerate(bitmap) if byte
+        for bit in range(8) if byte & (1 << bit))
+
+
 class Client(object):
 
     def __init__(self, ip, port, credentials, ssh_conn_info,
@@ -162,6 +349,13 @@ class Client(object):
             self._creds["client_cert"],
             self._creds["client_key"])
         sess.verify = self._creds["ca_cert"]
+        # NOTE: chunks are downloaded concurrently, so the connection pool
+        # must be able to accommodate all of the downloaders at once:
+        adapter = adapters.HTTPAdapter(
+            pool_maxsize=(
+                CONF.replicator.chunk_download_workers *
+                CONF.replicator.concurrent_disk_syncs))
+        sess.mount("https://", adapter)
         return sess
 
     @utils.retry_on_error()
@@ -219,11 +413,27 @@ class Client(object):
         if self._use_compression is False:
             headers["Accept-encoding"] = "identity"
 
-        data = self._cli.get(
-            diskUri, headers=headers,
-            timeout=CONF.replicator.default_requests_timeout)
-        data.raise_for_status()
-        return data.content
+        # NOTE: the response is read straight into a buffer of the expected
+        # size, which is then handed over without further copies:
+        length = int(chunk["length"])
+        buf = memoryview(bytearray(length))
+        with self._cli.get(
+                diskUri, headers=headers, stream=True,
+                timeout=CONF.replicator.default_requests_timeout) as data:
+            data.raise_for_status()
+            data.raw.decode_content = True
+            read = 0
+            while read < length:
+                count = data.raw.readinto(buf[read:])
+                if not count:
+                    break
+                read += count
+
+        if read != length:
+            raise exception.CoriolisException(
+                "Expected %d bytes for chunk at offset %d of disk %s, but "
+                "only got %d" % (length, offset, disk, read))
+        return buf
 
 
 class Replicator(object):
@@ -252,6 +462,15 @@ class Replicator(object):
         self._cli = None
         self._use_tunnel = use_tunnel
 
+        self._memory_budget = None
+        if CONF.replicator.memory_budget_mb:
+            self._memory_budget = _MemoryBudget(
+                CONF.replicator.memory_budget_mb * units.Mi)
+        self._bandwidth_limiter = None
+        if CONF.replicator.bandwidth_limit_mbps:
+            self._bandwidth_limiter = _BandwidthLimiter(
+                CONF.replicator.bandwidth_limit_mbps * units.Mi)
+
     def __del__(self):
         if self._cert_dir is not None:
             utils.ignore_exceptions(
@@ -458,10 +677,17 @@ class Replicator(object):
     def restart(self):
         utils.restart_service(self._ssh, REPLICATOR_SVC_NAME)
 
+    def _decode_state(self, state):
+        # NOTE: the disk states stored in the volumes info have their chunk
+        # lists packed, which the replicator does not know about:
+        if isinstance(state, list):
+            return [replica_state.decode(vol_state) for vol_state in state]
+        return state
+
     def update_state(self, state, restart=False):
         state_file = tempfile.mkstemp()[1]
         with open(state_file, 'w') as fp:
-            json.dump(state, fp)
+            json.dump(self._decode_state(state), fp)
 
         self._copy_file(self._ssh, state_file, REPLICATOR_STATE)
         if restart:
@@ -526,7 +752,7 @@ class Replicator(object):
         # if state is not present, just return an empty array
         # saves us the trouble of an extra if during the setup
         # of the replicator process
-        state = self._repl_state
+        state = self._decode_state(self._repl_state)
         filename = tempfile.mkstemp()[1]
         with open(filename, 'w') as fp:
             json.dump(state, fp)
@@ -748,6 +974,199 @@ class Replicator(object):
                 return vol
         return None
 
+    def _reserve_memory(self, amount, blocking=True):
+        if self._memory_budget is None:
+            return True
+        return self._memory_budget.reserve(amount, blocking=blocking)
+
+    def _release_memory(self, amount):
+        if self._memory_budget is not None:
+            self._memory_budget.release(amount)
+
+    def _coalesce_chunks(self, chunks):
+        """ Merges adjacent chunks into larger extents of the same format
+        which can each be fetched with a single ranged read.
+
+        Chunks are merged if the gap between them is no larger than
+        'coalesce_gap_tolerance_kb' and the resulting extent does not exceed
+        'max_coalesced_read_mb'.
+        """
+        max_size = CONF.replicator.max_coalesced_read_mb * units.Mi
+        max_gap = CONF.replicator.coalesce_gap_tolerance_kb * units.Ki
+
+        extents = []
+        for chunk in sorted(chunks, key=lambda c: int(c["offset"])):
+            offset = int(chunk["offset"])
+            end = offset + int(chunk["length"])
+            if extents:
+                last = extents[-1]
+                gap = offset - (last["offset"] + last["length"])
+                if 0 <= gap <= max_gap and end - last["offset"] <= max_size:
+                    last["length"] = end - last["offset"]
+                    continue
+            extents.append({"offset": offset, "length": end - offset})
+
+        if len(extents) < len(chunks):
+            LOG.debug(
+                "Coalesced %d chunks into %d extents", len(chunks),
+                len(extents))
+        return extents
+
+    def _split_buffer(self, data):
+        """ Splits the data of a downloaded extent into buffers the size of
+        a replicator chunk to be passed on to the backup writer.
+        """
+        data = memoryview(data)
+        for i in range(0, len(data), self._chunk_size):
+            yield data[i:i + self._chunk_size]
+
+    def _get_chunk_index(self, dst_vol, chunks):
+        index = _ChunkIndex(
+            dst_vol.get("chunk_index"),
+            CONF.replicator.dedup_index_max_entries)
+        # NOTE: the chunks about to be written may already have been
+        # overwritten by a previous failed sync, so they cannot be copied
+        # from until written again:
+        for chunk in chunks:
+            index.discard(int(chunk["offset"]))
+        return index
+
+    def _hash_buffer(self, data):
+        # NOTE: hashlib releases the GIL while hashing large buffers:
+        return tpool.execute(
+            lambda: hashlib.sha256(data).digest())
+
+    def _write_buffer(self, destination, index, offset, data):
+        """ Writes the given data at 'offset', or has the destination copy
+        it from another offset if the index holds a chunk with the same hash.
+        Returns the number of bytes which were actually sent.
+        """
+        # NOTE: zero chunks are cheap enough to send and would otherwise
+        # take over the index:
+        if index is None or data_transfer.is_zero_block(data):
+            destination.write(data)
+            return len(data)
+
+        digest = self._hash_buffer(data)
+        # NOTE: the chunk at 'offset' is being overwritten, so it can never
+        # be copied from, not even by itself:
+        index.discard(offset)
+        src_offset = index.find(digest)
+        if src_offset is not None:
+            destination.copy(src_offset, len(data))
+            index.add(digest, offset)
+            return 0
+        destination.write(data)
+        index.add(digest, offset)
+        return len(data)
+
+    def _get_state_digest(self, state_for_vol):
+        # NOTE: the checksumming progress changes even if the disk does not:
+        state = {
+            key: value for key, value in (state_for_vol or {}).items()
+            if key != "checksum-status"}
+        return hashlib.sha256(
+            json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+    def _get_completed_chunks(self, dst_vol, state_digest):
+        """ Returns the indexes of the chunks written by a previous failed
+        sync of the disk, according to its last checkpoint.
+        """
+        checkpoint = dst_vol.get("replica_checkpoint")
+        if not checkpoint:
+            return set()
+        # NOTE: chunks written by the failed sync may have changed again on
+        # the source since then, in which case they must be synced again:
+        if (checkpoint.get("state_digest") != state_digest or
+                checkpoint.get("chunk_size") != self._chunk_size):
+            LOG.info(
+                "Ignoring checkpoint of disk %s, as the source disk has "
+                "changed since it was saved", dst_vol["disk_id"])
+            return set()
+        return _decode_chunk_bitmap(checkpoint["completed"])
+
+    def _save_checkpoint(self, destination, dst_vol, state_digest,
+                         completed):
+        # NOTE: only chunks which have reached the destination may be
+        # skipped later on:
+        destination.flush()
+        checkpoint = {
+            "state_digest": state_digest,
+            "chunk_size": self._chunk_size,
+            "completed": _encode_chunk_bitmap(completed),
+        }
+        dst_vol["replica_checkpoint"] = checkpoint
+        self._event_manager.update_volume_checkpoint(
+            dst_vol["disk_id"], checkpoint)
+
+    def _download_chunk(self, disk, chunk):
+        if self._bandwidth_limiter is not None:
+            self._bandwidth_limiter.consume(int(chunk["length"]))
+        return self._cli.download_chunk(disk, chunk)
+
+    def _download_chunks(self, disk, chunks):
+        """ Downloads the given chunks of the disk concurrently, yielding
+        (chunk, data) tuples in the same order as the chunks were provided.
+
+        At most 'chunk_download_workers' requests are run at once, and no
+        more than 'max_inflight_chunks' worth of data is downloaded ahead of
+        the chunk the caller is currently waiting on, which caps memory usage
+        when the consumer is slower than the downloads. Each downloaded
+        chunk also holds its size out of the global memory budget (if any)
+        until the caller is done with it.
+        """
+        workers = CONF.replicator.chunk_download_workers
+        max_inflight = CONF.replicator.max_inflight_chunks * self._chunk_size
+        pool = eventlet.greenpool.GreenPool(size=workers)
+        pending = collections.deque()
+        inflight = 0
+
+        try:
+            for chunk in chunks:
+                length = int(chunk["length"])
+                reserved = False
+                while pending and not reserved:
+                    if inflight + length <= max_inflight:
+                        reserved = self._reserve_memory(
+                            length, blocking=False)
+                        if reserved:
+                            break
+                    # NOTE: hand the oldest chunk over before waiting on the
+                    # budget, as the memory it holds may be what the other
+                    # disks being replicated are waiting on:
+                    done_chunk, greenthread = pending.popleft()
+                    yield done_chunk, greenthread.wait()
+                    done_length = int(done_chunk["length"])
+                    self._release_memory(done_length)
+                    inflight -= done_length
+                if not reserved:
+                    self._reserve_memory(length)
+                inflight += length
+                pending.append((
+                    chunk, pool.spawn(self._download_chunk, disk, chunk)))
+
+            while pending:
+                done_chunk, greenthread = pending.popleft()
+                yield done_chunk, greenthread.wait()
+                done_length = int(done_chunk["length"])
+                self._release_memory(done_length)
+                inflight -= done_length
+        finally:
+            # NOTE: this is reached on errors or if the consumer stops
+            # iterating early, in which case no other downloads are needed:
+            for _, greenthread in pending:
+                greenthread.kill()
+            self._release_memory(inflight)
+
+    def _report_throughput(self, disk_id, dev_name, size_mb, duration):
+        throughput = 0
+        if duration > 0:
+            throughput = size_mb / duration
+        self._event_manager.progress_update(
+            "Replicated %.2f MB for disk \"%s\" (device \"%s\") in %.2f "
+            "seconds (%.2f MB/s)" % (
+                size_mb, disk_id, dev_name, duration, throughput))
+
     def replicate_disks(self, source_volumes_info, backup_writer):
         """
         Fetch the block diff and send it to the backup_writer.
@@ -771,6 +1190,7 @@ class Replicator(object):
             isInitial = True
         curr_state = self._cli.get_status(brief=False)
 
+        disks = []
         for volume in source_volumes_info:
             dst_vol_idx = None
             for idx, vol in enumerate(self._volumes_info):
@@ -782,53 +1202,130 @@ class Replicator(object):
                 raise exception.CoriolisException(
                     "failed to find a coresponding volume in volumes_info"
                     " for %s" % volume["disk_id"])
+            disks.append((volume, self._volumes_info[dst_vol_idx]))
+
+        # NOTE: each disk gets its own backup writer context and only
+        # updates its own entry in volumes_info, so the disks may
+        # finish in any order:
+        pool = eventlet.greenpool.GreenPool(
+            size=CONF.replicator.concurrent_disk_syncs)
+        greenthreads = []
+        try:
+            for volume, dst_vol in disks:
+                greenthreads.append(pool.spawn(
+                    self._replicate_disk, volume, dst_vol, curr_state,
+                    isInitial, backup_writer))
+            for greenthread in greenthreads:
+                greenthread.wait()
+        except BaseException:
+            # NOTE: the replica state is only persisted if all disks get
+            # synced, so there is no point in letting the others finish:
+            for greenthread in greenthreads:
+                greenthread.kill()
+            raise
 
-            dst_vol = self._volumes_info[dst_vol_idx]
-
-            devName = volume["disk_path"]
-            if devName.startswith('/dev'):
-                devName = devName[5:]
+        self._repl_state = curr_state
+        return self._repl_state
 
-            state_for_vol = self._find_vol_state(devName, curr_state)
-            if isInitial and dst_vol.get("zeroed", False) is True:
-                # This is an initial sync of the disk, and we can
-                # skip zero chunks
-                chunks = self._cli.get_chunks(
-                    devName, skip_zeros=True)
-            else:
-                # subsequent sync. Get changes.
-                chunks = self._cli.get_changes(devName)
+    def _replicate_disk(self, volume, dst_vol, curr_state, is_initial,
+                        backup_writer):
+        devName = volume["disk_path"]
+        if devName.startswith('/dev'):
+            devName = devName[5:]
+
+        state_for_vol = self._find_vol_state(devName, curr_state)
+        if is_initial and dst_vol.get("zeroed", False) is True:
+            # This is an initial sync of the disk, and we can
+            # skip zero chunks
+            chunks = self._cli.get_chunks(
+                devName, skip_zeros=True)
+        else:
+            # subsequent sync. Get changes.
+            chunks = self._cli.get_changes(devName)
 
-            if not chunks:
-                self._event_manager.progress_update(
-                    "No new chunks to replicate for disk \"%s\" (%s)" % (
-                        volume['disk_id'], devName))
-                self._repl_state = curr_state
-                return self._repl_state
+        if not chunks:
+            self._event_manager.progress_update(
+                "No new chunks to replicate for disk \"%s\" (%s)" % (
+                    volume['disk_id'], devName))
+            return
+
+        state_digest = self._get_state_digest(state_for_vol)
+        completed = self._get_completed_chunks(dst_vol, state_digest)
+        remaining = [
+            chunk for chunk in chunks
+            if int(chunk["offset"]) // self._chunk_size not in completed]
+        if len(remaining) < len(chunks):
+            self._event_manager.progress_update(
+                "Resuming replication of disk \"%s\" (%s), skipping %d "
+                "chunks written by a previous sync" % (
+                    volume['disk_id'], devName,
+                    len(chunks) - len(remaining)))
+        if remaining:
+            self._write_chunks(
+                volume, dst_vol, devName, chunks, remaining, backup_writer,
+                state_digest, completed)
+        else:
+            # NOTE: the chunk index does not account for the chunks written
+            # by the previous sync:
+            dst_vol.pop("chunk_index", None)
 
-            size = self._get_size_from_chunks(chunks)
+        dst_vol.pop("replica_checkpoint", None)
+        dst_vol["replica_state"] = replica_state.encode(state_for_vol)
 
-            msg = (
-                "Replicating changed data for disk \"%s\" (device \"%s\", "
-                "written chunks: %.2f MB)") % (
-                    volume["disk_id"], devName, size)
-            perc_step = self._event_manager.add_percentage_step(
-                msg, len(chunks))
-
-            total = 0
-            with backup_writer.open("", volume['disk_id']) as destination:
-                for chunk in chunks:
-                    offset = int(chunk["offset"])
-                    destination.seek(offset)
-                    data = self._cli.download_chunk(devName, chunk)
-                    destination.write(data)
-                    total += 1
-                    self._event_manager.set_percentage_step(
-                        perc_step, total)
-            dst_vol["replica_state"] = state_for_vol
+    def _write_chunks(self, volume, dst_vol, devName, changed_chunks, chunks,
+                      backup_writer, state_digest, completed):
+        """ Writes the given chunks out of all the changed chunks of the
+        disk, periodically checkpointing the indexes of the ones written.
+        """
+        size = self._get_size_from_chunks(chunks)
+        extents = self._coalesce_chunks(chunks)
+        extents_size = sum(extent["length"] for extent in extents)
+
+        msg = (
+            "Replicating changed data for disk \"%s\" (device \"%s\", "
+            "written chunks: %.2f MB)") % (
+                volume["disk_id"], devName, size)
+        perc_step = self._event_manager.add_percentage_step(
+            msg, extents_size)
 
-        self._repl_state = curr_state
-        return self._repl_state
+        checkpoint_interval = CONF.replicator.checkpoint_interval_chunks
+        chunks_since_checkpoint = 0
+        total = 0
+        sent = 0
+        start_time = time.time()
+        with backup_writer.open("", volume['disk_id']) as destination:
+            index = None
+            if CONF.replicator.dedup_chunks and destination.supports_copy:
+                index = self._get_chunk_index(dst_vol, changed_chunks)
+            for extent, data in self._download_chunks(devName, extents):
+                offset = int(extent["offset"])
+                destination.seek(offset)
+                for buf in self._split_buffer(data):
+                    sent += self._write_buffer(destination, index, offset, buf)
+                    completed.add(offset // self._chunk_size)
+                    chunks_since_checkpoint += 1
+                    offset += len(buf)
+                total += len(data)
+                self._event_manager.set_percentage_step(
+                    perc_step, total)
+                if (checkpoint_interval and
+                        chunks_since_checkpoint >= checkpoint_interval):
+                    self._save_checkpoint(
+                        destination, dst_vol, state_digest, completed)
+                    chunks_since_checkpoint = 0
+        self._report_throughput(
+            volume["disk_id"], devName, size, time.time() - start_time)
+        if index is not None:
+            LOG.debug(
+                "Sent %d out of %d bytes for disk %s, the rest being copied "
+                "from other chunks already on the destination", sent, total,
+                volume["disk_id"])
+            dst_vol["chunk_index"] = index.encode(
+                CONF.replicator.dedup_index_stored_entries)
+        else:
+            # NOTE: an index left over from a previous sync would not
+            # account for the chunks written by this one:
+            dst_vol.pop("chunk_index", None)
 
     def _download_full_disk(self, disk, path):
         self._event_manager.progress_update(
@@ -856,19 +1353,18 @@ class Replicator(object):
             "Downloading %s as sparse file" % disk)
         size = self._cli.get_disk_size(disk)
         size_from_chunks = self._get_size_from_chunks(chunks)
+        extents = self._coalesce_chunks(chunks)
         total = 0
         with open(path, 'wb') as fp:
             # create sparse file
             fp.truncate(size)
             perc_step = self._event_manager.add_percentage_step(
                 "Downloading spart disk /dev/%s (%s MB)" % (
-                    disk, size_from_chunks), len(chunks))
-            for chunk in chunks:
+                    disk, size_from_chunks), len(extents))
+            for chunk, data in self._download_chunks(disk, extents):
                 offset = int(chunk["offset"])
                 # seek to offset
                 fp.seek(offset)
-
-                data = self._cli.download_chunk(disk, chunk)
                 fp.write(data)
 
                 total += 1
@@ -0,0 +1,172 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+""" Compact encoding of the per-chunk lists within replica states.
+
+The state of each disk reported by the replicator includes a list with an
+entry for every chunk of the disk, which for multi-TB disks amounts to tens
+of MB of JSON carried around within the volumes info. The entries get packed
+column by column into a single compressed blob, with integers stored as
+64-bit values and hex strings (e.g. checksums) as raw bytes. Lists whose
+entries cannot be packed this way are left as they are.
+"""
+
+import base64
+import collections.abc
+import struct
+import zlib
+
+from coriolis import exception
+
+CHUNKS_KEY = "chunks"
+ENCODING_PACKED = "packed-v1"
+
+_FIELD_TYPE_U64 = "u64"
+_FIELD_TYPE_HEX = "hex"
+
+
+def _is_hex(value):
+    try:
+        return bytes.fromhex(value).hex() == value
+    except ValueError:
+        return False
+
+
+def _get_field_type(values):
+    """ Returns the type and size in bytes of the given column's values, or
+    (None, None) if they cannot be packed.
+    """
+    if all(type(v) is int and 0 <= v < 2 ** 64 for v in values):
+        return _FIELD_TYPE_U64, 8
+    if all(type(v) is str for v in values):
+        lengths = set(len(v) for v in values)
+        if len(lengths) == 1 and all(_is_hex(v) for v in values):
+            return _FIELD_TYPE_HEX, lengths.pop() // 2
+    return None, None
+
+
+def _get_columns(chunks):
+    """ Returns the list of (field name, values) columns of the given chunks,
+    the field name being None for chunks which are scalars rather than dicts.
+    """
+    if all(type(chunk) is dict for chunk in chunks):
+        fields = set(chunks[0])
+        if any(set(chunk) != fields for chunk in chunks):
+            return None
+        return [
+            (field, [chunk[field] for chunk in chunks])
+            for field in sorted(fields)]
+    return [(None, chunks)]
+
+
+def encode_chunks(chunks):
+    """ Returns the packed form of the given list of chunks, or the list
+    itself if its entries cannot be packed.
+    """
+    if not isinstance(chunks, list) or not chunks:
+        return chunks
+    columns = _get_columns(chunks)
+    if columns is None:
+        return chunks
+
+    fields = []
+    data = []
+    for field, values in columns:
+        field_type, size = _get_field_type(values)
+        if field_type is None:
+            return chunks
+        fields.append([field, field_type, size])
+        if field_type == _FIELD_TYPE_U64:
+            data.append(struct.pack("<%dQ" % len(values), *values))
+        else:
+            data.append(bytes.fromhex("".join(values)))
+
+    return {
+        "encoding": ENCODING_PACKED,
+        "count": len(chunks),
+        "fields": fields,
+        "data": base64.b64encode(zlib.compress(b"".join(data))).decode(),
+    }
+
+
+class PackedChunks(collections.abc.Sequence):
+    """ Read-only sequence of the chunks of a packed chunk list, only
+    unpacking it on the first access to one of its chunks.
+    """
+
+    def __init__(self, packed):
+        if packed.get("encoding") != ENCODING_PACKED:
+            raise exception.CoriolisException(
+                "Unsupported chunks encoding: %s" % packed.get("encoding"))
+        self._packed = packed
+        self._columns = None
+
+    def __len__(self):
+        return self._packed["count"]
+
+    def _get_columns(self):
+        if self._columns is None:
+            count = len(self)
+            data = zlib.decompress(base64.b64decode(self._packed["data"]))
+            columns = []
+            pos = 0
+            for field, field_type, size in self._packed["fields"]:
+                column = data[pos:pos + count * size]
+                pos += count * size
+                if field_type == _FIELD_TYPE_U64:
+                    column = struct.unpack("<%dQ" % count, column)
+                columns.append((field, field_type, size, column))
+            self._columns = columns
+        return self._columns
+
+    def _get_chunk(self, idx):
+        values = {}
+        for field, field_type, size, column in self._get_columns():
+            if field_type == _FIELD_TYPE_U64:
+                value = column[idx]
+            else:
+                value = column[idx * size:(idx + 1) * size].hex()
+            if field is None:
+                return value
+            values[field] = value
+        return values
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._get_chunk(i) for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("chunk index out of range")
+        return self._get_chunk(idx)
+
+
+def get_chunks(state):
+    """ Returns the chunks of the given disk state as a sequence, without
+    unpacking them.
+    """
+    chunks = (state or {}).get(CHUNKS_KEY)
+    if isinstance(chunks, dict):
+        return PackedChunks(chunks)
+    return chunks
+
+
+def encode(state):
+    """ Returns a copy of the given disk state with its chunks packed. """
+    if not isinstance(state, dict) or CHUNKS_KEY not in state:
+        return state
+    encoded = dict(state)
+    encoded[CHUNKS_KEY] = encode_chunks(state[CHUNKS_KEY])
+    return encoded
+
+
+def decode(state):
+    """ Returns a copy of the given disk state with its chunks unpacked, as
+    expected by the replicator.
+    """
+    if not isinstance(state, dict) or not isinstance(
+            state.get(CHUNKS_KEY), dict):
+        return state
+    decoded = dict(state)
+    decoded[CHUNKS_KEY] = list(get_chunks(state))
+    return decoded
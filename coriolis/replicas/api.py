@@ -28,10 +28,14 @@ class API(object):
         self._rpc_client.delete_replica(ctxt, replica_id)
 
     def get_replicas(self, ctxt, include_tasks_executions=False,
-                     include_task_info=False):
+                     include_task_info=False, marker=None, limit=None,
+                     sort_keys=None, sort_dirs=None, filters=None,
+                     fields=None):
         return self._rpc_client.get_replicas(
             ctxt, include_tasks_executions,
-            include_task_info=include_task_info)
+            include_task_info=include_task_info, marker=marker, limit=limit,
+            sort_keys=sort_keys, sort_dirs=sort_dirs, filters=filters,
+            fields=fields)
 
     def get_replica(self, ctxt, replica_id, include_task_info=False):
         return self._rpc_client.get_replica(
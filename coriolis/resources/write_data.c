@@ -1,14 +1,25 @@
 // Copyright 2016 Cloudbase Solutions Srl
 // All Rights Reserved.
 
+#define _GNU_SOURCE
+
+#include <fcntl.h>
+#include <linux/falloc.h>
 #include <stdio.h>
 #include <stdint.h>
 #include <stdlib.h>
 #include <string.h>
+#include <unistd.h>
 #include <zlib.h>
 
 #define MIN_MSG_SIZE (sizeof(uint64_t) + 1)
 #define MAX_MSG_SIZE (100 * 1024 * 1024)
+// Messages with this inflated size hold a length to zero out instead of data
+#define ZERO_MSG_SIZE_INFLATED 0xFFFFFFFF
+// Messages with this inflated size hold a range of the file to copy instead
+#define COPY_MSG_SIZE_INFLATED 0xFFFFFFFE
+#define ZERO_BUF_SIZE (1024 * 1024)
+#define COPY_BUF_SIZE (1024 * 1024)
 
 #define ERR_MORE_MSG            -1
 #define ERR_DONE                0
@@ -63,6 +74,114 @@ int inflate_buf(uint32_t msg_size, void* buf, uint32_t msg_size_inflated,
     return ERR_DONE;
 }
 
+int write_zeros(const char* path, uint64_t offset, uint64_t length)
+{
+    int fd = open(path, O_WRONLY);
+    if (fd < 0)
+        return ERR_OPEN_FILE;
+
+    off_t disk_size = lseek(fd, 0, SEEK_END);
+    if (disk_size < 0 || offset + length > (uint64_t)disk_size)
+    {
+        close(fd);
+        return ERR_OUT_OF_BOUDS;
+    }
+
+    // Punching a hole zeroes out the range on both files and block devices
+    // supporting it (discarding the blocks if possible), without any writes
+    if (fallocate(fd, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE,
+                  (off_t)offset, (off_t)length))
+    {
+        static const unsigned char zeros[ZERO_BUF_SIZE];
+        if (lseek(fd, (off_t)offset, SEEK_SET) < 0)
+        {
+            close(fd);
+            return ERR_IO_SEEK;
+        }
+
+        while (length > 0)
+        {
+            size_t count = length < ZERO_BUF_SIZE ? length : ZERO_BUF_SIZE;
+            ssize_t c = write(fd, zeros, count);
+            if (c <= 0)
+            {
+                close(fd);
+                return ERR_IO_WRITE;
+            }
+            length -= c;
+        }
+    }
+
+    if (close(fd))
+        return ERR_IO_CLOSE;
+    return ERR_DONE;
+}
+
+int handle_zero_msg(unsigned char* buf, uint32_t msg_size)
+{
+    char* path = (char*)buf;
+    unsigned char* data = (unsigned char*)memchr(path, '\0', msg_size);
+    if (!data || msg_size - (++data - buf) != 2 * sizeof(uint64_t))
+        return ERR_DATA;
+
+    uint64_t offset = *((uint64_t*)data);
+    uint64_t length = *((uint64_t*)data + 1);
+    return write_zeros(path, offset, length);
+}
+
+int copy_range(const char* path, uint64_t offset, uint64_t src_offset,
+               uint64_t length)
+{
+    int fd = open(path, O_RDWR);
+    if (fd < 0)
+        return ERR_OPEN_FILE;
+
+    off_t disk_size = lseek(fd, 0, SEEK_END);
+    if (disk_size < 0 || offset + length > (uint64_t)disk_size ||
+            src_offset + length > (uint64_t)disk_size)
+    {
+        close(fd);
+        return ERR_OUT_OF_BOUDS;
+    }
+
+    static unsigned char buf[COPY_BUF_SIZE];
+    while (length > 0)
+    {
+        size_t count = length < COPY_BUF_SIZE ? length : COPY_BUF_SIZE;
+        ssize_t c = pread(fd, buf, count, (off_t)src_offset);
+        if (c <= 0)
+        {
+            close(fd);
+            return ERR_IO_SEEK;
+        }
+        if (pwrite(fd, buf, c, (off_t)offset) != c)
+        {
+            close(fd);
+            return ERR_IO_WRITE;
+        }
+        src_offset += c;
+        offset += c;
+        length -= c;
+    }
+
+    if (close(fd))
+        return ERR_IO_CLOSE;
+    return ERR_DONE;
+}
+
+int handle_copy_msg(unsigned char* buf, uint32_t msg_size)
+{
+    char* path = (char*)buf;
+    unsigned char* data = (unsigned char*)memchr(path, '\0', msg_size);
+    if (!data || msg_size - (++data - buf) != 3 * sizeof(uint64_t))
+        return ERR_DATA;
+
+    uint64_t offset = *((uint64_t*)data);
+    uint64_t src_offset = *((uint64_t*)data + 1);
+    uint64_t length = *((uint64_t*)data + 2);
+    return copy_range(path, offset, src_offset, length);
+}
+
 int handle_msg(FILE* input_stream)
 {
     uint32_t msg_id = 0;
@@ -88,8 +207,11 @@ int handle_msg(FILE* input_stream)
     c = fread(&msg_size_inflated, 1, sizeof(uint32_t), input_stream);
     if (c != sizeof(uint32_t))
         return ERR_MSG_SIZE_INFLATED;
-    if (msg_size_inflated != 0 && (msg_size_inflated < MIN_MSG_SIZE ||
-            msg_size_inflated > MAX_MSG_SIZE))
+    if (msg_size_inflated != 0 &&
+            msg_size_inflated != ZERO_MSG_SIZE_INFLATED &&
+            msg_size_inflated != COPY_MSG_SIZE_INFLATED &&
+            (msg_size_inflated < MIN_MSG_SIZE ||
+             msg_size_inflated > MAX_MSG_SIZE))
         return ERR_MSG_SIZE_INFLATED;
 
     unsigned char* buf = (unsigned char*)malloc(msg_size);
@@ -100,6 +222,24 @@ int handle_msg(FILE* input_stream)
     if (c != msg_size)
         return ERR_IO_OPEN;
 
+    if (msg_size_inflated == ZERO_MSG_SIZE_INFLATED ||
+            msg_size_inflated == COPY_MSG_SIZE_INFLATED)
+    {
+        int err;
+        if (msg_size_inflated == ZERO_MSG_SIZE_INFLATED)
+            err = handle_zero_msg(buf, msg_size);
+        else
+            err = handle_copy_msg(buf, msg_size);
+        free(buf);
+        if (err)
+            return err;
+
+        err = write_msg_id(msg_id);
+        if(err)
+            return err;
+        return ERR_MORE_MSG;
+    }
+
     if(msg_size_inflated)
     {
         unsigned char* inflated_buf = (unsigned char*)malloc(msg_size_inflated);
@@ -117,6 +117,11 @@ class BaseRPCClient(object):
         client = self._rpc_client()
         client.cast(ctxt, method, **kwargs)
 
+    def _fanout_cast(self, ctxt, method, **kwargs):
+        client = self._rpc_client()
+        cctxt = client.prepare(fanout=True)
+        cctxt.cast(ctxt, method, **kwargs)
+
     def _cast_for_host(self, host, ctxt, method, **kwargs):
         client = self._rpc_client()
         cctxt = client.prepare(server=host)
@@ -0,0 +1,141 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+""" Filters rating Worker services based on the load they last reported.
+
+The services whose load is unknown or whose last report is older than the
+configured maximum age are given a neutral rating and are never rejected.
+The tasks scheduled on each service since its last report can be passed
+along as pending tasks in order to be accounted for.
+"""
+
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+from coriolis.scheduler.filters import base
+
+
+LOG = logging.getLogger(__name__)
+
+UNKNOWN_LOAD_RATING = 50
+
+
+class BaseLoadFilter(base.BaseServiceFilter):
+
+    def __init__(self, max_load_age, pending_tasks=None):
+        """
+        :param max_load_age: number of seconds after which the load reported
+        by a service is ignored.
+        :param pending_tasks: dict of the form {
+            "<service_id>": ("<task count>", "<disk transfer count>")}
+        with the tasks scheduled on each service since its last report.
+        """
+        self._max_load_age = max_load_age
+        self._pending_tasks = pending_tasks or {}
+
+    def __repr__(self):
+        return "<%s(max_load_age=%s)>" % (
+            self.__class__.__name__, self._max_load_age)
+
+    def _get_service_load(self, service):
+        if not service.load or not service.load_updated_at:
+            return None
+        age = timeutils.delta_seconds(
+            service.load_updated_at, timeutils.utcnow())
+        if age > self._max_load_age:
+            LOG.debug(
+                "Ignoring load of service with ID '%s' which was reported "
+                "%d seconds ago.", service.id, age)
+            return None
+        return service.load
+
+    def _get_running_tasks(self, service, load):
+        pending_tasks, pending_transfers = self._pending_tasks.get(
+            service.id, (0, 0))
+        return (
+            load.get("running_tasks", 0) + pending_tasks,
+            load.get("running_disk_transfers", 0) + pending_transfers)
+
+
+class TaskCapacityFilter(BaseLoadFilter):
+    """ Rejects the services already running as many (disk transfer) tasks
+    as they are configured to.
+    """
+
+    def __init__(self, max_load_age, pending_tasks=None,
+                 disk_transfer=False):
+        super(TaskCapacityFilter, self).__init__(
+            max_load_age, pending_tasks=pending_tasks)
+        self._disk_transfer = disk_transfer
+
+    def __repr__(self):
+        return "<%s(max_load_age=%s, disk_transfer=%s)>" % (
+            self.__class__.__name__, self._max_load_age, self._disk_transfer)
+
+    def rate_service(self, service):
+        load = self._get_service_load(service)
+        if not load:
+            return 100
+
+        running_tasks, running_transfers = self._get_running_tasks(
+            service, load)
+        max_tasks = load.get("max_running_tasks")
+        if max_tasks and running_tasks >= max_tasks:
+            LOG.debug(
+                "Service with ID '%s' is running %d out of a maximum of %d "
+                "tasks.", service.id, running_tasks, max_tasks)
+            return 0
+        max_transfers = load.get("max_running_disk_transfers")
+        if self._disk_transfer and max_transfers and (
+                running_transfers >= max_transfers):
+            LOG.debug(
+                "Service with ID '%s' is running %d out of a maximum of %d "
+                "disk transfers.", service.id, running_transfers,
+                max_transfers)
+            return 0
+
+        return 100
+
+
+class LeastLoadedFilter(BaseLoadFilter):
+    """ Rates services by their CPU and memory usage, as well as by the
+    number of tasks they are running relative to their maximum or, lacking
+    one, their CPU count.
+    """
+
+    def rate_service(self, service):
+        load = self._get_service_load(service)
+        if not load:
+            return UNKNOWN_LOAD_RATING
+
+        running_tasks, _ = self._get_running_tasks(service, load)
+        max_tasks = load.get("max_running_tasks") or load.get(
+            "cpu_count") or 1
+        tasks_percent = min(100, 100 * running_tasks / max_tasks)
+        usage = (
+            load.get("cpu_percent", 0) + load.get("memory_percent", 0) +
+            tasks_percent) / 3
+
+        return max(1, min(100, int(100 - usage)))
+
+
+class NetworkHeadroomFilter(BaseLoadFilter):
+    """ Rates services by the share of their unused network bandwidth which
+    a new disk transfer would get, were the running disk transfers and the
+    new one to share it equally.
+    """
+
+    def rate_service(self, service):
+        load = self._get_service_load(service)
+        if not load:
+            return UNKNOWN_LOAD_RATING
+        capacity = load.get("network_capacity_bytes_per_second")
+        if not capacity:
+            return UNKNOWN_LOAD_RATING
+
+        _, running_transfers = self._get_running_tasks(service, load)
+        headroom = max(
+            0, capacity - load.get("network_bytes_per_second", 0))
+        share = headroom / (running_transfers + 1)
+
+        return max(1, min(100, int(100 * share / capacity)))
@@ -0,0 +1,130 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+""" In-memory cache of the services and regions registered in the DB, which
+the Scheduler makes its decisions on.
+
+The cache is versioned: invalidating it (as the Conductor requests after
+any change to the services or regions) bumps its version, and the snapshot
+of the registry is reloaded on its next use. Snapshots are also reloaded
+after a configurable interval in case an invalidation request was missed.
+"""
+
+import collections
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from coriolis.db import api as db_api
+
+
+registry_opts = [
+    cfg.IntOpt("service_registry_cache_ttl",
+               default=60,
+               min=0,
+               help="Number of seconds for which the Scheduler caches the "
+                    "registered services and regions. 0 disables caching."),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(registry_opts, 'scheduler')
+
+LOG = logging.getLogger(__name__)
+
+
+class RegistrySnapshot(object):
+    """ Snapshot of the registered services and regions, indexed by the
+    properties the Scheduler filters them by.
+    """
+
+    def __init__(self, version, services, regions):
+        self.version = version
+        self.loaded_at = time.time()
+        self.services = services
+        self.regions = regions
+        self.services_by_id = {service.id: service for service in services}
+        self.services_by_topic = collections.defaultdict(list)
+        self.service_ids_by_region = collections.defaultdict(set)
+        self.service_ids_by_provider_type = collections.defaultdict(set)
+        for service in services:
+            self.services_by_topic[service.topic].append(service)
+            for region in service.mapped_regions:
+                self.service_ids_by_region[region.id].add(service.id)
+            for platform, provider_info in (service.providers or {}).items():
+                for provider_type in provider_info.get('types', []):
+                    self.service_ids_by_provider_type[
+                        (platform, provider_type)].add(service.id)
+
+    def get_services(
+            self, topic, region_sets=None, provider_requirements=None):
+        """ Returns the services with the given topic which are mapped to at
+        least one region of each region set and have all the required
+        provider types.
+        """
+        services = self.services_by_topic.get(topic, [])
+        candidate_ids = None
+
+        def _narrow(service_ids):
+            if candidate_ids is None:
+                return set(service_ids)
+            return candidate_ids.intersection(service_ids)
+
+        for region_set in (region_sets or []):
+            if not region_set:
+                continue
+            region_service_ids = set()
+            for region_id in region_set:
+                region_service_ids.update(
+                    self.service_ids_by_region.get(region_id, set()))
+            candidate_ids = _narrow(region_service_ids)
+        for platform, provider_types in (provider_requirements or {}).items():
+            for provider_type in provider_types:
+                candidate_ids = _narrow(
+                    self.service_ids_by_provider_type.get(
+                        (platform, provider_type), set()))
+
+        if candidate_ids is None:
+            return list(services)
+        return [
+            service for service in services if service.id in candidate_ids]
+
+
+class ServiceRegistry(object):
+
+    def __init__(self):
+        self._version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+        LOG.debug(
+            "Invalidated service registry cache (version %d)", self._version)
+
+    def _is_fresh(self, snapshot):
+        return snapshot is not None and (
+            snapshot.version == self._version and (
+                time.time() - snapshot.loaded_at <
+                CONF.scheduler.service_registry_cache_ttl))
+
+    def get_snapshot(self, ctxt):
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot):
+                return snapshot
+            version = self._version
+            snapshot = RegistrySnapshot(
+                version, db_api.get_services(ctxt), db_api.get_regions(ctxt))
+            self._snapshot = snapshot
+        LOG.debug(
+            "Loaded service registry cache (version %d) with %d services and "
+            "%d regions", version, len(snapshot.services),
+            len(snapshot.regions))
+        return snapshot
@@ -21,12 +21,30 @@ LOG = logging.getLogger(__name__)
 scheduler_opts = [
     cfg.IntOpt("scheduler_rpc_timeout",
                help="Number of seconds until RPC calls to the "
-                    "scheduler timeout.")
+                    "scheduler timeout."),
+    cfg.IntOpt("worker_capacity_wait_timeout",
+               default=600,
+               min=0,
+               help="Number of seconds for which to wait for a Worker "
+                    "service to be able to run a task when all of the "
+                    "suitable ones are running as many tasks as they are "
+                    "configured to. The scheduling attempts made during this "
+                    "time are not counted as retries. Only applies to single "
+                    "task scheduling requests, as the Conductor never waits "
+                    "for capacity but retries the scheduling of the tasks "
+                    "later instead.")
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(scheduler_opts, 'scheduler')
 
+_SCHEDULING_FAILED_MESSAGE_FORMAT = (
+    "Failed to schedule task %s after %d tries. This may indicate that"
+    " there are no Coriolis Worker services able to perform the task "
+    "on the platforms and in the Coriolis Regions required by the "
+    "selected source/destination Coriolis Endpoints. Please review"
+    " the Conductor and Scheduler logs for more exact details.")
+
 
 class SchedulerClient(rpc.BaseRPCClient):
     def __init__(self, timeout=None):
@@ -39,12 +57,20 @@ class SchedulerClient(rpc.BaseRPCClient):
     def get_diagnostics(self, ctxt):
         return self._call(ctxt, 'get_diagnostics')
 
+    def invalidate_service_registry(self, ctxt):
+        self._fanout_cast(ctxt, 'invalidate_service_registry')
+
     def get_workers_for_specs(
             self, ctxt, provider_requirements=None,
-            region_sets=None, enabled=None):
+            region_sets=None, enabled=None, task_type=None):
         return self._call(
             ctxt, 'get_workers_for_specs', region_sets=region_sets,
-            enabled=enabled, provider_requirements=provider_requirements)
+            enabled=enabled, provider_requirements=provider_requirements,
+            task_type=task_type)
+
+    def get_workers_for_tasks(self, ctxt, tasks, enabled=True):
+        return self._call(
+            ctxt, 'get_workers_for_tasks', tasks=tasks, enabled=enabled)
 
     def get_any_worker_service(
             self, ctxt, random_choice=False, raise_if_none=True):
@@ -63,19 +89,26 @@ class SchedulerClient(rpc.BaseRPCClient):
 
     def get_worker_service_for_specs(
             self, ctxt, provider_requirements=None, region_sets=None,
-            enabled=True, random_choice=False, raise_on_no_matches=True):
+            enabled=True, random_choice=False, raise_on_no_matches=True,
+            task_type=None):
         """Utility method which ensures at least one service matching
         the provided requirements exists and is usable.
+
+        :param random_choice: whether to pick a random service instead of
+        the first one. Ignored if the task type is given, in which case
+        the first (least loaded) service is always picked, as it is the one
+        the scheduler accounts the task to.
         """
         requirements_str = (
-            "enabled=%s; region_sets=%s; provider_requirements=%s" % (
-                enabled, region_sets, provider_requirements))
+            "enabled=%s; region_sets=%s; provider_requirements=%s; "
+            "task_type=%s" % (
+                enabled, region_sets, provider_requirements, task_type))
         LOG.info(
             "Requesting Worker Service from scheduler with the following "
             "specifications: %s", requirements_str)
         services = self.get_workers_for_specs(
             ctxt, provider_requirements=provider_requirements,
-            region_sets=region_sets, enabled=enabled)
+            region_sets=region_sets, enabled=enabled, task_type=task_type)
         if not services:
             if raise_on_no_matches:
                 raise exception.NoSuitableWorkerServiceError()
@@ -86,7 +119,7 @@ class SchedulerClient(rpc.BaseRPCClient):
             requirements_str, [s["id"] for s in services])
 
         selected_service = services[0]
-        if random_choice:
+        if random_choice and not task_type:
             selected_service = random.choice(services)
 
         LOG.info(
@@ -94,25 +127,11 @@ class SchedulerClient(rpc.BaseRPCClient):
             selected_service['id'], requirements_str)
         return selected_service
 
-    def get_worker_service_for_task(
-            self, ctxt, task, origin_endpoint, destination_endpoint,
-            retry_count=5, retry_period=2, random_choice=True):
-        """ Gets a worker service for the task with the given properties
-        and source/target endpoints.
-
-        :param task: Dict of the form: {
-            "id": "<task_id>",
-            "task_type": "<constants.TASK_TYPE_*>"}
-        :param origin_endpoint: Dict of the form {
-            "id": "<ID>",
-            "mapped_regions": ["List of mapped endpoint regions"]}
-        :param destination_endpoint: Same as origin_endpoint
+    def _get_task_worker_specs(
+            self, task, origin_endpoint, destination_endpoint):
+        """ Returns the region sets and provider requirements which the
+        Worker Service running the given task must satisfy.
         """
-        LOG.debug(
-            "Compiling required Worker Service specs for task with "
-            "ID '%s' (type '%s') from endpoints '%s' to '%s'",
-            task['id'], task['task_type'], origin_endpoint['id'],
-            destination_endpoint['id'])
         task_cls = tasks_factory.get_task_runner_class(
             task['task_type'])
 
@@ -145,8 +164,41 @@ class SchedulerClient(rpc.BaseRPCClient):
                 required_provider_types[
                     constants.PROVIDER_PLATFORM_DESTINATION])
 
+        return required_region_sets, provider_requirements
+
+    def get_worker_service_for_task(
+            self, ctxt, task, origin_endpoint, destination_endpoint,
+            retry_count=5, retry_period=2, random_choice=True,
+            capacity_wait_timeout=None):
+        """ Gets a worker service for the task with the given properties
+        and source/target endpoints.
+
+        :param task: Dict of the form: {
+            "id": "<task_id>",
+            "task_type": "<constants.TASK_TYPE_*>"}
+        :param origin_endpoint: Dict of the form {
+            "id": "<ID>",
+            "mapped_regions": ["List of mapped endpoint regions"]}
+        :param destination_endpoint: Same as origin_endpoint
+        :param capacity_wait_timeout: number of seconds to wait for a Worker
+        service to have capacity for the task. Defaults to the value of the
+        'worker_capacity_wait_timeout' option.
+        """
+        LOG.debug(
+            "Compiling required Worker Service specs for task with "
+            "ID '%s' (type '%s') from endpoints '%s' to '%s'",
+            task['id'], task['task_type'], origin_endpoint['id'],
+            destination_endpoint['id'])
+        required_region_sets, provider_requirements = (
+            self._get_task_worker_specs(
+                task, origin_endpoint, destination_endpoint))
+
         worker_service = None
-        for i in range(retry_count):
+        if capacity_wait_timeout is None:
+            capacity_wait_timeout = CONF.scheduler.worker_capacity_wait_timeout
+        capacity_wait_deadline = time.time() + capacity_wait_timeout
+        i = 0
+        while i < retry_count:
             try:
                 LOG.debug(
                     "Requesting Worker Service for task with ID '%s' (type "
@@ -156,29 +208,115 @@ class SchedulerClient(rpc.BaseRPCClient):
                 worker_service = self.get_worker_service_for_specs(
                     ctxt, provider_requirements=provider_requirements,
                     region_sets=required_region_sets, enabled=True,
-                    random_choice=random_choice)
+                    random_choice=random_choice,
+                    task_type=task['task_type'])
                 LOG.debug(
                     "Scheduler has granted Worker Service '%s' for task with "
                     "ID '%s' (type '%s') from endpoints '%s' to '%s'",
                     worker_service['id'], task['id'], task['task_type'],
                     origin_endpoint['id'], destination_endpoint['id'])
                 return worker_service
+            except exception.WorkerServicesAtCapacityError:
+                if time.time() >= capacity_wait_deadline:
+                    if not capacity_wait_timeout:
+                        raise
+                    i = i + 1
+                LOG.info(
+                    "All Worker Services able to run task with ID '%s' are "
+                    "at capacity. Waiting %d seconds and then retrying.",
+                    task['id'], retry_period)
+                time.sleep(retry_period)
             except Exception:
+                i = i + 1
                 LOG.warn(
                     "Failed to schedule task with ID '%s' (attempt %d/%d). "
                     "Waiting %d seconds and then retrying. Error was: %s",
-                    task['id'], i + 1, retry_count, retry_period,
+                    task['id'], i, retry_count, retry_period,
                     utils.get_exception_details())
                 time.sleep(retry_period)
 
-        message = (
-            "Failed to schedule task %s after %d tries. This may indicate that"
-            " there are no Coriolis Worker services able to perform the task "
-            "on the platforms and in the Coriolis Regions required by the "
-            "selected source/destination Coriolis Endpoints. Please review"
-            " the Conductor and Scheduler logs for more exact details." % (
-                task['id'], retry_count))
+        message = _SCHEDULING_FAILED_MESSAGE_FORMAT % (
+            task['id'], retry_count)
         # db_api.set_task_status(
         #     ctxt, task.id, constants.TASK_STATUS_FAILED_TO_SCHEDULE,
         #     exception_details=message)
         raise exception.NoSuitableWorkerServiceError(message)
+
+    def get_worker_services_for_tasks(
+            self, ctxt, tasks, origin_endpoint, destination_endpoint,
+            retry_count=5, retry_period=2):
+        """ Gets worker services for all the given tasks at once, retrying
+        the scheduling of each task which could not be scheduled the same
+        way as `get_worker_service_for_task` does.
+        The tasks for which all suitable Worker services are at capacity
+        are not waited for, but are immediately reported as errors of type
+        `exception.WorkerServicesAtCapacityError` so the caller may retry
+        scheduling them later.
+
+        :param tasks: list of dicts of the form: {
+            "id": "<task_id>",
+            "task_type": "<constants.TASK_TYPE_*>"}
+        :param origin_endpoint: see `get_worker_service_for_task`
+        :param destination_endpoint: see `get_worker_service_for_task`
+        :return: a tuple of two dicts mapping task IDs to the worker service
+        granted for them and to the exception raised for the tasks which
+        could not be scheduled, respectively.
+        """
+        pending_specs = {}
+        for task in tasks:
+            region_sets, provider_requirements = self._get_task_worker_specs(
+                task, origin_endpoint, destination_endpoint)
+            pending_specs[task['id']] = {
+                "id": task['id'],
+                "task_type": task['task_type'],
+                "region_sets": region_sets,
+                "provider_requirements": provider_requirements}
+
+        worker_services = {}
+        errors = {}
+        attempts = {task_id: 0 for task_id in pending_specs}
+        while pending_specs:
+            LOG.debug(
+                "Requesting Worker Services for tasks with IDs %s from "
+                "endpoints '%s' to '%s'", list(pending_specs.keys()),
+                origin_endpoint['id'], destination_endpoint['id'])
+            try:
+                placements = self.get_workers_for_tasks(
+                    ctxt, list(pending_specs.values()))
+            except Exception:
+                LOG.warn(
+                    "Failed to schedule tasks with IDs %s. Error was: %s",
+                    list(pending_specs.keys()), utils.get_exception_details())
+                placements = {}
+
+            for task_id in list(pending_specs.keys()):
+                placement = placements.get(task_id)
+                if placement and placement["service"]:
+                    worker_services[task_id] = placement["service"]
+                    pending_specs.pop(task_id)
+                    LOG.debug(
+                        "Scheduler has granted Worker Service '%s' for task "
+                        "with ID '%s'", placement["service"]['id'], task_id)
+                    continue
+                if placement and placement["at_capacity"]:
+                    pending_specs.pop(task_id)
+                    errors[task_id] = exception.WorkerServicesAtCapacityError()
+                    LOG.debug(
+                        "All Worker Services able to run task with ID '%s' "
+                        "are at capacity.", task_id)
+                    continue
+                attempts[task_id] += 1
+                if attempts[task_id] >= retry_count:
+                    pending_specs.pop(task_id)
+                    errors[task_id] = exception.NoSuitableWorkerServiceError(
+                        _SCHEDULING_FAILED_MESSAGE_FORMAT % (
+                            task_id, retry_count))
+
+            if pending_specs:
+                LOG.info(
+                    "Failed to schedule tasks with IDs %s. Waiting %d "
+                    "seconds and then retrying.",
+                    list(pending_specs.keys()), retry_period)
+                time.sleep(retry_period)
+
+        return worker_services, errors
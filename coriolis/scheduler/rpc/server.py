@@ -1,14 +1,21 @@
 # Copyright 2020 Cloudbase Solutions Srl
 # All Rights Reserved.
 
+import datetime
+import random
+import threading
+
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import timeutils
 
 from coriolis.conductor.rpc import client as rpc_conductor_client
 from coriolis import constants
 from coriolis.db import api as db_api
 from coriolis import exception
+from coriolis.scheduler.filters import load_filters
 from coriolis.scheduler.filters import trivial_filters
+from coriolis.scheduler import registry
 from coriolis import utils
 
 
@@ -17,7 +24,17 @@ VERSION = "1.0"
 LOG = logging.getLogger(__name__)
 
 
-SCHEDULER_OPTS = []
+SCHEDULER_OPTS = [
+    cfg.BoolOpt("weigh_worker_load",
+                default=True,
+                help="Whether to weigh Worker services by the load they "
+                     "report and enforce their task concurrency limits."),
+    cfg.IntOpt("max_worker_load_age",
+               default=60,
+               min=1,
+               help="Number of seconds after which the load last reported by "
+                    "a Worker service is no longer taken into account."),
+]
 
 CONF = cfg.CONF
 CONF.register_opts(SCHEDULER_OPTS, 'scheduler')
@@ -26,20 +43,38 @@ CONF.register_opts(SCHEDULER_OPTS, 'scheduler')
 class SchedulerServerEndpoint(object):
     def __init__(self):
         self._rpc_conductor_client = rpc_conductor_client.ConductorClient()
+        # NOTE: maps the IDs of Worker services to the times at which tasks
+        # were scheduled on them and whether they were disk transfers, so
+        # that the tasks not yet included in their load reports are
+        # accounted for:
+        self._scheduled_tasks = {}
+        self._scheduled_tasks_lock = threading.Lock()
+        self._service_registry = registry.ServiceRegistry()
 
     def get_diagnostics(self, ctxt):
         return utils.get_diagnostics_info()
 
-    def _get_all_worker_services(self, ctxt):
-        services = db_api.get_services(ctxt)
-        services = trivial_filters.TopicFilter(
-            constants.WORKER_MAIN_MESSAGING_TOPIC).filter_services(
-                services)
+    def invalidate_service_registry(self, ctxt):
+        self._service_registry.invalidate()
+
+    def _get_all_worker_services(self, ctxt, registry_snapshot=None):
+        if registry_snapshot is None:
+            registry_snapshot = self._service_registry.get_snapshot(ctxt)
+        services = registry_snapshot.get_services(
+            constants.WORKER_MAIN_MESSAGING_TOPIC)
         if not services:
             raise exception.NoWorkerServiceError()
 
         return services
 
+    def _refresh_service_loads(self, ctxt, services, service_loads=None):
+        """ Updates the cached services with their latest reported load. """
+        if service_loads is None:
+            service_loads = db_api.get_service_loads(ctxt)
+        for service in services:
+            service.load, service.load_updated_at = service_loads.get(
+                service.id, (None, None))
+
     def _get_weighted_filtered_services(
             self, services, filters, minimum_per_filter_rating=1):
         """ Returns list of services and their scores for the given filters.
@@ -88,6 +123,9 @@ class SchedulerServerEndpoint(object):
             "Determined following scores for services based on filters '%s': "
             "%s", filters, scores)
 
+        # NOTE: the sorting is stable, so shuffling beforehand breaks the
+        # ties between equally rated services randomly:
+        random.shuffle(scores)
         return sorted(
             scores, key=lambda s: s[1], reverse=True)
 
@@ -117,19 +155,142 @@ class SchedulerServerEndpoint(object):
 
         return filtered_regions
 
+    def _get_pending_tasks(self, services):
+        """ Returns a dict with the number of tasks and disk transfers
+        scheduled on each of the given services since their last load report.
+        """
+        pending_tasks = {}
+        min_scheduled_at = timeutils.utcnow() - datetime.timedelta(
+            seconds=CONF.scheduler.max_worker_load_age)
+        with self._scheduled_tasks_lock:
+            for service in services:
+                scheduled = self._scheduled_tasks.pop(service.id, None)
+                if not scheduled:
+                    continue
+                cutoff = min_scheduled_at
+                if service.load_updated_at:
+                    cutoff = max(cutoff, service.load_updated_at)
+                scheduled = [
+                    (scheduled_at, disk_transfer)
+                    for (scheduled_at, disk_transfer) in scheduled
+                    if scheduled_at > cutoff]
+                if not scheduled:
+                    continue
+                self._scheduled_tasks[service.id] = scheduled
+                pending_tasks[service.id] = (
+                    len(scheduled), len([s for s in scheduled if s[1]]))
+        return pending_tasks
+
+    def _record_scheduled_task(self, service, task_type):
+        with self._scheduled_tasks_lock:
+            self._scheduled_tasks.setdefault(service.id, []).append(
+                (timeutils.utcnow(),
+                 task_type in constants.DISK_TRANSFER_TASKS))
+
+    def _get_load_weighted_services(self, services, filters, task_type=None):
+        """ Returns the list of services and their scores for the given
+        filters, as well as their load. If the task type is given, services
+        which cannot run any more tasks of that type are excluded.
+        """
+        max_load_age = CONF.scheduler.max_worker_load_age
+        disk_transfer = task_type in constants.DISK_TRANSFER_TASKS
+        pending_tasks = self._get_pending_tasks(services)
+
+        if task_type:
+            capacity_filter = load_filters.TaskCapacityFilter(
+                max_load_age, pending_tasks=pending_tasks,
+                disk_transfer=disk_transfer)
+            available_services = capacity_filter.filter_services(services)
+            if not available_services:
+                raise exception.WorkerServicesAtCapacityError(
+                    "All of the Coriolis Worker services matching the "
+                    "required criteria (IDs %s) are running as many tasks "
+                    "of type '%s' as they are configured to." % (
+                        [s.id for s in services], task_type))
+            services = available_services
+
+        load_weighing_filters = [load_filters.LeastLoadedFilter(
+            max_load_age, pending_tasks=pending_tasks)]
+        if disk_transfer:
+            load_weighing_filters.append(load_filters.NetworkHeadroomFilter(
+                max_load_age, pending_tasks=pending_tasks))
+
+        return self._get_weighted_filtered_services(
+            services, filters + load_weighing_filters)
+
     def get_workers_for_specs(
             self, ctxt, provider_requirements=None,
-            region_sets=None, enabled=None, filter_disabled_regions=True):
+            region_sets=None, enabled=None, filter_disabled_regions=True,
+            task_type=None):
         """ Returns a list of enabled Worker Services with the specified
-        parameters.
+        parameters, with the most suitable ones first.
         :param provider_requirements: dict of the form {
             "<platform_type>": [constants.PROVIDER_TYPE_*, ...]}
         param region_sets: list of lists of region IDs to filter for.
         Services will be filtered unless they are associated with
         at least one region in each region set.
+        param task_type: the type of the task which is to be scheduled on the
+        first of the returned services, if any. Services which cannot run any
+        more tasks of the type are excluded.
+        """
+        registry_snapshot = self._service_registry.get_snapshot(ctxt)
+        return self._get_workers_for_specs(
+            ctxt, registry_snapshot,
+            provider_requirements=provider_requirements,
+            region_sets=region_sets, enabled=enabled,
+            filter_disabled_regions=filter_disabled_regions,
+            task_type=task_type)
+
+    def get_workers_for_tasks(self, ctxt, tasks, enabled=True):
+        """ Schedules all the given tasks at once, returning a dict with the
+        Worker Service each task was scheduled on or the reason it could not
+        be, of the form: {
+            "<task_id>": {
+                "service": "<service or None>",
+                "error": "<error message or None>",
+                "at_capacity": "<whether all suitable services are full>"}}
+
+        :param tasks: list of dicts of the form: {
+            "id": "<task_id>",
+            "task_type": "<constants.TASK_TYPE_*>",
+            "provider_requirements": "<see get_workers_for_specs>",
+            "region_sets": "<see get_workers_for_specs>"}
         """
+        registry_snapshot = self._service_registry.get_snapshot(ctxt)
+        service_loads = None
+        if CONF.scheduler.weigh_worker_load:
+            service_loads = db_api.get_service_loads(ctxt)
+
+        placements = {}
+        for task in tasks:
+            placement = {"service": None, "error": None, "at_capacity": False}
+            try:
+                placement["service"] = self._get_workers_for_specs(
+                    ctxt, registry_snapshot,
+                    provider_requirements=task.get("provider_requirements"),
+                    region_sets=task.get("region_sets"), enabled=enabled,
+                    task_type=task["task_type"],
+                    service_loads=service_loads)[0]
+            except exception.WorkerServicesAtCapacityError as ex:
+                placement["error"] = str(ex)
+                placement["at_capacity"] = True
+            except Exception as ex:
+                LOG.warn(
+                    "Failed to schedule task with ID '%s' (type '%s'). "
+                    "Error was: %s", task["id"], task["task_type"],
+                    utils.get_exception_details())
+                placement["error"] = str(ex)
+            placements[task["id"]] = placement
+
+        return placements
+
+    def _get_workers_for_specs(
+            self, ctxt, registry_snapshot, provider_requirements=None,
+            region_sets=None, enabled=None, filter_disabled_regions=True,
+            task_type=None, service_loads=None):
         filters = []
-        worker_services = self._get_all_worker_services(ctxt)
+        worker_services = self._get_all_worker_services(
+            ctxt, registry_snapshot=registry_snapshot)
 
         LOG.debug(
             "Searching for Worker Services with specs: %s" % {
@@ -144,7 +305,8 @@ class SchedulerServerEndpoint(object):
                     continue
                 filtered_regions = self._filter_regions(
                     ctxt, region_set, enabled=filter_disabled_regions,
-                    check_all_exist=True)
+                    check_all_exist=True,
+                    regions_cache=registry_snapshot.regions)
                 if not filtered_regions:
                     raise exception.NoSuitableRegionError(
                         "None of the selected Regions (%s) are enabled or "
@@ -156,8 +318,22 @@ class SchedulerServerEndpoint(object):
             filters.append(
                 trivial_filters.ProviderTypesFilter(provider_requirements))
 
+        # NOTE: the indexes of the registry narrow down the services which
+        # the filters are run on, but only the filters rate them:
+        candidate_services = registry_snapshot.get_services(
+            constants.WORKER_MAIN_MESSAGING_TOPIC, region_sets=region_sets,
+            provider_requirements=provider_requirements)
         filtered_services = self._get_weighted_filtered_services(
-            worker_services, filters)
+            candidate_services or worker_services, filters)
+        if CONF.scheduler.weigh_worker_load:
+            self._refresh_service_loads(
+                ctxt, [s[0] for s in filtered_services],
+                service_loads=service_loads)
+            filtered_services = self._get_load_weighted_services(
+                [s[0] for s in filtered_services], filters,
+                task_type=task_type)
+            if task_type:
+                self._record_scheduled_task(filtered_services[0][0], task_type)
         LOG.info(
             "Found Worker Services %s for specs: %s" % (
                 filtered_services, {
@@ -2,8 +2,13 @@
 # All Rights Reserved.
 
 # NOTE: we neeed to make sure eventlet is imported:
+import collections
 import multiprocessing
+import os
 import sys
+import threading
+import time
+import uuid
 import eventlet  # noqa
 
 from logging import handlers
@@ -11,11 +16,39 @@ from oslo_config import cfg
 from oslo_log import log as logging
 from six.moves import queue
 from taskflow import engines
+from taskflow import states
 from taskflow.types import notifier
 
 from coriolis import utils
 
 
+taskflow_runner_opts = [
+    cfg.IntOpt(
+        "background_flow_processes",
+        default=4,
+        min=0,
+        help="Number of long-lived processes which run the flows started in "
+             "the background, such as the minion pool operations. Flows "
+             "started while all the processes are running their maximum "
+             "number of flows are queued until one finishes. Set to 0 to "
+             "start a new process for each flow instead."),
+    cfg.IntOpt(
+        "background_flows_per_process",
+        default=20,
+        min=1,
+        help="Maximum number of flows each of the long-lived background "
+             "flow processes runs at the same time."),
+    cfg.IntOpt(
+        "background_flow_process_max_flows",
+        default=100,
+        min=1,
+        help="Number of flows after which a long-lived background flow "
+             "process is replaced with a new one once it finishes running "
+             "its current flows.")]
+
+CONF = cfg.CONF
+CONF.register_opts(taskflow_runner_opts, 'taskflow')
+
 LOG = logging.getLogger(__name__)
 
 TASKFLOW_EXECUTION_ORDER_PARALLEL = 'parallel'
@@ -25,6 +58,20 @@ TASKFLOW_EXECUTOR_THREADED = "threaded"
 TASKFLOW_EXECUTOR_PROCESSES = "processes"
 TASKFLOW_EXECUTOR_GREENTHREADED = "greenthreaded"
 
+BACKGROUND_FLOW_STATUS_QUEUED = "QUEUED"
+BACKGROUND_FLOW_STATUS_RUNNING = "RUNNING"
+BACKGROUND_FLOW_STATUS_CANCELLING = "CANCELLING"
+BACKGROUND_FLOW_STATUS_FINISHED = "FINISHED"
+
+_BACKGROUND_FLOW_ACTION_RUN = "run"
+_BACKGROUND_FLOW_ACTION_CANCEL = "cancel"
+
+BACKGROUND_FLOW_PARENT_CHECK_INTERVAL = 5
+BACKGROUND_FLOW_PROCESS_CHECK_INTERVAL = 5
+
+_BACKGROUND_FLOW_POOLS = {}
+_BACKGROUND_FLOW_POOLS_LOCK = threading.Lock()
+
 
 class TaskFlowRunner(object):
 
@@ -66,7 +113,9 @@ class TaskFlowRunner(object):
     def _run_flow(self, flow, store=None):
         LOG.debug("Ramping up to run flow with name '%s'", flow.name)
         engine = self._setup_engine_for_flow(flow, store=store)
+        self._run_engine(flow, engine)
 
+    def _run_engine(self, flow, engine):
         LOG.debug("Attempting to compile flow with name '%s'", flow.name)
         engine.compile()
 
@@ -82,6 +131,11 @@ class TaskFlowRunner(object):
                 "Full trace was: %s", flow.name,
                 utils.get_exception_details())
             raise
+        if engine.storage.get_flow_state() == states.SUSPENDED:
+            LOG.info(
+                "Flow with name '%s' was cancelled. Statistics were: %s",
+                flow.name, engine.statistics)
+            return
         LOG.info(
             "Successfully ran flow with name '%s'. Statistics were: %s",
             flow.name, engine.statistics)
@@ -104,6 +158,71 @@ class TaskFlowRunner(object):
         self._setup_task_process_logging(mp_log_queue)
         self._run_flow(flow, store=store)
 
+    def _run_flows_in_process(
+            self, parent_pid, job_q, status_q, mp_log_queue):
+        """ Runs the flows received through the job queue in separate
+        threads until None is received or the parent process dies,
+        reporting their status changes.
+        """
+        self._setup_task_process_logging(mp_log_queue)
+        dispatched_flow_ids = set()
+        running_engines = {}
+        cancelled_flow_ids = set()
+        lock = threading.Lock()
+
+        def _run_flow_in_thread(flow_id, flow, store):
+            error = None
+            try:
+                engine = self._setup_engine_for_flow(flow, store=store)
+                with lock:
+                    if flow_id in cancelled_flow_ids:
+                        LOG.info(
+                            "Not running flow '%s' (ID '%s') as it was "
+                            "cancelled.", flow.name, flow_id)
+                        return
+                    running_engines[flow_id] = engine
+                status_q.put((flow_id, BACKGROUND_FLOW_STATUS_RUNNING, None))
+                self._run_engine(flow, engine)
+            except Exception as ex:
+                error = str(ex)
+            finally:
+                with lock:
+                    dispatched_flow_ids.discard(flow_id)
+                    running_engines.pop(flow_id, None)
+                    cancelled_flow_ids.discard(flow_id)
+                status_q.put((flow_id, BACKGROUND_FLOW_STATUS_FINISHED, error))
+
+        # NOTE: the flows running in daemon threads stop along with the
+        # process should the parent process die:
+        while os.getppid() == parent_pid:
+            try:
+                message = job_q.get(
+                    timeout=BACKGROUND_FLOW_PARENT_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            if message is None:
+                break
+            action, flow_id, args = message
+            if action == _BACKGROUND_FLOW_ACTION_RUN:
+                with lock:
+                    dispatched_flow_ids.add(flow_id)
+                thread = threading.Thread(
+                    target=_run_flow_in_thread, args=(flow_id,) + args)
+                thread.daemon = True
+                thread.start()
+            elif action == _BACKGROUND_FLOW_ACTION_CANCEL:
+                with lock:
+                    # NOTE: flows which already finished are ignored:
+                    if flow_id not in dispatched_flow_ids:
+                        continue
+                    engine = running_engines.get(flow_id)
+                    if engine is None:
+                        cancelled_flow_ids.add(flow_id)
+                if engine is not None:
+                    # NOTE: the tasks which are already running are left to
+                    # complete, but no further tasks get started:
+                    engine.suspend()
+
     def _handle_mp_log_events(self, p, mp_log_q):
         while True:
             try:
@@ -113,7 +232,7 @@ class TaskFlowRunner(object):
                 logger = logging.getLogger(record.name).logger
                 logger.handle(record)
             except queue.Empty:
-                if not p.is_alive():
+                if p is not None and not p.is_alive():
                     break
 
     def _spawn_process_flow(self, flow, store=None):
@@ -129,6 +248,17 @@ class TaskFlowRunner(object):
             "PID: '%d'", flow.name, process.pid)
         eventlet.spawn(self._handle_mp_log_events, process, mp_log_q)
 
+    def _get_background_flow_pool(self):
+        with _BACKGROUND_FLOW_POOLS_LOCK:
+            pool = _BACKGROUND_FLOW_POOLS.get(self._service_name)
+            if pool is None:
+                pool = _BackgroundFlowProcessPool(
+                    self, CONF.taskflow.background_flow_processes,
+                    CONF.taskflow.background_flows_per_process,
+                    CONF.taskflow.background_flow_process_max_flows)
+                _BACKGROUND_FLOW_POOLS[self._service_name] = pool
+            return pool
+
     def run_flow_in_background(self, flow, store=None):
         """ Starts the given flow in the background in a separate process.
         Does NOT return/store any result.
@@ -138,5 +268,254 @@ class TaskFlowRunner(object):
         Care should be taken that any fields/attributes within the tasks
         are thread/fork-safe.
         The 'store' inputs should also only contain be thread-safe datatypes.
+
+        Returns the ID of the background flow, or None if it was started in
+        a process of its own.
         """
-        self._spawn_process_flow(flow, store=store)
+        if not CONF.taskflow.background_flow_processes:
+            self._spawn_process_flow(flow, store=store)
+            return None
+        return self._get_background_flow_pool().submit(flow, store=store)
+
+    def get_background_flows(self, name_prefix=None):
+        """ Returns a list with the ID, name and status of the flows which
+        are queued or running in the background, optionally only those
+        whose names start with the given prefix.
+        Only the flows started from the current process are returned, as
+        each process has a background flow pool of its own.
+        """
+        if not CONF.taskflow.background_flow_processes:
+            return []
+        return self._get_background_flow_pool().get_flows(
+            name_prefix=name_prefix)
+
+    def cancel_background_flow(self, flow_id):
+        """ Cancels the background flow with the given ID. Queued flows are
+        dropped, while running ones stop once their currently running tasks
+        complete. Returns whether the flow was found, which it can only be
+        if it was started from the current process.
+        """
+        if not CONF.taskflow.background_flow_processes:
+            return False
+        return self._get_background_flow_pool().cancel(flow_id)
+
+    def get_background_flow_stats(self):
+        if not CONF.taskflow.background_flow_processes:
+            return {}
+        return self._get_background_flow_pool().get_stats()
+
+
+class _BackgroundFlowProcessPool(object):
+    """ Bounded pool of long-lived processes which run background flows.
+
+    The processes are spawned on demand and kept running, so the config
+    parsing and imports only happen once per process instead of once per
+    flow. Flows are dispatched to the least loaded process, or queued until
+    one has room for more. Processes which have run their maximum number of
+    flows get no new ones and are stopped once their current flows finish.
+    Processes which die are periodically detected, with their flows counted
+    as failed and the queued flows dispatched to new processes.
+
+    Each process of a service has a pool of its own, so the pool only knows
+    of the flows started from the process it belongs to.
+    """
+
+    def __init__(
+            self, runner, num_processes, flows_per_process,
+            max_flows_per_process):
+        self._runner = runner
+        self._num_processes = num_processes
+        self._flows_per_process = flows_per_process
+        self._max_flows_per_process = max_flows_per_process
+        self._mp_ctx = multiprocessing.get_context('spawn')
+        self._mp_log_q = self._mp_ctx.Queue()
+        self._status_q = self._mp_ctx.Queue()
+        self._lock = threading.Lock()
+        self._processes = []
+        self._flows = collections.OrderedDict()
+        self._queue = collections.deque()
+        self._started_count = 0
+        self._finished_count = 0
+        self._failed_count = 0
+        self._total_queue_time = 0
+        self._total_run_time = 0
+        eventlet.spawn(
+            self._runner._handle_mp_log_events, None, self._mp_log_q)
+        eventlet.spawn(self._handle_status_events)
+
+    def _spawn_process(self):
+        job_q = self._mp_ctx.Queue()
+        process = self._mp_ctx.Process(
+            target=self._runner._run_flows_in_process,
+            args=(os.getpid(), job_q, self._status_q, self._mp_log_q))
+        process.daemon = True
+        process.start()
+        LOG.debug(
+            "Sucessfully started background flow process with PID: '%d'",
+            process.pid)
+        return {
+            "process": process, "job_q": job_q, "flow_ids": set(),
+            "flows_run": 0}
+
+    def _is_process_retired(self, proc):
+        return proc["flows_run"] >= self._max_flows_per_process
+
+    def _check_processes(self):
+        for proc in list(self._processes):
+            if not proc["process"].is_alive():
+                LOG.error(
+                    "Background flow process with PID '%s' has died while "
+                    "running flows: %s", proc["process"].pid,
+                    [self._flows[fid]["name"] for fid in proc["flow_ids"]])
+                for flow_id in proc["flow_ids"]:
+                    self._flows.pop(flow_id, None)
+                    self._failed_count += 1
+                self._processes.remove(proc)
+            elif self._is_process_retired(proc) and not proc["flow_ids"]:
+                LOG.debug(
+                    "Stopping background flow process with PID '%d' after "
+                    "it ran %d flows", proc["process"].pid,
+                    proc["flows_run"])
+                proc["job_q"].put(None)
+                self._processes.remove(proc)
+
+    def _dispatch_flows(self):
+        self._check_processes()
+        while self._queue:
+            active_processes = [
+                proc for proc in self._processes
+                if not self._is_process_retired(proc)]
+            candidates = [
+                proc for proc in active_processes
+                if len(proc["flow_ids"]) < self._flows_per_process]
+            if not candidates:
+                # NOTE: retired processes still finishing their flows do
+                # not count against the number of processes:
+                if len(active_processes) >= self._num_processes:
+                    return
+                self._processes.append(self._spawn_process())
+                continue
+            proc = min(candidates, key=lambda p: len(p["flow_ids"]))
+            flow_id, flow, store = self._queue.popleft()
+            flow_info = self._flows[flow_id]
+            flow_info["process"] = proc
+            proc["flow_ids"].add(flow_id)
+            proc["flows_run"] += 1
+            proc["job_q"].put(
+                (_BACKGROUND_FLOW_ACTION_RUN, flow_id, (flow, store)))
+            LOG.debug(
+                "Dispatched flow '%s' (ID '%s') to background flow process "
+                "with PID '%d'", flow_info["name"], flow_id,
+                proc["process"].pid)
+
+    def _handle_status_events(self):
+        last_check = time.time()
+        while True:
+            # NOTE: dead processes report nothing, so the processes are
+            # checked periodically regardless of any status events:
+            if time.time() - last_check >= (
+                    BACKGROUND_FLOW_PROCESS_CHECK_INTERVAL):
+                with self._lock:
+                    self._dispatch_flows()
+                last_check = time.time()
+            try:
+                flow_id, status, error = self._status_q.get(timeout=1)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._handle_status_event(flow_id, status, error)
+
+    def _handle_status_event(self, flow_id, status, error):
+        flow_info = self._flows.get(flow_id)
+        if not flow_info:
+            return
+        now = time.time()
+        if status == BACKGROUND_FLOW_STATUS_RUNNING:
+            if flow_info["status"] == BACKGROUND_FLOW_STATUS_QUEUED:
+                flow_info["status"] = status
+            flow_info["started_at"] = now
+            queue_time = now - flow_info["queued_at"]
+            self._started_count += 1
+            self._total_queue_time += queue_time
+            LOG.info(
+                "Background flow '%s' (ID '%s') started after being "
+                "queued for %.2f seconds. Currently queued flows: %d",
+                flow_info["name"], flow_id, queue_time, len(self._queue))
+            return
+
+        self._flows.pop(flow_id)
+        flow_info["process"]["flow_ids"].discard(flow_id)
+        run_time = now - flow_info.get("started_at", now)
+        self._total_run_time += run_time
+        self._finished_count += 1
+        if error:
+            self._failed_count += 1
+        LOG.info(
+            "Background flow '%s' (ID '%s') finished after running "
+            "for %.2f seconds%s", flow_info["name"], flow_id,
+            run_time, " with error: %s" % error if error else "")
+        self._dispatch_flows()
+
+    def submit(self, flow, store=None):
+        flow_id = str(uuid.uuid4())
+        with self._lock:
+            self._flows[flow_id] = {
+                "name": flow.name,
+                "status": BACKGROUND_FLOW_STATUS_QUEUED,
+                "queued_at": time.time(),
+                "process": None}
+            self._queue.append((flow_id, flow, store))
+            LOG.debug(
+                "Queued flow '%s' (ID '%s') for running in the background. "
+                "Currently queued flows: %d", flow.name, flow_id,
+                len(self._queue))
+            self._dispatch_flows()
+        return flow_id
+
+    def get_flows(self, name_prefix=None):
+        with self._lock:
+            return [{
+                "id": flow_id,
+                "name": flow_info["name"],
+                "status": flow_info["status"]}
+                for flow_id, flow_info in self._flows.items()
+                if not name_prefix or (
+                    flow_info["name"].startswith(name_prefix))]
+
+    def cancel(self, flow_id):
+        with self._lock:
+            flow_info = self._flows.get(flow_id)
+            if not flow_info:
+                return False
+            if flow_info["process"] is None:
+                self._flows.pop(flow_id)
+                self._queue = collections.deque(
+                    job for job in self._queue if job[0] != flow_id)
+                LOG.info(
+                    "Cancelled queued background flow '%s' (ID '%s')",
+                    flow_info["name"], flow_id)
+                return True
+            flow_info["status"] = BACKGROUND_FLOW_STATUS_CANCELLING
+            flow_info["process"]["job_q"].put(
+                (_BACKGROUND_FLOW_ACTION_CANCEL, flow_id, ()))
+            LOG.info(
+                "Cancelling running background flow '%s' (ID '%s')",
+                flow_info["name"], flow_id)
+            return True
+
+    def get_stats(self):
+        with self._lock:
+            statuses = collections.Counter(
+                flow_info["status"] for flow_info in self._flows.values())
+            return {
+                "processes": len(self._processes),
+                "queued_flows": len(self._queue),
+                "running_flows": (
+                    statuses[BACKGROUND_FLOW_STATUS_RUNNING] +
+                    statuses[BACKGROUND_FLOW_STATUS_CANCELLING]),
+                "finished_flows": self._finished_count,
+                "failed_flows": self._failed_count,
+                "average_queue_time": (
+                    self._total_queue_time / (self._started_count or 1)),
+                "average_run_time": (
+                    self._total_run_time / (self._finished_count or 1))}
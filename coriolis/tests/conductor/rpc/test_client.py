@@ -0,0 +1,105 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+from unittest import mock
+
+from coriolis.conductor.rpc import client
+from coriolis import constants
+from coriolis.tests import test_base
+
+
+class ConductorTaskRpcEventHandlerTestCase(test_base.CoriolisBaseTestCase):
+    """Test suite for the Coriolis Conductor task RPC event handler."""
+
+    def setUp(self):
+        super(ConductorTaskRpcEventHandlerTestCase, self).setUp()
+        self.rpc_client = mock.Mock()
+        self.handler = client.ConductorTaskRpcEventHandler(
+            mock.sentinel.context, mock.sentinel.task_id)
+        self.handler._rpc_conductor_client_instance = self.rpc_client
+
+    @mock.patch.object(client.eventlet, "spawn")
+    def test_batched_events(self, mock_spawn):
+        self.handler.add_event("event 1")
+        self.handler.add_progress_update("update 1")
+        for step in range(1, 5):
+            self.handler.update_progress_update(3, step)
+        self.handler.update_progress_update(
+            3, 5, new_total_steps=10, new_message="message")
+        self.handler.add_event(
+            "event 2", level=constants.TASK_EVENT_WARNING)
+
+        self.rpc_client.add_task_event.assert_not_called()
+        self.rpc_client.update_task_progress_update.assert_not_called()
+        mock_spawn.assert_called_once_with(
+            self.handler._flush_periodically)
+
+        self.handler.flush()
+
+        self.rpc_client.add_task_events.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.task_id, [
+                {"level": constants.TASK_EVENT_INFO, "message": "event 1"},
+                {"level": constants.TASK_EVENT_WARNING,
+                 "message": "event 2"}], wait=False)
+        self.rpc_client.add_task_progress_updates.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.task_id, [
+                {"message": "update 1", "initial_step": 0,
+                 "total_steps": 0}], wait=False)
+        self.rpc_client.update_task_progress_updates.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.task_id, [
+                {"index": 3, "current_step": 5, "total_steps": 10,
+                 "message": "message"}], wait=False)
+
+        # nothing left to send:
+        self.rpc_client.reset_mock()
+        self.handler.flush()
+        self.assertEqual([], self.rpc_client.mock_calls)
+
+    @mock.patch.object(client.eventlet, "spawn")
+    def test_flush_wait(self, mock_spawn):
+        self.handler.add_event("event")
+        self.handler.add_progress_update("update")
+
+        self.handler.flush(wait=True)
+
+        self.rpc_client.add_task_events.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.task_id,
+            [{"level": constants.TASK_EVENT_INFO, "message": "event"}],
+            wait=True)
+        self.rpc_client.add_task_progress_updates.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.task_id,
+            [{"message": "update", "initial_step": 0, "total_steps": 0}],
+            wait=True)
+
+    @mock.patch.object(client.eventlet, "spawn")
+    def test_synchronous_progress_update_flushes(self, mock_spawn):
+        self.handler.add_event("event")
+
+        result = self.handler.add_progress_update(
+            "update", total_steps=10, return_event=True)
+
+        self.assertEqual(
+            self.rpc_client.add_task_progress_update.return_value, result)
+        self.assertEqual(
+            ["add_task_events", "add_task_progress_update"],
+            [c[0] for c in self.rpc_client.method_calls])
+
+    def test_batching_disabled(self):
+        client.CONF.set_override(
+            "task_events_flush_interval", 0, group="conductor")
+        self.addCleanup(
+            client.CONF.clear_override, "task_events_flush_interval",
+            group="conductor")
+        handler = client.ConductorTaskRpcEventHandler(
+            mock.sentinel.context, mock.sentinel.task_id)
+        handler._rpc_conductor_client_instance = self.rpc_client
+
+        handler.add_event("event")
+        handler.update_progress_update(3, 5)
+
+        self.rpc_client.add_task_event.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.task_id,
+            constants.TASK_EVENT_INFO, "event")
+        self.rpc_client.update_task_progress_update.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.task_id, 3, 5,
+            new_total_steps=None, new_message=None)
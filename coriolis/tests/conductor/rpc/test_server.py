@@ -9,16 +9,17 @@ from unittest import mock
 
 from coriolis.conductor.rpc import server
 from coriolis import constants
+from coriolis import context
 from coriolis.db import api as db_api
 from coriolis.db.sqlalchemy import models
 from coriolis import exception
 from coriolis.licensing import client as licensing_client
+from coriolis import locks
 from coriolis import schemas
 from coriolis.tests import test_base
 from coriolis.tests import testutils
 from coriolis import utils
 from coriolis.worker.rpc import client as rpc_worker_client
-from oslo_concurrency import lockutils
 from oslo_config import cfg
 
 
@@ -55,12 +56,10 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
     @mock.patch.object(
         rpc_worker_client.WorkerClient, "from_service_definition"
     )
-    @mock.patch.object(db_api, "get_service")
     @mock.patch.object(server.ConductorServerEndpoint, "_scheduler_client")
     def test_get_worker_service_rpc_for_specs(
             self,
             mock_scheduler_client,
-            mock_get_service,
             mock_from_service_definition,
     ):
         # returns dictionary with id and rpc
@@ -80,9 +79,8 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             random_choice=False,
             raise_on_no_matches=True,
         )
-        mock_get_service.assert_called_once_with(
-            mock.sentinel.context, mock.sentinel.worker_id
-        )
+        mock_from_service_definition.assert_called_once_with(
+            worker_service.return_value)
 
         self.assertEqual(result, mock_from_service_definition.return_value)
 
@@ -679,55 +677,225 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
     @mock.patch.object(
         rpc_worker_client.WorkerClient, "from_service_definition"
     )
+    @mock.patch.object(db_api, "set_tasks_hosts")
     @mock.patch.object(db_api, "set_task_status")
     @mock.patch.object(server.ConductorServerEndpoint, "_scheduler_client")
-    def test_get_worker_service_rpc_for_task(
+    def test_get_worker_service_rpcs_for_tasks(
             self,
             mock_scheduler_client,
             mock_set_task_status,
+            mock_set_tasks_hosts,
             mock_service_definition,
     ):
-        task_mock = mock.Mock()
-        service = self.server._get_worker_service_rpc_for_task(
-            mock.sentinel.context,
-            task_mock,
+        task_1 = mock.Mock(id=mock.sentinel.task_1)
+        task_2 = mock.Mock(id=mock.sentinel.task_2)
+        service_1 = {"host": mock.sentinel.host_1}
+        service_2 = {"host": mock.sentinel.host_2}
+        mock_scheduler_client.get_worker_services_for_tasks.return_value = (
+            {mock.sentinel.task_1: service_1,
+             mock.sentinel.task_2: service_2}, {})
+        rpcs = self.server._get_worker_service_rpcs_for_tasks(
+            mock.sentinel.context,
+            [task_1, task_2],
             mock.sentinel.origin_endpoint,
             mock.sentinel.destination_endpoint,
         )
-        mock_scheduler_client.get_worker_service_for_task\
+        mock_scheduler_client.get_worker_services_for_tasks\
             .assert_called_once_with(
                 mock.sentinel.context,
-                {"id": task_mock.id, "task_type": task_mock.task_type},
+                [{"id": task_1.id, "task_type": task_1.task_type},
+                 {"id": task_2.id, "task_type": task_2.task_type}],
                 mock.sentinel.origin_endpoint,
                 mock.sentinel.destination_endpoint,
                 retry_count=5,
                 retry_period=2,
-                random_choice=True,
             )
-        mock_service_definition.assert_called_once_with(
-            mock_scheduler_client.get_worker_service_for_task.return_value
-        )
-        self.assertEqual(service, mock_service_definition.return_value)
+        self.assertEqual(
+            rpcs, {mock.sentinel.task_1: mock_service_definition.return_value,
+                   mock.sentinel.task_2: mock_service_definition.return_value})
         mock_set_task_status.assert_not_called()
+        mock_set_tasks_hosts.assert_called_once_with(
+            mock.sentinel.context,
+            {mock.sentinel.task_1: mock.sentinel.host_1,
+             mock.sentinel.task_2: mock.sentinel.host_2})
 
-        # Handles exception
-        mock_scheduler_client.get_worker_service_for_task.side_effect = (
-            CoriolisTestException("test")
-        )
-        self.assertRaises(
+        # Marks each unscheduleable task and raises the first error
+        mock_set_tasks_hosts.reset_mock()
+        mock_scheduler_client.get_worker_services_for_tasks.return_value = (
+            {}, {mock.sentinel.task_1: CoriolisTestException("test1"),
+                 mock.sentinel.task_2: CoriolisTestException("test2")})
+        self.assertRaisesRegex(
             CoriolisTestException,
-            self.server._get_worker_service_rpc_for_task,
+            "test1",
+            self.server._get_worker_service_rpcs_for_tasks,
             mock.sentinel.context,
-            task_mock,
+            [task_1, task_2],
             mock.sentinel.origin_endpoint,
             mock.sentinel.destination_endpoint,
         )
-        mock_set_task_status.assert_called_once_with(
+        mock_set_task_status.assert_has_calls([
+            mock.call(
+                mock.sentinel.context,
+                mock.sentinel.task_1,
+                constants.TASK_STATUS_FAILED_TO_SCHEDULE,
+                exception_details="test1"),
+            mock.call(
+                mock.sentinel.context,
+                mock.sentinel.task_2,
+                constants.TASK_STATUS_FAILED_TO_SCHEDULE,
+                exception_details="test2"),
+        ])
+        mock_set_tasks_hosts.assert_not_called()
+
+        # Leaves out the tasks for which all Workers are at capacity
+        mock_set_task_status.reset_mock()
+        mock_scheduler_client.get_worker_services_for_tasks.return_value = (
+            {mock.sentinel.task_1: service_1},
+            {mock.sentinel.task_2: exception.WorkerServicesAtCapacityError()})
+        rpcs = self.server._get_worker_service_rpcs_for_tasks(
             mock.sentinel.context,
-            task_mock.id,
-            constants.TASK_STATUS_FAILED_TO_SCHEDULE,
-            exception_details="test",
+            [task_1, task_2],
+            mock.sentinel.origin_endpoint,
+            mock.sentinel.destination_endpoint,
         )
+        self.assertEqual(
+            rpcs, {mock.sentinel.task_1: mock_service_definition.return_value})
+        mock_set_task_status.assert_not_called()
+        mock_set_tasks_hosts.assert_called_once_with(
+            mock.sentinel.context,
+            {mock.sentinel.task_1: mock.sentinel.host_1})
+
+    @mock.patch.object(server.ConductorServerEndpoint, "_capacity_retry_loop")
+    @mock.patch.object(db_api, "add_task_event")
+    @mock.patch.object(
+        server.ConductorServerEndpoint, "_get_worker_service_rpcs_for_tasks"
+    )
+    @mock.patch.object(db_api, "set_tasks_statuses")
+    def test_start_tasks_defers_tasks_at_capacity(
+            self,
+            mock_set_tasks_statuses,
+            mock_get_worker_service_rpcs_for_tasks,
+            mock_add_task_event,
+            mock_capacity_retry_loop,
+    ):
+        task_1 = mock.Mock(id=mock.sentinel.task_1)
+        task_2 = mock.Mock(id=mock.sentinel.task_2)
+        execution = mock.Mock(id=mock.sentinel.execution_id)
+        worker_rpc = mock.Mock()
+        mock_get_worker_service_rpcs_for_tasks.return_value = {
+            mock.sentinel.task_1: worker_rpc}
+
+        started_tasks = self.server._start_tasks(
+            mock.sentinel.context, execution, [task_1, task_2],
+            mock.sentinel.origin, mock.sentinel.destination,
+            mock.sentinel.origin_endpoint, mock.sentinel.destination_endpoint,
+            {mock.sentinel.task_1: mock.sentinel.task_info_1,
+             mock.sentinel.task_2: mock.sentinel.task_info_2})
+
+        self.assertEqual([mock.sentinel.task_1], started_tasks)
+        worker_rpc.begin_task.assert_called_once_with(
+            mock.sentinel.context,
+            task_id=mock.sentinel.task_1,
+            task_type=task_1.task_type,
+            origin=mock.sentinel.origin,
+            destination=mock.sentinel.destination,
+            instance=task_1.instance,
+            task_info=mock.sentinel.task_info_1)
+        mock_add_task_event.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.task_2,
+            constants.TASK_EVENT_INFO, mock.ANY)
+        self.assertTrue(self.server._capacity_deferred_tasks_found)
+        self.assertIsNotNone(self.server._capacity_retry_thread)
+        self.server._capacity_retry_thread.wait()
+        mock_capacity_retry_loop.assert_called_once_with()
+
+    @mock.patch.object(
+        server.ConductorServerEndpoint, "_start_capacity_deferred_tasks"
+    )
+    @mock.patch.object(db_api, "get_capacity_deferred_tasks")
+    @mock.patch.object(context, "get_admin_context")
+    def test_retry_capacity_deferred_tasks(
+            self,
+            mock_get_admin_context,
+            mock_get_capacity_deferred_tasks,
+            mock_start_capacity_deferred_tasks,
+    ):
+        mock_get_capacity_deferred_tasks.return_value = [
+            mock.Mock(execution_id=mock.sentinel.execution_1),
+            mock.Mock(execution_id=mock.sentinel.execution_1),
+            mock.Mock(execution_id=mock.sentinel.execution_2)]
+        mock_start_capacity_deferred_tasks.side_effect = [
+            CoriolisTestException(), None]
+
+        self.server._retry_capacity_deferred_tasks()
+
+        # the failure of one execution does not affect the others:
+        mock_start_capacity_deferred_tasks.assert_has_calls([
+            mock.call(mock.sentinel.execution_1),
+            mock.call(mock.sentinel.execution_2)], any_order=True)
+        self.assertEqual(2, mock_start_capacity_deferred_tasks.call_count)
+        self.assertTrue(self.server._capacity_deferred_tasks_found)
+
+        mock_start_capacity_deferred_tasks.reset_mock()
+        mock_get_capacity_deferred_tasks.return_value = []
+        self.server._retry_capacity_deferred_tasks()
+        mock_start_capacity_deferred_tasks.assert_not_called()
+        self.assertFalse(self.server._capacity_deferred_tasks_found)
+
+    @mock.patch.object(locks, "lock")
+    @mock.patch.object(server.ConductorServerEndpoint, "_start_tasks")
+    @mock.patch.object(db_api, "get_action_instance_info")
+    @mock.patch.object(db_api, "get_endpoint")
+    @mock.patch.object(server.ConductorServerEndpoint, "_get_task_destination")
+    @mock.patch.object(server.ConductorServerEndpoint, "_get_task_origin")
+    @mock.patch.object(db_api, "get_capacity_deferred_tasks")
+    @mock.patch.object(db_api, "get_tasks_execution")
+    @mock.patch.object(context, "get_admin_context")
+    def test_start_capacity_deferred_tasks(
+            self,
+            mock_get_admin_context,
+            mock_get_tasks_execution,
+            mock_get_capacity_deferred_tasks,
+            mock_get_task_origin,
+            mock_get_task_destination,
+            mock_get_endpoint,
+            mock_get_action_instance_info,
+            mock_start_tasks,
+            mock_lock,
+    ):
+        execution = mock.Mock(
+            trust_id=mock.sentinel.trust_id, delete_trust_id=True)
+        mock_get_tasks_execution.return_value = execution
+        deferred_task = mock.Mock(id=mock.sentinel.task_id)
+        mock_get_capacity_deferred_tasks.return_value = [deferred_task]
+
+        self.server._start_capacity_deferred_tasks(mock.sentinel.execution_id)
+
+        mock_lock.assert_called_once_with(
+            constants.EXECUTION_LOCK_NAME_FORMAT % mock.sentinel.execution_id)
+        # the tasks are started with the trust of the execution:
+        mock_get_admin_context.assert_called_with(
+            trust_id=mock.sentinel.trust_id)
+        ctxt = mock_get_admin_context.return_value
+        self.assertTrue(ctxt.delete_trust_id)
+        mock_get_capacity_deferred_tasks.assert_called_once_with(
+            ctxt, execution_id=mock.sentinel.execution_id)
+        mock_start_tasks.assert_called_once_with(
+            ctxt,
+            execution,
+            [deferred_task],
+            mock_get_task_origin.return_value,
+            mock_get_task_destination.return_value,
+            mock_get_endpoint.return_value,
+            mock_get_endpoint.return_value,
+            {mock.sentinel.task_id: (
+                mock_get_action_instance_info.return_value)})
+
+        # Nothing is done if the tasks were meanwhile started
+        mock_start_tasks.reset_mock()
+        mock_get_capacity_deferred_tasks.return_value = []
+        self.server._start_capacity_deferred_tasks(mock.sentinel.execution_id)
+        mock_start_tasks.assert_not_called()
 
     @mock.patch.object(server.ConductorServerEndpoint, "_create_task")
     @mock.patch.object(
@@ -1335,7 +1503,7 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
         '_check_execution_tasks_sanity'
     )
     @mock.patch.object(db_api, 'add_migration')
-    @mock.patch.object(lockutils, 'lock')
+    @mock.patch.object(locks, 'lock')
     @mock.patch.object(
         server.ConductorServerEndpoint,
         "_minion_manager_client"
@@ -1538,7 +1706,6 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             mock_lock.assert_any_call(
                 constants.MIGRATION_LOCK_NAME_FORMAT
                 % mock_migration.return_value.id,
-                external=True,
             )
             mock_minion_manager_client\
                 .allocate_minion_machines_for_migration\
@@ -1610,7 +1777,7 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
         "add_migration"
     )
     @mock.patch.object(
-        lockutils,
+        locks,
         "lock"
     )
     @mock.patch.object(
@@ -1824,7 +1991,6 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             mock_lock.assert_any_call(
                 constants.MIGRATION_LOCK_NAME_FORMAT
                 % mock_migration.return_value.id,
-                external=True,
             )
             mock_minion_manager_client\
                 .allocate_minion_machines_for_migration\
@@ -2149,10 +2315,12 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
         '_set_tasks_execution_status'
     )
     @mock.patch.object(db_api, 'set_task_status')
+    @mock.patch.object(db_api, 'get_tasks_execution_task_summaries')
     @mock.patch.object(db_api, 'get_tasks_execution')
     def test_check_clean_execution_deadlock(
             self,
             mock_get_tasks_execution,
+            mock_get_tasks_execution_task_summaries,
             mock_set_task_status,
             mock_set_tasks_execution_status,
     ):
@@ -2172,10 +2340,16 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             )
 
         # requery with default task_statuses
+        mock_get_tasks_execution.return_value = execution
         determined_state = call_check_clean_execution_deadlock(requery=True)
         mock_get_tasks_execution.assert_called_once_with(
             mock.sentinel.context,
             mock.sentinel.execution_id,
+            include_tasks=False,
+        )
+        mock_get_tasks_execution_task_summaries.assert_called_once_with(
+            mock.sentinel.context,
+            mock.sentinel.execution_id,
         )
         # RUNNING is default state
         self.assertEqual(
@@ -2256,10 +2430,10 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             constants.EXECUTION_STATUS_DEADLOCKED
         )
 
-    @mock.patch.object(db_api, 'get_tasks_execution')
+    @mock.patch.object(db_api, 'get_tasks_execution_status_counts')
     def test_get_execution_status_no_config(
             self,
-            mock_get_tasks_execution,
+            mock_get_tasks_execution_status_counts,
     ):
         execution = mock.Mock(
             id=mock.sentinel.execution_id,
@@ -2274,9 +2448,10 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
                 requery=requery,
             )
 
-        # task is requeried
+        # task status counts are requeried
+        mock_get_tasks_execution_status_counts.return_value = {}
         status = call_get_execution_status(requery=True)
-        mock_get_tasks_execution.assert_called_once_with(
+        mock_get_tasks_execution_status_counts.assert_called_once_with(
             mock.sentinel.context,
             mock.sentinel.execution_id,
         )
@@ -2286,6 +2461,16 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             constants.EXECUTION_STATUS_COMPLETED
         )
 
+        mock_get_tasks_execution_status_counts.return_value = {
+            constants.TASK_STATUS_COMPLETED: 3,
+            constants.TASK_STATUS_RUNNING: 1,
+        }
+        status = call_get_execution_status(requery=True)
+        self.assertEqual(
+            status,
+            constants.EXECUTION_STATUS_RUNNING
+        )
+
     @ddt.file_data("data/get_execution_status_config.yml")
     @ddt.unpack
     def test_get_execution_status(
@@ -2324,11 +2509,12 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
     )
     @mock.patch.object(
         server.ConductorServerEndpoint,
-        '_get_worker_service_rpc_for_task'
+        '_get_worker_service_rpcs_for_tasks'
     )
+    @mock.patch.object(db_api, 'set_tasks_statuses')
     @mock.patch.object(db_api, 'set_task_status')
     @mock.patch.object(db_api, 'get_endpoint')
-    @mock.patch.object(db_api, 'get_action')
+    @mock.patch.object(db_api, 'get_action_instance_info')
     @mock.patch.object(
         server.ConductorServerEndpoint,
         '_get_task_destination'
@@ -2348,10 +2534,11 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             mock_check_clean_execution_deadlock,
             mock_get_task_origin,
             mock_get_task_destination,
-            mock_get_action,
+            mock_get_action_instance_info,
             mock_get_endpoint,
             mock_set_task_status,
-            mock_get_worker_service_rpc_for_task,
+            mock_set_tasks_statuses,
+            mock_get_worker_service_rpcs_for_tasks,
             mock_cancel_tasks_execution,
             mock_get_execution_status,
             mock_set_tasks_execution_status,
@@ -2366,12 +2553,12 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
         mock_get_tasks_execution.assert_called_once_with(
             mock.sentinel.context,
             mock.sentinel.execution_id,
+            include_tasks=False,
         )
         mock_check_clean_execution_deadlock.assert_called_once_with(
             mock.sentinel.context,
             mock_get_tasks_execution.return_value,
             task_statuses=None,
-            requery=False,
         )
         self.assertEqual(started_tasks, [])
 
@@ -2415,11 +2602,7 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             mock.sentinel.context,
             execution.action
         )
-        mock_get_action.assert_called_once_with(
-            mock.sentinel.context,
-            execution.action_id,
-            include_task_info=True,
-        )
+        mock_get_action_instance_info.assert_not_called()
         mock_get_endpoint.assert_has_calls([
             mock.call(
                 mock.sentinel.context,
@@ -2477,30 +2660,56 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
                 'test': 'info',
             },
         }
-        mock_get_action.return_value = mock.Mock(
-            info=task_info
-        )
+        mock_get_action_instance_info.return_value = task_info[
+            mock.sentinel.instance]
+        worker_rpc = mock.Mock()
+        mock_get_worker_service_rpcs_for_tasks.return_value = {
+            mock.sentinel.task_1: worker_rpc}
         started_tasks = call_advance_execution_state()
-        mock_get_worker_service_rpc_for_task.assert_called_once_with(
+        mock_set_tasks_statuses.assert_called_once_with(
             mock.sentinel.context,
-            task,
+            [mock.sentinel.task_1],
+            constants.TASK_STATUS_PENDING,
+        )
+        mock_get_worker_service_rpcs_for_tasks.assert_called_once_with(
+            mock.sentinel.context,
+            [task],
             mock.ANY,
             mock.ANY,
+            retry_count=5,
+            retry_period=2,
+        )
+        worker_rpc.begin_task.assert_called_once_with(
+            mock.sentinel.context,
+            task_id=mock.sentinel.task_1,
+            task_type=mock.sentinel.task_type,
+            origin=mock_get_task_origin.return_value,
+            destination=mock_get_task_destination.return_value,
+            instance=mock.sentinel.instance,
+            task_info=task_info[mock.sentinel.instance],
+        )
+        mock_get_action_instance_info.assert_called_once_with(
+            mock.sentinel.context,
+            execution.action_id,
+            mock.sentinel.instance,
         )
-        mock_get_worker_service_rpc_for_task.return_value\
-            .begin_task.assert_called_once_with(
-                mock.sentinel.context,
-                task_id=mock.sentinel.task_1,
-                task_type=mock.sentinel.task_type,
-                origin=mock_get_task_origin.return_value,
-                destination=mock_get_task_destination.return_value,
-                instance=mock.sentinel.instance,
-                task_info=task_info[mock.sentinel.instance],
-            )
         self.assertEqual(started_tasks, [task.id])
 
+        # handles task begin error
+        worker_rpc.begin_task.side_effect = CoriolisTestException()
+        self.assertRaises(
+            CoriolisTestException,
+            call_advance_execution_state,
+        )
+        mock_cancel_tasks_execution.assert_called_once_with(
+            mock.sentinel.context,
+            execution,
+            requery=True,
+        )
+
         # handles worker service rpc error
-        mock_get_worker_service_rpc_for_task.side_effect = (
+        mock_cancel_tasks_execution.reset_mock()
+        mock_get_worker_service_rpcs_for_tasks.side_effect = (
             CoriolisTestException())
         self.assertRaises(
             CoriolisTestException,
@@ -2526,11 +2735,12 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
     )
     @mock.patch.object(
         server.ConductorServerEndpoint,
-        '_get_worker_service_rpc_for_task'
+        '_get_worker_service_rpcs_for_tasks'
     )
+    @mock.patch.object(db_api, 'set_tasks_statuses')
     @mock.patch.object(db_api, 'set_task_status')
     @mock.patch.object(db_api, 'get_endpoint')
-    @mock.patch.object(db_api, 'get_action')
+    @mock.patch.object(db_api, 'get_action_instance_info')
     @mock.patch.object(
         server.ConductorServerEndpoint,
         '_get_task_destination'
@@ -2552,14 +2762,18 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             mock_check_clean_execution_deadlock,
             mock_get_task_origin,
             mock_get_task_destination,
-            mock_get_action,
+            mock_get_action_instance_info,
             mock_get_endpoint,
             mock_set_task_status,
-            mock_get_worker_service_rpc_for_task,
+            mock_set_tasks_statuses,
+            mock_get_worker_service_rpcs_for_tasks,
             mock_cancel_tasks_execution,
             mock_get_execution_status,
             mock_set_tasks_execution_status,
             config):
+        mock_get_worker_service_rpcs_for_tasks.side_effect = (
+            lambda ctxt, tasks, *args, **kwargs: {
+                task.id: mock.Mock() for task in tasks})
         tasks = config.get('tasks', [])
         execution = mock.Mock(
             status=constants.EXECUTION_STATUS_RUNNING,
@@ -2582,26 +2796,31 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
         )
 
         for task in tasks:
-            if 'expected_status' not in task:
+            if 'expected_status' not in task or (
+                    task['expected_status'] == constants.TASK_STATUS_PENDING):
                 continue
-            kwargs = {'exception_details': mock.ANY}
-            if task['expected_status'] == constants.TASK_STATUS_PENDING:
-                kwargs = {}
             mock_set_task_status.assert_has_calls([
                 mock.call(
                     mock.sentinel.context,
                     task['id'],
                     task['expected_status'],
-                    **kwargs
+                    exception_details=mock.ANY,
                 )
             ])
 
-        self.assertEqual(
-            started_tasks,
-            [t['id'] for t in tasks
-             if 'expected_status' in t and t['expected_status'] ==
-                constants.TASK_STATUS_PENDING]
-        )
+        expected_started_tasks = [
+            t['id'] for t in tasks
+            if 'expected_status' in t and t['expected_status'] ==
+            constants.TASK_STATUS_PENDING]
+        self.assertEqual(started_tasks, expected_started_tasks)
+        if expected_started_tasks:
+            mock_set_tasks_statuses.assert_called_once_with(
+                mock.sentinel.context,
+                expected_started_tasks,
+                constants.TASK_STATUS_PENDING,
+            )
+        else:
+            mock_set_tasks_statuses.assert_not_called()
 
     @mock.patch.object(
         server.ConductorServerEndpoint,
@@ -2893,24 +3112,28 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
         mock_minion_manager_client.deallocate_minion_machine\
             .assert_not_called()
 
+    @mock.patch.object(db_api, "get_task_execution_id")
     @mock.patch.object(utils, "sanitize_task_info")
     @mock.patch.object(db_api, "get_task")
     @mock.patch.object(db_api, "set_task_status")
+    @mock.patch.object(db_api, "get_tasks_execution_task_summaries")
     @mock.patch.object(db_api, "get_tasks_execution")
-    @mock.patch.object(db_api, "get_action")
+    @mock.patch.object(db_api, "get_action_instance_info")
     @mock.patch.object(db_api, "update_transfer_action_info_for_instance")
-    @mock.patch.object(lockutils, "lock")
+    @mock.patch.object(locks, "lock")
     @ddt.file_data("data/task_completed_config.yml")
     @ddt.unpack
     def test_task_completed(
             self,
             mock_lock,
             mock_update_transfer_action_info,
-            mock_get_action,
+            mock_get_action_instance_info,
             mock_get_tasks_execution,
+            mock_get_tasks_execution_task_summaries,
             mock_set_task_status,
             mock_get_task,
             mock_sanitize_task_info,
+            mock_get_task_execution_id,
             config,
             expected_status,
     ):
@@ -2952,15 +3175,12 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
                 **kwargs,
             )
 
-        mock_get_tasks_execution.assert_called_with(
+        mock_get_tasks_execution.assert_any_call(
             mock.sentinel.context,
             mock.sentinel.execution_id,
+            include_tasks=False,
         )
-        mock_get_action.assert_called_once_with(
-            mock.sentinel.context,
-            mock.sentinel.action_id,
-            include_task_info=True,
-        )
+        mock_get_action_instance_info.assert_not_called()
         mock_update_transfer_action_info.assert_called_once_with(
             mock.sentinel.context,
             mock.sentinel.action_id,
@@ -2968,7 +3188,6 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             mock.sentinel.task_result,
         )
 
-        mock_get_action.reset_mock()
         mock_update_transfer_action_info.reset_mock()
 
         # no task result
@@ -2978,8 +3197,13 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             None
         )
         mock_update_transfer_action_info.assert_not_called()
-        self.assertEqual(2, mock_get_action.call_count)
+        mock_get_action_instance_info.assert_called_once_with(
+            mock.sentinel.context,
+            mock.sentinel.action_id,
+            mock.sentinel.instance,
+        )
 
+    @mock.patch.object(db_api, "get_task_execution_id")
     @mock.patch.object(
         server.ConductorServerEndpoint,
         "_check_delete_reservation_for_transfer"
@@ -2996,7 +3220,8 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
         server.ConductorServerEndpoint,
         "_cancel_execution_for_osmorphing_debugging"
     )
-    @mock.patch.object(lockutils, "lock")
+    @mock.patch.object(locks, "lock")
+    @mock.patch.object(db_api, "get_action_instance_info")
     @mock.patch.object(db_api, "get_action")
     @mock.patch.object(db_api, "get_tasks_execution")
     @mock.patch.object(db_api, "set_task_status")
@@ -3009,11 +3234,13 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             mock_set_task_status,
             mock_get_tasks_execution,
             mock_get_action,
+            mock_get_action_instance_info,
             mock_lock,
             mock_cancel_execution_for_osmorphing_debugging,
             mock_set_tasks_execution_status,
             mock_cancel_tasks_execution,
             mock_check_delete_reservation_for_transfer,
+            mock_get_task_execution_id,
             config,
             expected_status,
     ):
@@ -3047,6 +3274,7 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             mock.ANY,
         )
 
+    @mock.patch.object(db_api, "get_task_execution_id")
     @mock.patch.object(cfg.CONF, "conductor")
     @mock.patch.object(
         server.ConductorServerEndpoint,
@@ -3064,7 +3292,8 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
         server.ConductorServerEndpoint,
         "_cancel_execution_for_osmorphing_debugging"
     )
-    @mock.patch.object(lockutils, "lock")
+    @mock.patch.object(locks, "lock")
+    @mock.patch.object(db_api, "get_action_instance_info")
     @mock.patch.object(db_api, "get_action")
     @mock.patch.object(db_api, "get_tasks_execution")
     @mock.patch.object(db_api, "set_task_status")
@@ -3075,12 +3304,14 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             mock_set_task_status,
             mock_get_tasks_execution,
             mock_get_action,
+            mock_get_action_instance_info,
             mock_lock,
             mock_cancel_execution_for_osmorphing_debugging,
             mock_set_tasks_execution_status,
             mock_cancel_tasks_execution,
             mock_check_delete_reservation_for_transfer,
             mock_conf_conductor,
+            mock_get_task_execution_id,
     ):
         execution = mock.Mock(
             type=constants.EXECUTION_TYPE_REPLICA_UPDATE,
@@ -3141,3 +3372,49 @@ class ConductorServerEndpointTestCase(test_base.CoriolisBaseTestCase):
         mock_check_delete_reservation_for_transfer.assert_called_once_with(
             mock_get_action.return_value,
         )
+
+    @mock.patch.object(db_api, "get_task")
+    @mock.patch.object(db_api, "get_tasks_execution")
+    @mock.patch.object(db_api, "get_action_instance_info")
+    @mock.patch.object(db_api, "update_transfer_action_info_for_instance")
+    @mock.patch.object(locks, "lock")
+    def test_update_task_volume_checkpoint(
+            self,
+            mock_lock,
+            mock_update_transfer_action_info,
+            mock_get_action_instance_info,
+            mock_get_tasks_execution,
+            mock_get_task,
+    ):
+        update_task_volume_checkpoint = testutils.get_wrapped_function(
+            self.server.update_task_volume_checkpoint)
+        mock_get_task.return_value = mock.Mock(
+            status=constants.TASK_STATUS_RUNNING,
+            instance=mock.sentinel.instance,
+        )
+        mock_get_tasks_execution.return_value = mock.Mock(
+            type=constants.EXECUTION_TYPE_REPLICA_EXECUTION,
+            action_id=mock.sentinel.action_id,
+        )
+        mock_get_action_instance_info.return_value = {
+            "volumes_info": [{"disk_id": "1"}, {"disk_id": "2"}]}
+
+        update_task_volume_checkpoint(
+            self.server, mock.sentinel.context, mock.sentinel.task_id,
+            "2", mock.sentinel.checkpoint)
+
+        mock_update_transfer_action_info.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.action_id,
+            mock.sentinel.instance,
+            {"volumes_info": [
+                {"disk_id": "1"},
+                {"disk_id": "2",
+                 "replica_checkpoint": mock.sentinel.checkpoint}]})
+
+        # checkpoints sent by tasks which are no longer running are ignored:
+        mock_update_transfer_action_info.reset_mock()
+        mock_get_task.return_value.status = constants.TASK_STATUS_COMPLETED
+        update_task_volume_checkpoint(
+            self.server, mock.sentinel.context, mock.sentinel.task_id,
+            "2", mock.sentinel.checkpoint)
+        mock_update_transfer_action_info.assert_not_called()
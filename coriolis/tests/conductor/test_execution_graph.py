@@ -0,0 +1,68 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+from unittest import mock
+
+from coriolis.conductor import execution_graph
+from coriolis import constants
+from coriolis.tests import test_base
+
+
+class ExecutionGraphTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis Conductor dependency index."""
+
+    def _get_task(self, task_id, index, status, depends_on=None,
+                  on_error=False):
+        task = mock.Mock()
+        task.id = task_id
+        task.index = index
+        task.status = status
+        task.depends_on = depends_on
+        task.on_error = on_error
+        return task
+
+    def _get_tasks(self, task_1_status=constants.TASK_STATUS_RUNNING):
+        return [
+            self._get_task("task_3", 2, constants.TASK_STATUS_SCHEDULED,
+                           depends_on=["task_1", "task_2"]),
+            self._get_task("task_1", 0, task_1_status),
+            self._get_task("task_2", 1, constants.TASK_STATUS_COMPLETED),
+            self._get_task("task_4", 3, constants.TASK_STATUS_SCHEDULED,
+                           depends_on=["task_3"], on_error=True),
+        ]
+
+    def test_pop_ready_task(self):
+        graph = execution_graph.ExecutionGraph(self._get_tasks())
+        self.assertEqual({"task_4"}, graph.on_error_tasks)
+        self.assertIsNone(graph.pop_ready_task())
+
+        graph.set_task_status("task_1", constants.TASK_STATUS_COMPLETED)
+        task = graph.pop_ready_task()
+        self.assertEqual("task_3", task.id)
+        self.assertEqual(
+            {"task_1": constants.TASK_STATUS_COMPLETED,
+             "task_2": constants.TASK_STATUS_COMPLETED},
+            graph.get_parent_statuses("task_3"))
+        self.assertIsNone(graph.pop_ready_task())
+
+        graph.set_task_status("task_3", constants.TASK_STATUS_UNSCHEDULED)
+        self.assertEqual("task_4", graph.pop_ready_task().id)
+        self.assertIsNone(graph.pop_ready_task())
+
+    def test_cache_get(self):
+        cache = execution_graph.ExecutionGraphCache(max_size=1)
+
+        graph = cache.get("execution_1", self._get_tasks())
+        self.assertIsNone(graph.pop_ready_task())
+
+        tasks = self._get_tasks(
+            task_1_status=constants.TASK_STATUS_COMPLETED)
+        self.assertIs(graph, cache.get("execution_1", tasks))
+        self.assertEqual("task_3", graph.pop_ready_task().id)
+
+        cache.get("execution_2", tasks)
+        self.assertIsNot(graph, cache.get("execution_1", tasks))
+
+        graph = cache.get("execution_1", tasks)
+        cache.invalidate("execution_1")
+        self.assertIsNot(graph, cache.get("execution_1", tasks))
@@ -0,0 +1,100 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import datetime
+from unittest import mock
+
+from coriolis.cron import cron
+from coriolis import exception
+from coriolis.tests import test_base
+
+
+class CronTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis cron engine."""
+
+    def _get_job(self, name, schedule, enabled=True, expires=None):
+        return cron.CronJob(
+            name, "description", schedule, enabled, expires, None, None,
+            mock.Mock())
+
+    def test_parse_schedule(self):
+        parsed = cron.parse_schedule(
+            {"minute": "*/20", "hour": "1-3,22", "dom": 5, "dow": "*"})
+        self.assertEqual(
+            {"minute": {0, 20, 40}, "hour": {1, 2, 3, 22}, "dom": {5},
+             "month": None, "dow": None},
+            parsed)
+        self.assertEqual(
+            {10, 25, 40, 55},
+            cron.parse_schedule({"minute": "10/15"})["minute"])
+
+    def test_parse_schedule_invalid(self):
+        for schedule in [
+                {"minute": "*/0"}, {"hour": "20-24"}, {"dom": 0},
+                {"month": "5-1"}, {"dow": "mon"}]:
+            self.assertRaises(
+                exception.InvalidInput, cron.parse_schedule, schedule)
+
+    def test_get_next_run_time(self):
+        start = datetime.datetime(2026, 1, 30, 23, 58, 30)
+        self.assertEqual(
+            datetime.datetime(2026, 1, 31, 0, 0),
+            cron.get_next_run_time({"minute": "*/10"}, start))
+        self.assertEqual(
+            datetime.datetime(2026, 3, 2, 4, 5),
+            cron.get_next_run_time(
+                {"minute": 5, "hour": 4, "month": "3-4", "dow": 0}, start))
+        self.assertIsNone(
+            cron.get_next_run_time({"dom": 30, "month": 2}, start))
+        self.assertIsNone(
+            cron.get_next_run_time(
+                {"minute": 0}, start, start + datetime.timedelta(minutes=1)))
+
+    def test_get_next_run_time_bounds(self):
+        start = datetime.datetime(2026, 1, 1, 10, 20)
+        # both the start and the end of the window are included:
+        self.assertEqual(
+            start, cron.get_next_run_time({"minute": 20}, start))
+        self.assertEqual(
+            datetime.datetime(2026, 1, 1, 10, 50),
+            cron.get_next_run_time(
+                {"minute": 50}, start, start + datetime.timedelta(minutes=30)))
+        self.assertIsNone(
+            cron.get_next_run_time(
+                {"minute": 51}, start, start + datetime.timedelta(minutes=30)))
+
+        # jobs do not run past their expiry or while disabled:
+        job = self._get_job(
+            "job", {"minute": 50},
+            expires=start + datetime.timedelta(minutes=10))
+        self.assertIsNone(job.get_next_run_time(start))
+        job = self._get_job("job", {"minute": 50}, enabled=False)
+        self.assertIsNone(job.get_next_run_time(start))
+
+    @mock.patch.object(cron.timeutils, "utcnow")
+    def test_get_due_jobs(self, mock_utcnow):
+        mock_utcnow.return_value = datetime.datetime(2026, 1, 1, 10, 0, 30)
+        job_cron = cron.Cron()
+        job_1 = self._get_job("job_1", {"minute": "*/5"})
+        job_2 = self._get_job("job_2", {"minute": 2})
+        job_3 = self._get_job("job_3", {"minute": 2})
+        job_cron.register(job_1)
+        job_cron.register(job_2)
+        job_cron.register(job_3)
+        job_cron.register(self._get_job("job_4", {}, enabled=False))
+        job_cron.unregister("job_3")
+
+        self.assertEqual(
+            [job_2],
+            job_cron._get_due_jobs(datetime.datetime(2026, 1, 1, 10, 2)))
+        self.assertEqual(
+            [job_1],
+            job_cron._get_due_jobs(datetime.datetime(2026, 1, 1, 10, 7)))
+        self.assertEqual(
+            cron.MAX_CRON_SLEEP_SECONDS, job_cron._get_sleep_time(
+                datetime.datetime(2026, 1, 1, 10, 7)))
+        self.assertEqual(
+            30, job_cron._get_sleep_time(
+                datetime.datetime(2026, 1, 1, 10, 9, 30)))
+        self.assertEqual(
+            [], job_cron._get_due_jobs(datetime.datetime(2026, 1, 1, 10, 8)))
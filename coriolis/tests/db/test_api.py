@@ -27,3 +27,75 @@ class DBAPITestCase(test_base.CoriolisBaseTestCase):
 
         mock_get_endpoint.assert_called_once_with(mock.sentinel.context,
                                                   mock.sentinel.endpoint_id)
+
+    @mock.patch.object(api.sqlalchemyutils, 'paginate_query')
+    def test_paginate_transfer_actions_query(self, mock_paginate_query):
+        result = api._paginate_transfer_actions_query(
+            mock.sentinel.context, mock.sentinel.query, mock.sentinel.model,
+            limit=10, sort_keys=["last_execution_status", "id"],
+            sort_dirs=["asc"])
+
+        mock_paginate_query.assert_called_once_with(
+            mock.sentinel.query, mock.sentinel.model, 10,
+            ["last_execution_status", "base_id"], marker=None,
+            sort_dirs=["asc", "desc"])
+        self.assertEqual(mock_paginate_query.return_value, result)
+
+    @mock.patch.object(api.sqlalchemyutils, 'paginate_query')
+    @mock.patch.object(api, 'is_user_context')
+    @mock.patch.object(api, '_soft_delete_aware_query')
+    def test_paginate_transfer_actions_query_marker(
+            self, mock_query, mock_is_user_context, mock_paginate_query):
+        mock_is_user_context.return_value = True
+        marker_q = mock_query.return_value.filter.return_value
+        marker_action = marker_q.filter.return_value.first.return_value
+
+        api._paginate_transfer_actions_query(
+            mock.Mock(), mock.sentinel.query, mock.Mock(),
+            marker=mock.sentinel.marker)
+
+        # the marker is only looked up within the user's project:
+        mock_query.return_value.filter.assert_called_once()
+        marker_q.filter.assert_called_once()
+        self.assertEqual(
+            marker_action, mock_paginate_query.call_args[1]["marker"])
+
+        marker_q.filter.return_value.first.return_value = None
+        self.assertRaises(
+            exception.InvalidInput, api._paginate_transfer_actions_query,
+            mock.Mock(), mock.sentinel.query, mock.Mock(),
+            marker=mock.sentinel.marker)
+
+    def test_paginate_transfer_actions_query_invalid_sort(self):
+        self.assertRaises(
+            exception.InvalidInput, api._paginate_transfer_actions_query,
+            mock.sentinel.context, mock.sentinel.query, mock.sentinel.model,
+            sort_keys=["info"])
+        self.assertRaises(
+            exception.InvalidInput, api._paginate_transfer_actions_query,
+            mock.sentinel.context, mock.sentinel.query, mock.sentinel.model,
+            sort_keys=["created_at"], sort_dirs=["up"])
+
+    @mock.patch.object(api, '_update_sqlalchemy_object_fields')
+    @mock.patch.object(api, 'get_minion_machine')
+    def test_update_minion_machine_power_status(
+            self, mock_get_minion_machine, mock_update_fields):
+        machine = mock_get_minion_machine.return_value
+        machine.power_status = "POWERED_OFF"
+        update_minion_machine = testutils.get_wrapped_function(
+            api.update_minion_machine)
+
+        # the healthcheck no longer applies once the power status changes:
+        update_minion_machine(
+            mock.sentinel.context, mock.sentinel.machine_id,
+            {"power_status": "POWERED_ON"})
+        mock_update_fields.assert_called_once_with(
+            machine, mock.ANY,
+            {"power_status": "POWERED_ON", "last_healthcheck_at": None})
+
+        mock_update_fields.reset_mock()
+        update_minion_machine(
+            mock.sentinel.context, mock.sentinel.machine_id,
+            {"power_status": "POWERED_OFF"})
+        mock_update_fields.assert_called_once_with(
+            machine, mock.ANY, {"power_status": "POWERED_OFF"})
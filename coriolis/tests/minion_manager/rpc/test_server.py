@@ -0,0 +1,205 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import datetime
+from unittest import mock
+
+from coriolis import constants
+from coriolis.db import api as db_api
+from coriolis.minion_manager.rpc import server
+from coriolis.minion_manager.rpc import tasks as minion_mgr_tasks
+from coriolis.tests import test_base
+
+
+class MinionManagerServerEndpointTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis Minion Manager RPC server."""
+
+    @mock.patch.object(
+        server.MinionManagerServerEndpoint, "__init__", return_value=None)
+    def setUp(self, _):
+        super(MinionManagerServerEndpointTestCase, self).setUp()
+        self.server = server.MinionManagerServerEndpoint()
+        self.now = datetime.datetime(2026, 1, 1, 10, 0)
+
+    def _set_override(self, name, value):
+        server.CONF.set_override(name, value, group="minion_manager")
+        self.addCleanup(
+            server.CONF.clear_override, name, group="minion_manager")
+
+    def _get_machine(
+            self, machine_id, allocation_status, power_status,
+            last_used_at=None):
+        machine = mock.Mock()
+        machine.id = machine_id
+        machine.allocation_status = allocation_status
+        machine.power_status = power_status
+        machine.last_used_at = last_used_at
+        return machine
+
+    def _get_pool(self, machines, minimum_minions=0, maximum_minions=10):
+        return mock.Mock(
+            minion_machines=machines, minimum_minions=minimum_minions,
+            maximum_minions=maximum_minions, minion_max_idle_time=60,
+            minion_retention_strategy=(
+                constants.MINION_POOL_MACHINE_RETENTION_STRATEGY_DELETE),
+            platform=constants.PROVIDER_PLATFORM_DESTINATION)
+
+    @mock.patch.object(server.timeutils, "utcnow")
+    @mock.patch.object(db_api, "get_minion_pool_replica_schedules")
+    def test_get_minion_pool_prewarm_count(
+            self, mock_get_schedules, mock_utcnow):
+        mock_utcnow.return_value = self.now
+        self._set_override("minion_pool_prewarm_window_minutes", 30)
+        self._set_override("minion_pool_prewarm_history_minutes", 60)
+        mock_get_schedules.return_value = [
+            # runs within the window:
+            ({"minute": 20}, None, ["instance1", "instance2"]),
+            # runs after the window:
+            ({"minute": 45}, None, ["instance3"]),
+            # expires before running:
+            ({"minute": 10}, self.now + datetime.timedelta(minutes=5),
+             ["instance4"]),
+        ]
+        recently_used = self.now - datetime.timedelta(minutes=10)
+        machines = [
+            self._get_machine(
+                "machine1", constants.MINION_MACHINE_STATUS_AVAILABLE,
+                constants.MINION_MACHINE_POWER_STATUS_POWERED_ON,
+                last_used_at=recently_used),
+            self._get_machine(
+                "machine2", constants.MINION_MACHINE_STATUS_IN_USE,
+                constants.MINION_MACHINE_POWER_STATUS_POWERED_ON,
+                last_used_at=recently_used),
+            self._get_machine(
+                "machine3", constants.MINION_MACHINE_STATUS_AVAILABLE,
+                constants.MINION_MACHINE_POWER_STATUS_POWERED_OFF,
+                last_used_at=self.now - datetime.timedelta(hours=2)),
+        ]
+
+        self.assertEqual(
+            2, self.server._get_minion_pool_prewarm_count(
+                mock.sentinel.context, self._get_pool(machines)))
+
+        # the recent allocations are considered if they are more:
+        mock_get_schedules.return_value = []
+        self.assertEqual(
+            1, self.server._get_minion_pool_prewarm_count(
+                mock.sentinel.context, self._get_pool(machines)))
+
+        # the pre-warm count never exceeds the pool maximum:
+        mock_get_schedules.return_value = [
+            ({"minute": 20}, None, ["instance%d" % i for i in range(5)])]
+        self.assertEqual(
+            3, self.server._get_minion_pool_prewarm_count(
+                mock.sentinel.context,
+                self._get_pool(machines, maximum_minions=3)))
+
+    @mock.patch.object(minion_mgr_tasks, "AllocateMinionMachineTask")
+    @mock.patch.object(minion_mgr_tasks, "PowerOnMinionMachineTask")
+    @mock.patch.object(minion_mgr_tasks, "DeallocateMinionMachineTask")
+    @mock.patch.object(db_api, "add_minion_machine")
+    @mock.patch.object(db_api, "set_minion_machine_allocation_status")
+    @mock.patch.object(server.unordered_flow, "Flow")
+    @mock.patch.object(
+        server.MinionManagerServerEndpoint, "_add_batch_healthcheck_to_flow")
+    @mock.patch.object(
+        server.MinionManagerServerEndpoint,
+        "_get_healtchcheck_flow_for_minion_machine")
+    @mock.patch.object(
+        server.MinionManagerServerEndpoint, "_add_minion_pool_event")
+    @mock.patch.object(
+        server.MinionManagerServerEndpoint, "_get_minion_pool_prewarm_count")
+    def test_get_minion_pool_refresh_flow_prewarm_shortfall(
+            self, mock_get_prewarm_count, mock_add_event,
+            mock_get_healthcheck_flow, mock_add_batch_healthcheck,
+            mock_flow, mock_set_allocation_status, mock_add_minion_machine,
+            mock_deallocate_task, mock_power_on_task, mock_allocate_task):
+        mock_get_prewarm_count.return_value = 4
+        machines = [
+            self._get_machine(
+                "machine1", constants.MINION_MACHINE_STATUS_AVAILABLE,
+                constants.MINION_MACHINE_POWER_STATUS_POWERED_ON),
+            self._get_machine(
+                "machine2", constants.MINION_MACHINE_STATUS_AVAILABLE,
+                constants.MINION_MACHINE_POWER_STATUS_POWERED_OFF),
+        ]
+
+        self.server._get_minion_pool_refresh_flow(
+            mock.sentinel.context, self._get_pool(machines), requery=False)
+
+        # none of the (expired) machines get deallocated as there are fewer
+        # of them available than the pre-warm count:
+        mock_deallocate_task.assert_not_called()
+        mock_get_healthcheck_flow.assert_called_once()
+        mock_power_on_task.assert_called_once_with(
+            mock.ANY, "machine2", constants.PROVIDER_PLATFORM_DESTINATION,
+            fail_on_error=False,
+            status_once_powered_on=constants.MINION_MACHINE_STATUS_AVAILABLE)
+        mock_set_allocation_status.assert_any_call(
+            mock.sentinel.context, "machine2",
+            constants.MINION_MACHINE_STATUS_POWERING_ON)
+        self.assertEqual(2, mock_allocate_task.call_count)
+        self.assertEqual(2, mock_add_minion_machine.call_count)
+
+        # no more machines than the pool maximum are created:
+        mock_allocate_task.reset_mock()
+        mock_add_minion_machine.reset_mock()
+        self.server._get_minion_pool_refresh_flow(
+            mock.sentinel.context,
+            self._get_pool(machines, maximum_minions=3), requery=False)
+        self.assertEqual(1, mock_allocate_task.call_count)
+        self.assertEqual(1, mock_add_minion_machine.call_count)
+
+    @mock.patch.object(minion_mgr_tasks, "AllocateMinionMachineTask")
+    @mock.patch.object(minion_mgr_tasks, "PowerOnMinionMachineTask")
+    @mock.patch.object(minion_mgr_tasks, "DeallocateMinionMachineTask")
+    @mock.patch.object(db_api, "add_minion_machine")
+    @mock.patch.object(db_api, "set_minion_machine_allocation_status")
+    @mock.patch.object(server.unordered_flow, "Flow")
+    @mock.patch.object(
+        server.MinionManagerServerEndpoint, "_add_batch_healthcheck_to_flow")
+    @mock.patch.object(
+        server.MinionManagerServerEndpoint,
+        "_get_healtchcheck_flow_for_minion_machine")
+    @mock.patch.object(
+        server.MinionManagerServerEndpoint, "_add_minion_pool_event")
+    @mock.patch.object(
+        server.MinionManagerServerEndpoint, "_get_minion_pool_prewarm_count")
+    def test_get_minion_pool_refresh_flow_prewarm_deallocation(
+            self, mock_get_prewarm_count, mock_add_event,
+            mock_get_healthcheck_flow, mock_add_batch_healthcheck,
+            mock_flow, mock_set_allocation_status, mock_add_minion_machine,
+            mock_deallocate_task, mock_power_on_task, mock_allocate_task):
+        mock_get_prewarm_count.return_value = 1
+        machines = [
+            self._get_machine(
+                "machine%d" % i, constants.MINION_MACHINE_STATUS_AVAILABLE,
+                constants.MINION_MACHINE_POWER_STATUS_POWERED_ON)
+            for i in range(3)]
+
+        self.server._get_minion_pool_refresh_flow(
+            mock.sentinel.context, self._get_pool(machines), requery=False)
+
+        # only the machines exceeding the pre-warm count get deallocated:
+        self.assertEqual(2, mock_deallocate_task.call_count)
+        mock_get_healthcheck_flow.assert_called_once()
+        mock_power_on_task.assert_not_called()
+        mock_allocate_task.assert_not_called()
+        mock_add_minion_machine.assert_not_called()
+
+    @mock.patch.object(
+        server.MinionManagerServerEndpoint, "_taskflow_runner",
+        new_callable=mock.PropertyMock)
+    def test_cancel_minion_pool_background_flows(self, mock_runner):
+        runner = mock_runner.return_value
+        runner.get_background_flows.return_value = [
+            {"id": "flow1", "name": "pool-1-allocation", "status": "RUNNING"},
+            {"id": "flow2", "name": "pool-1-deallocation",
+             "status": "QUEUED"}]
+
+        self.server.cancel_minion_pool_background_flows(
+            mock.sentinel.context, "1", exclude_flow_ids=["flow2"])
+
+        runner.get_background_flows.assert_called_once_with(
+            name_prefix="pool-1-")
+        runner.cancel_background_flow.assert_called_once_with("flow1")
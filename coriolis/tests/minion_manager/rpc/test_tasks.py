@@ -0,0 +1,232 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import datetime
+from unittest import mock
+
+from coriolis import constants
+from coriolis import exception
+from coriolis.minion_manager.rpc import tasks
+from coriolis.tests import test_base
+
+
+class PowerOnMinionMachineTaskTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the minion machine power on task."""
+
+    def setUp(self):
+        super(PowerOnMinionMachineTaskTestCase, self).setUp()
+        self.task = tasks.PowerOnMinionMachineTask(
+            mock.sentinel.pool_id, mock.sentinel.machine_id,
+            constants.PROVIDER_PLATFORM_DESTINATION,
+            status_once_powered_on=constants.MINION_MACHINE_STATUS_AVAILABLE)
+
+    @mock.patch.object(
+        tasks.PowerOnMinionMachineTask,
+        "_set_minion_machine_allocation_status")
+    @mock.patch.object(tasks.PowerOnMinionMachineTask, "_get_minion_machine")
+    def test_execute_already_powered_on(
+            self, mock_get_minion_machine, mock_set_allocation_status):
+        mock_get_minion_machine.return_value = mock.Mock(
+            power_status=constants.MINION_MACHINE_POWER_STATUS_POWERED_ON)
+
+        result = self.task.execute(
+            mock.sentinel.context, mock.sentinel.origin,
+            mock.sentinel.destination, mock.sentinel.task_info)
+
+        self.assertEqual(mock.sentinel.task_info, result)
+        mock_set_allocation_status.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.pool_id,
+            mock.sentinel.machine_id,
+            constants.MINION_MACHINE_STATUS_AVAILABLE)
+
+    @mock.patch.object(
+        tasks.PowerOnMinionMachineTask, "_add_minion_pool_event")
+    @mock.patch.object(
+        tasks.PowerOnMinionMachineTask,
+        "_set_minion_machine_allocation_status")
+    @mock.patch.object(tasks.PowerOnMinionMachineTask, "_get_minion_machine")
+    def test_execute_invalid_power_status(
+            self, mock_get_minion_machine, mock_set_allocation_status,
+            mock_add_event):
+        mock_get_minion_machine.return_value = mock.Mock(
+            power_status=constants.MINION_MACHINE_POWER_STATUS_POWERING_OFF)
+        task = tasks.PowerOnMinionMachineTask(
+            mock.sentinel.pool_id, mock.sentinel.machine_id,
+            constants.PROVIDER_PLATFORM_DESTINATION, fail_on_error=False)
+
+        result = task.execute(
+            mock.sentinel.context, mock.sentinel.origin,
+            mock.sentinel.destination, mock.sentinel.task_info)
+
+        self.assertEqual(mock.sentinel.task_info, result)
+        mock_set_allocation_status.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.pool_id,
+            mock.sentinel.machine_id,
+            constants.MINION_MACHINE_STATUS_POWER_ERROR)
+
+        # the error is only raised when failing on errors:
+        self.assertRaises(
+            exception.CoriolisException, self.task.execute,
+            mock.sentinel.context, mock.sentinel.origin,
+            mock.sentinel.destination, mock.sentinel.task_info)
+
+
+class HealthcheckCacheTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the reuse of minion machine healthchecks."""
+
+    @mock.patch.object(tasks.timeutils, "utcnow")
+    def test_is_minion_machine_healthcheck_cached(self, mock_utcnow):
+        now = datetime.datetime(2026, 1, 1, 10, 0)
+        mock_utcnow.return_value = now
+        machine = mock.Mock(
+            power_status=constants.MINION_MACHINE_POWER_STATUS_POWERED_ON,
+            last_healthcheck_at=now - datetime.timedelta(seconds=30))
+
+        self.assertTrue(tasks.is_minion_machine_healthcheck_cached(
+            machine, 60))
+        # expired:
+        self.assertFalse(tasks.is_minion_machine_healthcheck_cached(
+            machine, 20))
+        # caching disabled:
+        self.assertFalse(tasks.is_minion_machine_healthcheck_cached(
+            machine, 0))
+
+        machine.power_status = (
+            constants.MINION_MACHINE_POWER_STATUS_POWERED_OFF)
+        self.assertFalse(tasks.is_minion_machine_healthcheck_cached(
+            machine, 60))
+
+        machine.power_status = constants.MINION_MACHINE_POWER_STATUS_POWERED_ON
+        machine.last_healthcheck_at = None
+        self.assertFalse(tasks.is_minion_machine_healthcheck_cached(
+            machine, 60))
+
+    @mock.patch.object(
+        tasks.HealthcheckMinionMachineTask, "_get_worker_service_rpc_for_task")
+    @mock.patch.object(
+        tasks.HealthcheckMinionMachineTask, "_add_minion_pool_event")
+    @mock.patch.object(
+        tasks.HealthcheckMinionMachineTask,
+        "_set_minion_machine_allocation_status")
+    @mock.patch.object(
+        tasks.HealthcheckMinionMachineTask, "_get_minion_machine")
+    @mock.patch.object(tasks, "is_minion_machine_healthcheck_cached")
+    def test_healthcheck_reuses_cached_result(
+            self, mock_is_cached, mock_get_minion_machine,
+            mock_set_allocation_status, mock_add_event, mock_get_worker_rpc):
+        mock_is_cached.return_value = True
+        mock_get_minion_machine.return_value = mock.Mock(
+            allocation_status=constants.MINION_MACHINE_STATUS_IN_USE)
+        task = tasks.HealthcheckMinionMachineTask(
+            mock.sentinel.pool_id, mock.sentinel.machine_id,
+            constants.PROVIDER_PLATFORM_DESTINATION,
+            healthcheck_cache_ttl=60)
+
+        result = task.execute(
+            mock.sentinel.context, mock.sentinel.origin,
+            mock.sentinel.destination, mock.sentinel.task_info)
+
+        self.assertEqual({"healthy": True, "error": None}, result)
+        mock_is_cached.assert_called_once_with(
+            mock_get_minion_machine.return_value, 60)
+        mock_set_allocation_status.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.pool_id,
+            mock.sentinel.machine_id,
+            constants.MINION_MACHINE_STATUS_AVAILABLE)
+        mock_get_worker_rpc.assert_not_called()
+
+
+class HealthcheckMinionMachinesTaskTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the batched minion machines healthcheck."""
+
+    def setUp(self):
+        super(HealthcheckMinionMachinesTaskTestCase, self).setUp()
+        self.machine_ids = ["machine%d" % i for i in range(5)]
+        self.task = tasks.HealthcheckMinionMachinesTask(
+            mock.sentinel.pool_id, self.machine_ids,
+            constants.PROVIDER_PLATFORM_DESTINATION, "label", 2)
+        self.destination = {
+            "type": mock.sentinel.platform, "connection_info": {"a": 1}}
+        self.machines = {
+            machine_id: mock.Mock(
+                power_status=(
+                    constants.MINION_MACHINE_POWER_STATUS_POWERED_ON),
+                provider_properties="props-%s" % machine_id,
+                connection_info="conn-%s" % machine_id)
+            for machine_id in self.machine_ids}
+        self.machines["machine4"].power_status = (
+            constants.MINION_MACHINE_POWER_STATUS_POWERED_OFF)
+
+        for name in ["_get_worker_service_rpc_for_task",
+                     "_update_minion_machine", "_add_minion_pool_event"]:
+            patcher = mock.patch.object(
+                tasks.HealthcheckMinionMachinesTask, name)
+            setattr(self, "mock%s" % name, patcher.start())
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            tasks.HealthcheckMinionMachinesTask, "_get_minion_machine",
+            side_effect=lambda ctxt, machine_id, **kwargs: (
+                self.machines[machine_id]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.worker_rpc = self.mock_get_worker_service_rpc_for_task\
+            .return_value
+
+    def _get_batch(self, *machine_ids):
+        return {
+            machine_id: {
+                "minion_provider_properties": "props-%s" % machine_id,
+                "minion_connection_info": "conn-%s" % machine_id}
+            for machine_id in machine_ids}
+
+    def _execute(self):
+        return self.task.execute(
+            mock.sentinel.context, mock.sentinel.origin, self.destination,
+            mock.sentinel.task_info)
+
+    @mock.patch.object(tasks.timeutils, "utcnow")
+    def test_execute(self, mock_utcnow):
+        self.worker_rpc.healthcheck_minion_machines.side_effect = [
+            {"machine0": None, "machine1": "error"}, {"machine2": None}]
+
+        self.assertEqual(mock.sentinel.task_info, self._execute())
+
+        # the powered on machines are split into batches:
+        self.worker_rpc.healthcheck_minion_machines.assert_has_calls([
+            mock.call(
+                mock.sentinel.context, mock.sentinel.platform,
+                constants.PROVIDER_PLATFORM_DESTINATION, {"a": 1},
+                self._get_batch("machine0", "machine1")),
+            mock.call(
+                mock.sentinel.context, mock.sentinel.platform,
+                constants.PROVIDER_PLATFORM_DESTINATION, {"a": 1},
+                self._get_batch("machine2", "machine3"))])
+        self.assertEqual(
+            2, self.worker_rpc.healthcheck_minion_machines.call_count)
+        # only the healthy machines are marked as healthchecked:
+        self.mock_update_minion_machine.assert_has_calls([
+            mock.call(
+                mock.sentinel.context, mock.sentinel.pool_id, machine_id,
+                {"last_healthcheck_at": mock_utcnow.return_value})
+            for machine_id in ["machine0", "machine2"]])
+        self.assertEqual(2, self.mock_update_minion_machine.call_count)
+
+    def test_execute_batch_failure(self):
+        self.worker_rpc.healthcheck_minion_machines.side_effect = [
+            Exception("timeout"), {"machine2": None, "machine3": None}]
+
+        self.assertEqual(mock.sentinel.task_info, self._execute())
+
+        # the machines of the failed batch are left to their individual
+        # healthchecks, while the other batches are still recorded:
+        self.assertEqual(
+            ["machine2", "machine3"],
+            [c[0][2] for c in self.mock_update_minion_machine.call_args_list])
+
+    def test_execute_no_worker_service(self):
+        self.mock_get_worker_service_rpc_for_task.side_effect = (
+            Exception("no workers"))
+
+        self.assertEqual(mock.sentinel.task_info, self._execute())
+
+        self.mock_update_minion_machine.assert_not_called()
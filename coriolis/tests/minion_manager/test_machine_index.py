@@ -0,0 +1,63 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+from unittest import mock
+
+from coriolis import constants
+from coriolis.minion_manager import machine_index
+from coriolis.tests import test_base
+
+
+class MinionMachineIndexTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis Minion Manager machine index."""
+
+    def _get_machine(self, machine_id, allocation_status, power_status):
+        machine = mock.Mock()
+        machine.id = machine_id
+        machine.allocation_status = allocation_status
+        machine.power_status = power_status
+        return machine
+
+    def test_acquire_release(self):
+        machines = [
+            self._get_machine(
+                "machine1", constants.MINION_MACHINE_STATUS_IN_USE,
+                constants.MINION_MACHINE_POWER_STATUS_POWERED_ON),
+            self._get_machine(
+                "machine2", constants.MINION_MACHINE_STATUS_AVAILABLE,
+                constants.MINION_MACHINE_POWER_STATUS_POWERED_OFF),
+            self._get_machine(
+                "machine3", constants.MINION_MACHINE_STATUS_AVAILABLE,
+                constants.MINION_MACHINE_POWER_STATUS_POWERED_ON),
+        ]
+        index = machine_index.MinionMachineIndex(machines)
+        self.assertEqual(
+            2, index.count(constants.MINION_MACHINE_STATUS_AVAILABLE))
+        self.assertEqual(
+            1, index.count(
+                constants.MINION_MACHINE_STATUS_AVAILABLE,
+                power_status=constants.MINION_MACHINE_POWER_STATUS_POWERED_ON))
+
+        self.assertEqual(
+            machines[2], index.acquire(
+                constants.MINION_MACHINE_STATUS_AVAILABLE,
+                power_statuses=[
+                    constants.MINION_MACHINE_POWER_STATUS_POWERED_ON]))
+        self.assertEqual(
+            machines[1], index.acquire(
+                constants.MINION_MACHINE_STATUS_AVAILABLE))
+        self.assertIsNone(
+            index.acquire(constants.MINION_MACHINE_STATUS_AVAILABLE))
+
+        # released machines keep their original preference order:
+        index.release(machines[2])
+        index.release(machines[1])
+        self.assertEqual(
+            machines[1], index.acquire(
+                constants.MINION_MACHINE_STATUS_AVAILABLE))
+
+        index.remove(machines[2].id)
+        self.assertEqual(
+            0, index.count(constants.MINION_MACHINE_STATUS_AVAILABLE))
+        self.assertIsNone(
+            index.acquire(constants.MINION_MACHINE_STATUS_AVAILABLE))
@@ -0,0 +1,77 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import datetime
+from unittest import mock
+
+from oslo_utils import timeutils
+
+from coriolis.scheduler.filters import load_filters
+from coriolis.tests import test_base
+
+
+class LoadFiltersTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis Scheduler load filters."""
+
+    def _get_service(self, age=0, **load):
+        service = mock.Mock()
+        service.id = "service"
+        service.load = {
+            "running_tasks": 0, "max_running_tasks": 0,
+            "running_disk_transfers": 0, "max_running_disk_transfers": 0,
+            "cpu_count": 4, "cpu_percent": 0, "memory_percent": 0,
+            "network_bytes_per_second": 0,
+            "network_capacity_bytes_per_second": 0}
+        service.load.update(load)
+        service.load_updated_at = timeutils.utcnow() - datetime.timedelta(
+            seconds=age)
+        return service
+
+    def test_task_capacity_filter(self):
+        service = self._get_service(
+            running_tasks=2, max_running_tasks=4,
+            running_disk_transfers=1, max_running_disk_transfers=2)
+        flt = load_filters.TaskCapacityFilter(60)
+        transfer_flt = load_filters.TaskCapacityFilter(
+            60, disk_transfer=True)
+        pending_flt = load_filters.TaskCapacityFilter(
+            60, pending_tasks={"service": (1, 1)}, disk_transfer=True)
+
+        self.assertEqual(100, flt.rate_service(service))
+        self.assertEqual(100, transfer_flt.rate_service(service))
+        self.assertEqual(0, pending_flt.rate_service(service))
+
+        service.load["running_tasks"] = 4
+        self.assertEqual(0, flt.rate_service(service))
+        # outdated loads are ignored:
+        self.assertEqual(100, flt.rate_service(self._get_service(
+            age=120, running_tasks=4, max_running_tasks=4)))
+
+    def test_least_loaded_filter(self):
+        flt = load_filters.LeastLoadedFilter(60)
+
+        idle = flt.rate_service(self._get_service())
+        busy = flt.rate_service(self._get_service(
+            running_tasks=2, cpu_percent=60, memory_percent=40))
+        overloaded = flt.rate_service(self._get_service(
+            running_tasks=8, cpu_percent=100, memory_percent=100))
+
+        self.assertEqual(100, idle)
+        self.assertEqual(50, busy)
+        self.assertEqual(1, overloaded)
+        self.assertEqual(
+            load_filters.UNKNOWN_LOAD_RATING,
+            flt.rate_service(self._get_service(age=120)))
+
+    def test_network_headroom_filter(self):
+        flt = load_filters.NetworkHeadroomFilter(60)
+
+        self.assertEqual(50, flt.rate_service(self._get_service(
+            network_bytes_per_second=500,
+            network_capacity_bytes_per_second=1000)))
+        self.assertEqual(25, flt.rate_service(self._get_service(
+            running_disk_transfers=1, network_bytes_per_second=500,
+            network_capacity_bytes_per_second=1000)))
+        self.assertEqual(
+            load_filters.UNKNOWN_LOAD_RATING,
+            flt.rate_service(self._get_service()))
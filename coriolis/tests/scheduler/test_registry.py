@@ -0,0 +1,59 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+from unittest import mock
+
+from coriolis.scheduler import registry
+from coriolis.tests import test_base
+
+
+class ServiceRegistryTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis Scheduler service registry."""
+
+    def _get_service(self, service_id, topic, region_ids, providers):
+        service = mock.Mock()
+        service.id = service_id
+        service.topic = topic
+        service.mapped_regions = [mock.Mock(id=r) for r in region_ids]
+        service.providers = providers
+        return service
+
+    def test_snapshot_get_services(self):
+        service1 = self._get_service(
+            "service1", "worker", ["region1"],
+            {"openstack": {"types": [1, 2]}})
+        service2 = self._get_service(
+            "service2", "worker", ["region1", "region2"],
+            {"openstack": {"types": [1]}, "vmware": {"types": [2]}})
+        service3 = self._get_service("service3", "other", ["region2"], {})
+        snapshot = registry.RegistrySnapshot(
+            1, [service1, service2, service3], [])
+
+        self.assertEqual(
+            [service1, service2], snapshot.get_services("worker"))
+        self.assertEqual(
+            [service2], snapshot.get_services(
+                "worker", region_sets=[["region2", "region3"]]))
+        self.assertEqual(
+            [service1], snapshot.get_services(
+                "worker", region_sets=[[]],
+                provider_requirements={"openstack": [1, 2]}))
+        self.assertEqual(
+            [], snapshot.get_services(
+                "worker", region_sets=[["region1"], ["region3"]]))
+
+    @mock.patch.object(registry.db_api, "get_regions")
+    @mock.patch.object(registry.db_api, "get_services")
+    def test_get_snapshot(self, mock_get_services, mock_get_regions):
+        service_registry = registry.ServiceRegistry()
+
+        snapshot = service_registry.get_snapshot(mock.sentinel.context)
+        self.assertIs(
+            snapshot, service_registry.get_snapshot(mock.sentinel.context))
+        mock_get_services.assert_called_once_with(mock.sentinel.context)
+
+        service_registry.invalidate()
+        self.assertIsNot(
+            snapshot, service_registry.get_snapshot(mock.sentinel.context))
+        self.assertEqual(2, mock_get_services.call_count)
+        self.assertEqual(2, mock_get_regions.call_count)
@@ -0,0 +1,157 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+from unittest import mock
+
+from six.moves import queue
+
+from coriolis.taskflow import runner
+from coriolis.tests import test_base
+
+
+class CoriolisTestException(Exception):
+    pass
+
+
+class BackgroundFlowProcessPoolTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the pool of background flow processes."""
+
+    def setUp(self):
+        super(BackgroundFlowProcessPoolTestCase, self).setUp()
+        with mock.patch.object(runner.eventlet, "spawn"):
+            self.pool = runner._BackgroundFlowProcessPool(
+                mock.Mock(), num_processes=1, flows_per_process=2,
+                max_flows_per_process=3)
+        self.processes = []
+        patcher = mock.patch.object(
+            self.pool, "_spawn_process", side_effect=self._spawn_process)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _spawn_process(self):
+        process = mock.Mock(pid=len(self.processes))
+        process.is_alive.return_value = True
+        proc = {
+            "process": process, "job_q": mock.Mock(), "flow_ids": set(),
+            "flows_run": 0}
+        self.processes.append(proc)
+        return proc
+
+    def _submit(self, name):
+        flow = mock.Mock()
+        flow.name = name
+        return flow, self.pool.submit(flow, store=mock.sentinel.store)
+
+    def _get_statuses(self):
+        return {
+            flow["name"]: flow["status"] for flow in self.pool.get_flows()}
+
+    def test_submit(self):
+        flow_1, flow_id_1 = self._submit("pool-1-allocation")
+        flow_2, flow_id_2 = self._submit("pool-2-allocation")
+        _, flow_id_3 = self._submit("pool-1-refresh")
+
+        # flows are queued once the process runs its maximum number of them:
+        self.assertEqual(1, len(self.processes))
+        proc = self.processes[0]
+        proc["job_q"].put.assert_has_calls([
+            mock.call((runner._BACKGROUND_FLOW_ACTION_RUN, flow_id_1,
+                       (flow_1, mock.sentinel.store))),
+            mock.call((runner._BACKGROUND_FLOW_ACTION_RUN, flow_id_2,
+                       (flow_2, mock.sentinel.store)))])
+        self.assertEqual(2, proc["job_q"].put.call_count)
+        self.assertEqual(1, self.pool.get_stats()["queued_flows"])
+        self.assertEqual(
+            ["pool-1-allocation", "pool-1-refresh"],
+            [flow["name"] for flow in self.pool.get_flows(
+                name_prefix="pool-1-")])
+
+        self.pool._handle_status_event(
+            flow_id_1, runner.BACKGROUND_FLOW_STATUS_RUNNING, None)
+        self.assertEqual(
+            {"pool-1-allocation": runner.BACKGROUND_FLOW_STATUS_RUNNING,
+             "pool-2-allocation": runner.BACKGROUND_FLOW_STATUS_QUEUED,
+             "pool-1-refresh": runner.BACKGROUND_FLOW_STATUS_QUEUED},
+            self._get_statuses())
+
+        # queued flows are dispatched once others finish:
+        self.pool._handle_status_event(
+            flow_id_1, runner.BACKGROUND_FLOW_STATUS_FINISHED, "error")
+        self.assertEqual(1, len(self.processes))
+        self.assertEqual({flow_id_2, flow_id_3}, proc["flow_ids"])
+        stats = self.pool.get_stats()
+        self.assertEqual(0, stats["queued_flows"])
+        self.assertEqual(1, stats["finished_flows"])
+        self.assertEqual(1, stats["failed_flows"])
+
+    def test_process_recycling(self):
+        flow_ids = [self._submit("flow-%d" % i)[1] for i in range(3)]
+        self.pool._handle_status_event(
+            flow_ids[0], runner.BACKGROUND_FLOW_STATUS_FINISHED, None)
+        old_proc = self.processes[0]
+        self.assertEqual(3, old_proc["flows_run"])
+
+        # the process which ran its maximum number of flows gets no more:
+        _, flow_id = self._submit("flow-3")
+        self.assertEqual(2, len(self.processes))
+        new_proc = self.processes[1]
+        self.assertEqual({flow_id}, new_proc["flow_ids"])
+
+        # and is stopped once its current flows finish:
+        for finished_flow_id in flow_ids[1:]:
+            self.pool._handle_status_event(
+                finished_flow_id, runner.BACKGROUND_FLOW_STATUS_FINISHED,
+                None)
+        old_proc["job_q"].put.assert_called_with(None)
+        self.assertEqual([new_proc], self.pool._processes)
+
+    def test_cancel(self):
+        _, running_flow_id = self._submit("flow-1")
+        self._submit("flow-2")
+        _, queued_flow_id = self._submit("flow-3")
+        proc = self.processes[0]
+
+        self.assertTrue(self.pool.cancel(queued_flow_id))
+        self.assertEqual(0, self.pool.get_stats()["queued_flows"])
+        self.assertNotIn("flow-3", self._get_statuses())
+
+        proc["job_q"].put.reset_mock()
+        self.assertTrue(self.pool.cancel(running_flow_id))
+        proc["job_q"].put.assert_called_once_with(
+            (runner._BACKGROUND_FLOW_ACTION_CANCEL, running_flow_id, ()))
+        self.assertEqual(
+            runner.BACKGROUND_FLOW_STATUS_CANCELLING,
+            self._get_statuses()["flow-1"])
+
+        self.assertFalse(self.pool.cancel("missing"))
+
+    def test_dead_process(self):
+        self._submit("flow-1")
+        self._submit("flow-2")
+        _, queued_flow_id = self._submit("flow-3")
+        dead_proc = self.processes[0]
+        dead_proc["process"].is_alive.return_value = False
+
+        self.pool._dispatch_flows()
+
+        # the flows of the dead process fail and the queued ones are
+        # dispatched to a new process:
+        self.assertEqual(["flow-3"], list(self._get_statuses()))
+        self.assertEqual(2, self.pool.get_stats()["failed_flows"])
+        self.assertEqual([self.processes[1]], self.pool._processes)
+        self.assertEqual({queued_flow_id}, self.processes[1]["flow_ids"])
+
+    @mock.patch.object(runner.time, "time")
+    @mock.patch.object(runner._BackgroundFlowProcessPool, "_dispatch_flows")
+    def test_handle_status_events_checks_processes(
+            self, mock_dispatch_flows, mock_time):
+        interval = runner.BACKGROUND_FLOW_PROCESS_CHECK_INTERVAL
+        mock_time.side_effect = [0, interval, interval, interval]
+        self.pool._status_q = mock.Mock()
+        self.pool._status_q.get.side_effect = [
+            queue.Empty(), CoriolisTestException()]
+
+        # the processes are checked even though no status events come in:
+        self.assertRaises(
+            CoriolisTestException, self.pool._handle_status_events)
+        mock_dispatch_flows.assert_called_once_with()
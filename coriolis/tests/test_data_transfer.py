@@ -0,0 +1,171 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import os
+import struct
+import zlib
+
+import lz4.frame
+import zstandard
+
+from coriolis import constants
+from coriolis import data_transfer
+from coriolis import exception
+from coriolis.tests import test_base
+
+
+class DataTransferTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis data_transfer module."""
+
+    def setUp(self):
+        super(DataTransferTestCase, self).setUp()
+        self._path = "/dev/sdb"
+        self._offset = 4096
+        self._prefix = (
+            self._path.encode() + b'\0' + struct.pack("<Q", self._offset))
+
+    def _decode(self, msg):
+        msg_id, data_len, data_len_inflated = struct.unpack("<III", msg[:12])
+        data = msg[12:]
+        self.assertEqual(data_len, len(data))
+        if data_len_inflated:
+            data = zlib.decompress(data)
+            self.assertEqual(data_len_inflated, len(data))
+        return msg_id, data
+
+    def test_encode_data_compressed(self):
+        content = b"coriolis" * 1024
+
+        msg = data_transfer.encode_data(
+            3, self._path, self._offset, memoryview(content))
+
+        msg_id, data = self._decode(msg)
+        self.assertEqual(3, msg_id)
+        self.assertEqual(self._prefix + content, data)
+        self.assertLess(len(msg), len(content))
+
+    def test_encode_data_incompressible(self):
+        content = os.urandom(4096)
+
+        msg = data_transfer.encode_data(
+            3, self._path, self._offset, content)
+
+        self.assertEqual(0, struct.unpack("<III", msg[:12])[2])
+        self.assertEqual((3, self._prefix + content), self._decode(msg))
+
+    def test_encode_data_buffers_no_copy(self):
+        content = memoryview(os.urandom(4096))
+
+        buffers = data_transfer.encode_data_buffers(
+            3, self._path, self._offset, content, compress=False)
+
+        self.assertIs(content, buffers[-1])
+        self.assertEqual(
+            (3, self._prefix + content.tobytes()),
+            self._decode(b"".join(buffers)))
+
+    def test_encode_zeros(self):
+        msg = data_transfer.encode_zeros(3, self._path, self._offset, 8192)
+
+        self.assertEqual(
+            (3, len(msg) - 12, data_transfer.ZERO_MSG_SIZE_INFLATED),
+            struct.unpack("<III", msg[:12]))
+        self.assertEqual(
+            self._path.encode() + b'\0' +
+            struct.pack("<QQ", self._offset, 8192), msg[12:])
+
+    def test_encode_copy(self):
+        msg = data_transfer.encode_copy(
+            3, self._path, self._offset, 0, 8192)
+
+        self.assertEqual(
+            (3, len(msg) - 12, data_transfer.COPY_MSG_SIZE_INFLATED),
+            struct.unpack("<III", msg[:12]))
+        self.assertEqual(
+            self._path.encode() + b'\0' +
+            struct.pack("<QQQ", self._offset, 0, 8192), msg[12:])
+
+    def test_get_zero_runs(self):
+        data = bytearray(10240)
+        data[4096] = 1
+        data[10000] = 1
+
+        runs = data_transfer.get_zero_runs(memoryview(data), 2048)
+
+        self.assertEqual(
+            [(0, 4096, True), (4096, 2048, False), (6144, 2048, True),
+             (8192, 2048, False)], runs)
+
+    def test_get_zero_runs_partial_block(self):
+        runs = data_transfer.get_zero_runs(b"\0" * 5000 + b"\1", 4096)
+
+        self.assertEqual([(0, 4096, True), (4096, 905, False)], runs)
+
+    def test_compress_buffers(self):
+        content = b"coriolis" * 1024
+        zstd_decompressor = zstandard.ZstdDecompressor()
+        decompressors = {
+            constants.COMPRESSION_FORMAT_GZIP: (
+                lambda d: zlib.decompress(d, wbits=31)),
+            constants.COMPRESSION_FORMAT_ZLIB: zlib.decompress,
+            constants.COMPRESSION_FORMAT_ZSTD: (
+                lambda d: zstd_decompressor.decompressobj().decompress(d)),
+            constants.COMPRESSION_FORMAT_LZ4: lz4.frame.decompress,
+        }
+
+        for fmt, decompress in decompressors.items():
+            pieces = data_transfer.compress_buffers(
+                [self._prefix, memoryview(content)], fmt)
+            self.assertEqual(
+                self._prefix + content, decompress(b"".join(pieces)))
+
+    def test_get_compressed_zeros(self):
+        fmt = constants.COMPRESSION_FORMAT_ZLIB
+        compressed = data_transfer.get_compressed_zeros(4096, fmt)
+        self.assertEqual(bytes(4096), zlib.decompress(compressed))
+        self.assertIs(
+            compressed, data_transfer.get_compressed_zeros(4096, fmt))
+
+        # changes to the compression level are taken into account:
+        data_transfer.CONF.set_override("zlib_compression_level", 0)
+        self.addCleanup(
+            data_transfer.CONF.clear_override, "zlib_compression_level")
+        uncompressed = data_transfer.get_compressed_zeros(4096, fmt)
+        self.assertEqual(bytes(4096), zlib.decompress(uncompressed))
+        self.assertGreater(len(uncompressed), len(compressed))
+
+    def test_adaptive_compressor(self):
+        # NOTE: make sending the data uncompressed slow enough for the
+        # compression time not to matter:
+        data_transfer.CONF.set_override("adaptive_compression_link_mbps", 1)
+        self.addCleanup(
+            data_transfer.CONF.clear_override,
+            "adaptive_compression_link_mbps")
+        compressor = data_transfer.AdaptiveCompressor(
+            [constants.COMPRESSION_FORMAT_ZLIB])
+        compressible = b"coriolis" * 131072
+
+        pieces, fmt = compressor.compress([compressible])
+        self.assertEqual(constants.COMPRESSION_FORMAT_ZLIB, fmt)
+        self.assertEqual(compressible, zlib.decompress(b"".join(pieces)))
+
+        # the format sampled last keeps being used until the next sample:
+        incompressible = os.urandom(4096)
+        pieces, fmt = compressor.compress([incompressible])
+        self.assertEqual(constants.COMPRESSION_FORMAT_ZLIB, fmt)
+
+    def test_adaptive_compressor_disables_compression(self):
+        compressor = data_transfer.AdaptiveCompressor(
+            [constants.COMPRESSION_FORMAT_ZLIB])
+        incompressible = os.urandom(4096)
+
+        pieces, fmt = compressor.compress([incompressible])
+
+        self.assertIsNone(fmt)
+        self.assertEqual([incompressible], pieces)
+        self.assertIsNone(compressor.current_format)
+
+    def test_adaptive_compressor_invalid_format(self):
+        self.assertRaises(
+            exception.CoriolisException, data_transfer.AdaptiveCompressor,
+            ["invalid"])
@@ -0,0 +1,75 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import tempfile
+import threading
+
+from oslo_config import cfg
+
+from coriolis import exception
+from coriolis import locks
+from coriolis.tests import test_base
+
+
+class FileLockManagerTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis file lock manager."""
+
+    def setUp(self):
+        super(FileLockManagerTestCase, self).setUp()
+        lock_path = tempfile.mkdtemp()
+        cfg.CONF.set_override(
+            "lock_path", lock_path, group="oslo_concurrency")
+        self.addCleanup(
+            cfg.CONF.clear_override, "lock_path", group="oslo_concurrency")
+        self.manager = locks.FileLockManager()
+
+    def _try_lock_in_thread(self, name, mode):
+        acquired = threading.Event()
+
+        def _lock():
+            with self.manager.lock(name, mode=mode):
+                acquired.set()
+
+        thread = threading.Thread(target=_lock, daemon=True)
+        thread.start()
+        return acquired, thread
+
+    def test_shared_read_locks(self):
+        with self.manager.lock("test", mode=locks.LOCK_MODE_READ):
+            acquired, thread = self._try_lock_in_thread(
+                "test", locks.LOCK_MODE_READ)
+            self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def test_write_lock_excludes_readers(self):
+        with self.manager.lock("test"):
+            acquired, thread = self._try_lock_in_thread(
+                "test", locks.LOCK_MODE_READ)
+            self.assertFalse(acquired.wait(0.5))
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+        with self.manager.lock("test", mode=locks.LOCK_MODE_READ):
+            acquired, thread = self._try_lock_in_thread(
+                "test", locks.LOCK_MODE_WRITE)
+            self.assertFalse(acquired.wait(0.5))
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def test_wait_stats(self):
+        with self.manager.lock("test"):
+            pass
+        with self.manager.lock("test", mode=locks.LOCK_MODE_READ):
+            pass
+
+        stats = self.manager.get_wait_stats()
+
+        self.assertEqual(["test"], list(stats))
+        self.assertEqual(2, stats["test"]["acquisitions"])
+        self.assertLessEqual(
+            stats["test"]["max_wait"], stats["test"]["total_wait"])
+
+    def test_invalid_mode(self):
+        self.assertRaises(
+            exception.CoriolisException,
+            self.manager.lock("test", mode="invalid").__enter__)
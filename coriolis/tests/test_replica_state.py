@@ -0,0 +1,70 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+import hashlib
+import json
+
+from coriolis import exception
+from coriolis import replica_state
+from coriolis.tests import test_base
+
+
+class ReplicaStateTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis replica_state module."""
+
+    def setUp(self):
+        super(ReplicaStateTestCase, self).setUp()
+        self._chunks = [
+            {"offset": i * 10485760, "length": 10485760,
+             "checksum": hashlib.sha256(str(i).encode()).hexdigest()}
+            for i in range(1024)]
+        self._state = {
+            "device-name": "sdb",
+            "size": 10737418240,
+            "chunks": self._chunks,
+        }
+
+    def test_encode_decode(self):
+        encoded = replica_state.encode(self._state)
+
+        self.assertEqual(
+            replica_state.ENCODING_PACKED, encoded["chunks"]["encoding"])
+        self.assertEqual("sdb", encoded["device-name"])
+        self.assertLess(
+            len(json.dumps(encoded)), len(json.dumps(self._state)) // 2)
+        self.assertEqual(self._state, replica_state.decode(encoded))
+
+    def test_encode_scalar_chunks(self):
+        state = {"chunks": [chunk["checksum"] for chunk in self._chunks]}
+
+        encoded = replica_state.encode(state)
+
+        self.assertIsInstance(encoded["chunks"], dict)
+        self.assertEqual(state, replica_state.decode(encoded))
+
+    def test_encode_unsupported_chunks(self):
+        states = [
+            {"chunks": [{"offset": 0}, {"length": 1}]},
+            {"chunks": [{"checksum": "not hex"}]},
+            {"chunks": [{"offset": -1}]},
+            {"chunks": []},
+        ]
+
+        for state in states:
+            self.assertEqual(state, replica_state.encode(state))
+
+    def test_get_chunks(self):
+        chunks = replica_state.get_chunks(replica_state.encode(self._state))
+
+        self.assertEqual(len(self._chunks), len(chunks))
+        self.assertIsNone(chunks._columns)
+        self.assertEqual(self._chunks[-1], chunks[-1])
+        self.assertEqual(self._chunks[10:12], chunks[10:12])
+        self.assertRaises(IndexError, chunks.__getitem__, len(self._chunks))
+        self.assertEqual(
+            self._chunks, replica_state.get_chunks(self._state))
+
+    def test_invalid_encoding(self):
+        self.assertRaises(
+            exception.CoriolisException, replica_state.PackedChunks,
+            {"encoding": "invalid"})
@@ -0,0 +1,278 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+from unittest import mock
+
+import eventlet
+from oslo_utils import units
+
+from coriolis.providers import replicator
+from coriolis.tests import test_base
+
+
+class ReplicatorTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis replicator client."""
+
+    def setUp(self):
+        super(ReplicatorTestCase, self).setUp()
+        self._chunk_size = 16
+        self._replicator = self._get_replicator()
+
+    def _set_override(self, name, value):
+        replicator.CONF.set_override(name, value, group="replicator")
+        self.addCleanup(
+            replicator.CONF.clear_override, name, group="replicator")
+
+    def _get_replicator(self, memory_budget=None):
+        repl = replicator.Replicator.__new__(replicator.Replicator)
+        repl._cert_dir = None
+        repl._chunk_size = self._chunk_size
+        repl._event_manager = mock.Mock()
+        repl._cli = mock.Mock()
+        repl._cli.download_chunk.side_effect = (
+            lambda disk, chunk: b"%d" % chunk["offset"])
+        repl._bandwidth_limiter = None
+        repl._memory_budget = None
+        if memory_budget:
+            repl._memory_budget = replicator._MemoryBudget(memory_budget)
+        return repl
+
+    def _get_chunks(self, *offsets, length=None):
+        return [
+            {"offset": offset, "length": length or self._chunk_size}
+            for offset in offsets]
+
+    def test_download_chunks(self):
+        self._set_override("chunk_download_workers", 2)
+        self._set_override("max_inflight_chunks", 2)
+        chunks = self._get_chunks(
+            *range(0, 5 * self._chunk_size, self._chunk_size))
+
+        downloads = self._replicator._download_chunks("sdb", chunks)
+        first_chunk, first_data = next(downloads)
+        # no more than 'max_inflight_chunks' are downloaded ahead:
+        self.assertLessEqual(
+            self._replicator._cli.download_chunk.call_count, 2)
+        results = [(first_chunk, first_data)] + list(downloads)
+
+        self.assertEqual(
+            [(chunk, b"%d" % chunk["offset"]) for chunk in chunks], results)
+
+    def test_download_chunks_error(self):
+        self._replicator._cli.download_chunk.side_effect = Exception("boom")
+
+        self.assertRaisesRegex(
+            Exception, "boom", list,
+            self._replicator._download_chunks(
+                "sdb", self._get_chunks(0, 16)))
+
+    def _setup_disks(self, count):
+        self._replicator._repl_state = None
+        self._replicator._volumes_info = [
+            {"disk_id": "disk%d" % i} for i in range(count)]
+        return [
+            {"disk_id": "disk%d" % i, "disk_path": "/dev/sd%d" % i}
+            for i in range(count)]
+
+    def test_replicate_disks_concurrently(self):
+        self._set_override("concurrent_disk_syncs", 2)
+        source_volumes_info = self._setup_disks(3)
+        running = []
+        max_running = []
+
+        def _replicate_disk(volume, dst_vol, *args):
+            running.append(volume["disk_id"])
+            max_running.append(len(running))
+            eventlet.sleep(0.01)
+            running.remove(volume["disk_id"])
+
+        with mock.patch.object(
+                self._replicator, "_replicate_disk",
+                side_effect=_replicate_disk) as mock_replicate_disk:
+            result = self._replicator.replicate_disks(
+                source_volumes_info, mock.sentinel.backup_writer)
+
+        self.assertEqual(3, mock_replicate_disk.call_count)
+        self.assertEqual(2, max(max_running))
+        self.assertEqual(
+            self._replicator._cli.get_status.return_value, result)
+
+    def test_replicate_disks_error(self):
+        self._set_override("concurrent_disk_syncs", 2)
+        source_volumes_info = self._setup_disks(2)
+        finished = []
+
+        def _replicate_disk(volume, dst_vol, *args):
+            if volume["disk_id"] == "disk0":
+                raise Exception("boom")
+            eventlet.sleep(1)
+            finished.append(volume["disk_id"])
+
+        with mock.patch.object(
+                self._replicator, "_replicate_disk",
+                side_effect=_replicate_disk):
+            self.assertRaisesRegex(
+                Exception, "boom", self._replicator.replicate_disks,
+                source_volumes_info, mock.sentinel.backup_writer)
+
+        # the other disks are not waited for and the state is not updated:
+        self.assertEqual([], finished)
+        self.assertIsNone(self._replicator._repl_state)
+
+    def test_coalesce_chunks(self):
+        self._set_override("max_coalesced_read_mb", 2)
+        self._set_override("coalesce_gap_tolerance_kb", 0)
+        chunks = self._get_chunks(
+            3 * units.Mi, 0, units.Mi, 2 * units.Mi, 5 * units.Mi,
+            length=units.Mi)
+
+        # adjacent chunks are merged up to the size limit, but not across
+        # gaps, regardless of the order they are provided in:
+        self.assertEqual(
+            [{"offset": 0, "length": 2 * units.Mi},
+             {"offset": 2 * units.Mi, "length": 2 * units.Mi},
+             {"offset": 5 * units.Mi, "length": units.Mi}],
+            self._replicator._coalesce_chunks(chunks))
+
+    def test_coalesce_chunks_gap_tolerance(self):
+        self._set_override("max_coalesced_read_mb", 64)
+        self._set_override("coalesce_gap_tolerance_kb", 4)
+        chunks = [
+            {"offset": 0, "length": 4 * units.Ki},
+            # within the gap tolerance:
+            {"offset": 8 * units.Ki, "length": 4 * units.Ki},
+            # past the gap tolerance:
+            {"offset": 17 * units.Ki, "length": 4 * units.Ki}]
+
+        self.assertEqual(
+            [{"offset": 0, "length": 12 * units.Ki},
+             {"offset": 17 * units.Ki, "length": 4 * units.Ki}],
+            self._replicator._coalesce_chunks(chunks))
+
+    def test_coalesce_chunks_disabled(self):
+        self._set_override("max_coalesced_read_mb", 0)
+        chunks = self._get_chunks(0, self._chunk_size)
+
+        self.assertEqual(chunks, self._replicator._coalesce_chunks(chunks))
+
+    def test_memory_budget(self):
+        budget = replicator._MemoryBudget(10)
+
+        self.assertTrue(budget.reserve(6))
+        self.assertFalse(budget.reserve(6, blocking=False))
+        budget.release(6)
+        # reservations larger than the whole budget are capped to it:
+        self.assertTrue(budget.reserve(20, blocking=False))
+        self.assertFalse(budget.reserve(1, blocking=False))
+        budget.release(20)
+        self.assertTrue(budget.reserve(10, blocking=False))
+
+    def test_download_chunks_releases_memory(self):
+        self._set_override("max_inflight_chunks", 4)
+        repl = self._get_replicator(memory_budget=3 * self._chunk_size)
+        chunks = self._get_chunks(
+            *range(0, 5 * self._chunk_size, self._chunk_size))
+
+        self.assertEqual(
+            [(chunk, b"%d" % chunk["offset"]) for chunk in chunks],
+            list(repl._download_chunks("sdb", chunks)))
+        self.assertEqual(
+            3 * self._chunk_size, repl._memory_budget._available)
+
+        # the memory is also released if the consumer stops early:
+        downloads = repl._download_chunks("sdb", chunks)
+        next(downloads)
+        downloads.close()
+        self.assertEqual(
+            3 * self._chunk_size, repl._memory_budget._available)
+
+    def test_chunk_bitmap_round_trip(self):
+        for chunk_indexes in [set(), {0}, {7, 8}, {0, 3, 15, 16, 1000}]:
+            self.assertEqual(
+                chunk_indexes,
+                replicator._decode_chunk_bitmap(
+                    replicator._encode_chunk_bitmap(chunk_indexes)))
+
+    def test_chunk_index_encode(self):
+        index = replicator._ChunkIndex(None, 3)
+        for i in range(4):
+            index.add(b"%032d" % i, i * self._chunk_size)
+        index.find(b"%032d" % 1)
+
+        # only the most recently used hashes are stored:
+        decoded = replicator._ChunkIndex(index.encode(2), 3)
+        self.assertIsNone(decoded.find(b"%032d" % 0))
+        self.assertIsNone(decoded.find(b"%032d" % 2))
+        self.assertEqual(3 * self._chunk_size, decoded.find(b"%032d" % 3))
+        self.assertEqual(self._chunk_size, decoded.find(b"%032d" % 1))
+        self.assertEqual("", index.encode(0))
+
+    def test_write_buffer(self):
+        index = replicator._ChunkIndex(None, 10)
+        destination = mock.Mock()
+        data = b"a" * self._chunk_size
+
+        self.assertEqual(
+            self._chunk_size,
+            self._replicator._write_buffer(destination, index, 0, data))
+        destination.write.assert_called_once_with(data)
+
+        # duplicate chunks are copied from the first one:
+        self.assertEqual(
+            0, self._replicator._write_buffer(
+                destination, index, self._chunk_size, data))
+        destination.copy.assert_called_once_with(0, self._chunk_size)
+
+        # chunks are never copied over themselves:
+        destination.reset_mock()
+        index = replicator._ChunkIndex(None, 10)
+        index.add(self._replicator._hash_buffer(data), 0)
+        self._replicator._write_buffer(destination, index, 0, data)
+        destination.write.assert_called_once_with(data)
+        destination.copy.assert_not_called()
+
+    def _get_checkpoint(self, completed, state_digest="digest",
+                        chunk_size=None):
+        return {
+            "state_digest": state_digest,
+            "chunk_size": chunk_size or self._chunk_size,
+            "completed": replicator._encode_chunk_bitmap(completed)}
+
+    def test_get_completed_chunks(self):
+        dst_vol = {"disk_id": "disk0"}
+        self.assertEqual(
+            set(), self._replicator._get_completed_chunks(dst_vol, "digest"))
+
+        dst_vol["replica_checkpoint"] = self._get_checkpoint({1, 3})
+        self.assertEqual(
+            {1, 3}, self._replicator._get_completed_chunks(dst_vol, "digest"))
+
+        # checkpoints of a source disk which changed since are ignored:
+        self.assertEqual(
+            set(), self._replicator._get_completed_chunks(dst_vol, "other"))
+        dst_vol["replica_checkpoint"] = self._get_checkpoint(
+            {1, 3}, chunk_size=2 * self._chunk_size)
+        self.assertEqual(
+            set(), self._replicator._get_completed_chunks(dst_vol, "digest"))
+
+    @mock.patch.object(replicator.Replicator, "_write_chunks")
+    def test_replicate_disk_resumes_from_checkpoint(self, mock_write_chunks):
+        curr_state = [{"device-name": "sdb", "size": 4 * self._chunk_size}]
+        state_digest = self._replicator._get_state_digest(curr_state[0])
+        chunks = self._get_chunks(
+            *range(0, 4 * self._chunk_size, self._chunk_size))
+        self._replicator._cli.get_changes.return_value = chunks
+        dst_vol = {
+            "disk_id": "disk0",
+            "replica_checkpoint": self._get_checkpoint(
+                {0, 2}, state_digest=state_digest)}
+
+        self._replicator._replicate_disk(
+            {"disk_id": "disk0", "disk_path": "/dev/sdb"}, dst_vol,
+            curr_state, False, mock.sentinel.backup_writer)
+
+        # only the chunks which were not checkpointed are written:
+        mock_write_chunks.assert_called_once_with(
+            {"disk_id": "disk0", "disk_path": "/dev/sdb"}, dst_vol, "sdb",
+            chunks, [chunks[1], chunks[3]], mock.sentinel.backup_writer,
+            state_digest, {0, 2})
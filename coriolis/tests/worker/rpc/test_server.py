@@ -27,6 +27,9 @@ class WorkerServerEndpointTestCase(test_base.CoriolisBaseTestCase):
                        "_register_worker_service")
     def setUp(self, _):  # pylint: disable=arguments-differ
         super(WorkerServerEndpointTestCase, self).setUp()
+        for opt in ("load_report_interval", "task_process_pool_size"):
+            server.CONF.set_override(opt, 0, group="worker")
+            self.addCleanup(server.CONF.clear_override, opt, group="worker")
         self.server = server.WorkerServerEndpoint()
 
     @mock.patch.object(server.WorkerServerEndpoint,
@@ -194,6 +197,97 @@ class WorkerServerEndpointTestCase(test_base.CoriolisBaseTestCase):
             )
             mock_client.confirm_task_cancellation.assert_called_once()
 
+    @mock.patch.object(server.task_pool, "get_process_task")
+    @mock.patch.object(server.WorkerServerEndpoint, "_rpc_conductor_client")
+    @mock.patch.object(psutil, "Process")
+    def test_cancel_task_pooled_process(
+            self, mock_process, mock_client, mock_get_process_task):
+        mock_get_process_task.return_value = (True, "other_task_id")
+
+        self.server.cancel_task(
+            mock.sentinel.context, "task_id", mock.sentinel.process_id,
+            False)
+
+        # the pooled process has moved on to another task:
+        mock_process.return_value.send_signal.assert_not_called()
+        mock_client.confirm_task_cancellation.assert_called_once()
+
+        mock_get_process_task.return_value = (True, "task_id")
+        self.server.cancel_task(
+            mock.sentinel.context, "task_id", mock.sentinel.process_id,
+            False)
+
+        mock_process.return_value.send_signal.assert_called_once_with(
+            signal.SIGINT)
+
+    @mock.patch.object(eventlet, "spawn")
+    @mock.patch.object(server.WorkerServerEndpoint, "_rpc_conductor_client")
+    @mock.patch.object(
+        server.WorkerServerEndpoint, "_get_extra_library_paths_for_providers"
+    )
+    def test_exec_task_in_pooled_process(
+            self, mock_get_extra_lib_paths, mock_rpc_client, mock_spawn):
+        server.CONF.set_override(
+            "task_process_pool_size", 2, group="worker")
+        mock_pool = mock.Mock()
+        self.server._task_process_pool_instance = mock_pool
+        pooled = mock_pool.acquire.return_value
+        pooled.tasks_run = 0
+        mock_spawn.return_value.wait.return_value = (
+            mock.sentinel.task_result,)
+        manager = mock.Mock()
+        manager.attach_mock(pooled.task_q.put, "put")
+        manager.attach_mock(pooled.wait_for_task, "wait_for_task")
+        manager.attach_mock(
+            mock_rpc_client.set_task_process, "set_task_process")
+
+        result = self.server._exec_task_process(
+            mock.sentinel.context, mock.sentinel.task_id,
+            mock.sentinel.task_type, mock.sentinel.origin,
+            mock.sentinel.destination, mock.sentinel.instance,
+            mock.sentinel.task_info)
+
+        self.assertEqual(mock.sentinel.task_result, result)
+        mock_pool.acquire.assert_called_once_with(
+            mock_get_extra_lib_paths.return_value)
+        # the process is only reported once it started the task:
+        manager.assert_has_calls([
+            mock.call.put(
+                (mock.sentinel.context, mock.sentinel.task_id,
+                 mock.sentinel.task_type, mock.sentinel.origin,
+                 mock.sentinel.destination, mock.sentinel.instance,
+                 mock.sentinel.task_info)),
+            mock.call.wait_for_task(mock.sentinel.task_id),
+            mock.call.set_task_process(
+                mock.sentinel.context, mock.sentinel.task_id, pooled.pid)])
+        mock_pool.release.assert_called_once_with(pooled, reusable=True)
+        self.assertEqual(1, pooled.tasks_run)
+
+        # processes which got interrupted are not reused:
+        mock_pool.release.reset_mock()
+        mock_spawn.return_value.wait.return_value = None
+        self.assertRaises(
+            exception.TaskProcessCanceledException,
+            self.server._exec_task_process, mock.sentinel.context,
+            mock.sentinel.task_id, mock.sentinel.task_type,
+            mock.sentinel.origin, mock.sentinel.destination,
+            mock.sentinel.instance, mock.sentinel.task_info)
+        mock_pool.release.assert_called_once_with(pooled, reusable=False)
+
+        # processes which already got the task are stopped if reporting
+        # them fails:
+        mock_pool.release.reset_mock()
+        mock_rpc_client.set_task_process.side_effect = (
+            exception.TaskIsCancelling(task_id=mock.sentinel.task_id))
+        self.assertRaises(
+            exception.TaskIsCancelling,
+            self.server._exec_task_process, mock.sentinel.context,
+            mock.sentinel.task_id, mock.sentinel.task_type,
+            mock.sentinel.origin, mock.sentinel.destination,
+            mock.sentinel.instance, mock.sentinel.task_info)
+        pooled.process.terminate.assert_called_once_with()
+        mock_pool.release.assert_called_once_with(pooled, reusable=False)
+
     @mock.patch.object(server.WorkerServerEndpoint, "_exec_task_process")
     @mock.patch.object(server.WorkerServerEndpoint, "_rpc_conductor_client")
     @mock.patch.object(utils, "sanitize_task_info")
@@ -903,6 +997,46 @@ class WorkerServerEndpointTestCase(test_base.CoriolisBaseTestCase):
         result = call_validate_endpoint_connection()
         self.assertEqual(result[0], False)
 
+    @mock.patch.object(server.tasks_base, "unmarshal_migr_conn_info")
+    @mock.patch.object(utils, "get_secret_connection_info")
+    @mock.patch.object(providers_factory, "get_provider")
+    def test_healthcheck_minion_machines(
+            self, mock_get_provider, mock_get_secret_connection_info,
+            mock_unmarshal_conn_info):
+        provider = mock_get_provider.return_value
+
+        def _healthcheck_minion(
+                ctxt, conn_info, provider_properties, minion_conn_info):
+            if provider_properties == "props2":
+                raise Exception("unreachable")
+        provider.healthcheck_minion.side_effect = _healthcheck_minion
+        minion_machines = {
+            "machine1": {
+                "minion_provider_properties": "props1",
+                "minion_connection_info": "conn_info1"},
+            "machine2": {
+                "minion_provider_properties": "props2",
+                "minion_connection_info": "conn_info2"}}
+
+        result = self.server.healthcheck_minion_machines(
+            mock.sentinel.context, mock.sentinel.platform_name,
+            constants.PROVIDER_PLATFORM_SOURCE, mock.sentinel.connection_info,
+            minion_machines)
+
+        # the errors of each machine are reported separately:
+        self.assertEqual(
+            {"machine1": None, "machine2": "unreachable"}, result)
+        mock_get_provider.assert_called_once_with(
+            mock.sentinel.platform_name,
+            constants.PROVIDER_TYPE_SOURCE_MINION_POOL, None)
+        mock_get_secret_connection_info.assert_called_once_with(
+            mock.sentinel.context, mock.sentinel.connection_info)
+        provider.healthcheck_minion.assert_any_call(
+            mock.sentinel.context,
+            mock_get_secret_connection_info.return_value, "props1",
+            mock_unmarshal_conn_info.return_value)
+        self.assertEqual(2, provider.healthcheck_minion.call_count)
+
     @mock.patch.object(providers_factory, "get_provider")
     @ddt.data(
         (
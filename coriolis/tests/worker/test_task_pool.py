@@ -0,0 +1,65 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+from unittest import mock
+
+from coriolis.tests import test_base
+from coriolis.worker import task_pool
+
+
+class TaskProcessPoolTestCase(test_base.CoriolisBaseTestCase):
+    """Collection of tests for the Coriolis Worker task process pool."""
+
+    def setUp(self):
+        super(TaskProcessPoolTestCase, self).setUp()
+        self.start_process = mock.Mock()
+        self.pool = task_pool.TaskProcessPool(
+            mock.sentinel.target, self.start_process, mock.Mock(),
+            max_idle_processes=1, max_tasks_per_process=2)
+
+    @mock.patch.object(task_pool.eventlet, "spawn")
+    @mock.patch.object(task_pool, "PooledTaskProcess")
+    def test_acquire_release(self, mock_pooled_process, mock_spawn):
+        mock_pooled_process.side_effect = lambda target, paths: mock.Mock(
+            library_paths=paths, tasks_run=0)
+
+        pooled = self.pool.acquire(["/lib1"])
+        pooled.tasks_run = 1
+        self.pool.release(pooled)
+
+        self.assertIs(pooled, self.pool.acquire(["/lib1"]))
+        self.pool.release(pooled)
+        # processes are partitioned by their library paths:
+        other = self.pool.acquire(["/lib2"])
+        self.assertIsNot(pooled, other)
+        self.start_process.assert_called_with(other.process, ["/lib2"])
+
+        # too many idle processes:
+        self.pool.release(other)
+        mock_spawn.assert_any_call(pooled.stop)
+
+        # processes get replaced after running the maximum number of tasks:
+        other.tasks_run = 2
+        self.assertIs(other, self.pool.acquire(["/lib2"]))
+        self.pool.release(other)
+        mock_spawn.assert_any_call(other.stop)
+        replacement = self.pool.acquire(["/lib2"])
+        self.assertIsNot(other, replacement)
+        self.assertEqual(3, self.start_process.call_count)
+
+    @mock.patch.object(task_pool.eventlet, "sleep")
+    @mock.patch.object(task_pool, "get_process_task")
+    def test_wait_for_task(self, mock_get_process_task, mock_sleep):
+        pooled = task_pool.PooledTaskProcess.__new__(
+            task_pool.PooledTaskProcess)
+        pooled.process = mock.Mock()
+        pooled.process.is_alive.return_value = True
+        mock_get_process_task.side_effect = [
+            (True, None), (True, "other_task_id"), (True, "task_id")]
+
+        self.assertTrue(pooled.wait_for_task("task_id"))
+        self.assertEqual(2, mock_sleep.call_count)
+        mock_get_process_task.assert_called_with(pooled.pid)
+
+        pooled.process.is_alive.return_value = False
+        self.assertFalse(pooled.wait_for_task("task_id"))
@@ -657,7 +657,9 @@ def sanitize_task_info(task_info):
         for vol in task_info['volumes_info']:
             vol_cpy = {}
             for key in vol:
-                if key != "replica_state":
+                if key in ("chunk_index", "replica_checkpoint"):
+                    vol_cpy[key] = "<redacted>"
+                elif key != "replica_state":
                     vol_cpy[key] = copy.deepcopy(vol[key])
                 else:
                     vol_cpy['replica_state'] = {}
@@ -0,0 +1,124 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+""" Tracking of the load of the host of a Worker service, which is reported
+to the Conductor for the Scheduler to weigh Worker services by.
+"""
+
+import contextlib
+import multiprocessing
+import time
+
+from oslo_config import cfg
+from oslo_log import log as logging
+import psutil
+
+from coriolis import constants
+
+
+worker_load_opts = [
+    cfg.IntOpt("max_concurrent_tasks",
+               default=0,
+               min=0,
+               help="Maximum number of tasks which the Scheduler will have "
+                    "running on this Worker service at once. 0 means no "
+                    "limit."),
+    cfg.IntOpt("max_concurrent_disk_transfers",
+               default=0,
+               min=0,
+               help="Maximum number of disk transfer tasks which the "
+                    "Scheduler will have running on this Worker service at "
+                    "once. 0 means no limit."),
+    cfg.IntOpt("network_bandwidth_capacity",
+               default=0,
+               min=0,
+               help="Network bandwidth available to this Worker service in "
+                    "Mbps. 0 means it is determined from the link speeds of "
+                    "the host's network interfaces."),
+    cfg.IntOpt("load_report_interval",
+               default=15,
+               min=0,
+               help="Number of seconds between the reports of the load of "
+                    "this Worker service to the Conductor. 0 disables load "
+                    "reporting, in which case the Scheduler cannot take the "
+                    "load of this service into account."),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(worker_load_opts, 'worker')
+
+LOG = logging.getLogger(__name__)
+
+
+class WorkerLoadTracker(object):
+    """ Tracks the load of the host of a Worker service.
+
+    The counters of running tasks are kept in shared memory, so the tracker
+    must be instantiated before the service forks its worker processes in
+    order for the tasks started by all of them to be accounted for.
+    """
+
+    def __init__(self):
+        self._running_tasks = multiprocessing.Value('i', 0)
+        self._running_disk_transfers = multiprocessing.Value('i', 0)
+        self._last_network_sample = None
+
+    def _update_running_tasks(self, task_type, delta):
+        with self._running_tasks.get_lock():
+            self._running_tasks.value += delta
+        if task_type in constants.DISK_TRANSFER_TASKS:
+            with self._running_disk_transfers.get_lock():
+                self._running_disk_transfers.value += delta
+
+    @contextlib.contextmanager
+    def track_task(self, task_type):
+        self._update_running_tasks(task_type, 1)
+        try:
+            yield
+        finally:
+            self._update_running_tasks(task_type, -1)
+
+    def _get_network_throughput(self):
+        """ Returns the number of bytes per second sent and received by the
+        host since the previous call, or 0 on the first call.
+        """
+        counters = psutil.net_io_counters()
+        sample = (time.time(), counters.bytes_sent + counters.bytes_recv)
+        previous = self._last_network_sample
+        self._last_network_sample = sample
+        if not previous or sample[0] <= previous[0]:
+            return 0
+        return max(0, int(
+            (sample[1] - previous[1]) / (sample[0] - previous[0])))
+
+    def _get_network_capacity(self):
+        """ Returns the network bandwidth of the host in bytes per second,
+        or 0 if it could not be determined.
+        """
+        capacity_mbps = CONF.worker.network_bandwidth_capacity
+        if not capacity_mbps:
+            try:
+                capacity_mbps = sum(
+                    stats.speed for nic, stats in psutil.net_if_stats().items()
+                    if stats.isup and stats.speed > 0 and nic != "lo")
+            except Exception:
+                LOG.debug(
+                    "Failed to determine the link speeds of the network "
+                    "interfaces", exc_info=True)
+                capacity_mbps = 0
+        return capacity_mbps * 1000 * 1000 // 8
+
+    def get_load(self):
+        return {
+            "running_tasks": self._running_tasks.value,
+            "max_running_tasks": CONF.worker.max_concurrent_tasks,
+            "running_disk_transfers": self._running_disk_transfers.value,
+            "max_running_disk_transfers": (
+                CONF.worker.max_concurrent_disk_transfers),
+            "cpu_count": psutil.cpu_count() or 1,
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": psutil.virtual_memory().percent,
+            "network_bytes_per_second": self._get_network_throughput(),
+            "network_capacity_bytes_per_second": (
+                self._get_network_capacity()),
+        }
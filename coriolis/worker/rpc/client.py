@@ -186,3 +186,12 @@ class WorkerClient(rpc.BaseRPCClient):
         return self._call(
             ctxt, 'validate_endpoint_destination_minion_pool_options',
             platform_name=platform_name, pool_environment=pool_environment)
+
+    def healthcheck_minion_machines(
+            self, ctxt, platform_name, pool_platform, connection_info,
+            minion_machines):
+        return self._call(
+            ctxt, 'healthcheck_minion_machines',
+            platform_name=platform_name, pool_platform=pool_platform,
+            connection_info=connection_info,
+            minion_machines=minion_machines)
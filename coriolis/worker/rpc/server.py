@@ -24,12 +24,24 @@ from coriolis.minion_manager.rpc import client as rpc_minion_manager_client
 from coriolis.providers import factory as providers_factory
 from coriolis import schemas
 from coriolis import service
+from coriolis.tasks import base as tasks_base
 from coriolis.tasks import factory as task_runners_factory
 from coriolis import utils
+from coriolis.worker import load as worker_load
+from coriolis.worker import task_pool
 
 
+worker_opts = [
+    cfg.IntOpt("minion_healthcheck_concurrency",
+               default=10,
+               min=1,
+               help="Maximum number of minion machines which are "
+                    "healthchecked at the same time as part of a batched "
+                    "minion machine healthcheck request."),
+]
+
 CONF = cfg.CONF
-CONF.register_opts([], 'worker')
+CONF.register_opts(worker_opts, 'worker')
 
 LOG = logging.getLogger(__name__)
 
@@ -51,6 +63,13 @@ class WorkerServerEndpoint(object):
         self._server = utils.get_hostname()
         self._service_registration = self._register_worker_service()
         self._rpc_conductor_client_instance = None
+        self._load_tracker = worker_load.WorkerLoadTracker()
+        self._task_process_pool_instance = None
+        if CONF.worker.load_report_interval:
+            # NOTE: the endpoint is instantiated before the service forks its
+            # worker processes, whose eventlet hubs get reset, so the load is
+            # only reported from the parent process:
+            eventlet.spawn(self._report_load_periodically)
 
     @property
     def _rpc_conductor_client(self):
@@ -86,6 +105,23 @@ class WorkerServerEndpoint(object):
         self._service_registration = service_registration
         return service_registration
 
+    def _report_load_periodically(self):
+        dummy_context = context.RequestContext("coriolis", "admin")
+        service_id = self._service_registration['id']
+        # NOTE: the client is instantiated from the reporting thread so that
+        # the forked worker processes do not inherit it:
+        conductor_rpc = rpc_conductor_client.ConductorClient()
+        while True:
+            try:
+                conductor_rpc.update_service_load(
+                    dummy_context, service_id, self._load_tracker.get_load())
+            except Exception:
+                LOG.warn(
+                    "Failed to report the load of Worker service '%s'. "
+                    "Error was: %s", service_id,
+                    utils.get_exception_details())
+            eventlet.sleep(CONF.worker.load_report_interval)
+
     def _check_remove_dir(self, path):
         try:
             if os.path.exists(path):
@@ -118,6 +154,14 @@ class WorkerServerEndpoint(object):
         try:
             p = psutil.Process(process_id)
 
+            is_pooled, running_task_id = task_pool.get_process_task(
+                process_id)
+            if is_pooled and running_task_id != task_id:
+                # NOTE: pooled task processes outlive their tasks, so the
+                # process must not be interrupted if it moved on from the
+                # task which is to be cancelled:
+                raise psutil.NoSuchProcess(process_id)
+
             if force:
                 LOG.warn("Killing process: %s", process_id)
                 p.kill()
@@ -185,8 +229,11 @@ class WorkerServerEndpoint(object):
         task_runner = task_runners_factory.get_task_runner_class(
             task_type)()
 
-        return task_runner.get_shared_libs_for_providers(
-            ctxt, origin, destination, event_handler)
+        try:
+            return task_runner.get_shared_libs_for_providers(
+                ctxt, origin, destination, event_handler)
+        finally:
+            _flush_task_events(event_handler)
 
     def _wait_for_process(self, p, mp_q):
         result = None
@@ -206,9 +253,65 @@ class WorkerServerEndpoint(object):
                 break
         return result
 
-    def _exec_task_process(
+    def _wait_for_pooled_process_result(self, p, result_q):
+        while True:
+            try:
+                return result_q.get(timeout=1)
+            except queue.Empty:
+                if not p.is_alive():
+                    break
+        try:
+            return result_q.get(False)
+        except queue.Empty:
+            return None
+
+    @property
+    def _task_process_pool(self):
+        if not CONF.worker.task_process_pool_size:
+            return None
+        # NOTE: the pool is instantiated lazily so that each of the forked
+        # worker processes gets its own:
+        if self._task_process_pool_instance is None:
+            self._task_process_pool_instance = task_pool.TaskProcessPool(
+                _pooled_task_process,
+                self._start_process_with_custom_library_paths,
+                self._handle_mp_log_events,
+                CONF.worker.task_process_pool_size,
+                CONF.worker.task_process_max_tasks)
+        return self._task_process_pool_instance
+
+    def _check_task_process_start_error(self, task_id, ex):
+        LOG.debug(
+            "Exception occurred whilst setting host for task '%s'. Error "
+            "was: %s", task_id, utils.get_exception_details())
+        # NOTE: because the task error classes are wrapped,
+        # it's easiest to just check that the messages align:
+        cancelling_msg = (
+            exception.TASK_ALREADY_CANCELLING_EXCEPTION_FMT % {
+                "task_id": task_id})
+        if cancelling_msg in str(ex):
+            raise exception.TaskIsCancelling(
+                "Task '%s' was already in cancelling status." % task_id)
+
+    def _get_task_process_result(self, task_id, pid, result):
+        if result is None:
+            LOG.debug(
+                "No result from process (%s) running task '%s'. "
+                "Presuming task was cancelled.",
+                pid, task_id)
+            raise exception.TaskProcessCanceledException(
+                "Task was canceled.")
+
+        if isinstance(result, str):
+            LOG.debug(
+                "Error message while running task '%s' on process "
+                "with PID '%s': %s", task_id, pid, result)
+            raise exception.TaskProcessException(result)
+        return result
+
+    def _exec_task_in_new_process(
             self, ctxt, task_id, task_type, origin, destination, instance,
-            task_info, report_to_conductor=True):
+            task_info, extra_library_paths, report_to_conductor=True):
         mp_ctx = multiprocessing.get_context('spawn')
         mp_q = mp_ctx.Queue()
         mp_log_q = mp_ctx.Queue()
@@ -217,9 +320,6 @@ class WorkerServerEndpoint(object):
             args=(ctxt, task_id, task_type, origin, destination, instance,
                   task_info, mp_q, mp_log_q))
 
-        extra_library_paths = self._get_extra_library_paths_for_providers(
-            ctxt, task_id, task_type, origin, destination)
-
         try:
             if report_to_conductor:
                 LOG.debug(
@@ -243,39 +343,85 @@ class WorkerServerEndpoint(object):
                 "Successfully started and reported task process for task "
                 "with ID '%s' (PID %d)", task_id, p.pid)
         except (Exception, KeyboardInterrupt) as ex:
-            LOG.debug(
-                "Exception occurred whilst setting host for task '%s'. Error "
-                "was: %s", task_id, utils.get_exception_details())
-            # NOTE: because the task error classes are wrapped,
-            # it's easiest to just check that the messages align:
-            cancelling_msg = (
-                exception.TASK_ALREADY_CANCELLING_EXCEPTION_FMT % {
-                    "task_id": task_id})
-            if cancelling_msg in str(ex):
-                raise exception.TaskIsCancelling(
-                    "Task '%s' was already in cancelling status." % task_id)
+            self._check_task_process_start_error(task_id, ex)
             raise
 
-        evt = eventlet.spawn(self._wait_for_process, p, mp_q)
-        eventlet.spawn(self._handle_mp_log_events, p, mp_log_q)
+        with self._load_tracker.track_task(task_type):
+            evt = eventlet.spawn(self._wait_for_process, p, mp_q)
+            eventlet.spawn(self._handle_mp_log_events, p, mp_log_q)
 
-        result = evt.wait()
-        p.join()
+            result = evt.wait()
+            p.join()
 
-        if result is None:
-            LOG.debug(
-                "No result from process (%s) running task '%s'. "
-                "Presuming task was cancelled.",
-                p.pid, task_id)
-            raise exception.TaskProcessCanceledException(
-                "Task was canceled.")
+        return self._get_task_process_result(task_id, p.pid, result)
 
-        if isinstance(result, str):
-            LOG.debug(
-                "Error message while running task '%s' on process "
-                "with PID '%s': %s", task_id, p.pid, result)
-            raise exception.TaskProcessException(result)
-        return result
+    def _exec_task_in_pooled_process(
+            self, ctxt, task_id, task_type, origin, destination, instance,
+            task_info, extra_library_paths, report_to_conductor=True):
+        pool = self._task_process_pool
+        pooled = None
+        try:
+            if report_to_conductor:
+                LOG.debug(
+                    "Attempting to set task host on Conductor for task '%s'.",
+                    task_id)
+                self._rpc_conductor_client.set_task_host(
+                    ctxt, task_id, self._server)
+            pooled = pool.acquire(extra_library_paths)
+            LOG.info(
+                "Running task '%s' in pooled process %s", task_id, pooled.pid)
+            pooled.task_q.put(
+                (ctxt, task_id, task_type, origin, destination, instance,
+                 task_info))
+            # NOTE: the process is only reported once it has recorded the
+            # task as its current one, as cancellation requests would
+            # otherwise find it idle and leave the task running:
+            if not pooled.wait_for_task(task_id):
+                LOG.warn(
+                    "Pooled process %s died before starting task '%s'.",
+                    pooled.pid, task_id)
+            if report_to_conductor:
+                LOG.debug(
+                    "Attempting to set task process on Conductor "
+                    "for task '%s'.",
+                    task_id)
+                self._rpc_conductor_client.set_task_process(
+                    ctxt, task_id, pooled.pid)
+        except (Exception, KeyboardInterrupt) as ex:
+            if pooled:
+                # NOTE: the process may have already started the task, so it
+                # is stopped right away instead of being reused:
+                pooled.process.terminate()
+                pool.release(pooled, reusable=False)
+            self._check_task_process_start_error(task_id, ex)
+            raise
+
+        with self._load_tracker.track_task(task_type):
+            result = eventlet.spawn(
+                self._wait_for_pooled_process_result, pooled.process,
+                pooled.result_q).wait()
+        pooled.tasks_run += 1
+        # NOTE: the results of pooled processes are wrapped in a tuple, with
+        # no result meaning that the process was interrupted or crashed:
+        pool.release(pooled, reusable=result is not None)
+        if result is not None:
+            result = result[0]
+
+        return self._get_task_process_result(task_id, pooled.pid, result)
+
+    def _exec_task_process(
+            self, ctxt, task_id, task_type, origin, destination, instance,
+            task_info, report_to_conductor=True):
+        extra_library_paths = self._get_extra_library_paths_for_providers(
+            ctxt, task_id, task_type, origin, destination)
+
+        exec_task_func = self._exec_task_in_new_process
+        if self._task_process_pool:
+            exec_task_func = self._exec_task_in_pooled_process
+        return exec_task_func(
+            ctxt, task_id, task_type, origin, destination, instance,
+            task_info, extra_library_paths,
+            report_to_conductor=report_to_conductor)
 
     def exec_task(self, ctxt, task_id, task_type, origin, destination,
                   instance, task_info, report_to_conductor=True):
@@ -556,6 +702,45 @@ class WorkerServerEndpoint(object):
 
         return (is_valid, message)
 
+    def healthcheck_minion_machines(
+            self, ctxt, platform_name, pool_platform, connection_info,
+            minion_machines):
+        """ Healthchecks the given minion machines of a pool, reusing the
+        same provider and endpoint connection info for all of them.
+
+        :param minion_machines: dict of the form {
+            "<machine_id>": {
+                "minion_provider_properties": {...},
+                "minion_connection_info": {...}}}
+        Returns a dict with the error message of the healthcheck of each
+        machine, or None if it was successful.
+        """
+        provider_type = constants.PROVIDER_TYPE_SOURCE_MINION_POOL
+        if pool_platform != constants.PROVIDER_PLATFORM_SOURCE:
+            provider_type = constants.PROVIDER_TYPE_DESTINATION_MINION_POOL
+        provider = providers_factory.get_provider(
+            platform_name, provider_type, None)
+        secret_connection_info = utils.get_secret_connection_info(
+            ctxt, connection_info)
+
+        def _healthcheck_machine(machine_id):
+            machine_info = minion_machines[machine_id]
+            try:
+                provider.healthcheck_minion(
+                    ctxt, secret_connection_info,
+                    machine_info["minion_provider_properties"],
+                    tasks_base.unmarshal_migr_conn_info(
+                        machine_info["minion_connection_info"]))
+            except Exception as ex:
+                LOG.debug(
+                    "Healthcheck of minion machine '%s' failed: %s",
+                    machine_id, utils.get_exception_details())
+                return machine_id, str(ex) or ex.__class__.__name__
+            return machine_id, None
+
+        pool = eventlet.GreenPool(CONF.worker.minion_healthcheck_concurrency)
+        return dict(pool.imap(_healthcheck_machine, list(minion_machines)))
+
     def validate_endpoint_connection(self, ctxt, platform_name,
                                      connection_info):
         provider = providers_factory.get_provider(
@@ -637,11 +822,22 @@ def _setup_task_process(mp_log_q):
     log_root.addHandler(handlers.QueueHandler(mp_log_q))
 
 
-def _task_process(ctxt, task_id, task_type, origin, destination, instance,
-                  task_info, mp_q, mp_log_q):
+def _flush_task_events(event_handler):
+    # NOTE: the events are sent synchronously, as the conductor refuses
+    # events for tasks which have already completed:
     try:
-        _setup_task_process(mp_log_q)
+        event_handler.flush(wait=True)
+    except Exception:
+        LOG.warn(
+            "Failed to send the remaining task events to the conductor",
+            exc_info=True)
 
+
+def _run_task(ctxt, task_id, task_type, origin, destination, instance,
+              task_info):
+    """ Runs the given task, returning its result or its error message. """
+    event_handler = None
+    try:
         task_runner = task_runners_factory.get_task_runner_class(
             task_type)()
         event_handler = _get_event_handler_for_task_type(
@@ -660,10 +856,62 @@ def _task_process(ctxt, task_id, task_type, origin, destination, instance,
             ctxt, instance, origin, destination, task_info, event_handler)
         # mq_p.put() doesn't raise if new_task_info is not serializable
         utils.is_serializable(task_result)
-        mp_q.put(task_result)
+        _flush_task_events(event_handler)
+        return task_result
     except Exception as ex:
-        mp_q.put(str(ex))
+        if event_handler:
+            _flush_task_events(event_handler)
         LOG.exception(ex)
+        return str(ex)
+
+
+def _task_process(ctxt, task_id, task_type, origin, destination, instance,
+                  task_info, mp_q, mp_log_q):
+    try:
+        try:
+            _setup_task_process(mp_log_q)
+        except Exception as ex:
+            mp_q.put(str(ex))
+            LOG.exception(ex)
+            return
+
+        mp_q.put(_run_task(
+            ctxt, task_id, task_type, origin, destination, instance,
+            task_info))
+    finally:
+        # Signal the log event handler that there are no more events
+        mp_log_q.put(None)
+
+
+def _pooled_task_process(parent_pid, task_q, result_q, mp_log_q):
+    try:
+        try:
+            _setup_task_process(mp_log_q)
+            task_pool.set_current_task(None)
+        except Exception as ex:
+            # NOTE: reported as the result of the first task:
+            result_q.put((str(ex),))
+            LOG.exception(ex)
+            return
+
+        while task_pool.is_parent_alive(parent_pid):
+            try:
+                task = task_q.get(timeout=task_pool.PARENT_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            except KeyboardInterrupt:
+                LOG.debug(
+                    "Ignoring interruption of idle pooled task process.")
+                continue
+            if task is None:
+                break
+
+            # NOTE: interrupting the task (i.e. cancelling it) also stops the
+            # process, as its state is not to be trusted afterwards:
+            task_pool.set_current_task(task[1])
+            result_q.put((_run_task(*task),))
+            task_pool.set_current_task(None)
     finally:
+        task_pool.clear_state()
         # Signal the log event handler that there are no more events
         mp_log_q.put(None)
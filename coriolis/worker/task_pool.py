@@ -0,0 +1,266 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+""" Pool of long-lived processes for running the tasks of a Worker service.
+
+Starting a new process for each task implies re-importing Coriolis and its
+provider plugins, parsing the config and setting up logging all over again,
+so the task processes are instead kept around and reused. As the shared
+libraries needed by the providers of a task are loaded through the
+'LD_LIBRARY_PATH' the process was started with, the pool is partitioned by
+the set of extra library paths of the processes.
+
+Each pooled process records the ID of the task it is running in a state
+file, so that task cancellation requests (which target the process by its
+PID and may be handled by any process of the Worker service) do not
+interrupt a different task than the one they are meant for. The process is
+only reported as running a task once it has recorded it, so that no
+cancellation request can find it still idle.
+"""
+
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+import psutil
+
+from coriolis import utils
+
+
+task_pool_opts = [
+    cfg.IntOpt("task_process_pool_size",
+               default=2,
+               min=0,
+               help="Maximum number of idle task processes which each "
+                    "process of the Worker service keeps around for running "
+                    "subsequent tasks. 0 disables the reuse of task "
+                    "processes, starting a new process for each task."),
+    cfg.IntOpt("task_process_max_tasks",
+               default=20,
+               min=1,
+               help="Number of tasks after which a pooled task process is "
+                    "replaced with a new one."),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(task_pool_opts, 'worker')
+
+LOG = logging.getLogger(__name__)
+
+TASK_PROCESS_STOP_TIMEOUT = 10
+TASK_START_CHECK_INTERVAL = 0.1
+PARENT_CHECK_INTERVAL = 5
+
+_STATE_DIR = os.path.join(
+    tempfile.gettempdir(), "coriolis-task-processes")
+
+
+def _get_state_file_path(pid):
+    return os.path.join(_STATE_DIR, str(pid))
+
+
+def set_current_task(task_id):
+    """ Records the ID of the task the current pooled process is running,
+    or that it is idle if the task ID is None.
+    """
+    os.makedirs(_STATE_DIR, exist_ok=True)
+    path = _get_state_file_path(os.getpid())
+    tmp_path = "%s.tmp" % path
+    with open(tmp_path, "w") as fd:
+        fd.write(task_id or "")
+    os.replace(tmp_path, path)
+
+
+def clear_state():
+    try:
+        os.remove(_get_state_file_path(os.getpid()))
+    except OSError:
+        pass
+
+
+def get_process_task(pid):
+    """ Returns a tuple with whether the process with the given PID is a
+    pooled task process and the ID of the task it is running, if any.
+    """
+    path = _get_state_file_path(pid)
+    try:
+        with open(path) as fd:
+            task_id = fd.read().strip()
+        modified_at = os.path.getmtime(path)
+        created_at = psutil.Process(pid).create_time()
+    except (OSError, psutil.Error):
+        return False, None
+    if modified_at < created_at:
+        # stale file of a previous process with the same PID:
+        return False, None
+    return True, task_id or None
+
+
+def is_parent_alive(parent_pid):
+    return os.getppid() == parent_pid
+
+
+class PooledTaskProcess(object):
+
+    def __init__(self, target, library_paths):
+        self.library_paths = library_paths
+        self.tasks_run = 0
+        mp_ctx = multiprocessing.get_context('spawn')
+        self.task_q = mp_ctx.Queue()
+        self.result_q = mp_ctx.Queue()
+        self.log_q = mp_ctx.Queue()
+        self.process = mp_ctx.Process(
+            target=target,
+            args=(os.getpid(), self.task_q, self.result_q, self.log_q))
+
+    def __repr__(self):
+        return "<%s(pid=%s, library_paths=%s, tasks_run=%s)>" % (
+            self.__class__.__name__, self.process.pid, self.library_paths,
+            self.tasks_run)
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def wait_for_task(self, task_id):
+        """ Waits for the process to record the given task as the one it is
+        running. Returns False if the process died before doing so.
+        """
+        while self.process.is_alive():
+            if get_process_task(self.pid) == (True, task_id):
+                return True
+            eventlet.sleep(TASK_START_CHECK_INTERVAL)
+        return False
+
+    def stop(self):
+        try:
+            if self.process.is_alive():
+                self.task_q.put(None)
+                self.process.join(TASK_PROCESS_STOP_TIMEOUT)
+            if self.process.is_alive():
+                LOG.warn(
+                    "Pooled task process %s did not stop in time. "
+                    "Terminating it.", self.pid)
+                self.process.terminate()
+                self.process.join(TASK_PROCESS_STOP_TIMEOUT)
+        except Exception:
+            LOG.warn(
+                "Error occurred while stopping pooled task process %s: %s",
+                self.pid, utils.get_exception_details())
+
+
+class TaskProcessPool(object):
+    """ Pool of task processes, partitioned by their extra library paths.
+
+    :param target: function run by the pooled processes, which gets passed
+    the PID of the parent process and the task, result and log queues.
+    :param start_process: function starting a process with the given
+    extra library paths.
+    :param handle_log_events: function which handles the log events of the
+    given process from the given queue until it is stopped.
+    """
+
+    def __init__(self, target, start_process, handle_log_events,
+                 max_idle_processes, max_tasks_per_process):
+        self._target = target
+        self._start_process = start_process
+        self._handle_log_events = handle_log_events
+        self._max_idle_processes = max_idle_processes
+        self._max_tasks_per_process = max_tasks_per_process
+        # NOTE: ordered from the least to the most recently used:
+        self._idle_processes = []
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stopped = False
+        atexit.register(self.stop)
+
+    def _start_new_process(self, library_paths):
+        # NOTE: the creation of the multiprocessing primitives of processes
+        # is serialized, as concurrent greenthreads would otherwise write to
+        # the multiprocessing resource tracker's pipe at the same time:
+        with self._start_lock:
+            pooled = PooledTaskProcess(self._target, library_paths)
+            self._start_process(pooled.process, list(library_paths))
+        eventlet.spawn(self._handle_log_events, pooled.process, pooled.log_q)
+        LOG.debug("Started new pooled task process: %s", pooled)
+        return pooled
+
+    def acquire(self, library_paths):
+        """ Returns an idle process with the given extra library paths,
+        starting a new one if there are none.
+        """
+        library_paths = tuple(library_paths)
+        dead_processes = []
+        pooled = None
+        with self._lock:
+            for candidate in reversed(self._idle_processes):
+                if candidate.library_paths != library_paths:
+                    continue
+                self._idle_processes.remove(candidate)
+                if candidate.is_alive():
+                    pooled = candidate
+                    break
+                dead_processes.append(candidate)
+        for dead in dead_processes:
+            LOG.debug("Discarding dead pooled task process: %s", dead)
+            eventlet.spawn(dead.stop)
+        if pooled:
+            LOG.debug("Reusing pooled task process: %s", pooled)
+            return pooled
+        return self._start_new_process(library_paths)
+
+    def release(self, pooled, reusable=True):
+        """ Returns the process to the pool after running a task, or stops
+        it if it is not reusable, has run the maximum number of tasks or
+        there are too many idle processes already.
+        """
+        to_stop = []
+        replace = False
+        if not reusable or not pooled.is_alive():
+            to_stop.append(pooled)
+        elif pooled.tasks_run >= self._max_tasks_per_process:
+            to_stop.append(pooled)
+            replace = True
+        else:
+            with self._lock:
+                if self._stopped:
+                    to_stop.append(pooled)
+                else:
+                    self._idle_processes.append(pooled)
+                    while len(self._idle_processes) > (
+                            self._max_idle_processes):
+                        to_stop.append(self._idle_processes.pop(0))
+
+        for process in to_stop:
+            LOG.debug("Stopping pooled task process: %s", process)
+            eventlet.spawn(process.stop)
+        if replace:
+            # NOTE: keep a warm process around for the next task with the
+            # same library paths:
+            self._add_idle_process(pooled.library_paths)
+
+    def _add_idle_process(self, library_paths):
+        try:
+            pooled = self._start_new_process(library_paths)
+        except Exception:
+            LOG.warn(
+                "Failed to start replacement pooled task process: %s",
+                utils.get_exception_details())
+            return
+        self.release(pooled)
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            idle_processes = self._idle_processes
+            self._idle_processes = []
+        for pooled in idle_processes:
+            pooled.stop()
@@ -0,0 +1,157 @@
+# Copyright 2026 Cloudbase Solutions Srl
+# All Rights Reserved.
+
+"""Microbenchmark for the disk data transfer path.
+
+By default, reports how many bytes get allocated on top of the downloaded
+chunk in order to produce the message sent to the SSH backup writer,
+comparing the previous implementation (which concatenated the message into
+a single bytes object) with the current buffer-based one.
+
+With --scaling, reports the compression throughput achieved by greenthreads
+compressing chunks in parallel, with and without offloading the compression
+to native threads.
+
+Usage: python tools/bench_data_transfer.py [--chunk-size BYTES] [--scaling]
+"""
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import struct  # noqa: E402
+import time  # noqa: E402
+import tracemalloc  # noqa: E402
+import zlib  # noqa: E402
+
+from oslo_config import cfg  # noqa: E402
+
+from coriolis import constants  # noqa: E402
+from coriolis import data_transfer  # noqa: E402
+
+
+def _legacy_encode_data(msg_id, path, offset, content, compress=True):
+    inflated_content = (path.encode() + b'\0' +
+                        struct.pack("<Q", offset) +
+                        content)
+    data_len_inflated = len(inflated_content)
+    compressed = False
+    if compress:
+        data_content = zlib.compress(inflated_content)
+        data_len = len(data_content)
+        compressed = data_len < data_len_inflated
+    if not compressed:
+        data_len = data_len_inflated
+        data_len_inflated = 0
+        data_content = inflated_content
+    return (struct.pack("<I", msg_id) +
+            struct.pack("<I", data_len) +
+            struct.pack("<I", data_len_inflated) +
+            data_content)
+
+
+def _legacy_send(msg):
+    # paramiko's buffered channel file copies each write into its buffer
+    # before handing the buffer's value over to the channel:
+    buf = bytearray()
+    buf += msg
+    return bytes(buf)
+
+
+def _send(buffers):
+    return len(buffers)
+
+
+def _measure(func, *args):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def _legacy_path(content, compress):
+    _legacy_send(_legacy_encode_data(
+        0, "/dev/sdb", 0, content, compress=compress))
+
+
+def _buffers_path(content, compress):
+    _send(data_transfer.encode_data_buffers(
+        0, "/dev/sdb", 0, memoryview(content), compress=compress))
+
+
+def _compression_throughput(content, workers, chunks):
+    """ Returns the compression throughput in MB/s and the longest time in
+    seconds during which other greenthreads could not run.
+    """
+    max_stall = [0]
+
+    def _ticker():
+        while True:
+            before = time.time()
+            eventlet.sleep(0.001)
+            max_stall[0] = max(max_stall[0], time.time() - before)
+
+    ticker = eventlet.spawn(_ticker)
+    pool = eventlet.greenpool.GreenPool(size=workers)
+    start = time.time()
+    for _ in pool.imap(
+            lambda _: data_transfer.compress_buffers(
+                [content], constants.COMPRESSION_FORMAT_ZLIB),
+            range(chunks)):
+        pass
+    elapsed = time.time() - start
+    ticker.kill()
+    return len(content) * chunks / elapsed / 1024 / 1024, max_stall[0]
+
+
+def _scaling(chunk_size):
+    # NOTE: random data with runs of zeros, to be somewhat compressible:
+    content = b"".join(
+        os.urandom(512) + b"\0" * 512 for _ in range(chunk_size // 1024))
+    worker_counts = sorted(set([1, 2, 4, os.cpu_count() or 1]))
+    print("%-8s %-10s %12s %16s" % (
+        "workers", "offloaded", "MB/s", "max stall (s)"))
+    for workers in worker_counts:
+        for offload in (False, True):
+            cfg.CONF.set_override("offload_compression", offload)
+            throughput, stall = _compression_throughput(
+                content, workers, workers * 4)
+            print("%-8d %-10s %12.2f %16.3f" % (
+                workers, offload, throughput, stall))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--chunk-size", type=int, default=10485760,
+        help="Size in bytes of the simulated chunk.")
+    parser.add_argument(
+        "--scaling", action="store_true",
+        help="Report the compression throughput for several numbers of "
+             "parallel workers.")
+    args = parser.parse_args()
+    cfg.CONF([], project="coriolis")
+
+    if args.scaling:
+        _scaling(args.chunk_size)
+        return
+
+    samples = {
+        "incompressible": os.urandom(args.chunk_size),
+        "compressible": b"coriolis" * (args.chunk_size // 8),
+    }
+    print("%-16s %-9s %16s %16s" % (
+        "data", "compress", "legacy (bytes)", "buffers (bytes)"))
+    for name, content in samples.items():
+        for compress in (False, True):
+            print("%-16s %-9s %16d %16d" % (
+                name, compress,
+                _measure(_legacy_path, content, compress),
+                _measure(_buffers_path, content, compress)))
+
+
+if __name__ == "__main__":
+    main()